@@ -7,6 +7,7 @@ from .routes.auth import auth_bp
 from .routes.sejours import sejours_bp
 from .routes.parametres import parametres_bp
 from .routes.countries import countries_bp
+from .routes.cities import cities_bp
 from .routes.chambres import chambres_bp
 from .routes.etablissements import etablissements_bp
 from .routes.data_management import data_bp
@@ -17,6 +18,17 @@ from .routes.mail import mail_bp
 from .routes.calendars import calendars_bp
 from .models.user import User
 from .services.activity_logger import ActivityLoggerMiddleware
+from .services.request_metrics import RequestMetricsMiddleware, request_metrics
+from .services.query_tracer import query_tracer
+from .services.sampling_profiler import profiler
+from .services.calendar_scheduler import calendar_scheduler
+from .services.http_client import http_client
+from .services.smtp_pool import smtp_pool
+from .services.mail_dispatcher import mail_dispatcher
+from .services.imap_listener import imap_listener
+from .services.newsletter_dispatcher import newsletter_dispatcher
+from .services.invoice_cache import invoice_cache
+from .services.cache_policy import cache_policy
 
 base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -29,6 +41,22 @@ app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024
 CORS(app)
 
 ActivityLoggerMiddleware(app)
+RequestMetricsMiddleware(app)
+query_tracer.init_app(app, registry=request_metrics)
+profiler.init_app(app, excluded_endpoints=(
+    'platform_admin.start_profiler',
+    'platform_admin.stop_profiler',
+    'platform_admin.get_profiler_status',
+    'platform_admin.get_profiler_stacks',
+))
+calendar_scheduler.init_app(app, registry=request_metrics)
+http_client.init_app(app, registry=request_metrics)
+smtp_pool.init_app(app, registry=request_metrics)
+mail_dispatcher.init_app(app, registry=request_metrics)
+imap_listener.init_app(app, registry=request_metrics)
+newsletter_dispatcher.init_app(app, registry=request_metrics)
+invoice_cache.init_app(app, registry=request_metrics)
+cache_policy.init_app(app)
 
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -43,6 +71,7 @@ app.register_blueprint(clients_bp)
 app.register_blueprint(sejours_bp)
 app.register_blueprint(parametres_bp)
 app.register_blueprint(countries_bp)
+app.register_blueprint(cities_bp)
 app.register_blueprint(chambres_bp)
 app.register_blueprint(etablissements_bp)
 app.register_blueprint(data_bp)
@@ -70,6 +99,9 @@ app.register_blueprint(platform_settings_bp)
 from .routes.newsletters import newsletters_bp
 app.register_blueprint(newsletters_bp)
 
+from .routes.metrics import metrics_bp
+app.register_blueprint(metrics_bp)
+
 @app.route('/')
 @login_required
 def index():
@@ -170,12 +202,5 @@ def tenant_dashboard():
 def favicon():
     return '', 204
 
-@app.after_request
-def add_header(response):
-    response.headers['Cache-Control'] = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '-1'
-    return response
-
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
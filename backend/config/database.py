@@ -1,16 +1,108 @@
 import os
+import time
+from contextvars import ContextVar
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+
+class DbStats:
+    """
+    Compteurs d'accès à la base de données pour la requête HTTP en cours
+
+    Attributes:
+        queries: Nombre de requêtes SQL exécutées
+        db_time: Temps cumulé passé dans la base de données (secondes)
+        connections: Nombre de connexions ouvertes
+        trace: Traceur de requêtes SQL (None si le traçage est désactivé)
+    """
+    __slots__ = ('queries', 'db_time', 'connections', 'trace')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.connections = 0
+        self.trace = None
+
+
+_db_stats = ContextVar('db_stats', default=None)
+
+
+def start_db_stats():
+    """
+    Commencer à compter les accès base de données dans le contexte courant
+
+    Returns:
+        Tuple (stats, token) - le token permet de restaurer le contexte avec stop_db_stats
+    """
+    stats = DbStats()
+    token = _db_stats.set(stats)
+    return stats, token
+
+
+def stop_db_stats(token):
+    """Arrêter le comptage démarré par start_db_stats"""
+    _db_stats.reset(token)
+
+
+def get_db_stats():
+    """Obtenir les compteurs du contexte courant (None hors requête instrumentée)"""
+    return _db_stats.get()
+
+
+class InstrumentedCursor(RealDictCursor):
+    """
+    RealDictCursor qui mesure le temps passé dans chaque requête SQL
+
+    Hors d'un contexte instrumenté, le coût se limite à la lecture d'une ContextVar.
+    Lorsque le traçage est actif pour la requête HTTP, chaque instruction est
+    également transmise au traceur (texte normalisé, durée, nombre de lignes).
+    """
+
+    def execute(self, query, vars=None):
+        stats = _db_stats.get()
+        if stats is None:
+            return super().execute(query, vars)
+
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.queries += 1
+            stats.db_time += elapsed
+            if stats.trace is not None:
+                stats.trace.record(query, elapsed, self.rowcount)
+
+    def executemany(self, query, vars_list):
+        stats = _db_stats.get()
+        if stats is None:
+            return super().executemany(query, vars_list)
+
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            elapsed = time.perf_counter() - start
+            stats.queries += 1
+            stats.db_time += elapsed
+            if stats.trace is not None:
+                stats.trace.record(query, elapsed, self.rowcount)
+
+
 def get_db_connection():
     """
     Obtenir une connexion à la base de données PostgreSQL
-    
+
     Returns:
         psycopg2.connection: Connexion à la base de données avec RealDictCursor
     """
     conn = psycopg2.connect(
         os.environ['DATABASE_URL'],
-        cursor_factory=RealDictCursor
+        cursor_factory=InstrumentedCursor
     )
+
+    stats = _db_stats.get()
+    if stats is not None:
+        stats.connections += 1
+
     return conn
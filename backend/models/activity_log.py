@@ -9,7 +9,7 @@ class ActivityLog:
     """
     
     @staticmethod
-    def create(user_id, username, action, route, method, ip_address, user_agent, status_code=None, details=None, etablissement_id=None):
+    def create(user_id, username, action, route, method, ip_address, user_agent, status_code=None, details=None, etablissement_id=None, duration_ms=None):
         """
         Créer un nouveau log d'activité
         
@@ -24,6 +24,7 @@ class ActivityLog:
             status_code: Code de statut HTTP (optionnel)
             details: Informations supplémentaires au format JSON (optionnel)
             etablissement_id: ID de l'établissement concerné (optionnel)
+            duration_ms: Durée de traitement de la requête en millisecondes (optionnel)
         """
         conn = get_db_connection()
         cur = conn.cursor()
@@ -34,9 +35,10 @@ class ActivityLog:
             cur.execute('''
                 INSERT INTO activity_logs (
                     user_id, username, action, route, method, 
-                    ip_address, user_agent, status_code, details, created_at, etablissement_id
+                    ip_address, user_agent, status_code, details, created_at, etablissement_id,
+                    duration_ms
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id
             ''', (
                 user_id,
@@ -49,7 +51,8 @@ class ActivityLog:
                 status_code,
                 details_json,
                 datetime.now(),
-                etablissement_id
+                etablissement_id,
+                duration_ms
             ))
             
             log_id = cur.fetchone()['id']
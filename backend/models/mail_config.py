@@ -6,7 +6,12 @@ from typing import Optional, Dict, List
 
 
 class MailConfig:
-    """Gestion des configurations mail SMTP/POP"""
+    """
+    Gestion des configurations mail SMTP/POP/IMAP
+    
+    Les champs pop_* décrivent le serveur de réception, POP3 ou IMAP selon
+    incoming_protocol ('pop3' par défaut, ou 'imap').
+    """
     
     @staticmethod
     def create(data: Dict) -> int:
@@ -19,8 +24,8 @@ class MailConfig:
                 etablissement_id, nom_config, email_address,
                 smtp_host, smtp_port, smtp_username, smtp_password, smtp_use_tls,
                 pop_host, pop_port, pop_username, pop_password, pop_use_ssl,
-                actif
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                actif, send_rate_per_minute, incoming_protocol, imap_folder
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             RETURNING id
         ''', (
             data.get('etablissement_id'),
@@ -36,7 +41,10 @@ class MailConfig:
             data.get('pop_username'),
             data.get('pop_password'),
             data.get('pop_use_ssl', True),
-            data.get('actif', True)
+            data.get('actif', True),
+            data.get('send_rate_per_minute'),
+            data.get('incoming_protocol') or 'pop3',
+            data.get('imap_folder') or 'INBOX'
         ))
         
         config_id = cur.fetchone()['id']
@@ -102,6 +110,9 @@ class MailConfig:
                 pop_password = %s,
                 pop_use_ssl = %s,
                 actif = %s,
+                send_rate_per_minute = %s,
+                incoming_protocol = %s,
+                imap_folder = %s,
                 updated_at = CURRENT_TIMESTAMP
             WHERE id = %s
         ''', (
@@ -118,6 +129,9 @@ class MailConfig:
             data.get('pop_password'),
             data.get('pop_use_ssl'),
             data.get('actif'),
+            data.get('send_rate_per_minute'),
+            data.get('incoming_protocol') or 'pop3',
+            data.get('imap_folder') or 'INBOX',
             config_id
         ))
         
@@ -0,0 +1,332 @@
+"""
+Modèle pour la file d'attente des emails sortants
+
+Cycle de vie d'un message : pending -> sending -> sent, ou retour à pending
+(nouvelle tentative avec recul exponentiel) et dead après MAIL_QUEUE_MAX_ATTEMPTS
+tentatives ou un refus définitif du serveur. Un message en cours d'envoi porte
+l'échéance de son bail dans next_attempt_at : si le worker qui l'a réservé meurt,
+il redevient éligible à l'expiration du bail.
+"""
+from typing import Dict, List, Optional
+from psycopg2.extras import execute_values
+from ..config.database import get_db_connection
+
+# Espace de noms des verrous consultatifs (pg_try_advisory_xact_lock(espace, mail_config_id))
+RATE_LOCK_NAMESPACE = 7241502
+
+# Nouvelle tentative : recul exponentiel selon le nombre de tentatives déjà faites, gigue de ±50 %
+_NEXT_RETRY_SQL = '''
+    CURRENT_TIMESTAMP + make_interval(secs => LEAST(
+        %(base_delay)s * power(2, LEAST(attempts - 1, 20)), %(max_delay)s
+    ) * (0.5 + random()))
+'''
+
+
+class MailQueue:
+    """Gestion de la file d'attente des emails sortants"""
+    
+    @staticmethod
+    def enqueue(config_id: int, messages: List[Dict], user_id: Optional[int] = None) -> List[int]:
+        """
+        Mettre des emails en file d'envoi
+        
+        Args:
+            config_id: ID de la configuration mail
+            messages: Liste de dicts (to_email, subject, body_html, cc_email, bcc_email)
+            user_id: Utilisateur à l'origine de l'envoi
+        
+        Returns:
+            Les IDs des messages, dans l'ordre
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        rows = execute_values(cur, '''
+            INSERT INTO mail_queue (
+                mail_config_id, to_email, cc_email, bcc_email, subject, body_html, created_by_user_id
+            ) VALUES %s
+            RETURNING id
+        ''', [(
+            config_id,
+            message['to_email'],
+            message.get('cc_email'),
+            message.get('bcc_email'),
+            message['subject'],
+            message['body_html'],
+            user_id
+        ) for message in messages], fetch=True)
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return [row['id'] for row in rows]
+    
+    @staticmethod
+    def claim(limit: int, lease_seconds: int, default_rate: int) -> List[Dict]:
+        """
+        Réserver des messages échus pour l'envoi, dans la limite de débit de chaque configuration
+        
+        Les lignes sont verrouillées avec FOR UPDATE SKIP LOCKED : plusieurs
+        threads ou workers peuvent réserver en parallèle sans se bloquer ni
+        prendre les mêmes messages. Le verrou consultatif de la configuration,
+        pris pour la durée de la transaction, rend le calcul du débit restant
+        cohérent entre workers ; une configuration déjà traitée ailleurs est
+        passée.
+        
+        Args:
+            limit: Nombre maximal de messages réservés
+            lease_seconds: Durée du bail avant qu'un message non confirmé redevienne éligible
+            default_rate: Messages par minute des configurations sans send_rate_per_minute
+        
+        Returns:
+            Les messages réservés (statut sending, attempts incrémenté)
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT c.id, COALESCE(c.send_rate_per_minute, %s) AS rate
+            FROM mail_configs c
+            WHERE c.id IN (
+                SELECT DISTINCT mail_config_id FROM mail_queue
+                WHERE status IN ('pending', 'sending') AND next_attempt_at <= CURRENT_TIMESTAMP
+            )
+            ORDER BY random()
+        ''', (default_rate,))
+        configs = cur.fetchall()
+        
+        claimed = []
+        for config in configs:
+            if len(claimed) >= limit:
+                break
+            
+            cur.execute('SELECT pg_try_advisory_xact_lock(%s, %s) AS acquired', (RATE_LOCK_NAMESPACE, config['id']))
+            if not cur.fetchone()['acquired']:
+                continue
+            
+            cur.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM mail_queue
+                     WHERE mail_config_id = %(config_id)s AND status = 'sent'
+                       AND sent_at > CURRENT_TIMESTAMP - INTERVAL '1 minute')
+                  + (SELECT COUNT(*) FROM mail_queue
+                     WHERE mail_config_id = %(config_id)s AND status = 'sending'
+                       AND next_attempt_at > CURRENT_TIMESTAMP) AS used
+            ''', {'config_id': config['id']})
+            budget = min(config['rate'] - cur.fetchone()['used'], limit - len(claimed))
+            if budget <= 0:
+                continue
+            
+            cur.execute('''
+                UPDATE mail_queue q SET
+                    status = 'sending',
+                    attempts = q.attempts + 1,
+                    next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %(lease)s)
+                FROM (
+                    SELECT id FROM mail_queue
+                    WHERE mail_config_id = %(config_id)s
+                      AND status IN ('pending', 'sending') AND next_attempt_at <= CURRENT_TIMESTAMP
+                    ORDER BY next_attempt_at, id
+                    LIMIT %(budget)s
+                    FOR UPDATE SKIP LOCKED
+                ) due
+                WHERE q.id = due.id
+                RETURNING q.*
+            ''', {'config_id': config['id'], 'lease': lease_seconds, 'budget': budget})
+            claimed.extend(cur.fetchall())
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return sorted(claimed, key=lambda row: row['id'])
+    
+    @staticmethod
+    def mark_sent(ids: List[int], from_email: str, notes: Optional[Dict[int, str]] = None):
+        """
+        Marquer des messages comme envoyés et les enregistrer dans le dossier 'sent'
+        
+        Args:
+            ids: IDs des messages acceptés par le serveur
+            from_email: Adresse d'expédition de la configuration
+            notes: Remarque par message (ex. destinataires en copie refusés)
+        """
+        if not ids:
+            return
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            WITH sent AS (
+                UPDATE mail_queue SET
+                    status = 'sent',
+                    sent_at = CURRENT_TIMESTAMP,
+                    last_error = NULL
+                WHERE id = ANY(%s) AND status = 'sending'
+                RETURNING *
+            ), numbered AS (
+                SELECT sent.*, nextval(pg_get_serial_sequence('emails', 'id')) AS email_id FROM sent
+            ), saved AS (
+                INSERT INTO emails (
+                    id, mail_config_id, subject, from_email, to_email, cc_email, bcc_email,
+                    folder, is_read, date_sent, snippet
+                )
+                SELECT email_id, mail_config_id, subject, %s, to_email, cc_email, bcc_email,
+                       'sent', TRUE, sent_at, email_snippet(NULL, body_html)
+                FROM numbered
+            )
+            INSERT INTO email_bodies (email_id, body_html)
+            SELECT email_id, body_html FROM numbered
+        ''', (ids, from_email))
+        
+        if notes:
+            cur.executemany('UPDATE mail_queue SET last_error = %s WHERE id = %s',
+                            [(note, queue_id) for queue_id, note in notes.items()])
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+    
+    @staticmethod
+    def mark_failed(failures: List[Dict], max_attempts: int, base_delay: int, max_delay: int) -> Dict:
+        """
+        Replanifier des messages en échec, ou les passer en dead
+        
+        Args:
+            failures: Liste de dicts (id, error, permanent)
+            max_attempts: Tentatives au-delà desquelles le message passe en dead
+            base_delay: Délai de la première nouvelle tentative (secondes)
+            max_delay: Plafond du recul exponentiel (secondes)
+        
+        Returns:
+            Dict: Nombre de messages replanifiés (retried) et abandonnés (dead)
+        """
+        if not failures:
+            return {'retried': 0, 'dead': 0}
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.executemany(f'''
+            UPDATE mail_queue SET
+                status = CASE WHEN %(permanent)s OR attempts >= %(max_attempts)s THEN 'dead' ELSE 'pending' END,
+                last_error = %(error)s,
+                next_attempt_at = CASE WHEN %(permanent)s OR attempts >= %(max_attempts)s
+                    THEN next_attempt_at ELSE {_NEXT_RETRY_SQL} END
+            WHERE id = %(id)s AND status = 'sending'
+        ''', [{
+            'id': failure['id'],
+            'error': failure['error'],
+            'permanent': failure['permanent'],
+            'max_attempts': max_attempts,
+            'base_delay': base_delay,
+            'max_delay': max_delay
+        } for failure in failures])
+        
+        cur.execute('''
+            SELECT status, COUNT(*) AS count FROM mail_queue
+            WHERE id = ANY(%s) GROUP BY status
+        ''', ([failure['id'] for failure in failures],))
+        counts = {row['status']: row['count'] for row in cur.fetchall()}
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return {'retried': counts.get('pending', 0), 'dead': counts.get('dead', 0)}
+    
+    @staticmethod
+    def get_by_id(queue_id: int) -> Optional[Dict]:
+        """Récupérer un message de la file (sans son contenu)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT id, mail_config_id, to_email, cc_email, bcc_email, subject, status,
+                   attempts, next_attempt_at, last_error, created_at, sent_at
+            FROM mail_queue WHERE id = %s
+        ''', (queue_id,))
+        item = cur.fetchone()
+        
+        cur.close()
+        conn.close()
+        
+        return dict(item) if item else None
+    
+    @staticmethod
+    def get_by_config(config_id: int, status: Optional[str] = None, limit: int = 50) -> List[Dict]:
+        """Récupérer les derniers messages d'une configuration (sans leur contenu)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT id, mail_config_id, to_email, cc_email, bcc_email, subject, status,
+                   attempts, next_attempt_at, last_error, created_at, sent_at
+            FROM mail_queue
+            WHERE mail_config_id = %s AND (%s::text IS NULL OR status = %s)
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        ''', (config_id, status, status, limit))
+        items = cur.fetchall()
+        
+        cur.close()
+        conn.close()
+        
+        return [dict(item) for item in items]
+    
+    @staticmethod
+    def count_by_status(config_id: Optional[int] = None) -> Dict[str, int]:
+        """Nombre de messages par statut (d'une configuration ou de toute la plateforme)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT status, COUNT(*) AS count FROM mail_queue
+            WHERE %s::integer IS NULL OR mail_config_id = %s
+            GROUP BY status
+        ''', (config_id, config_id))
+        counts = {status: 0 for status in ('pending', 'sending', 'sent', 'dead')}
+        counts.update({row['status']: row['count'] for row in cur.fetchall()})
+        
+        cur.close()
+        conn.close()
+        
+        return counts
+    
+    @staticmethod
+    def retry(queue_id: int) -> bool:
+        """Remettre en file un message abandonné (dead) ; retourner False s'il n'était pas abandonné"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            UPDATE mail_queue SET status = 'pending', attempts = 0, next_attempt_at = CURRENT_TIMESTAMP
+            WHERE id = %s AND status = 'dead'
+        ''', (queue_id,))
+        updated = cur.rowcount == 1
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return updated
+    
+    @staticmethod
+    def purge_sent(retention_days: int) -> int:
+        """Supprimer les messages envoyés depuis plus de retention_days jours (copie conservée dans emails)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            DELETE FROM mail_queue
+            WHERE status = 'sent' AND sent_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+        ''', (retention_days,))
+        deleted = cur.rowcount
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return deleted
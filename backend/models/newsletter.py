@@ -1,31 +1,87 @@
 from backend.config.database import get_db_connection
-from datetime import datetime
+from datetime import date, datetime
 import json
+import os
+
+# Adresses par appel SendGrid (1 000 personnalisations au plus par requête)
+NEWSLETTER_CHUNK_SIZE = min(int(os.environ.get('NEWSLETTER_CHUNK_SIZE', 1000)), 1000)
+
+# Destinataires choisis un par un : adresses déjà nettoyées et dédoublonnées, dans l'ordre d'origine
+_LIST_AUDIENCE_SQL = '''
+    SELECT lower(t.email) AS email_key, t.email, t.position, o.email_key IS NOT NULL AS desabonne
+    FROM unnest(%(emails)s::text[]) WITH ORDINALITY AS t(email, position)
+    LEFT JOIN newsletter_optouts o ON o.etablissement_id = %(etablissement_id)s AND o.email_key = lower(t.email)
+'''
 
 class Newsletter:
     """Modèle pour les newsletters envoyées"""
     
     @staticmethod
-    def create(etablissement_id, subject, content, content_type, recipient_emails, sent_by_user_id):
-        """Créer une nouvelle newsletter"""
+    def create(etablissement_id, subject, content, content_type, recipient_emails, sent_by_user_id,
+               html_content=None, segment=None, chunk_size=NEWSLETTER_CHUNK_SIZE):
+        """
+        Créer une nouvelle newsletter et planifier son envoi par lots
+        
+        Les destinataires (liste d'adresses, ou segment résolu en SQL) sont
+        répartis en lots de chunk_size adresses (un appel SendGrid par lot) par
+        une seule requête, dans la même transaction que la newsletter. Les
+        adresses désabonnées sont écartées.
+        
+        Returns:
+            dict avec newsletter_id et total_recipients, ou None s'il ne reste aucun destinataire
+        """
+        if segment:
+            audience_sql, params = NewsletterSegment._audience_sql(segment['criteres'])
+            order_by = 'email_key'
+        else:
+            audience_sql, params = _LIST_AUDIENCE_SQL, {'emails': recipient_emails}
+            order_by = 'position'
+        
         conn = get_db_connection()
         cur = conn.cursor()
         try:
             cur.execute('''
                 INSERT INTO newsletters (
                     etablissement_id, subject, content, content_type,
-                    recipient_emails, sent_by_user_id, sent_at, status
+                    recipient_emails, sent_by_user_id, sent_at, status,
+                    html_content, segment_id, segment_criteres
                 )
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                 RETURNING id
             ''', (
                 etablissement_id, subject, content, content_type,
-                json.dumps(recipient_emails), sent_by_user_id,
-                datetime.now(), 'pending'
+                None if segment else json.dumps(recipient_emails), sent_by_user_id,
+                datetime.now(), 'sending', html_content,
+                segment['id'] if segment else None,
+                json.dumps(segment['criteres']) if segment else None
             ))
-            newsletter_id = cur.fetchone()[0]
+            newsletter_id = cur.fetchone()['id']
+            
+            params.update({'etablissement_id': etablissement_id, 'newsletter_id': newsletter_id, 'chunk_size': chunk_size})
+            cur.execute(f'''
+                WITH audience AS ({audience_sql}),
+                numbered AS (
+                    SELECT email, (row_number() OVER (ORDER BY {order_by}) - 1) / %(chunk_size)s AS chunk_index
+                    FROM audience
+                    WHERE NOT desabonne
+                ),
+                chunks AS (
+                    INSERT INTO newsletter_chunks (newsletter_id, chunk_index, recipient_count)
+                    SELECT %(newsletter_id)s, chunk_index, COUNT(*) FROM numbered GROUP BY chunk_index
+                    RETURNING id, chunk_index
+                )
+                INSERT INTO newsletter_recipients (newsletter_id, chunk_id, email)
+                SELECT %(newsletter_id)s, chunks.id, numbered.email
+                FROM numbered JOIN chunks ON chunks.chunk_index = numbered.chunk_index
+            ''', params)
+            total = cur.rowcount
+            if not total:
+                conn.rollback()
+                return None
+            
+            cur.execute('UPDATE newsletters SET total_recipients = %s WHERE id = %s', (total, newsletter_id))
             conn.commit()
-            return newsletter_id
+            return {'newsletter_id': newsletter_id, 'total_recipients': total}
         except Exception as e:
             conn.rollback()
             raise e
@@ -54,14 +110,19 @@ class Newsletter:
     
     @staticmethod
     def get_by_etablissement(etablissement_id, limit=50):
-        """Récupérer les newsletters d'un établissement"""
+        """Récupérer les newsletters d'un établissement (sans la liste des destinataires)"""
         conn = get_db_connection()
         cur = conn.cursor()
         try:
             cur.execute('''
-                SELECT n.*, u.username, u.nom, u.prenom
+                SELECT n.id, n.etablissement_id, n.subject, n.content, n.content_type,
+                       n.sent_by_user_id, n.sent_at, n.status, n.error_message,
+                       n.total_recipients, n.sent_count, n.failed_count, n.completed_at,
+                       n.segment_id, s.nom AS segment_nom,
+                       u.username, u.nom, u.prenom
                 FROM newsletters n
                 LEFT JOIN users u ON n.sent_by_user_id = u.id
+                LEFT JOIN newsletter_segments s ON s.id = n.segment_id
                 WHERE n.etablissement_id = %s
                 ORDER BY n.sent_at DESC
                 LIMIT %s
@@ -69,24 +130,99 @@ class Newsletter:
             newsletters = []
             for row in cur.fetchall():
                 newsletters.append({
-                    'id': row[0],
-                    'etablissement_id': row[1],
-                    'subject': row[2],
-                    'content': row[3],
-                    'content_type': row[4],
-                    'recipient_emails': json.loads(row[5]) if row[5] else [],
-                    'sent_by_user_id': row[6],
-                    'sent_at': row[7].isoformat() if row[7] else None,
-                    'status': row[8],
-                    'error_message': row[9],
-                    'sent_by_username': row[10],
-                    'sent_by_nom': row[11],
-                    'sent_by_prenom': row[12]
+                    'id': row['id'],
+                    'etablissement_id': row['etablissement_id'],
+                    'subject': row['subject'],
+                    'content': row['content'],
+                    'content_type': row['content_type'],
+                    'sent_by_user_id': row['sent_by_user_id'],
+                    'sent_at': row['sent_at'].isoformat() if row['sent_at'] else None,
+                    'status': row['status'],
+                    'error_message': row['error_message'],
+                    'total_recipients': row['total_recipients'],
+                    'sent_count': row['sent_count'],
+                    'failed_count': row['failed_count'],
+                    'completed_at': row['completed_at'].isoformat() if row['completed_at'] else None,
+                    'segment_id': row['segment_id'],
+                    'segment_nom': row['segment_nom'],
+                    'sent_by_username': row['username'],
+                    'sent_by_nom': row['nom'],
+                    'sent_by_prenom': row['prenom']
                 })
             return newsletters
         finally:
             cur.close()
             conn.close()
+    
+    @staticmethod
+    def get_progress(newsletter_id, etablissement_id):
+        """Avancement de l'envoi d'une newsletter : compteurs, lots par statut, dernière erreur"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT id, status, total_recipients, sent_count, failed_count,
+                       sent_at, completed_at, error_message
+                FROM newsletters
+                WHERE id = %s AND etablissement_id = %s
+            ''', (newsletter_id, etablissement_id))
+            newsletter = cur.fetchone()
+            if not newsletter:
+                return None
+            
+            cur.execute('''
+                SELECT status, COUNT(*) AS count, MAX(next_attempt_at) FILTER (WHERE status = 'pending') AS next_attempt_at
+                FROM newsletter_chunks WHERE newsletter_id = %s GROUP BY status
+            ''', (newsletter_id,))
+            chunks = {status: 0 for status in ('pending', 'sending', 'sent', 'failed')}
+            next_attempt_at = None
+            for row in cur.fetchall():
+                chunks[row['status']] = row['count']
+                next_attempt_at = row['next_attempt_at'] or next_attempt_at
+            
+            cur.execute('''
+                SELECT last_error FROM newsletter_chunks
+                WHERE newsletter_id = %s AND last_error IS NOT NULL
+                ORDER BY attempts DESC, id DESC LIMIT 1
+            ''', (newsletter_id,))
+            last_error = cur.fetchone()
+            
+            total = newsletter['total_recipients']
+            done = newsletter['sent_count'] + newsletter['failed_count']
+            return {
+                'newsletter_id': newsletter['id'],
+                'status': newsletter['status'],
+                'total_recipients': total,
+                'sent': newsletter['sent_count'],
+                'failed': newsletter['failed_count'],
+                'pending': total - done,
+                'percent': round(100 * done / total, 1) if total else 100.0,
+                'chunks': chunks,
+                'next_attempt_at': next_attempt_at.isoformat() if next_attempt_at else None,
+                'last_error': last_error['last_error'] if last_error else newsletter['error_message'],
+                'sent_at': newsletter['sent_at'].isoformat() if newsletter['sent_at'] else None,
+                'completed_at': newsletter['completed_at'].isoformat() if newsletter['completed_at'] else None
+            }
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def get_recipients(newsletter_id, status=None, limit=500):
+        """Récupérer les destinataires d'une newsletter et leur statut d'envoi"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT email, status, error FROM newsletter_recipients
+                WHERE newsletter_id = %s AND (%s::text IS NULL OR status = %s)
+                ORDER BY id
+                LIMIT %s
+            ''', (newsletter_id, status, status, limit))
+            return [dict(row) for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
 
 
 class NewsletterConfig:
@@ -105,16 +241,7 @@ class NewsletterConfig:
                 LIMIT 1
             ''', (etablissement_id,))
             row = cur.fetchone()
-            if row:
-                return {
-                    'id': row[0],
-                    'etablissement_id': row[1],
-                    'sendgrid_api_key': row[2],
-                    'from_email': row[3],
-                    'from_name': row[4],
-                    'active': row[5]
-                }
-            return None
+            return dict(row) if row else None
         finally:
             cur.close()
             conn.close()
@@ -148,7 +275,7 @@ class NewsletterConfig:
                     RETURNING id
                 ''', (etablissement_id, sendgrid_api_key, from_email, from_name, True))
             
-            config_id = cur.fetchone()[0]
+            config_id = cur.fetchone()['id']
             conn.commit()
             return config_id
         except Exception as e:
@@ -157,3 +284,614 @@ class NewsletterConfig:
         finally:
             cur.close()
             conn.close()
+
+
+# Espace de noms des verrous consultatifs (pg_try_advisory_xact_lock(espace, etablissement_id))
+NEWSLETTER_LOCK_NAMESPACE = 7241504
+
+# Clôturer la newsletter quand plus aucun lot n'est à envoyer ; la ligne de la
+# newsletter, verrouillée en début de transaction, sérialise cette vérification
+_COMPLETE_SQL = '''
+    UPDATE newsletters SET
+        status = CASE WHEN failed_count = 0 THEN 'sent' WHEN sent_count = 0 THEN 'failed' ELSE 'partial' END,
+        error_message = CASE WHEN failed_count = 0 THEN NULL ELSE COALESCE((
+            SELECT last_error FROM newsletter_chunks
+            WHERE newsletter_id = %(newsletter_id)s AND last_error IS NOT NULL
+            ORDER BY id DESC LIMIT 1
+        ), failed_count || ' destinataire(s) refusé(s)') END,
+        completed_at = CURRENT_TIMESTAMP
+    WHERE id = %(newsletter_id)s AND status = 'sending' AND NOT EXISTS (
+        SELECT 1 FROM newsletter_chunks
+        WHERE newsletter_id = %(newsletter_id)s AND status IN ('pending', 'sending')
+    )
+'''
+
+
+class NewsletterChunk:
+    """
+    Lots d'envoi des newsletters (un appel SendGrid par lot)
+    
+    Cycle de vie d'un lot : pending -> sending -> sent, ou retour à pending
+    (nouvelle tentative avec recul exponentiel) et failed après le nombre
+    maximal de tentatives ou un refus définitif. Un lot en cours d'envoi porte
+    l'échéance de son bail dans next_attempt_at : si le worker qui l'a réservé
+    meurt, il redevient éligible à l'expiration du bail.
+    """
+    
+    @staticmethod
+    def claim(lease_seconds, default_rate):
+        """
+        Réserver un lot échu, dans la limite de débit de son établissement
+        
+        Args:
+            lease_seconds: Durée du bail avant qu'un lot non confirmé redevienne éligible
+            default_rate: Appels SendGrid par minute et par établissement
+        
+        Returns:
+            Le lot (avec sujet, source du modèle, nom de l'établissement et
+            destinataires en attente), ou None
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT etablissement_id FROM (
+                    SELECT DISTINCT n.etablissement_id
+                    FROM newsletter_chunks c
+                    JOIN newsletters n ON n.id = c.newsletter_id
+                    WHERE c.status IN ('pending', 'sending') AND c.next_attempt_at <= CURRENT_TIMESTAMP
+                ) due
+                ORDER BY random()
+            ''')
+            etablissement_ids = [row['etablissement_id'] for row in cur.fetchall()]
+            
+            chunk = None
+            for etablissement_id in etablissement_ids:
+                # Verrou non bloquant : un établissement déjà traité par un autre worker est sauté,
+                # aucun thread n'attend un verrou en tenant ceux des établissements précédents
+                cur.execute('SELECT pg_try_advisory_xact_lock(%s, %s) AS acquired',
+                            (NEWSLETTER_LOCK_NAMESPACE, etablissement_id))
+                if not cur.fetchone()['acquired']:
+                    continue
+                
+                cur.execute('''
+                    SELECT COUNT(*) AS used
+                    FROM newsletter_chunks c
+                    JOIN newsletters n ON n.id = c.newsletter_id
+                    WHERE n.etablissement_id = %s AND (
+                        (c.status = 'sent' AND c.sent_at > CURRENT_TIMESTAMP - INTERVAL '1 minute')
+                        OR (c.status = 'sending' AND c.next_attempt_at > CURRENT_TIMESTAMP)
+                    )
+                ''', (etablissement_id,))
+                if cur.fetchone()['used'] >= default_rate:
+                    continue
+                
+                cur.execute('''
+                    UPDATE newsletter_chunks c SET
+                        status = 'sending',
+                        attempts = c.attempts + 1,
+                        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                    FROM (
+                        SELECT c.id FROM newsletter_chunks c
+                        JOIN newsletters n ON n.id = c.newsletter_id
+                        WHERE n.etablissement_id = %s
+                          AND c.status IN ('pending', 'sending') AND c.next_attempt_at <= CURRENT_TIMESTAMP
+                        ORDER BY c.next_attempt_at, c.id
+                        LIMIT 1
+                        FOR UPDATE OF c SKIP LOCKED
+                    ) due
+                    WHERE c.id = due.id
+                    RETURNING c.*
+                ''', (lease_seconds, etablissement_id))
+                chunk = cur.fetchone()
+                if chunk:
+                    break
+            
+            if not chunk:
+                conn.commit()
+                return None
+            
+            chunk = dict(chunk)
+            cur.execute('''
+                SELECT n.etablissement_id, n.subject, n.html_content, e.nom_etablissement
+                FROM newsletters n
+                LEFT JOIN etablissements e ON e.id = n.etablissement_id
+                WHERE n.id = %s
+            ''', (chunk['newsletter_id'],))
+            chunk.update(cur.fetchone())
+            cur.execute('''
+                SELECT id, email FROM newsletter_recipients
+                WHERE chunk_id = %s AND status = 'pending'
+                ORDER BY id
+            ''', (chunk['id'],))
+            chunk['recipients'] = [dict(row) for row in cur.fetchall()]
+            
+            conn.commit()
+            return chunk
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def record_delivery(chunk_id, newsletter_id, sent_ids, rejected, error, permanent,
+                        max_attempts, base_delay, max_delay):
+        """
+        Enregistrer le résultat des appels SendGrid d'un lot
+        
+        Les destinataires acceptés passent en sent, ceux refusés par SendGrid en
+        failed. S'il reste des destinataires en attente, le lot est renvoyé
+        immédiatement (refus seuls, tentative non décomptée), replanifié avec recul
+        exponentiel et gigue (error), ou abandonné après max_attempts tentatives ou
+        un refus définitif : ses destinataires restants passent alors en failed.
+        
+        Args:
+            sent_ids: IDs des destinataires acceptés
+            rejected: Message d'erreur par ID de destinataire refusé
+            error: Erreur de l'appel en échec (None si aucun)
+            permanent: L'erreur est définitive (inutile de réessayer)
+        
+        Returns:
+            Le nouveau statut du lot, ou None s'il a été repris ailleurs entre-temps
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT id FROM newsletters WHERE id = %s FOR UPDATE', (newsletter_id,))
+            cur.execute("SELECT attempts FROM newsletter_chunks WHERE id = %s AND status = 'sending' FOR UPDATE",
+                        (chunk_id,))
+            chunk = cur.fetchone()
+            if not chunk:
+                conn.commit()
+                return None
+            
+            sent = failed = 0
+            if sent_ids:
+                cur.execute('''
+                    UPDATE newsletter_recipients SET status = 'sent'
+                    WHERE chunk_id = %s AND id = ANY(%s) AND status = 'pending'
+                ''', (chunk_id, list(sent_ids)))
+                sent = cur.rowcount
+            if rejected:
+                cur.execute('''
+                    UPDATE newsletter_recipients r SET status = 'failed', error = v.error
+                    FROM unnest(%s::bigint[], %s::text[]) AS v(id, error)
+                    WHERE r.id = v.id AND r.chunk_id = %s AND r.status = 'pending'
+                ''', (list(rejected.keys()), list(rejected.values()), chunk_id))
+                failed = cur.rowcount
+            
+            cur.execute('''
+                SELECT COUNT(*) FILTER (WHERE status = 'pending') AS pending,
+                       COUNT(*) FILTER (WHERE status = 'sent') AS sent
+                FROM newsletter_recipients WHERE chunk_id = %s
+            ''', (chunk_id,))
+            counts = cur.fetchone()
+            
+            if not counts['pending']:
+                status = 'sent' if counts['sent'] else 'failed'
+                last_error = None if status == 'sent' else (error or f'{failed} destinataire(s) refusé(s)')
+                cur.execute('''
+                    UPDATE newsletter_chunks SET status = %s, sent_at = CURRENT_TIMESTAMP, last_error = %s
+                    WHERE id = %s
+                ''', (status, last_error, chunk_id))
+            elif error is None:
+                status = 'pending'
+                cur.execute('''
+                    UPDATE newsletter_chunks SET
+                        status = 'pending', attempts = attempts - 1, next_attempt_at = CURRENT_TIMESTAMP,
+                        last_error = %s
+                    WHERE id = %s
+                ''', (f'{len(rejected)} destinataire(s) refusé(s)', chunk_id))
+            elif permanent or chunk['attempts'] >= max_attempts:
+                status = 'failed'
+                cur.execute('''
+                    UPDATE newsletter_chunks SET status = 'failed', last_error = %s WHERE id = %s
+                ''', (error, chunk_id))
+                cur.execute('''
+                    UPDATE newsletter_recipients SET status = 'failed', error = %s
+                    WHERE chunk_id = %s AND status = 'pending'
+                ''', (error, chunk_id))
+                failed += cur.rowcount
+            else:
+                status = 'pending'
+                cur.execute('''
+                    UPDATE newsletter_chunks SET
+                        status = 'pending',
+                        last_error = %(error)s,
+                        next_attempt_at = CURRENT_TIMESTAMP + make_interval(secs => LEAST(
+                            %(base_delay)s * power(2, LEAST(attempts - 1, 20)), %(max_delay)s
+                        ) * (0.5 + random()))
+                    WHERE id = %(id)s
+                ''', {'id': chunk_id, 'error': error, 'base_delay': base_delay, 'max_delay': max_delay})
+            
+            cur.execute('''
+                UPDATE newsletters SET sent_count = sent_count + %s, failed_count = failed_count + %s
+                WHERE id = %s
+            ''', (sent, failed, newsletter_id))
+            cur.execute(_COMPLETE_SQL, {'newsletter_id': newsletter_id})
+            conn.commit()
+            return status
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def count_by_status():
+        """Nombre de lots par statut (toute la plateforme)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('SELECT status, COUNT(*) AS count FROM newsletter_chunks GROUP BY status')
+            counts = {status: 0 for status in ('pending', 'sending', 'sent', 'failed')}
+            counts.update({row['status']: row['count'] for row in cur.fetchall()})
+            return counts
+        finally:
+            cur.close()
+            conn.close()
+
+
+# Critères d'un segment ; chacun porte sur l'ensemble des séjours de l'adresse dans l'établissement
+SEGMENT_CRITERIA = ('pays', 'sejour_du', 'sejour_au', 'sejours_min', 'sejours_max', 'extras', 'abonnement')
+SEGMENT_ABONNEMENTS = ('abonnes', 'desabonnes', 'tous')
+
+
+class NewsletterSegment:
+    """Modèle pour les segments de destinataires (critères résolus en SQL)"""
+    
+    @staticmethod
+    def normalize_criteria(criteres):
+        """
+        Valider les critères d'un segment et les ramener à leur forme enregistrée
+        
+        Raises:
+            ValueError: Critère inconnu ou valeur invalide (message affichable)
+        """
+        criteres = criteres or {}
+        if not isinstance(criteres, dict):
+            raise ValueError('Les critères doivent être un objet')
+        unknown = sorted(set(criteres) - set(SEGMENT_CRITERIA))
+        if unknown:
+            raise ValueError(f"Critère(s) inconnu(s): {', '.join(unknown)} (disponibles: {', '.join(SEGMENT_CRITERIA)})")
+        
+        normalized = {}
+        pays = criteres.get('pays') or []
+        if isinstance(pays, str):
+            pays = pays.split(',')
+        pays = list(dict.fromkeys(str(value).strip() for value in pays if str(value).strip()))
+        if pays:
+            normalized['pays'] = pays
+        
+        for key in ('sejour_du', 'sejour_au'):
+            if criteres.get(key):
+                try:
+                    normalized[key] = date.fromisoformat(str(criteres[key])).isoformat()
+                except ValueError:
+                    raise ValueError(f'Date invalide pour {key} (format AAAA-MM-JJ)')
+        if 'sejour_du' in normalized and 'sejour_au' in normalized and normalized['sejour_du'] > normalized['sejour_au']:
+            raise ValueError('La date de début de la période est postérieure à la date de fin')
+        
+        for key in ('sejours_min', 'sejours_max'):
+            if criteres.get(key) not in (None, ''):
+                try:
+                    normalized[key] = int(criteres[key])
+                except (TypeError, ValueError):
+                    raise ValueError(f'{key} doit être un nombre entier')
+                if normalized[key] < 0:
+                    raise ValueError(f'{key} doit être positif')
+        if normalized.get('sejours_min', 0) > normalized.get('sejours_max', float('inf')):
+            raise ValueError('Le nombre minimal de séjours dépasse le nombre maximal')
+        
+        extras = criteres.get('extras') or []
+        try:
+            extras = sorted({int(extra_id) for extra_id in extras})
+        except (TypeError, ValueError):
+            raise ValueError('extras doit être une liste d\'identifiants d\'extras')
+        if extras:
+            normalized['extras'] = extras
+        
+        abonnement = criteres.get('abonnement') or 'abonnes'
+        if abonnement not in SEGMENT_ABONNEMENTS:
+            raise ValueError(f"abonnement doit valoir {', '.join(SEGMENT_ABONNEMENTS)}")
+        normalized['abonnement'] = abonnement
+        return normalized
+    
+    @staticmethod
+    def _audience_sql(criteres):
+        """
+        Requête des destinataires d'un segment : une ligne par adresse (casse ignorée)
+        
+        Colonnes : email_key, email, nom, prenom, pays, ville (séjour le plus
+        récent), nombre_sejours, dernier_sejour, desabonne. Paramètres nommés :
+        etablissement_id, plus ceux des critères retournés avec la requête.
+        """
+        having = []
+        params = {}
+        extras_column = 'FALSE'
+        if criteres.get('pays'):
+            having.append('bool_or(lower(btrim(s.pays)) = ANY(%(pays)s))')
+            params['pays'] = [pays.lower() for pays in criteres['pays']]
+        
+        period = []
+        if criteres.get('sejour_du'):
+            period.append('s.date_depart >= %(sejour_du)s')
+            params['sejour_du'] = criteres['sejour_du']
+        if criteres.get('sejour_au'):
+            period.append('s.date_arrivee <= %(sejour_au)s')
+            params['sejour_au'] = criteres['sejour_au']
+        if period:
+            having.append(f"bool_or({' AND '.join(period)})")
+        
+        if criteres.get('sejours_min') is not None:
+            having.append('COUNT(DISTINCT s.reservation_id) >= %(sejours_min)s')
+            params['sejours_min'] = criteres['sejours_min']
+        if criteres.get('sejours_max') is not None:
+            having.append('COUNT(DISTINCT s.reservation_id) <= %(sejours_max)s')
+            params['sejours_max'] = criteres['sejours_max']
+        
+        if criteres.get('extras'):
+            extras_column = '''EXISTS (
+                SELECT 1 FROM sejours_extras se
+                WHERE se.reservation_id = r.id AND se.extra_id = ANY(%(extras)s)
+            )'''
+            having.append('bool_or(s.avec_extras)')
+            params['extras'] = criteres['extras']
+        
+        abonnement = criteres.get('abonnement') or 'abonnes'
+        where = {'abonnes': 'WHERE NOT desabonne', 'desabonnes': 'WHERE desabonne', 'tous': ''}[abonnement]
+        
+        sql = f'''
+            WITH sejours AS (
+                SELECT p.id AS personne_id, lower(btrim(p.email)) AS email_key, btrim(p.email) AS email,
+                       p.nom, p.prenom, p.pays, p.ville,
+                       r.id AS reservation_id, r.date_arrivee, r.date_depart,
+                       {extras_column} AS avec_extras
+                FROM reservations r
+                JOIN personnes p ON p.reservation_id = r.id
+                WHERE r.etablissement_id = %(etablissement_id)s AND p.email LIKE '%%_@_%%'
+            ), invites AS (
+                SELECT s.email_key, COUNT(DISTINCT s.reservation_id) AS nombre_sejours,
+                       MAX(s.date_arrivee) AS dernier_sejour
+                FROM sejours s
+                GROUP BY s.email_key
+                {'HAVING ' + ' AND '.join(having) if having else ''}
+            ), audience AS (
+                SELECT DISTINCT ON (s.email_key)
+                    s.email_key, s.email, s.nom, s.prenom, s.pays, s.ville,
+                    i.nombre_sejours, i.dernier_sejour, o.email_key IS NOT NULL AS desabonne
+                FROM invites i
+                JOIN sejours s ON s.email_key = i.email_key
+                LEFT JOIN newsletter_optouts o
+                    ON o.etablissement_id = %(etablissement_id)s AND o.email_key = i.email_key
+                ORDER BY s.email_key, s.date_arrivee DESC, s.personne_id DESC
+            )
+            SELECT * FROM audience {where}
+        '''
+        return sql, params
+    
+    @staticmethod
+    def get_audience(etablissement_id, criteres, limit=50, offset=0):
+        """
+        Résoudre des critères en destinataires : nombre total et une page d'adresses
+        
+        Returns:
+            dict avec total, desabonnes (parmi le total) et recipients
+        """
+        sql, params = NewsletterSegment._audience_sql(criteres)
+        params.update({'etablissement_id': etablissement_id, 'limit': limit, 'offset': offset})
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute(f'''
+                WITH audience AS ({sql}),
+                counts AS (
+                    SELECT COUNT(*) AS total, COUNT(*) FILTER (WHERE desabonne) AS desabonnes FROM audience
+                )
+                SELECT counts.total, counts.desabonnes, page.*
+                FROM counts
+                LEFT JOIN LATERAL (
+                    SELECT * FROM audience
+                    ORDER BY lower(nom), lower(prenom), email_key
+                    LIMIT %(limit)s OFFSET %(offset)s
+                ) page ON TRUE
+            ''', params)
+            rows = cur.fetchall()
+            recipients = [{
+                'email': row['email'],
+                'nom': row['nom'],
+                'prenom': row['prenom'],
+                'pays': row['pays'],
+                'ville': row['ville'],
+                'nombre_sejours': row['nombre_sejours'],
+                'dernier_sejour': row['dernier_sejour'].isoformat() if row['dernier_sejour'] else None,
+                'desabonne': row['desabonne']
+            } for row in rows if row['email_key']]
+            return {'total': rows[0]['total'], 'desabonnes': rows[0]['desabonnes'], 'recipients': recipients}
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def get_by_etablissement(etablissement_id):
+        """Récupérer les segments d'un établissement"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT id, nom, criteres, created_at, updated_at FROM newsletter_segments
+                WHERE etablissement_id = %s
+                ORDER BY lower(nom)
+            ''', (etablissement_id,))
+            return [{
+                'id': row['id'],
+                'nom': row['nom'],
+                'criteres': row['criteres'],
+                'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                'updated_at': row['updated_at'].isoformat() if row['updated_at'] else None
+            } for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def get_by_id(segment_id, etablissement_id):
+        """Récupérer un segment de l'établissement"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT id, etablissement_id, nom, criteres FROM newsletter_segments
+                WHERE id = %s AND etablissement_id = %s
+            ''', (segment_id, etablissement_id))
+            segment = cur.fetchone()
+            return dict(segment) if segment else None
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def create(etablissement_id, nom, criteres, created_by_user_id):
+        """Enregistrer un segment (critères déjà normalisés) et retourner son ID"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                INSERT INTO newsletter_segments (etablissement_id, nom, criteres, created_by_user_id)
+                VALUES (%s, %s, %s, %s)
+                RETURNING id
+            ''', (etablissement_id, nom, json.dumps(criteres), created_by_user_id))
+            segment_id = cur.fetchone()['id']
+            conn.commit()
+            return segment_id
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def update(segment_id, etablissement_id, nom, criteres):
+        """Modifier un segment ; retourner False s'il n'existe pas dans l'établissement"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                UPDATE newsletter_segments
+                SET nom = %s, criteres = %s, updated_at = CURRENT_TIMESTAMP
+                WHERE id = %s AND etablissement_id = %s
+            ''', (nom, json.dumps(criteres), segment_id, etablissement_id))
+            updated = cur.rowcount == 1
+            conn.commit()
+            return updated
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def delete(segment_id, etablissement_id):
+        """Supprimer un segment (les newsletters envoyées conservent leurs critères)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('DELETE FROM newsletter_segments WHERE id = %s AND etablissement_id = %s',
+                        (segment_id, etablissement_id))
+            deleted = cur.rowcount == 1
+            conn.commit()
+            return deleted
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def get_countries(etablissement_id):
+        """Pays des clients avec email de l'établissement et nombre d'adresses par pays"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT min(btrim(p.pays)) AS pays, COUNT(DISTINCT lower(btrim(p.email))) AS count
+                FROM reservations r
+                JOIN personnes p ON p.reservation_id = r.id
+                WHERE r.etablissement_id = %s AND p.email LIKE '%%_@_%%' AND btrim(p.pays) <> ''
+                GROUP BY lower(btrim(p.pays))
+                ORDER BY count DESC, pays
+            ''', (etablissement_id,))
+            return [dict(row) for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
+
+
+class NewsletterOptOut:
+    """Modèle pour les adresses désabonnées des newsletters d'un établissement"""
+    
+    @staticmethod
+    def add(etablissement_id, emails, source='manuel'):
+        """Désabonner des adresses ; retourner le nombre de nouvelles adresses désabonnées"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                INSERT INTO newsletter_optouts (etablissement_id, email_key, email, source)
+                SELECT %s, lower(email), email, %s FROM unnest(%s::text[]) AS t(email)
+                ON CONFLICT (etablissement_id, email_key) DO NOTHING
+            ''', (etablissement_id, source, emails))
+            added = cur.rowcount
+            conn.commit()
+            return added
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def remove(etablissement_id, email):
+        """Réabonner une adresse ; retourner False si elle n'était pas désabonnée"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('DELETE FROM newsletter_optouts WHERE etablissement_id = %s AND email_key = lower(btrim(%s))',
+                        (etablissement_id, email))
+            removed = cur.rowcount == 1
+            conn.commit()
+            return removed
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def get_by_etablissement(etablissement_id, limit=500):
+        """Récupérer les dernières adresses désabonnées d'un établissement"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        try:
+            cur.execute('''
+                SELECT email, source, created_at FROM newsletter_optouts
+                WHERE etablissement_id = %s
+                ORDER BY created_at DESC
+                LIMIT %s
+            ''', (etablissement_id, limit))
+            return [{
+                'email': row['email'],
+                'source': row['source'],
+                'created_at': row['created_at'].isoformat() if row['created_at'] else None
+            } for row in cur.fetchall()]
+        finally:
+            cur.close()
+            conn.close()
@@ -50,6 +50,48 @@ class Personne:
         
         return personnes
     
+    @staticmethod
+    def get_emails_by_reservation(reservation_id, etablissement_id):
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT DISTINCT lower(btrim(p.email)) AS email
+            FROM personnes p
+            JOIN reservations r ON r.id = p.reservation_id
+            WHERE p.reservation_id = %s AND r.etablissement_id = %s
+              AND COALESCE(btrim(p.email), '') <> ''
+        ''', (reservation_id, etablissement_id))
+        emails = [row['email'] for row in cur.fetchall()]
+        
+        cur.close()
+        conn.close()
+        
+        return emails
+    
+    @staticmethod
+    def get_newsletter_profiles(etablissement_id, emails):
+        """Profil de chaque adresse (dernier séjour dans l'établissement), indexé par email en minuscules"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT DISTINCT ON (lower(btrim(p.email)))
+                lower(btrim(p.email)) AS email_key, p.prenom, p.nom, p.pays, p.ville,
+                r.date_arrivee, r.date_depart,
+                COUNT(*) OVER (PARTITION BY lower(btrim(p.email))) AS nombre_sejours
+            FROM personnes p
+            JOIN reservations r ON r.id = p.reservation_id
+            WHERE r.etablissement_id = %s AND lower(btrim(p.email)) = ANY(%s)
+            ORDER BY lower(btrim(p.email)), r.date_arrivee DESC, p.id DESC
+        ''', (etablissement_id, [email.lower() for email in emails]))
+        profiles = {row['email_key']: row for row in cur.fetchall()}
+        
+        cur.close()
+        conn.close()
+        
+        return profiles
+    
     @staticmethod
     def get_all():
         conn = get_db_connection()
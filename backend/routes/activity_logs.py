@@ -81,6 +81,7 @@ def get_activity_logs():
                 'ip_address': log['ip_address'],
                 'user_agent': log['user_agent'],
                 'status_code': log['status_code'],
+                'duration_ms': float(log['duration_ms']) if log.get('duration_ms') is not None else None,
                 'details': log['details'],
                 'created_at': log['created_at'].isoformat() if log['created_at'] else None
             })
@@ -139,6 +140,7 @@ def get_activity_log(log_id):
                 'ip_address': log['ip_address'],
                 'user_agent': log['user_agent'],
                 'status_code': log['status_code'],
+                'duration_ms': float(log['duration_ms']) if log.get('duration_ms') is not None else None,
                 'details': log['details'],
                 'created_at': log['created_at'].isoformat() if log['created_at'] else None
             }
@@ -233,7 +235,7 @@ def export_activity_logs():
         
         writer.writerow([
             'ID', 'Utilisateur', 'Nom', 'Prénom', 'Action', 
-            'Route', 'Méthode', 'IP', 'Code Statut', 'Date/Heure'
+            'Route', 'Méthode', 'IP', 'Code Statut', 'Durée (ms)', 'Date/Heure'
         ])
         
         for log in logs:
@@ -247,6 +249,7 @@ def export_activity_logs():
                 log['method'],
                 log['ip_address'],
                 log['status_code'],
+                log.get('duration_ms') if log.get('duration_ms') is not None else '',
                 log['created_at'].strftime('%Y-%m-%d %H:%M:%S') if log['created_at'] else ''
             ])
         
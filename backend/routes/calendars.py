@@ -1,9 +1,13 @@
 """
 Routes pour la gestion des calendriers iCal
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, url_for
 from flask_login import login_required
+from ..models.chambre import Chambre
 from ..services.calendar_service import CalendarService
+from ..services.calendar_scheduler import calendar_scheduler
+from ..services.ical_export_service import IcalExportService, ICAL_EXPORT_MAX_AGE
+from ..utils.tenant_context import get_accessible_etablissement_ids, verify_etablissement_access
 
 calendars_bp = Blueprint('calendars', __name__)
 
@@ -81,6 +85,42 @@ def synchronize_calendar(calendar_id):
     return jsonify(result), 400
 
 
+@calendars_bp.route('/api/calendriers/synchroniser', methods=['POST'])
+@login_required
+def synchronize_all_calendars():
+    """
+    Synchroniser en parallèle les calendriers actifs d'un établissement
+    
+    Sans établissement précisé, les calendriers de tous les établissements
+    accessibles (toute la plateforme pour un PLATFORM_ADMIN) sont confiés au
+    planificateur (réponse 202) : leur synchronisation dépasserait le délai
+    d'une requête.
+    """
+    data = request.get_json(silent=True) or {}
+    etablissement_id = data.get('etablissement_id', request.args.get('etablissement_id'))
+    
+    if etablissement_id not in (None, ''):
+        if isinstance(etablissement_id, bool) or not str(etablissement_id).isdigit():
+            return jsonify({'error': 'etablissement_id invalide'}), 400
+        etablissement_id = int(etablissement_id)
+        if not verify_etablissement_access(etablissement_id):
+            return jsonify({'error': 'Accès refusé à cet établissement'}), 403
+        etablissement_ids = [etablissement_id]
+    else:
+        etablissement_ids = get_accessible_etablissement_ids()
+    
+    if etablissement_ids is None or len(etablissement_ids) > 1:
+        scheduled = CalendarService.schedule_now(etablissement_ids)
+        calendar_scheduler.notify()
+        return jsonify({
+            'scheduled': scheduled,
+            'message': f'Synchronisation de {scheduled} calendrier(s) planifiée en arrière-plan'
+        }), 202
+    
+    result = CalendarService.synchronize_all(etablissement_ids)
+    return jsonify(result)
+
+
 @calendars_bp.route('/api/calendriers/<int:calendar_id>/sejours', methods=['GET'])
 @login_required
 def get_calendar_sejours(calendar_id):
@@ -101,3 +141,71 @@ def get_all_ical_sejours():
         etablissement_id, date_debut, date_fin
     )
     return jsonify(sejours)
+
+
+@calendars_bp.route('/api/calendriers/export/<int:etablissement_id>', methods=['GET'])
+@login_required
+def get_calendar_export(etablissement_id):
+    """Liens d'export iCal d'un établissement et de ses chambres (le jeton est créé au premier appel)"""
+    if not verify_etablissement_access(etablissement_id):
+        return jsonify({'error': 'Accès refusé à cet établissement'}), 403
+    
+    export = IcalExportService.get_export(etablissement_id)
+    return jsonify(_export_links(export))
+
+
+@calendars_bp.route('/api/calendriers/export/<int:etablissement_id>/regenerer', methods=['POST'])
+@login_required
+def regenerate_calendar_export(etablissement_id):
+    """Remplacer le jeton d'export iCal (les liens déjà diffusés sont révoqués)"""
+    if not verify_etablissement_access(etablissement_id):
+        return jsonify({'error': 'Accès refusé à cet établissement'}), 403
+    
+    export = IcalExportService.regenerate_token(etablissement_id)
+    return jsonify(dict(_export_links(export), success=True, message='Nouveau lien d\'export généré'))
+
+
+def _export_links(export):
+    """URL publiques des flux d'un établissement"""
+    token = export['token']
+    return {
+        'etablissement_id': export['etablissement_id'],
+        'etablissement_url': url_for('calendars.export_etablissement_ical', token=token, _external=True),
+        'chambres': [
+            {
+                'chambre_id': chambre['id'],
+                'nom': chambre['nom'],
+                'url': url_for('calendars.export_chambre_ical', token=token, chambre_id=chambre['id'], _external=True)
+            }
+            for chambre in Chambre.get_by_etablissement(export['etablissement_id'])
+        ]
+    }
+
+
+@calendars_bp.route('/ical/<token>/etablissement.ics', methods=['GET'])
+def export_etablissement_ical(token):
+    """Flux iCal public des séjours d'un établissement (accès par jeton)"""
+    return _ical_response(IcalExportService.get_feed(token))
+
+
+@calendars_bp.route('/ical/<token>/chambres/<int:chambre_id>.ics', methods=['GET'])
+def export_chambre_ical(token, chambre_id):
+    """Flux iCal public des séjours d'une chambre (accès par jeton)"""
+    return _ical_response(IcalExportService.get_feed(token, chambre_id))
+
+
+def _ical_response(feed):
+    """Servir un flux rendu avec ETag / Last-Modified et, si accepté, en gzip"""
+    if feed is None:
+        return jsonify({'error': 'Flux introuvable'}), 404
+    
+    use_gzip = request.accept_encodings['gzip'] > 0
+    response = Response(feed['gzipped'] if use_gzip else feed['body'], mimetype='text/calendar')
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(feed['etag'] + ('-gz' if use_gzip else ''))
+    response.last_modified = feed['last_modified']
+    response.cache_control.public = True
+    response.cache_control.max_age = ICAL_EXPORT_MAX_AGE
+    return response.make_conditional(request)
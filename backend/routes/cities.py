@@ -1,68 +1,32 @@
 from flask import Blueprint, jsonify, request
-import json
-import os
+from ..services.reference_data import REFERENCE_DATA_MAX_AGE, CITY_SEARCH_LIMIT, get_city_index, get_pays_payload
+from ..utils.responses import payload_response
 
 cities_bp = Blueprint('cities', __name__)
 
-def get_data_file_path(filename):
-    backend_dir = os.path.dirname(os.path.dirname(__file__))
-    return os.path.join(backend_dir, 'data', filename)
+@cities_bp.record_once
+def load_city_index(state):
+    """Charger l'index des villes au démarrage plutôt qu'à la première requête"""
+    get_pays_payload()
+    get_city_index()
 
 @cities_bp.route('/api/pays', methods=['GET'])
 def get_pays():
-    try:
-        with open(get_data_file_path('pays.json'), 'r', encoding='utf-8') as f:
-            pays = json.load(f)
-        return jsonify(pays)
-    except Exception as e:
-        print(f"Erreur lors de la lecture des pays: {e}")
-        return jsonify({'error': 'Erreur lors de la récupération des pays'}), 500
+    return payload_response(get_pays_payload(), REFERENCE_DATA_MAX_AGE, public=True)
 
 @cities_bp.route('/api/villes/<pays_code>', methods=['GET'])
 def get_villes(pays_code):
-    try:
-        with open(get_data_file_path('villes.json'), 'r', encoding='utf-8') as f:
-            villes_data = json.load(f)
-        
-        villes = villes_data.get(pays_code, [])
-        return jsonify(villes)
-    except Exception as e:
-        print(f"Erreur lors de la lecture des villes: {e}")
-        return jsonify({'error': 'Erreur lors de la récupération des villes'}), 500
+    villes, _ = get_city_index().country_payloads(pays_code)
+    return payload_response(villes, REFERENCE_DATA_MAX_AGE, public=True)
 
 @cities_bp.route('/api/cities/<country_code>', methods=['GET'])
 def get_cities(country_code):
-    try:
-        with open(get_data_file_path('villes.json'), 'r', encoding='utf-8') as f:
-            villes_data = json.load(f)
-        
-        cities = villes_data.get(country_code.upper(), [])
-        return jsonify({
-            'country_code': country_code.upper(),
-            'cities': cities
-        })
-    except Exception as e:
-        print(f"Erreur lors de la lecture des villes: {e}")
-        return jsonify({'error': 'Erreur lors de la récupération des villes'}), 500
+    _, cities = get_city_index().country_payloads(country_code)
+    return payload_response(cities, REFERENCE_DATA_MAX_AGE, public=True)
 
 @cities_bp.route('/api/cities/search', methods=['GET'])
 def search_cities():
-    query = request.args.get('q', '').lower()
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', CITY_SEARCH_LIMIT, type=int)
     
-    try:
-        with open(get_data_file_path('villes.json'), 'r', encoding='utf-8') as f:
-            villes_data = json.load(f)
-        
-        all_cities = []
-        for country_code, cities in villes_data.items():
-            for city in cities:
-                if query in city.lower():
-                    all_cities.append({
-                        'name': city,
-                        'country_code': country_code
-                    })
-        
-        return jsonify(all_cities[:50])
-    except Exception as e:
-        print(f"Erreur lors de la recherche des villes: {e}")
-        return jsonify({'error': 'Erreur lors de la recherche'}), 500
+    return jsonify(get_city_index().search(query, limit))
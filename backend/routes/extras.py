@@ -1,10 +1,10 @@
 """
 Routes pour la gestion des extras
 """
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from ..services.extra_service import ExtraService
-from ..services.invoice_service import InvoiceService
+from ..services.invoice_cache import invoice_cache
 
 extras_bp = Blueprint('extras', __name__)
 
@@ -141,19 +141,12 @@ def get_extras_summary(etablissement_id):
     return jsonify(summary)
 
 
-@extras_bp.route('/api/sejours/<int:sejour_id>/facture', methods=['POST'])
+@extras_bp.route('/api/sejours/<int:sejour_id>/facture', methods=['GET', 'POST'])
 @login_required
 def generate_invoice(sejour_id):
-    """Générer une facture PDF pour un séjour"""
+    """Facture PDF d'un séjour clôturé (générée une fois, puis servie depuis le cache disque)"""
     try:
-        pdf_buffer = InvoiceService.generate_sejour_invoice(sejour_id)
-        
-        return send_file(
-            pdf_buffer,
-            mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f'facture_sejour_{sejour_id}.pdf'
-        )
+        return invoice_cache.send(sejour_id)
     except ValueError as e:
         error_msg = str(e)
         # Distinguer entre séjour non trouvé et séjour non clôturé
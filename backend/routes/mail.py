@@ -2,12 +2,24 @@
 Routes pour la gestion de la messagerie
 """
 from flask import Blueprint, request, jsonify
-from flask_login import login_required
+from flask_login import login_required, current_user
 from ..models.mail_config import MailConfig
+from ..models.mail_queue import MailQueue
+from ..models.personne import Personne
 from ..services.email_service import EmailService
+from ..services.imap_listener import imap_listener
+from ..services.mail_dispatcher import mail_dispatcher
+from ..services.smtp_pool import smtp_pool
+from ..utils.serializers import serialize_row, serialize_rows
+from ..utils.tenant_context import verify_etablissement_access
 
 mail_bp = Blueprint('mail', __name__)
 
+BULK_SEND_MAX_MESSAGES = 500
+INCOMING_PROTOCOLS = (None, '', 'pop3', 'imap')
+SEARCH_MAX_PER_PAGE = 100
+SEARCH_MAX_QUERY_LENGTH = 500
+
 
 def verify_config_access(config_id, etablissement_id):
     """Vérifier que l'utilisateur a accès à cette configuration mail"""
@@ -64,9 +76,12 @@ def get_mail_config(config_id):
 def create_mail_config():
     """Créer une nouvelle configuration mail"""
     data = request.get_json()
+    if data.get('incoming_protocol') not in INCOMING_PROTOCOLS:
+        return jsonify({'error': 'Protocole de réception invalide (pop3 ou imap)'}), 400
     
     try:
         config_id = MailConfig.create(data)
+        imap_listener.notify()
         return jsonify({
             'success': True,
             'config_id': config_id,
@@ -82,6 +97,8 @@ def update_mail_config(config_id):
     """Mettre à jour une configuration mail"""
     data = request.get_json()
     etablissement_id = data.get('etablissement_id')
+    if data.get('incoming_protocol') not in INCOMING_PROTOCOLS:
+        return jsonify({'error': 'Protocole de réception invalide (pop3 ou imap)'}), 400
     
     config, error = verify_config_access(config_id, etablissement_id)
     if error:
@@ -89,6 +106,8 @@ def update_mail_config(config_id):
     
     try:
         MailConfig.update(config_id, data)
+        smtp_pool.discard(config_id)
+        imap_listener.notify()
         return jsonify({
             'success': True,
             'message': 'Configuration mail mise à jour avec succès'
@@ -109,6 +128,8 @@ def delete_mail_config(config_id):
     
     try:
         MailConfig.delete(config_id)
+        smtp_pool.discard(config_id)
+        imap_listener.notify()
         return jsonify({
             'success': True,
             'message': 'Configuration mail supprimée avec succès'
@@ -120,7 +141,7 @@ def delete_mail_config(config_id):
 @mail_bp.route('/api/mail/send', methods=['POST'])
 @login_required
 def send_email():
-    """Envoyer un email"""
+    """Mettre un email en file d'envoi (distribué en arrière-plan)"""
     data = request.get_json()
     
     config_id = data.get('config_id')
@@ -139,14 +160,14 @@ def send_email():
         return jsonify({'error': error[0]}), error[1]
     
     try:
-        EmailService.send_email(
-            config_id=config_id,
-            to_email=to_email,
-            subject=subject,
-            body_html=body_html,
-            cc_email=cc_email,
-            bcc_email=bcc_email
-        )
+        queue_ids = MailQueue.enqueue(config_id, [{
+            'to_email': to_email,
+            'subject': subject,
+            'body_html': body_html,
+            'cc_email': cc_email,
+            'bcc_email': bcc_email
+        }], user_id=current_user.id)
+        mail_dispatcher.notify()
         
         client_email_indexed = data.get('client_email_indexed')
         if client_email_indexed:
@@ -154,25 +175,128 @@ def send_email():
         
         return jsonify({
             'success': True,
-            'message': 'Email envoyé avec succès'
-        })
+            'queue_id': queue_ids[0],
+            'status': 'pending',
+            'message': 'Email mis en file d\'envoi'
+        }), 202
     except Exception as e:
         return jsonify({'error': f'Erreur lors de l\'envoi: {str(e)}'}), 500
 
 
+@mail_bp.route('/api/mail/send-bulk', methods=['POST'])
+@login_required
+def send_bulk_emails():
+    """Mettre en file une série d'emails (ex. confirmations d'un groupe), envoyés sur une même session SMTP"""
+    data = request.get_json()
+    
+    config_id = data.get('config_id')
+    etablissement_id = data.get('etablissement_id')
+    messages = data.get('messages') or []
+    
+    if not config_id or not messages:
+        return jsonify({'error': 'Données manquantes'}), 400
+    
+    if len(messages) > BULK_SEND_MAX_MESSAGES:
+        return jsonify({'error': f'Maximum {BULK_SEND_MAX_MESSAGES} emails par envoi'}), 400
+    
+    if not all(m.get('to_email') and m.get('subject') and m.get('body_html') for m in messages):
+        return jsonify({'error': 'Chaque email doit avoir un destinataire, un sujet et un contenu'}), 400
+    
+    config, error = verify_config_access(config_id, etablissement_id)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    
+    try:
+        queue_ids = MailQueue.enqueue(config_id, messages, user_id=current_user.id)
+        mail_dispatcher.notify()
+        return jsonify({
+            'success': True,
+            'queue_ids': queue_ids,
+            'message': f'{len(queue_ids)} email(s) mis en file d\'envoi'
+        }), 202
+    except Exception as e:
+        return jsonify({'error': f'Erreur lors de l\'envoi: {str(e)}'}), 500
+
+
+@mail_bp.route('/api/mail/queue', methods=['GET'])
+@login_required
+def get_mail_queue():
+    """Obtenir les derniers messages de la file d'envoi d'une configuration et le nombre par statut"""
+    config_id = request.args.get('config_id', type=int)
+    etablissement_id = request.args.get('etablissement_id', type=int)
+    status = request.args.get('status')
+    limit = min(request.args.get('limit', 50, type=int), 500)
+    
+    if not config_id:
+        return jsonify({'error': 'Configuration requise'}), 400
+    
+    config, error = verify_config_access(config_id, etablissement_id)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    
+    try:
+        return jsonify({
+            'success': True,
+            'counts': MailQueue.count_by_status(config_id),
+            'items': serialize_rows(MailQueue.get_by_config(config_id, status, limit))
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@mail_bp.route('/api/mail/queue/<int:queue_id>', methods=['GET'])
+@login_required
+def get_mail_queue_item(queue_id):
+    """Obtenir le statut d'un message de la file d'envoi"""
+    etablissement_id = request.args.get('etablissement_id', type=int)
+    
+    item = MailQueue.get_by_id(queue_id)
+    if not item:
+        return jsonify({'error': 'Message non trouvé'}), 404
+    
+    config, error = verify_config_access(item['mail_config_id'], etablissement_id)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    
+    return jsonify({'success': True, 'item': serialize_row(item)})
+
+
+@mail_bp.route('/api/mail/queue/<int:queue_id>/retry', methods=['POST'])
+@login_required
+def retry_mail_queue_item(queue_id):
+    """Remettre en file un message abandonné après échecs"""
+    data = request.get_json(silent=True) or {}
+    etablissement_id = data.get('etablissement_id') or request.args.get('etablissement_id', type=int)
+    
+    item = MailQueue.get_by_id(queue_id)
+    if not item:
+        return jsonify({'error': 'Message non trouvé'}), 404
+    
+    config, error = verify_config_access(item['mail_config_id'], etablissement_id)
+    if error:
+        return jsonify({'error': error[0]}), error[1]
+    
+    if not MailQueue.retry(queue_id):
+        return jsonify({'error': 'Seuls les messages abandonnés peuvent être renvoyés'}), 409
+    
+    mail_dispatcher.notify()
+    return jsonify({'success': True, 'message': 'Email remis en file d\'envoi'})
+
+
 @mail_bp.route('/api/mail/fetch/<int:config_id>', methods=['POST'])
 @login_required
 def fetch_emails(config_id):
-    """Récupérer les emails via POP3"""
+    """Récupérer les nouveaux emails via POP3 ou IMAP (headers_only=true : en-têtes et aperçu seulement en POP3)"""
     limit = request.args.get('limit', 50, type=int)
     etablissement_id = request.args.get('etablissement_id', type=int)
+    headers_only = request.args.get('headers_only', 'false').lower() == 'true'
     
     config, error = verify_config_access(config_id, etablissement_id)
     if error:
         return jsonify({'error': error[0]}), error[1]
     
     try:
-        emails = EmailService.fetch_emails(config_id, limit)
+        emails = EmailService.fetch_emails(config_id, limit, headers_only=headers_only)
         return jsonify({
             'success': True,
             'count': len(emails),
@@ -201,6 +325,65 @@ def get_emails(config_id):
         return jsonify({'error': str(e)}), 500
 
 
+@mail_bp.route('/api/mail/search', methods=['GET'])
+@login_required
+def search_emails():
+    """
+    Rechercher dans les emails d'un établissement, classés par pertinence
+    
+    Paramètres: q, config_id, folder, guest_email (répétable), sejour_id
+    (adresses des personnes du séjour), page, per_page. Il faut un texte
+    recherché ou un client.
+    """
+    etablissement_id = request.args.get('etablissement_id', type=int)
+    if not etablissement_id:
+        return jsonify({'error': 'Établissement requis'}), 400
+    
+    # La recherche porte sur toutes les boîtes et tous les séjours de l'établissement
+    if not verify_etablissement_access(etablissement_id):
+        return jsonify({'error': 'Accès refusé à cet établissement'}), 403
+    
+    query = (request.args.get('q') or '').strip()
+    config_id = request.args.get('config_id', type=int)
+    folder = request.args.get('folder') or None
+    sejour_id = request.args.get('sejour_id', type=int)
+    guest_emails = [e.strip().lower() for e in request.args.getlist('guest_email') if e.strip()]
+    page = max(1, request.args.get('page', 1, type=int))
+    per_page = min(SEARCH_MAX_PER_PAGE, max(1, request.args.get('per_page', 20, type=int)))
+    
+    if len(query) > SEARCH_MAX_QUERY_LENGTH:
+        return jsonify({'error': f'Recherche limitée à {SEARCH_MAX_QUERY_LENGTH} caractères'}), 400
+    
+    if config_id:
+        config, error = verify_config_access(config_id, etablissement_id)
+        if error:
+            return jsonify({'error': error[0]}), error[1]
+    
+    if sejour_id:
+        sejour_emails = Personne.get_emails_by_reservation(sejour_id, etablissement_id)
+        if not sejour_emails:
+            # Séjour inconnu, d'un autre établissement ou sans adresse : aucune correspondance
+            return jsonify({'results': [], 'total': 0, 'page': page, 'per_page': per_page,
+                            'total_pages': 0, 'guest_emails': []})
+        guest_emails = sorted(set(guest_emails) | set(sejour_emails))
+    
+    if not query and not guest_emails:
+        return jsonify({'error': 'Texte recherché ou client requis'}), 400
+    
+    try:
+        found = EmailService.search_emails(etablissement_id, query, config_id, guest_emails, folder, page, per_page)
+        return jsonify({
+            'results': found['results'],
+            'total': found['total'],
+            'page': page,
+            'per_page': per_page,
+            'total_pages': (found['total'] + per_page - 1) // per_page,
+            'guest_emails': guest_emails
+        })
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
 @mail_bp.route('/api/mail/email/<int:email_id>', methods=['GET'])
 @login_required
 def get_email(email_id):
@@ -218,6 +401,7 @@ def get_email(email_id):
     if error:
         return jsonify({'error': error[0]}), error[1]
     
+    email_data = EmailService.ensure_full_body(email_data)
     EmailService.mark_as_read(email_id)
     return jsonify(email_data)
 
@@ -0,0 +1,36 @@
+"""
+Route d'exposition des métriques au format Prometheus
+"""
+import hmac
+import os
+from flask import Blueprint, Response, request, jsonify
+from flask_login import current_user
+from ..services.request_metrics import request_metrics
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+def _is_authorized():
+    """
+    Autoriser le scraping par jeton (METRICS_TOKEN) ou un PLATFORM_ADMIN connecté
+    """
+    token = os.environ.get('METRICS_TOKEN')
+    if token:
+        auth_header = request.headers.get('Authorization', '')
+        provided = auth_header[7:] if auth_header.startswith('Bearer ') else request.args.get('token', '')
+        if provided and hmac.compare_digest(provided, token):
+            return True
+
+    return current_user.is_authenticated and current_user.is_platform_admin()
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Exposer les métriques du worker courant au format texte Prometheus"""
+    if not _is_authorized():
+        return jsonify({'error': 'Accès refusé'}), 403
+
+    return Response(
+        request_metrics.render_prometheus(),
+        mimetype='text/plain; version=0.0.4; charset=utf-8'
+    )
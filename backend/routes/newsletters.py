@@ -1,14 +1,18 @@
 from flask import Blueprint, request, jsonify, render_template
 from flask_login import current_user
+from psycopg2.errors import UniqueViolation
 from backend.decorators.roles import tenant_admin_required
-from backend.models.newsletter import Newsletter, NewsletterConfig
-from backend.models.client import Client
+from backend.models.newsletter import Newsletter, NewsletterConfig, NewsletterSegment, NewsletterOptOut
 from backend.services.newsletter_service import NewsletterService
+from backend.services.newsletter_dispatcher import newsletter_dispatcher
+from backend.services.extra_service import ExtraService
 from backend.utils.tenant_context import get_current_etablissement_id
-from backend.utils.serializers import serialize_rows
 
 newsletters_bp = Blueprint('newsletters', __name__)
 
+# Adresses au plus par page de destinataires (sélection manuelle, aperçu des segments)
+AUDIENCE_MAX_LIMIT = 5000
+
 
 @newsletters_bp.route('/newsletters')
 @tenant_admin_required
@@ -54,6 +58,7 @@ def send_newsletter():
         content = data.get('content', '').strip()
         content_type = data.get('content_type', 'html')
         recipient_emails = data.get('recipient_emails', [])
+        segment_id = data.get('segment_id')
         
         if not subject:
             return jsonify({
@@ -67,7 +72,7 @@ def send_newsletter():
                 'error': 'Le contenu est obligatoire'
             }), 400
         
-        if not recipient_emails or len(recipient_emails) == 0:
+        if not segment_id and (not recipient_emails or len(recipient_emails) == 0):
             return jsonify({
                 'success': False,
                 'error': 'Aucun destinataire sélectionné'
@@ -79,14 +84,65 @@ def send_newsletter():
             content=content,
             content_type=content_type,
             recipient_emails=recipient_emails,
-            sent_by_user_id=user_id
+            sent_by_user_id=user_id,
+            segment_id=segment_id
         )
         
         if result['success']:
-            return jsonify(result)
+            newsletter_dispatcher.notify()
+            return jsonify(result), 202
         else:
             return jsonify(result), 400
-    
+            
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/<int:newsletter_id>/progress', methods=['GET'])
+@tenant_admin_required
+def get_newsletter_progress(newsletter_id):
+    """Avancement de l'envoi d'une newsletter"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        progress = Newsletter.get_progress(newsletter_id, etablissement_id)
+        if not progress:
+            return jsonify({'success': False, 'error': 'Newsletter non trouvée'}), 404
+        return jsonify({
+            'success': True,
+            'progress': progress
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/<int:newsletter_id>/recipients', methods=['GET'])
+@tenant_admin_required
+def get_newsletter_recipients(newsletter_id):
+    """Statut d'envoi par destinataire (filtrable: ?status=failed)"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        if not Newsletter.get_progress(newsletter_id, etablissement_id):
+            return jsonify({'success': False, 'error': 'Newsletter non trouvée'}), 404
+        
+        status = request.args.get('status') or None
+        if status not in (None, 'pending', 'sent', 'failed'):
+            return jsonify({'success': False, 'error': 'Statut invalide'}), 400
+        limit = min(5000, max(1, request.args.get('limit', 500, type=int)))
+        
+        return jsonify({
+            'success': True,
+            'recipients': Newsletter.get_recipients(newsletter_id, status, limit)
+        })
     except Exception as e:
         return jsonify({
             'success': False,
@@ -169,7 +225,7 @@ def save_newsletter_config():
             'success': True,
             'message': 'Configuration SendGrid enregistrée et testée avec succès'
         })
-    
+        
     except Exception as e:
         return jsonify({
             'success': False,
@@ -180,32 +236,269 @@ def save_newsletter_config():
 @newsletters_bp.route('/api/newsletters/clients', methods=['GET'])
 @tenant_admin_required
 def get_newsletter_clients():
-    """Récupérer les clients pour la sélection"""
+    """Récupérer les clients pour la sélection (une ligne par adresse, paginé: ?limit=&offset=)"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        limit = min(AUDIENCE_MAX_LIMIT, max(0, request.args.get('limit', 1000, type=int)))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        audience = NewsletterSegment.get_audience(etablissement_id, {'abonnement': 'tous'}, limit, offset)
+        
+        return jsonify({
+            'success': True,
+            'clients': audience['recipients'],
+            'total': audience['total'],
+            'desabonnes': audience['desabonnes']
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments', methods=['GET'])
+@tenant_admin_required
+def get_newsletter_segments():
+    """Récupérer les segments enregistrés"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        return jsonify({
+            'success': True,
+            'segments': NewsletterSegment.get_by_etablissement(etablissement_id)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments/options', methods=['GET'])
+@tenant_admin_required
+def get_newsletter_segment_options():
+    """Valeurs proposées dans l'éditeur de segments (pays des clients, extras)"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        extras = ExtraService.get_all_extras(etablissement_id, actif_only=False)
+        return jsonify({
+            'success': True,
+            'pays': NewsletterSegment.get_countries(etablissement_id),
+            'extras': [{'id': extra['id'], 'nom': extra['nom'], 'actif': extra['actif']} for extra in extras]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments', methods=['POST'])
+@tenant_admin_required
+def create_newsletter_segment():
+    """Enregistrer un segment"""
     try:
+        data = request.get_json() or {}
         etablissement_id = get_current_etablissement_id()
         if not etablissement_id:
             return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
-        clients_raw = Client.get_all_by_etablissement(etablissement_id)
-        clients = serialize_rows(clients_raw)
         
-        client_list = []
-        for client in clients:
-            if client.get('email'):
-                client_list.append({
-                    'id': client.get('id'),
-                    'nom': client.get('nom', ''),
-                    'prenom': client.get('prenom', ''),
-                    'email': client.get('email'),
-                    'pays': client.get('pays', ''),
-                    'ville': client.get('ville', '')
-                })
+        nom = (data.get('nom') or '').strip()
+        if not nom:
+            return jsonify({'success': False, 'error': 'Le nom du segment est obligatoire'}), 400
+        try:
+            criteres = NewsletterSegment.normalize_criteria(data.get('criteres'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
         
+        try:
+            segment_id = NewsletterSegment.create(etablissement_id, nom, criteres, current_user.id)
+        except UniqueViolation:
+            return jsonify({'success': False, 'error': 'Un segment porte déjà ce nom'}), 409
         return jsonify({
             'success': True,
-            'clients': client_list
+            'segment_id': segment_id,
+            'criteres': criteres
+        }), 201
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments/<int:segment_id>', methods=['PUT'])
+@tenant_admin_required
+def update_newsletter_segment(segment_id):
+    """Modifier un segment"""
+    try:
+        data = request.get_json() or {}
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        
+        nom = (data.get('nom') or '').strip()
+        if not nom:
+            return jsonify({'success': False, 'error': 'Le nom du segment est obligatoire'}), 400
+        try:
+            criteres = NewsletterSegment.normalize_criteria(data.get('criteres'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        try:
+            updated = NewsletterSegment.update(segment_id, etablissement_id, nom, criteres)
+        except UniqueViolation:
+            return jsonify({'success': False, 'error': 'Un segment porte déjà ce nom'}), 409
+        if not updated:
+            return jsonify({'success': False, 'error': 'Segment non trouvé'}), 404
+        return jsonify({
+            'success': True,
+            'criteres': criteres
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments/<int:segment_id>', methods=['DELETE'])
+@tenant_admin_required
+def delete_newsletter_segment(segment_id):
+    """Supprimer un segment"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        if not NewsletterSegment.delete(segment_id, etablissement_id):
+            return jsonify({'success': False, 'error': 'Segment non trouvé'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments/<int:segment_id>/audience', methods=['GET'])
+@tenant_admin_required
+def get_newsletter_segment_audience(segment_id):
+    """Destinataires d'un segment enregistré : nombre total et une page d'adresses (?limit=&offset=)"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        segment = NewsletterSegment.get_by_id(segment_id, etablissement_id)
+        if not segment:
+            return jsonify({'success': False, 'error': 'Segment non trouvé'}), 404
+        
+        limit = min(AUDIENCE_MAX_LIMIT, max(0, request.args.get('limit', 50, type=int)))
+        offset = max(0, request.args.get('offset', 0, type=int))
+        return jsonify({
+            'success': True,
+            **NewsletterSegment.get_audience(etablissement_id, segment['criteres'], limit, offset)
         })
     except Exception as e:
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
+
+
+@newsletters_bp.route('/api/newsletters/segments/preview', methods=['POST'])
+@tenant_admin_required
+def preview_newsletter_segment():
+    """Destinataires de critères non enregistrés (aperçu dans l'éditeur de segments)"""
+    try:
+        data = request.get_json() or {}
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        try:
+            criteres = NewsletterSegment.normalize_criteria(data.get('criteres'))
+        except ValueError as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        limit = min(AUDIENCE_MAX_LIMIT, max(0, int(data.get('limit', 20))))
+        return jsonify({
+            'success': True,
+            'criteres': criteres,
+            **NewsletterSegment.get_audience(etablissement_id, criteres, limit)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/optouts', methods=['GET'])
+@tenant_admin_required
+def get_newsletter_optouts():
+    """Récupérer les adresses désabonnées"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        limit = min(5000, max(1, request.args.get('limit', 500, type=int)))
+        return jsonify({
+            'success': True,
+            'optouts': NewsletterOptOut.get_by_etablissement(etablissement_id, limit)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/optouts', methods=['POST'])
+@tenant_admin_required
+def add_newsletter_optouts():
+    """Désabonner des adresses (elles sont écartées de toutes les newsletters)"""
+    try:
+        data = request.get_json() or {}
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        
+        emails = NewsletterService._normalize_recipients(data.get('emails') or [])
+        if not emails:
+            return jsonify({'success': False, 'error': 'Aucune adresse email valide'}), 400
+        added = NewsletterOptOut.add(etablissement_id, emails)
+        return jsonify({
+            'success': True,
+            'added': added,
+            'message': f'{added} adresse(s) désabonnée(s)'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@newsletters_bp.route('/api/newsletters/optouts', methods=['DELETE'])
+@tenant_admin_required
+def remove_newsletter_optout():
+    """Réabonner une adresse (?email=)"""
+    try:
+        etablissement_id = get_current_etablissement_id()
+        if not etablissement_id:
+            return jsonify({'success': False, 'error': 'Établissement non trouvé'}), 400
+        email = (request.args.get('email') or '').strip()
+        if not email:
+            return jsonify({'success': False, 'error': 'Adresse email requise'}), 400
+        if not NewsletterOptOut.remove(etablissement_id, email):
+            return jsonify({'success': False, 'error': 'Adresse non désabonnée'}), 404
+        return jsonify({'success': True})
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
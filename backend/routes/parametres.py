@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required
 from ..config.database import get_db_connection
+from ..services.cache_policy import cacheable
 from werkzeug.utils import secure_filename
 import json
 import os
@@ -15,6 +16,7 @@ def allowed_file(filename):
 
 @parametres_bp.route('/api/parametres', methods=['GET'])
 @login_required
+@cacheable()
 def get_parametres():
     conn = get_db_connection()
     cur = conn.cursor()
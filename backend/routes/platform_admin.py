@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, Response
 from flask_login import login_required, current_user
 from ..models.user import User
 from ..models.etablissement import Etablissement
@@ -7,6 +7,16 @@ from ..models.tenant_account import TenantAccount
 from ..decorators.roles import platform_admin_required
 from ..utils.serializers import serialize_row, serialize_rows
 from ..config.database import get_db_connection
+from ..services.query_tracer import query_tracer
+from ..services.http_client import http_client
+from ..services.smtp_pool import smtp_pool
+from ..services.mail_dispatcher import mail_dispatcher
+from ..services.imap_listener import imap_listener
+from ..models.mail_queue import MailQueue
+from ..services.newsletter_dispatcher import newsletter_dispatcher
+from ..models.newsletter import NewsletterChunk
+from ..services.invoice_cache import invoice_cache
+from ..services.sampling_profiler import profiler, ProfilerBusyError
 
 platform_admin_bp = Blueprint('platform_admin', __name__)
 
@@ -300,3 +310,133 @@ def delete_user(user_id):
     conn.close()
     
     return jsonify({'success': True, 'message': 'Utilisateur supprimé avec succès'})
+
+# ============== DIAGNOSTIC DES PERFORMANCES ==============
+
+@platform_admin_bp.route('/api/platform-admin/query-tracer', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_query_tracer():
+    """Obtenir la configuration du traceur SQL et les derniers signalements (worker courant)"""
+    return jsonify(query_tracer.status())
+
+@platform_admin_bp.route('/api/platform-admin/query-tracer', methods=['PUT'])
+@login_required
+@platform_admin_required
+def update_query_tracer():
+    """Activer/désactiver le traceur SQL et ajuster ses seuils (worker courant)"""
+    data = request.get_json() or {}
+    
+    try:
+        query_tracer.configure(
+            enabled=data.get('enabled'),
+            slow_threshold_ms=data.get('slow_threshold_ms'),
+            n_plus_one_threshold=data.get('n_plus_one_threshold')
+        )
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Paramètres du traceur invalides'}), 400
+    
+    return jsonify({'success': True, 'tracer': query_tracer.status()})
+
+@platform_admin_bp.route('/api/platform-admin/http-client', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_http_client_status():
+    """Obtenir l'état des disjoncteurs et les latences des hôtes externes (worker courant)"""
+    return jsonify(http_client.status())
+
+@platform_admin_bp.route('/api/platform-admin/smtp-pool', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_smtp_pool_status():
+    """Obtenir l'état des sessions SMTP réutilisées par configuration mail (worker courant)"""
+    return jsonify(smtp_pool.status())
+
+@platform_admin_bp.route('/api/platform-admin/mail-queue', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_mail_queue_status():
+    """Obtenir l'état de la file d'envoi des emails (plateforme) et des threads d'envoi (worker courant)"""
+    return jsonify({
+        'counts': MailQueue.count_by_status(),
+        'dispatcher': mail_dispatcher.status(),
+        'smtp_pool': smtp_pool.status()
+    })
+
+@platform_admin_bp.route('/api/platform-admin/imap-listener', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_imap_listener_status():
+    """Obtenir l'état des écoutes IDLE des boîtes IMAP (worker courant)"""
+    return jsonify(imap_listener.status())
+
+@platform_admin_bp.route('/api/platform-admin/newsletter-dispatcher', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_newsletter_dispatcher_status():
+    """Obtenir les lots de newsletters par statut et l'état des threads d'envoi (worker courant)"""
+    return jsonify({
+        'chunks': NewsletterChunk.count_by_status(),
+        'dispatcher': newsletter_dispatcher.status()
+    })
+
+@platform_admin_bp.route('/api/platform-admin/invoice-cache', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_invoice_cache_status():
+    """Obtenir les compteurs du cache des factures PDF (worker courant)"""
+    return jsonify(invoice_cache.status())
+
+@platform_admin_bp.route('/api/platform-admin/profiler', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_profiler_status():
+    """Obtenir l'état du profileur par échantillonnage (worker courant)"""
+    return jsonify(profiler.status())
+
+@platform_admin_bp.route('/api/platform-admin/profiler/start', methods=['POST'])
+@login_required
+@platform_admin_required
+def start_profiler():
+    """
+    Démarrer une session de profilage sur le worker courant
+    
+    Corps JSON: duration_seconds, max_requests, interval_ms, overhead_budget_percent
+    """
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        status = profiler.start(
+            duration_seconds=data.get('duration_seconds', 30),
+            max_requests=data.get('max_requests'),
+            interval_ms=data.get('interval_ms', 10),
+            overhead_budget_percent=data.get('overhead_budget_percent', 1.0)
+        )
+    except ProfilerBusyError as e:
+        return jsonify({'error': str(e)}), 409
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Paramètres du profileur invalides'}), 400
+    
+    return jsonify({'success': True, 'profiler': status}), 202
+
+@platform_admin_bp.route('/api/platform-admin/profiler/stop', methods=['POST'])
+@login_required
+@platform_admin_required
+def stop_profiler():
+    """Arrêter la session de profilage en cours sur le worker courant"""
+    return jsonify({'success': True, 'profiler': profiler.stop()})
+
+@platform_admin_bp.route('/api/platform-admin/profiler/stacks', methods=['GET'])
+@login_required
+@platform_admin_required
+def get_profiler_stacks():
+    """Télécharger les piles de la dernière session (format collapsed pour flamegraph)"""
+    status = profiler.status()
+    if status['running']:
+        return jsonify({'error': 'Session de profilage en cours', 'profiler': status}), 409
+    
+    return Response(
+        profiler.collapsed_stacks(),
+        mimetype='text/plain; charset=utf-8',
+        headers={'X-Profiler-Worker': str(status['worker'])}
+    )
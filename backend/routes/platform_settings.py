@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from flask_login import login_required, current_user
 from ..models.platform_settings import PlatformSettings
 from ..decorators.roles import platform_admin_required
+from ..services.cache_policy import cacheable
 
 platform_settings_bp = Blueprint('platform_settings', __name__)
 
@@ -9,6 +10,7 @@ platform_settings_bp = Blueprint('platform_settings', __name__)
 @platform_settings_bp.route('/api/platform-settings', methods=['GET'])
 @login_required
 @platform_admin_required
+@cacheable()
 def get_platform_settings():
     """Récupérer les paramètres de la plateforme (PLATFORM_ADMIN seulement)"""
     try:
@@ -74,6 +76,7 @@ def update_platform_settings():
 
 
 @platform_settings_bp.route('/api/platform-settings/public', methods=['GET'])
+@cacheable()
 def get_public_platform_settings():
     """Récupérer les paramètres publics de la plateforme (accessible à tous)"""
     try:
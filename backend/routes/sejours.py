@@ -9,6 +9,8 @@ from ..utils.tenant_context import (
     verify_etablissement_access
 )
 from ..config.database import get_db_connection
+from ..services.cache_policy import cacheable_response
+from ..services.invoice_cache import invoice_cache
 from datetime import datetime
 
 sejours_bp = Blueprint('sejours', __name__)
@@ -66,11 +68,15 @@ def get_sejour(sejour_id):
         cur.close()
         conn.close()
         
-        return jsonify({
+        response = jsonify({
             'sejour': serialize_row(sejour),
             'personnes': serialize_rows(personnes),
             'chambres': [dict(c) for c in chambres] if chambres else []
         })
+        # Un séjour clôturé ne change plus guère : le navigateur le revalide par ETag
+        if sejour.get('statut') == 'closed':
+            return cacheable_response(response)
+        return response
     return jsonify({'error': 'Séjour non trouvé'}), 404
 
 @sejours_bp.route('/api/sejours/generer-numero', methods=['GET'])
@@ -178,6 +184,8 @@ def update_sejour(sejour_id):
     
     data = request.get_json()
     Sejour.update(sejour_id, data)
+    # Réouverture ou modification : la facture en cache n'est plus à jour
+    invoice_cache.invalidate(sejour_id)
     return jsonify({'message': 'Séjour mis à jour avec succès'})
 
 @sejours_bp.route('/api/sejours/<int:sejour_id>', methods=['DELETE'])
@@ -189,6 +197,7 @@ def delete_sejour(sejour_id):
         return jsonify({'error': 'Accès refusé à ce séjour'}), 403
     
     Sejour.delete(sejour_id)
+    invoice_cache.invalidate(sejour_id)
     return jsonify({'message': 'Séjour supprimé avec succès'})
 
 @sejours_bp.route('/api/personnes', methods=['POST'])
@@ -202,6 +211,8 @@ def add_personne():
         return jsonify({'error': 'Accès refusé à cette séjour'}), 403
     
     personne_id = Personne.create(data)
+    if reservation_id:
+        invoice_cache.invalidate(reservation_id)
     return jsonify({
         'success': True,
         'personne_id': personne_id,
@@ -228,6 +239,7 @@ def update_personne(personne_id):
     
     data = request.get_json()
     Personne.update(personne_id, data)
+    invoice_cache.invalidate(result['reservation_id'])
     return jsonify({'message': 'Personne mise à jour avec succès'})
 
 @sejours_bp.route('/api/personnes/<int:personne_id>', methods=['DELETE'])
@@ -249,6 +261,7 @@ def delete_personne(personne_id):
         return jsonify({'error': 'Accès refusé'}), 403
     
     Personne.delete(personne_id)
+    invoice_cache.invalidate(result['reservation_id'])
     return jsonify({'message': 'Personne supprimée avec succès'})
 
 @sejours_bp.route('/api/personnes', methods=['GET'])
@@ -311,6 +324,8 @@ def close_sejour(sejour_id):
         ''', (user_id, sejour_id))
         
         conn.commit()
+        # Le séjour ne changera plus : générer sa facture dès maintenant
+        invoice_cache.prefill(sejour_id)
         
         return jsonify({
             'success': True,
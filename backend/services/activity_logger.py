@@ -1,4 +1,4 @@
-from flask import request
+from flask import request, g
 from flask_login import current_user
 from functools import wraps
 from backend.models.activity_log import ActivityLog
@@ -87,6 +87,10 @@ class ActivityLoggerMiddleware:
                 if request.path == '/favicon.ico':
                     return response
                 
+                # Flux iCal publics : interrogés en continu par les OTA, et le jeton figure dans l'URL
+                if request.path.startswith('/ical/'):
+                    return response
+                
                 user_id = current_user.id if current_user.is_authenticated else None
                 username = current_user.username if current_user.is_authenticated else 'Anonymous'
                 
@@ -102,6 +106,8 @@ class ActivityLoggerMiddleware:
                         'query_params': dict(request.args)
                     }
                 
+                timing = g.get('request_timing') or {}
+                
                 ActivityLog.create(
                     user_id=user_id,
                     username=username,
@@ -111,7 +117,8 @@ class ActivityLoggerMiddleware:
                     ip_address=ip_address,
                     user_agent=user_agent,
                     status_code=response.status_code,
-                    details=details
+                    details=details,
+                    duration_ms=timing.get('duration_ms')
                 )
             except Exception as e:
                 print(f"Erreur dans ActivityLoggerMiddleware: {e}")
@@ -0,0 +1,125 @@
+"""
+Politique de cache HTTP de l'application
+
+Remplace l'en-tête global « no-store » par une politique par type de réponse :
+- fichiers statiques : url_for('static', ...) ajoute l'empreinte du contenu
+  (?v=<sha256>) ; une URL dont l'empreinte correspond au fichier courant est
+  servie « public, max-age=1 an, immutable », les autres sont revalidées
+  (ETag / Last-Modified de Flask, réponse 304) ;
+- réponses ayant déjà leur politique (flux iCal, données de référence, vues
+  marquées @cacheable) : inchangées ;
+- tout le reste (données clients, séjours, administration, authentification) :
+  « no-store », considéré comme sensible par défaut.
+"""
+import hashlib
+import os
+import threading
+from functools import wraps
+from flask import current_app, make_response, request
+from werkzeug.security import safe_join
+
+STATIC_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+STATIC_HASH_LENGTH = 12
+
+NO_STORE = 'no-store, no-cache, must-revalidate, post-check=0, pre-check=0, max-age=0'
+
+
+def cacheable_response(response, max_age: int = 0, last_modified=None):
+    """
+    Rendre une réponse GET réutilisable par le navigateur de l'utilisateur
+    
+    La réponse est privée, porte un ETag calculé sur son corps (et
+    Last-Modified si fourni) ; avec max_age=0, le navigateur revalide à chaque
+    usage et reçoit un 304 sans corps si rien n'a changé.
+    """
+    if request.method not in ('GET', 'HEAD') or response.status_code != 200:
+        return response
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    if max_age == 0:
+        response.cache_control.no_cache = True
+    if not response.get_etag()[0]:
+        response.add_etag()
+    if last_modified is not None:
+        response.last_modified = last_modified
+    return response.make_conditional(request)
+
+
+def cacheable(max_age: int = 0):
+    """Décorateur de vue : appliquer cacheable_response à la réponse"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return cacheable_response(make_response(view(*args, **kwargs)), max_age=max_age)
+        return wrapper
+    return decorator
+
+
+class CachePolicy:
+    """Empreintes des fichiers statiques et en-têtes Cache-Control de chaque réponse"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._static_hashes = {}
+    
+    def init_app(self, app):
+        app.url_defaults(self._add_static_hash)
+        app.after_request(self.apply)
+    
+    def static_hash(self, filename: str):
+        """Empreinte du contenu d'un fichier statique (recalculée si le fichier change)"""
+        path = safe_join(current_app.static_folder, filename)
+        try:
+            stat = os.stat(path) if path else None
+        except OSError:
+            stat = None
+        if stat is None:
+            return None
+        
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._static_hashes.get(path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        value = digest.hexdigest()[:STATIC_HASH_LENGTH]
+        with self._lock:
+            self._static_hashes[path] = (signature, value)
+        return value
+    
+    def _add_static_hash(self, endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            value = self.static_hash(values['filename'])
+            if value:
+                values['v'] = value
+    
+    def apply(self, response):
+        """Fixer Cache-Control selon la politique (after_request)"""
+        if request.endpoint == 'static':
+            version = request.args.get('v')
+            if version and response.status_code in (200, 304) and version == self.static_hash(request.view_args['filename']):
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_IMMUTABLE_MAX_AGE
+                response.cache_control.immutable = True
+                response.cache_control.no_cache = None
+            else:
+                response.cache_control.public = True
+                response.cache_control.no_cache = True
+            return response
+        
+        # Politique déjà choisie par la vue (flux iCal, données de référence, @cacheable) ;
+        # le simple « no-cache » posé par send_file (exports, factures) reste sensible
+        if response.cache_control.public or response.cache_control.private:
+            return response
+        
+        response.headers['Cache-Control'] = NO_STORE
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '-1'
+        return response
+
+
+cache_policy = CachePolicy()
@@ -0,0 +1,193 @@
+"""
+Planificateur de synchronisation périodique des calendriers iCal
+
+Chaque worker gunicorn démarre un thread qui tente de prendre un verrou
+consultatif PostgreSQL (pg_try_advisory_lock) : un seul worker de toute la
+plateforme devient leader et synchronise les calendriers échus. Le verrou est
+lié à la session ; si le leader meurt, sa connexion se ferme et un autre worker
+prend le relais au tick suivant.
+
+Le planificateur peut aussi tourner dans un processus dédié :
+    python -m backend.services.calendar_scheduler
+"""
+import os
+import random
+import threading
+import time
+from ..config.database import get_db_connection
+from .calendar_service import CalendarService
+
+ICAL_SCHEDULER_ENABLED = os.environ.get('ICAL_SCHEDULER_ENABLED', 'true').lower() == 'true'
+ICAL_SCHEDULER_TICK = int(os.environ.get('ICAL_SCHEDULER_TICK', 60))
+ICAL_SCHEDULER_BATCH = int(os.environ.get('ICAL_SCHEDULER_BATCH', 100))
+
+# Identifiant du verrou consultatif partagé par tous les workers
+SCHEDULER_LOCK_ID = 7241500034
+
+
+class CalendarSyncScheduler:
+    """
+    Boucle de synchronisation avec élection d'un leader par verrou consultatif
+    
+    L'intervalle, la gigue et le recul exponentiel des flux en échec sont
+    calculés par CalendarService lors de l'enregistrement de chaque résultat
+    (colonnes prochaine_synchronisation et echecs_consecutifs).
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._leader_conn = None
+        self.tick_seconds = ICAL_SCHEDULER_TICK
+        self.batch_size = ICAL_SCHEDULER_BATCH
+        self.runs = 0
+        self.synchronized = 0
+        self.failures = 0
+        self.last_run = None
+    
+    def init_app(self, app, registry=None):
+        """
+        Démarrer le planificateur dans ce worker si ICAL_SCHEDULER_ENABLED est actif
+        
+        À appeler dans chaque worker (pas de --preload gunicorn : le thread ne
+        survivrait pas au fork).
+        """
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+        if ICAL_SCHEDULER_ENABLED:
+            self.start()
+    
+    def start(self):
+        """Démarrer le thread du planificateur (sans effet s'il tourne déjà)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(target=self._run, name='ical-scheduler', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Arrêter le thread et libérer le verrou de leader"""
+        self._stop_event.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=10)
+    
+    def notify(self):
+        """
+        Avancer le prochain passage de ce worker (des calendriers viennent d'être rendus échus)
+        
+        Si le leader est un autre worker, les calendriers sont synchronisés à son prochain tick.
+        """
+        self._wakeup.set()
+    
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_conn is not None
+    
+    def _run(self):
+        # Décaler le premier tick pour que les workers ne démarrent pas ensemble
+        wait = random.uniform(0, min(self.tick_seconds, 10))
+        while True:
+            if self._wakeup.wait(wait):
+                self._wakeup.clear()
+            if self._stop_event.is_set():
+                break
+            wait = self.tick_seconds
+            try:
+                if self._acquire_leadership():
+                    self.run_once()
+            except Exception as e:
+                print(f"Erreur dans le planificateur iCal: {e}")
+                self._release_leadership()
+        self._release_leadership()
+    
+    def _acquire_leadership(self) -> bool:
+        """Vérifier ou prendre le verrou de leader ; retourner True si ce worker est leader"""
+        if self._leader_conn is not None:
+            if not self._leader_conn.closed:
+                cur = self._leader_conn.cursor()
+                cur.execute('SELECT 1')
+                cur.close()
+                return True
+            self._leader_conn = None
+        
+        conn = get_db_connection()
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute('SELECT pg_try_advisory_lock(%s) AS acquired', (SCHEDULER_LOCK_ID,))
+        acquired = cur.fetchone()['acquired']
+        cur.close()
+        
+        if not acquired:
+            conn.close()
+            return False
+        
+        self._leader_conn = conn
+        return True
+    
+    def _release_leadership(self):
+        conn, self._leader_conn = self._leader_conn, None
+        if conn is not None and not conn.closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def run_once(self) -> dict:
+        """Synchroniser les calendriers échus (par lots tant qu'il en reste)"""
+        summary = {'total': 0, 'succeeded': 0, 'failed': 0}
+        while not self._stop_event.is_set():
+            result = CalendarService.synchronize_due(self.batch_size)
+            for key in summary:
+                summary[key] += result[key]
+            if result['total'] < self.batch_size:
+                break
+        
+        self.runs += 1
+        self.synchronized += summary['succeeded']
+        self.failures += summary['failed']
+        self.last_run = dict(summary, at=time.time())
+        return summary
+    
+    def status(self) -> dict:
+        """État du planificateur dans ce worker"""
+        return {
+            'enabled': self._thread is not None and self._thread.is_alive(),
+            'leader': self.is_leader,
+            'worker': os.getpid(),
+            'tick_seconds': self.tick_seconds,
+            'runs': self.runs,
+            'synchronized': self.synchronized,
+            'failures': self.failures,
+            'last_run': self.last_run,
+        }
+    
+    def prometheus_lines(self):
+        """Compteurs du planificateur au format texte Prometheus"""
+        worker = os.getpid()
+        return [
+            '# HELP guestadmission_ical_scheduler_leader 1 si ce worker détient le verrou du planificateur iCal',
+            '# TYPE guestadmission_ical_scheduler_leader gauge',
+            f'guestadmission_ical_scheduler_leader{{worker="{worker}"}} {int(self.is_leader)}',
+            '# HELP guestadmission_ical_scheduled_syncs_total Synchronisations iCal planifiées par résultat',
+            '# TYPE guestadmission_ical_scheduled_syncs_total counter',
+            f'guestadmission_ical_scheduled_syncs_total{{result="success",worker="{worker}"}} {self.synchronized}',
+            f'guestadmission_ical_scheduled_syncs_total{{result="failure",worker="{worker}"}} {self.failures}',
+        ]
+
+
+calendar_scheduler = CalendarSyncScheduler()
+
+
+if __name__ == '__main__':
+    print(f"🗓️  Planificateur iCal (tick {calendar_scheduler.tick_seconds}s, pid {os.getpid()})")
+    calendar_scheduler.start()
+    try:
+        while calendar_scheduler._thread.is_alive():
+            calendar_scheduler._thread.join(timeout=1)
+    except KeyboardInterrupt:
+        calendar_scheduler.stop()
@@ -1,13 +1,77 @@
 """
 Service pour la gestion des calendriers iCal (Airbnb, Booking.com, etc.)
 """
-from typing import List, Dict, Optional
-from datetime import datetime
-from icalendar import Calendar
+import hashlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Dict, Iterable, List, Optional, Tuple
 import requests
 from urllib.parse import urlparse
+from psycopg2.extras import execute_values
 from ..config.database import get_db_connection
 from ..utils import serialize_rows
+from .http_client import http_client
+from .ical_parser import iter_vevents
+from .sampling_profiler import profiler
+
+ICAL_SYNC_WORKERS = int(os.environ.get('ICAL_SYNC_WORKERS', 32))
+ICAL_SYNC_PER_HOST = int(os.environ.get('ICAL_SYNC_PER_HOST', 6))
+ICAL_SYNC_DB_CONCURRENCY = int(os.environ.get('ICAL_SYNC_DB_CONCURRENCY', 4))
+ICAL_CONNECT_TIMEOUT = 5
+ICAL_READ_TIMEOUT = 30
+ICAL_SPOOL_MAX_MEMORY = int(os.environ.get('ICAL_SPOOL_MAX_MEMORY', 1024 * 1024))
+ICAL_MAX_FEED_BYTES = int(os.environ.get('ICAL_MAX_FEED_BYTES', 64 * 1024 * 1024))
+ICAL_STAGING_BATCH = 5000
+ICAL_SYNC_INTERVAL = int(os.environ.get('ICAL_SYNC_INTERVAL', 1800))
+ICAL_SYNC_MAX_BACKOFF = int(os.environ.get('ICAL_SYNC_MAX_BACKOFF', 86400))
+ICAL_SYNC_JITTER = float(os.environ.get('ICAL_SYNC_JITTER', 0.1))
+
+# Prochaine synchronisation : intervalle régulier, ou recul exponentiel selon le
+# nombre d'échecs consécutifs (valeur avant mise à jour), avec une gigue aléatoire
+_NEXT_SYNC_SQL = '''
+    CURRENT_TIMESTAMP + make_interval(secs => %(interval)s * (1 + (random() * 2 - 1) * %(jitter)s))
+'''
+_NEXT_RETRY_SQL = '''
+    CURRENT_TIMESTAMP + make_interval(secs => LEAST(
+        %(interval)s * power(2, LEAST(COALESCE(echecs_consecutifs, 0), 20)), %(max_backoff)s
+    ) * (1 + (random() * 2 - 1) * %(jitter)s))
+'''
+
+_executor = None
+_executor_lock = threading.Lock()
+_host_semaphores = {}
+_store_semaphore = threading.BoundedSemaphore(ICAL_SYNC_DB_CONCURRENCY)
+
+
+def _get_sync_executor() -> ThreadPoolExecutor:
+    """Pool de synchronisation partagé par toutes les requêtes du worker"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=ICAL_SYNC_WORKERS, thread_name_prefix='ical-sync')
+        return _executor
+
+
+def _schedule_params(**params) -> Dict:
+    """Paramètres des expressions de planification, complétés par ceux de la requête"""
+    params.update({
+        'interval': ICAL_SYNC_INTERVAL,
+        'max_backoff': ICAL_SYNC_MAX_BACKOFF,
+        'jitter': ICAL_SYNC_JITTER
+    })
+    return params
+
+
+def _host_semaphore(host: str) -> threading.BoundedSemaphore:
+    """Sémaphore limitant les téléchargements simultanés vers un même hôte"""
+    with _executor_lock:
+        semaphore = _host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = _host_semaphores[host] = threading.BoundedSemaphore(ICAL_SYNC_PER_HOST)
+        return semaphore
 
 
 class CalendarService:
@@ -166,107 +230,437 @@ class CalendarService:
         if not calendar:
             return {'success': False, 'message': 'Calendrier non trouvé'}
         
-        if not CalendarService._validate_ical_url(calendar['ical_url']):
-            return {'success': False, 'message': 'URL non autorisée (sécurité SSRF)'}
+        return CalendarService._synchronize(calendar)
+    
+    @staticmethod
+    def synchronize_all(etablissement_ids: Optional[List[int]] = None) -> Dict:
+        """
+        Synchroniser en parallèle tous les calendriers actifs
+        
+        Les flux sont téléchargés et analysés dans le pool partagé du worker,
+        avec une limite de requêtes simultanées par hôte (Airbnb, Booking...).
+        La durée totale est donc proche de celle des flux les plus lents.
+        
+        Args:
+            etablissement_ids: Établissements à synchroniser (None = toute la plateforme)
+        
+        Returns:
+            Dict: Résumé et résultat de chaque calendrier
+        """
+        if etablissement_ids is not None and not etablissement_ids:
+            calendars = []
+        else:
+            conn = get_db_connection()
+            cur = conn.cursor()
+            
+            query = 'SELECT * FROM calendriers_ical WHERE actif = TRUE'
+            params = []
+            if etablissement_ids is not None:
+                query += ' AND etablissement_id = ANY(%s)'
+                params.append(list(etablissement_ids))
+            query += ' ORDER BY etablissement_id, id'
+            
+            cur.execute(query, tuple(params))
+            calendars = cur.fetchall()
+            cur.close()
+            conn.close()
+        
+        return CalendarService._synchronize_many(calendars)
+    
+    @staticmethod
+    def schedule_now(etablissement_ids: Optional[List[int]] = None) -> int:
+        """
+        Rendre échus les calendriers actifs, pour que le planificateur les synchronise à son prochain passage
+        
+        Args:
+            etablissement_ids: Établissements concernés (None = toute la plateforme)
+        
+        Returns:
+            Nombre de calendriers planifiés
+        """
+        if etablissement_ids is not None and not etablissement_ids:
+            return 0
         
         conn = get_db_connection()
         cur = conn.cursor()
         
-        try:
-            response = requests.get(calendar['ical_url'], timeout=30)
-            response.raise_for_status()
-            
-            ical_data = Calendar.from_ical(response.text)
-            
-            sejours_count = 0
-            errors = []
-            
-            for component in ical_data.walk():
-                if component.name == "VEVENT":
+        query = '''
+            UPDATE calendriers_ical SET prochaine_synchronisation = CURRENT_TIMESTAMP
+            WHERE actif = TRUE
+        '''
+        params = []
+        if etablissement_ids is not None:
+            query += ' AND etablissement_id = ANY(%s)'
+            params.append(list(etablissement_ids))
+        
+        cur.execute(query, tuple(params))
+        scheduled = cur.rowcount
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return scheduled
+    
+    @staticmethod
+    def synchronize_due(limit: int = 100) -> Dict:
+        """
+        Synchroniser les calendriers actifs dont la prochaine synchronisation est échue
+        
+        Utilisé par le planificateur ; les calendriers jamais synchronisés passent en premier.
+        
+        Args:
+            limit: Nombre maximal de calendriers traités par passage
+        
+        Returns:
+            Dict: Résumé et résultat de chaque calendrier
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT * FROM calendriers_ical
+            WHERE actif = TRUE
+              AND (prochaine_synchronisation IS NULL OR prochaine_synchronisation <= CURRENT_TIMESTAMP)
+            ORDER BY prochaine_synchronisation NULLS FIRST, id
+            LIMIT %s
+        ''', (limit,))
+        calendars = cur.fetchall()
+        
+        cur.close()
+        conn.close()
+        
+        return CalendarService._synchronize_many(calendars)
+    
+    @staticmethod
+    def _synchronize_many(calendars: List[Dict]) -> Dict:
+        """Synchroniser une liste de calendriers dans le pool partagé et résumer les résultats"""
+        started = time.perf_counter()
+        executor = _get_sync_executor()
+        futures = [executor.submit(CalendarService._synchronize_tracked, dict(c)) for c in calendars]
+        results = [future.result() for future in futures]
+        
+        succeeded = sum(1 for r in results if r['success'])
+        return {
+            'success': succeeded == len(results),
+            'message': f'{succeeded}/{len(results)} calendrier(s) synchronisé(s)',
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'unchanged': sum(1 for r in results if r.get('unchanged')),
+            'count': sum(r.get('count', 0) for r in results),
+            'cancelled': sum(r.get('cancelled', 0) for r in results),
+            'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+            'results': results
+        }
+    
+    @staticmethod
+    def _synchronize_tracked(calendar: Dict) -> Dict:
+        with profiler.tracked_thread():
+            return CalendarService._synchronize(calendar)
+    
+    @staticmethod
+    def _synchronize(calendar: Dict) -> Dict:
+        """Télécharger, analyser et enregistrer un flux iCal ; retourner le résultat du flux"""
+        started = time.perf_counter()
+        result = {
+            'calendar_id': calendar['id'],
+            'etablissement_id': calendar.get('etablissement_id'),
+            'nom': calendar.get('nom'),
+            'plateforme': calendar.get('plateforme'),
+        }
+        
+        if not CalendarService._validate_ical_url(calendar['ical_url']):
+            result.update(CalendarService._record_sync_error(calendar['id'], 'URL non autorisée (sécurité SSRF)'))
+        else:
+            try:
+                feed, etag, last_modified, content_hash = CalendarService._fetch_feed(
+                    calendar['ical_url'], calendar.get('etag'), calendar.get('last_modified')
+                )
+            except requests.exceptions.RequestException as e:
+                result.update(CalendarService._record_sync_error(calendar['id'], f"Erreur de connexion: {str(e)}"))
+            except ValueError as e:
+                result.update(CalendarService._record_sync_error(calendar['id'], f"Flux refusé: {str(e)}"))
+            else:
+                if feed is None or content_hash == calendar.get('content_hash'):
+                    CalendarService._record_unchanged(calendar['id'], etag, last_modified)
+                    result.update({
+                        'success': True,
+                        'message': 'Calendrier inchangé',
+                        'unchanged': True,
+                        'not_modified': feed is None,
+                        'count': 0,
+                        'updated': 0,
+                        'cancelled': 0
+                    })
+                else:
                     try:
-                        uid = str(component.get('uid', ''))
-                        summary = str(component.get('summary', 'Séjour'))
-                        dtstart = component.get('dtstart')
-                        dtend = component.get('dtend')
-                        description = str(component.get('description', ''))
-                        
-                        if dtstart and dtend:
-                            date_debut = dtstart.dt if hasattr(dtstart.dt, 'date') else dtstart.dt
-                            date_fin = dtend.dt if hasattr(dtend.dt, 'date') else dtend.dt
-                            
-                            if isinstance(date_debut, datetime):
-                                date_debut = date_debut.date()
-                            if isinstance(date_fin, datetime):
-                                date_fin = date_fin.date()
-                            
-                            cur.execute('''
-                                INSERT INTO reservations_ical (
-                                    calendrier_id, uid_ical, titre, date_debut, date_fin, description
-                                ) VALUES (%s, %s, %s, %s, %s, %s)
-                                ON CONFLICT (uid_ical) DO UPDATE SET
-                                    titre = EXCLUDED.titre,
-                                    date_debut = EXCLUDED.date_debut,
-                                    date_fin = EXCLUDED.date_fin,
-                                    description = EXCLUDED.description,
-                                    updated_at = CURRENT_TIMESTAMP
-                            ''', (calendar_id, uid, summary, date_debut, date_fin, description))
-                            
-                            sejours_count += 1
+                        errors = []
+                        skipped_uids = set()
+                        count, updated, cancelled = CalendarService._store_events(
+                            calendar['id'], iter_vevents(feed, errors, skipped_uids), errors,
+                            {'etag': etag, 'last_modified': last_modified, 'content_hash': content_hash},
+                            skipped_uids
+                        )
+                        result.update({
+                            'success': True,
+                            'message': f'{count} séjour(s) synchronisée(s), {updated} modifiée(s), {cancelled} annulée(s)',
+                            'unchanged': False,
+                            'count': count,
+                            'updated': updated,
+                            'cancelled': cancelled,
+                            'errors': errors
+                        })
+                    except ValueError as e:
+                        # Pas un calendrier complet (page HTML, corps vide, flux tronqué) : rien n'est fusionné
+                        result.update(CalendarService._record_sync_error(calendar['id'], f"Flux refusé: {str(e)}"))
                     except Exception as e:
-                        errors.append(f"Erreur événement: {str(e)}")
-            
-            cur.execute('''
-                UPDATE calendriers_ical SET
-                    derniere_synchronisation = CURRENT_TIMESTAMP,
-                    statut_derniere_synchro = %s,
-                    message_erreur = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            ''', ('succès' if sejours_count > 0 else 'aucune_sejour', 
-                  '\n'.join(errors) if errors else None, calendar_id))
-            
-            conn.commit()
-            cur.close()
-            conn.close()
+                        result.update(CalendarService._record_sync_error(calendar['id'], f"Erreur de parsing: {str(e)}"))
+                if feed is not None:
+                    feed.close()
+        
+        result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        return result
+    
+    @staticmethod
+    def _fetch_feed(url: str, etag: Optional[str] = None, last_modified: Optional[str] = None
+                    ) -> Tuple[Optional[BinaryIO], Optional[str], Optional[str], Optional[str]]:
+        """
+        Télécharger un flux iCal par requête conditionnelle, en respectant
+        la limite de requêtes simultanées par hôte (connexions réutilisées,
+        nouvelles tentatives et disjoncteur via http_client)
+        
+        Le corps est lu par blocs dans un fichier temporaire (en mémoire jusqu'à
+        ICAL_SPOOL_MAX_MEMORY, puis sur disque) tout en calculant son empreinte.
+        
+        Returns:
+            Tuple (fichier, etag, last_modified, empreinte) - fichier None si le serveur répond 304
+        
+        Raises:
+            ValueError: Si le flux dépasse ICAL_MAX_FEED_BYTES
+        """
+        headers = {}
+        if etag:
+            headers['If-None-Match'] = etag
+        if last_modified:
+            headers['If-Modified-Since'] = last_modified
+        
+        with _host_semaphore(urlparse(url).hostname or ''):
+            with http_client.get(url, headers=headers, stream=True,
+                                 timeout=(ICAL_CONNECT_TIMEOUT, ICAL_READ_TIMEOUT)) as response:
+                if response.status_code == 304:
+                    return (None, response.headers.get('ETag', etag),
+                            response.headers.get('Last-Modified', last_modified), None)
+                response.raise_for_status()
+                
+                feed = SpooledTemporaryFile(max_size=ICAL_SPOOL_MAX_MEMORY)
+                digest = hashlib.sha256()
+                size = 0
+                try:
+                    for chunk in response.iter_content(chunk_size=65536):
+                        size += len(chunk)
+                        if size > ICAL_MAX_FEED_BYTES:
+                            raise ValueError(f'flux supérieur à {ICAL_MAX_FEED_BYTES // (1024 * 1024)} Mo')
+                        digest.update(chunk)
+                        feed.write(chunk)
+                except BaseException:
+                    feed.close()
+                    raise
+                feed.seek(0)
+                return feed, response.headers.get('ETag'), response.headers.get('Last-Modified'), digest.hexdigest()
+    
+    @staticmethod
+    def _event_hash(event: Dict) -> str:
+        """Empreinte des champs enregistrés d'un événement"""
+        payload = '\x1f'.join((
+            event['uid'], event['titre'], str(event['date_debut']), str(event['date_fin']), event['description']
+        ))
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _store_events(calendar_id: int, events: Iterable[Dict], errors: List[str],
+                      validators: Dict, skipped_uids: Iterable[str] = ()) -> Tuple[int, int, int]:
+        """
+        Fusionner l'instantané d'un flux dans reservations_ical, en une transaction
+        
+        Les événements sont consommés au fil de l'analyse et chargés par lots de
+        ICAL_STAGING_BATCH dans une table temporaire, puis fusionnés par une seule
+        instruction : insertion des nouveaux UID, mise à jour de ceux dont
+        l'empreinte a changé, et marquage (cancelled_at) des séjours absents du
+        flux (annulations). Un UID qui réapparaît est réactivé. La mémoire utilisée
+        est bornée par la taille d'un lot, quelle que soit la taille du flux.
+        
+        Les événements présents dans le flux mais ignorés (skipped_uids : dates
+        absentes ou invalides) ne sont pas annulés. Une erreur levée par
+        l'itérateur (flux invalide ou tronqué) annule toute la transaction.
+        
+        Les validateurs HTTP et l'empreinte du flux ne sont enregistrés qu'en cas
+        de succès complet, pour qu'un flux en erreur ou partiellement analysé
+        soit retraité au passage suivant.
+        
+        Returns:
+            Tuple (événements, mis_à_jour, annulés)
+        """
+        with _store_semaphore:
+            conn = get_db_connection()
+            cur = conn.cursor()
             
-            return {
-                'success': True,
-                'message': f'{sejours_count} séjour(s) synchronisée(s)',
-                'count': sejours_count,
-                'errors': errors
-            }
+            try:
+                cur.execute('''
+                    CREATE TEMP TABLE ical_staging (
+                        uid_ical VARCHAR(500) PRIMARY KEY,
+                        titre VARCHAR(300),
+                        date_debut DATE NOT NULL,
+                        date_fin DATE NOT NULL,
+                        description TEXT,
+                        event_hash VARCHAR(64)
+                    ) ON COMMIT DROP
+                ''')
+                
+                count = 0
+                batch = {}
+                for event in events:
+                    count += 1
+                    # Un même UID peut apparaître plusieurs fois (occurrences récurrentes) : la dernière l'emporte
+                    batch[event['uid']] = event
+                    if len(batch) >= ICAL_STAGING_BATCH:
+                        CalendarService._stage_events(cur, batch)
+                        batch = {}
+                if batch:
+                    CalendarService._stage_events(cur, batch)
+                
+                cur.execute('''
+                    WITH upserted AS (
+                        INSERT INTO reservations_ical (
+                            calendrier_id, uid_ical, titre, date_debut, date_fin, description, event_hash
+                        )
+                        SELECT %(calendar_id)s, s.uid_ical, s.titre, s.date_debut, s.date_fin, s.description, s.event_hash
+                        FROM ical_staging s
+                        ON CONFLICT (calendrier_id, uid_ical) DO UPDATE SET
+                            titre = EXCLUDED.titre,
+                            date_debut = EXCLUDED.date_debut,
+                            date_fin = EXCLUDED.date_fin,
+                            description = EXCLUDED.description,
+                            event_hash = EXCLUDED.event_hash,
+                            cancelled_at = NULL,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE reservations_ical.event_hash IS DISTINCT FROM EXCLUDED.event_hash
+                           OR reservations_ical.cancelled_at IS NOT NULL
+                        RETURNING 1
+                    ),
+                    cancelled AS (
+                        UPDATE reservations_ical r SET
+                            cancelled_at = CURRENT_TIMESTAMP,
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE r.calendrier_id = %(calendar_id)s
+                          AND r.cancelled_at IS NULL
+                          AND NOT EXISTS (SELECT 1 FROM ical_staging s WHERE s.uid_ical = r.uid_ical)
+                          AND NOT (r.uid_ical = ANY(%(skipped_uids)s::text[]))
+                        RETURNING 1
+                    ),
+                    synchronized AS (
+                        UPDATE calendriers_ical SET
+                            derniere_synchronisation = CURRENT_TIMESTAMP,
+                            statut_derniere_synchro = %(statut)s,
+                            message_erreur = %(message)s,
+                            etag = %(etag)s,
+                            last_modified = %(last_modified)s,
+                            content_hash = %(content_hash)s,
+                            echecs_consecutifs = 0,
+                            prochaine_synchronisation = ''' + _NEXT_SYNC_SQL + ''',
+                            updated_at = CURRENT_TIMESTAMP
+                        WHERE id = %(calendar_id)s
+                    )
+                    SELECT
+                        (SELECT COUNT(*) FROM upserted) AS updated,
+                        (SELECT COUNT(*) FROM cancelled) AS cancelled
+                ''', _schedule_params(
+                    calendar_id=calendar_id,
+                    statut='succès' if count else 'aucune_sejour',
+                    message='\n'.join(errors) if errors else None,
+                    etag=None if errors else validators['etag'],
+                    last_modified=None if errors else validators['last_modified'],
+                    content_hash=None if errors else validators['content_hash'],
+                    skipped_uids=list(skipped_uids)
+                ))
+                counts = cur.fetchone()
+                
+                conn.commit()
+                return count, counts['updated'], counts['cancelled']
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                cur.close()
+                conn.close()
+    
+    @staticmethod
+    def _stage_events(cur, batch: Dict[str, Dict]):
+        """Charger un lot d'événements dans la table temporaire (un aller-retour par lot)"""
+        rows = [
+            (uid, e['titre'], e['date_debut'], e['date_fin'], e['description'], CalendarService._event_hash(e))
+            for uid, e in batch.items()
+        ]
+        execute_values(cur, '''
+            INSERT INTO ical_staging VALUES %s
+            ON CONFLICT (uid_ical) DO UPDATE SET
+                titre = EXCLUDED.titre,
+                date_debut = EXCLUDED.date_debut,
+                date_fin = EXCLUDED.date_fin,
+                description = EXCLUDED.description,
+                event_hash = EXCLUDED.event_hash
+        ''', rows, page_size=len(rows))
+    
+    @staticmethod
+    def _record_unchanged(calendar_id: int, etag: Optional[str], last_modified: Optional[str]):
+        """Enregistrer une synchronisation sans changement (réponse 304 ou contenu identique)"""
+        with _store_semaphore:
+            conn = get_db_connection()
+            cur = conn.cursor()
             
-        except requests.exceptions.RequestException as e:
             cur.execute('''
                 UPDATE calendriers_ical SET
                     derniere_synchronisation = CURRENT_TIMESTAMP,
-                    statut_derniere_synchro = 'erreur',
-                    message_erreur = %s,
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            ''', (f"Erreur de connexion: {str(e)}", calendar_id))
+                    statut_derniere_synchro = CASE
+                        WHEN statut_derniere_synchro = 'erreur' THEN 'succès' ELSE statut_derniere_synchro
+                    END,
+                    message_erreur = CASE
+                        WHEN statut_derniere_synchro = 'erreur' THEN NULL ELSE message_erreur
+                    END,
+                    etag = %(etag)s,
+                    last_modified = %(last_modified)s,
+                    echecs_consecutifs = 0,
+                    prochaine_synchronisation = ''' + _NEXT_SYNC_SQL + '''
+                WHERE id = %(calendar_id)s
+            ''', _schedule_params(calendar_id=calendar_id, etag=etag, last_modified=last_modified))
             
             conn.commit()
             cur.close()
             conn.close()
+    
+    @staticmethod
+    def _record_sync_error(calendar_id: int, message: str) -> Dict:
+        """Enregistrer l'échec d'une synchronisation"""
+        with _store_semaphore:
+            conn = get_db_connection()
+            cur = conn.cursor()
             
-            return {'success': False, 'message': f'Erreur de connexion: {str(e)}'}
-        
-        except Exception as e:
             cur.execute('''
                 UPDATE calendriers_ical SET
                     derniere_synchronisation = CURRENT_TIMESTAMP,
                     statut_derniere_synchro = 'erreur',
-                    message_erreur = %s,
+                    message_erreur = %(message)s,
+                    prochaine_synchronisation = ''' + _NEXT_RETRY_SQL + ''',
+                    echecs_consecutifs = COALESCE(echecs_consecutifs, 0) + 1,
                     updated_at = CURRENT_TIMESTAMP
-                WHERE id = %s
-            ''', (f"Erreur de parsing: {str(e)}", calendar_id))
+                WHERE id = %(calendar_id)s
+            ''', _schedule_params(calendar_id=calendar_id, message=message))
             
             conn.commit()
             cur.close()
             conn.close()
-            
-            return {'success': False, 'message': f'Erreur de parsing: {str(e)}'}
+        
+        return {'success': False, 'message': message}
     
     @staticmethod
     def get_calendar_sejours(calendar_id: int) -> List[Dict]:
@@ -276,7 +670,7 @@ class CalendarService:
         
         cur.execute('''
             SELECT * FROM reservations_ical
-            WHERE calendrier_id = %s
+            WHERE calendrier_id = %s AND cancelled_at IS NULL
             ORDER BY date_debut DESC
         ''', (calendar_id,))
         
@@ -299,7 +693,7 @@ class CalendarService:
             SELECT r.*, c.nom as calendrier_nom, c.plateforme
             FROM reservations_ical r
             JOIN calendriers_ical c ON r.calendrier_id = c.id
-            WHERE c.actif = TRUE
+            WHERE c.actif = TRUE AND r.cancelled_at IS NULL
         '''
         params = []
         
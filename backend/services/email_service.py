@@ -1,64 +1,86 @@
 """
-Service pour la gestion des emails (envoi SMTP et réception POP3)
+Service pour la gestion des emails (envoi SMTP et réception POP3 ou IMAP)
 """
-import smtplib
+import imaplib
 import poplib
+import re
 import email
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.header import decode_header
+from email.utils import parsedate_to_datetime
 from datetime import datetime
 from typing import Dict, List, Optional
+from psycopg2.extras import execute_values
 from ..config.database import get_db_connection
 from ..models.mail_config import MailConfig
+from .smtp_pool import smtp_pool
+
+POP_TIMEOUT = 30
+POP_PREVIEW_LINES = 20
+IMAP_TIMEOUT = 30
+IMAP_FETCH_CHUNK = 200
+
+# Colonnes des listes de messages : en-têtes et aperçu, sans les corps (table email_bodies)
+EMAIL_LIST_COLUMNS = '''
+    id, mail_config_id, message_id, subject, from_email, to_email, cc_email, folder,
+    is_read, is_starred, has_attachments, date_sent, date_received, snippet, body_complete
+'''
+
+_IMAP_FETCH_START_RE = re.compile(rb'^\d+ \(')
+_IMAP_UID_RE = re.compile(rb'\bUID (\d+)')
+_IMAP_FLAGS_RE = re.compile(rb'\bFLAGS \(([^)]*)\)')
+
+
+def _imap_quote(name: str) -> str:
+    """Nom de dossier IMAP entre guillemets (espaces, caractères spéciaux)"""
+    return '"' + name.replace('\\', '\\\\').replace('"', '\\"') + '"'
 
 
 class EmailService:
     """Service pour gérer l'envoi et la réception d'emails"""
     
+    @staticmethod
+    def _build_message(config: Dict, to_email: str, subject: str, body_html: str,
+                       cc_email: Optional[str] = None, bcc_email: Optional[str] = None):
+        """Construire le message MIME et la liste des destinataires SMTP"""
+        msg = MIMEMultipart('alternative')
+        msg['From'] = config['email_address']
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        
+        if cc_email:
+            msg['Cc'] = cc_email
+        
+        msg.attach(MIMEText(body_html, 'html'))
+        
+        recipients = [to_email]
+        if cc_email:
+            recipients.extend([email.strip() for email in cc_email.split(',')])
+        if bcc_email:
+            recipients.extend([email.strip() for email in bcc_email.split(',')])
+        
+        return msg, recipients
+    
     @staticmethod
     def send_email(config_id: int, to_email: str, subject: str, body_html: str, 
                    cc_email: Optional[str] = None, bcc_email: Optional[str] = None) -> bool:
-        """Envoyer un email via SMTP"""
+        """Envoyer un email via SMTP (session réutilisée depuis le pool de la configuration)"""
         config = MailConfig.get_by_id(config_id)
         if not config:
             raise ValueError("Configuration mail non trouvée")
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['From'] = config['email_address']
-            msg['To'] = to_email
-            msg['Subject'] = subject
-            
-            if cc_email:
-                msg['Cc'] = cc_email
+            msg, recipients = EmailService._build_message(config, to_email, subject, body_html, cc_email, bcc_email)
+            smtp_pool.send(config, config['email_address'], recipients, msg.as_string())
             
-            msg.attach(MIMEText(body_html, 'html'))
-            
-            recipients = [to_email]
-            if cc_email:
-                recipients.extend([email.strip() for email in cc_email.split(',')])
-            if bcc_email:
-                recipients.extend([email.strip() for email in bcc_email.split(',')])
-            
-            if config['smtp_use_tls']:
-                with smtplib.SMTP(config['smtp_host'], config['smtp_port']) as server:
-                    server.starttls()
-                    server.login(config['smtp_username'], config['smtp_password'])
-                    server.sendmail(config['email_address'], recipients, msg.as_string())
-            else:
-                with smtplib.SMTP_SSL(config['smtp_host'], config['smtp_port']) as server:
-                    server.login(config['smtp_username'], config['smtp_password'])
-                    server.sendmail(config['email_address'], recipients, msg.as_string())
-            
-            EmailService._save_sent_email(
-                config_id=config_id,
-                to_email=to_email,
-                cc_email=cc_email,
-                bcc_email=bcc_email,
-                subject=subject,
-                body_html=body_html
-            )
+            EmailService._save_sent_emails(config, [{
+                'to_email': to_email,
+                'cc_email': cc_email,
+                'bcc_email': bcc_email,
+                'subject': subject,
+                'body_html': body_html
+            }])
             
             return True
             
@@ -67,69 +89,170 @@ class EmailService:
             raise
     
     @staticmethod
-    def fetch_emails(config_id: int, limit: int = 50) -> List[Dict]:
-        """Récupérer les emails via POP3"""
+    def send_bulk(config_id: int, messages: List[Dict]) -> List[Dict]:
+        """
+        Envoyer une série d'emails sur une seule session SMTP authentifiée
+        
+        Args:
+            config_id: ID de la configuration mail
+            messages: Liste de dicts (to_email, subject, body_html, cc_email, bcc_email)
+        
+        Returns:
+            Un résultat par message, dans l'ordre : {'to_email', 'success', 'error'}.
+            Un refus du serveur pour un message n'interrompt pas l'envoi des suivants.
+        """
         config = MailConfig.get_by_id(config_id)
-        if not config or not config.get('pop_host'):
-            raise ValueError("Configuration POP3 non trouvée ou incomplète")
+        if not config:
+            raise ValueError("Configuration mail non trouvée")
+        
+        prepared = []
+        for message in messages:
+            msg, recipients = EmailService._build_message(
+                config,
+                message['to_email'],
+                message['subject'],
+                message['body_html'],
+                message.get('cc_email'),
+                message.get('bcc_email')
+            )
+            prepared.append((recipients, msg.as_string()))
+        
+        outcomes = smtp_pool.send_many(config, config['email_address'], prepared)
+        
+        sent = [message for message, outcome in zip(messages, outcomes) if outcome['success']]
+        if sent:
+            EmailService._save_sent_emails(config, sent)
+        
+        return [{
+            'to_email': message['to_email'],
+            'success': outcome['success'],
+            'error': outcome['error']
+        } for message, outcome in zip(messages, outcomes)]
+    
+    @staticmethod
+    def _pop_connect(config: Dict):
+        """Ouvrir une session POP3 authentifiée"""
+        if config['pop_use_ssl']:
+            server = poplib.POP3_SSL(config['pop_host'], config['pop_port'], timeout=POP_TIMEOUT)
+        else:
+            server = poplib.POP3(config['pop_host'], config['pop_port'], timeout=POP_TIMEOUT)
         
         try:
-            if config['pop_use_ssl']:
-                server = poplib.POP3_SSL(config['pop_host'], config['pop_port'])
-            else:
-                server = poplib.POP3(config['pop_host'], config['pop_port'])
-            
             server.user(config['pop_username'])
             server.pass_(config['pop_password'])
-            
-            num_messages = len(server.list()[1])
-            emails_data = []
-            
-            start = max(1, num_messages - limit + 1)
-            for i in range(start, num_messages + 1):
-                try:
-                    response, lines, octets = server.retr(i)
-                    msg_content = b'\r\n'.join(lines).decode('utf-8', errors='ignore')
-                    msg = email.message_from_string(msg_content)
-                    
-                    subject = EmailService._decode_header_value(msg.get('Subject', ''))
-                    from_email = EmailService._decode_header_value(msg.get('From', ''))
-                    to_email = EmailService._decode_header_value(msg.get('To', ''))
-                    date_str = msg.get('Date', '')
-                    message_id = msg.get('Message-ID', f'local-{i}')
-                    
-                    body_text = ''
-                    body_html = ''
-                    
-                    if msg.is_multipart():
-                        for part in msg.walk():
-                            content_type = part.get_content_type()
-                            if content_type == 'text/plain':
-                                body_text = part.get_payload(decode=True).decode('utf-8', errors='ignore')
-                            elif content_type == 'text/html':
-                                body_html = part.get_payload(decode=True).decode('utf-8', errors='ignore')
+        except Exception:
+            server.close()
+            raise
+        return server
+    
+    @staticmethod
+    def _pop_uidls(server) -> Dict[str, int]:
+        """Identifiants UIDL du serveur et numéro de message correspondant (du plus ancien au plus récent)"""
+        response, listing, octets = server.uidl()
+        uidls = {}
+        for line in listing:
+            number, uidl = line.decode('ascii', errors='ignore').split(' ', 1)
+            uidls[uidl.strip()] = int(number)
+        return uidls
+    
+    @staticmethod
+    def _parse_message(lines: List[bytes], default_message_id: str) -> Dict:
+        """Extraire en-têtes et corps d'un message POP3 (RETR, ou TOP pour un aperçu)"""
+        msg = email.message_from_bytes(b'\r\n'.join(lines))
+        
+        body_text = ''
+        body_html = ''
+        parts = msg.walk() if msg.is_multipart() else [msg]
+        for part in parts:
+            content_type = part.get_content_type()
+            if content_type not in ('text/plain', 'text/html') or part.is_multipart():
+                continue
+            payload = part.get_payload(decode=True) or b''
+            text = payload.decode(part.get_content_charset() or 'utf-8', errors='ignore')
+            if content_type == 'text/plain':
+                body_text = text
+            else:
+                body_html = text
+        
+        try:
+            date_sent = parsedate_to_datetime(msg.get('Date', ''))
+            if date_sent.tzinfo is not None:
+                date_sent = date_sent.astimezone().replace(tzinfo=None)
+        except (TypeError, ValueError):
+            date_sent = None
+        
+        return {
+            'message_id': (msg.get('Message-ID') or '').strip() or default_message_id,
+            'subject': EmailService._decode_header_value(msg.get('Subject', '')),
+            'from_email': EmailService._decode_header_value(msg.get('From', '')),
+            'to_email': EmailService._decode_header_value(msg.get('To', '')),
+            'body_text': body_text,
+            'body_html': body_html,
+            'date_sent': date_sent,
+            'folder': 'inbox'
+        }
+    
+    @staticmethod
+    def fetch_emails(config_id: int, limit: int = 50, headers_only: bool = False) -> List[Dict]:
+        """
+        Récupérer les nouveaux emails via POP3 (ou IMAP, voir _imap_sync)
+        
+        Une seule commande UIDL liste la boîte ; seuls les messages dont l'UIDL
+        n'a jamais été vu pour cette configuration sont téléchargés (les `limit`
+        plus récents), puis enregistrés en une transaction. Lors de la première
+        relève, les messages plus anciens sont marqués comme vus sans être
+        téléchargés.
+        
+        Args:
+            config_id: ID de la configuration mail
+            limit: Nombre maximal de messages téléchargés
+            headers_only: Ne récupérer que les en-têtes et le début du corps (TOP) ;
+                le message complet est téléchargé à l'ouverture. En IMAP, seuls
+                les en-têtes sont toujours récupérés
+        
+        Returns:
+            Les emails nouvellement enregistrés
+        """
+        config = MailConfig.get_by_id(config_id)
+        if not config or not config.get('pop_host'):
+            raise ValueError("Configuration de réception non trouvée ou incomplète")
+        
+        if config.get('incoming_protocol') == 'imap':
+            return EmailService._fetch_imap(config, limit)
+        
+        try:
+            server = EmailService._pop_connect(config)
+            try:
+                server_uidls = EmailService._pop_uidls(server)
+                unseen, first_sync = EmailService._unseen_uidls(config_id, list(server_uidls))
+                
+                selected = unseen[-limit:] if limit > 0 else []
+                skipped = unseen[:len(unseen) - len(selected)] if first_sync else []
+                
+                emails_data = []
+                for uidl in selected:
+                    number = server_uidls[uidl]
+                    if headers_only:
+                        response, lines, octets = server.top(number, POP_PREVIEW_LINES)
                     else:
-                        body_text = msg.get_payload(decode=True).decode('utf-8', errors='ignore')
-                    
-                    email_data = {
-                        'message_id': message_id,
-                        'subject': subject,
-                        'from_email': from_email,
-                        'to_email': to_email,
-                        'body_text': body_text,
-                        'body_html': body_html,
-                        'date_sent': date_str,
-                        'folder': 'inbox'
-                    }
-                    
-                    EmailService._save_received_email(config_id, email_data)
+                        response, lines, octets = server.retr(number)
+                    try:
+                        email_data = EmailService._parse_message(lines, f'<pop-{config_id}-{uidl}>')
+                    except Exception as e:
+                        # Message illisible : marqué comme vu pour ne pas le retélécharger à chaque relève
+                        print(f"Erreur lors de la lecture du message {uidl}: {e}")
+                        skipped.append(uidl)
+                        continue
+                    email_data['uidl'] = uidl
+                    email_data['body_complete'] = not headers_only
                     emails_data.append(email_data)
-                    
-                except Exception as e:
-                    print(f"Erreur lors de la lecture du message {i}: {e}")
-                    continue
+                
+                server.quit()
+            except Exception:
+                server.close()
+                raise
             
-            server.quit()
+            EmailService._save_received_emails(config_id, emails_data, skipped, list(server_uidls))
             return emails_data
             
         except Exception as e:
@@ -137,13 +260,308 @@ class EmailService:
             raise
     
     @staticmethod
-    def get_emails_by_folder(config_id: int, folder: str = 'inbox', limit: int = 100) -> List[Dict]:
-        """Récupérer les emails stockés par dossier"""
+    def _unseen_uidls(config_id: int, uidls: List[str]):
+        """
+        UIDL du serveur jamais vus pour la configuration, dans l'ordre du serveur
+        
+        Returns:
+            Tuple (uidls non vus, première relève de la configuration)
+        """
         conn = get_db_connection()
         cur = conn.cursor()
         
+        cur.execute('SELECT uidl FROM mail_uidls WHERE mail_config_id = %s', (config_id,))
+        known = {row['uidl'] for row in cur.fetchall()}
+        
+        cur.close()
+        conn.close()
+        
+        unseen = [uidl for uidl in uidls if uidl not in known]
+        return unseen, not known
+    
+    @staticmethod
+    def _pop_download(config: Dict, uidl: str) -> Optional[List[bytes]]:
+        """Message complet (RETR) désigné par son UIDL, None s'il n'est plus sur le serveur"""
+        server = EmailService._pop_connect(config)
+        try:
+            number = EmailService._pop_uidls(server).get(uidl)
+            lines = server.retr(number)[1] if number else None
+            server.quit()
+        except Exception:
+            server.close()
+            raise
+        return lines
+    
+    @staticmethod
+    def _imap_connect(config: Dict):
+        """Ouvrir une session IMAP authentifiée (champs pop_* de la configuration)"""
+        if config['pop_use_ssl']:
+            server = imaplib.IMAP4_SSL(config['pop_host'], config['pop_port'], timeout=IMAP_TIMEOUT)
+        else:
+            server = imaplib.IMAP4(config['pop_host'], config['pop_port'], timeout=IMAP_TIMEOUT)
+        
+        try:
+            server.login(config['pop_username'], config['pop_password'])
+        except Exception:
+            server.shutdown()
+            raise
+        
+        # Capacités annoncées après authentification (IDLE, CONDSTORE), sans aller-retour supplémentaire
+        typ, data = server.response('CAPABILITY')
+        if data and data[-1]:
+            server.capabilities = tuple(data[-1].decode('ascii', errors='ignore').upper().split())
+        return server
+    
+    @staticmethod
+    def _imap_select(server, config: Dict) -> Dict:
+        """
+        Ouvrir le dossier de la configuration en lecture seule (EXAMINE)
+        
+        Returns:
+            Dict: exists, uidvalidity, uidnext et highestmodseq (None si le
+            serveur ne les annonce pas)
+        """
+        folder = config.get('imap_folder') or 'INBOX'
+        typ, data = server.select(_imap_quote(folder), readonly=True)
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"Dossier IMAP inaccessible: {folder}")
+        
+        def response_code(name):
+            values = server.response(name)[1]
+            return int(values[-1]) if values and values[-1] else None
+        
+        mailbox = {
+            'folder': folder,
+            'exists': int(data[0] or 0),
+            'uidvalidity': response_code('UIDVALIDITY'),
+            'uidnext': response_code('UIDNEXT'),
+            'highestmodseq': response_code('HIGHESTMODSEQ'),
+        }
+        if mailbox['uidvalidity'] is None:
+            raise imaplib.IMAP4.error("Le serveur IMAP n'annonce pas UIDVALIDITY")
+        return mailbox
+    
+    @staticmethod
+    def _imap_fetch(server, uids: List, items: str, modifiers: Optional[str] = None) -> List[Dict]:
+        """
+        UID FETCH par lots de IMAP_FETCH_CHUNK identifiants
+        
+        Returns:
+            Liste de dicts (uid, flags, literal) ; literal est le contenu demandé
+            (en-têtes ou message) ou None
+        """
+        records = []
+        for start in range(0, len(uids), IMAP_FETCH_CHUNK):
+            uid_set = ','.join(str(uid) for uid in uids[start:start + IMAP_FETCH_CHUNK])
+            args = (uid_set, items, modifiers) if modifiers else (uid_set, items)
+            typ, data = server.uid('FETCH', *args)
+            if typ != 'OK':
+                raise imaplib.IMAP4.error(f"UID FETCH refusé: {data}")
+            
+            # Chaque réponse est soit un tuple (début, littéral) suivi de sa fin, soit une ligne
+            current = None
+            for item in data:
+                if isinstance(item, tuple):
+                    current = {'meta': item[0], 'literal': item[1]}
+                    records.append(current)
+                elif item and _IMAP_FETCH_START_RE.match(item):
+                    current = {'meta': item, 'literal': None}
+                    records.append(current)
+                elif item and current is not None:
+                    current['meta'] += item
+        
+        fetched = []
+        for record in records:
+            uid = _IMAP_UID_RE.search(record['meta'])
+            if not uid:
+                continue
+            flags = _IMAP_FLAGS_RE.search(record['meta'])
+            fetched.append({
+                'uid': int(uid.group(1)),
+                'flags': flags.group(1).decode('ascii', errors='ignore').split() if flags else [],
+                'literal': record['literal']
+            })
+        return fetched
+    
+    @staticmethod
+    def _imap_uids_from(server, first_uid: int) -> List[int]:
+        """UID du dossier supérieurs ou égaux à first_uid, croissants"""
+        typ, data = server.uid('SEARCH', None, f'UID {first_uid}:*')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"UID SEARCH refusé: {data}")
+        # « n:* » renvoie toujours le dernier UID, même s'il est inférieur à n
+        return sorted(uid for uid in (int(value) for value in (data[0] or b'').split()) if uid >= first_uid)
+    
+    @staticmethod
+    def _imap_sync(server, config: Dict, limit: int = 50) -> List[Dict]:
+        """
+        Synchroniser le dossier IMAP de la configuration avec la base
+        
+        L'état de la dernière synchronisation (mail_imap_state) borne le travail :
+        - nouveaux messages : UID au-delà du UIDNEXT mémorisé, rien à récupérer
+          si le UIDNEXT du serveur n'a pas bougé ;
+        - drapeaux : avec CONDSTORE, seuls les messages modifiés depuis le
+          HIGHESTMODSEQ mémorisé sont relus (lu / non lu) ;
+        - UIDVALIDITY différent (dossier recréé) ou changement de dossier : les
+          UID connus sont oubliés et la synchronisation repart des `limit`
+          messages les plus récents.
+        Seuls les en-têtes sont récupérés (BODY.PEEK, sans marquer les messages
+        comme lus) ; le corps est téléchargé à l'ouverture (ensure_full_body).
+        
+        Returns:
+            Les emails nouvellement enregistrés
+        """
+        config_id = config['id']
+        mailbox = EmailService._imap_select(server, config)
+        uidvalidity = mailbox['uidvalidity']
+        state = EmailService._imap_state(config_id)
+        same_mailbox = (state is not None and state['uidvalidity'] == uidvalidity
+                        and state['folder'] == mailbox['folder'])
+        
+        if same_mailbox:
+            if mailbox['uidnext'] is not None and mailbox['uidnext'] <= state['uidnext']:
+                new_uids = []
+            else:
+                new_uids = EmailService._imap_uids_from(server, state['uidnext'])
+        else:
+            all_uids = EmailService._imap_uids_from(server, 1) if mailbox['exists'] else []
+            new_uids = all_uids[-limit:] if limit > 0 else []
+        
+        emails_data = []
+        for record in EmailService._imap_fetch(server, new_uids, '(UID FLAGS BODY.PEEK[HEADER])'):
+            uidl = f"{uidvalidity}:{record['uid']}"
+            try:
+                email_data = EmailService._parse_message(
+                    (record['literal'] or b'').split(b'\r\n'), f'<imap-{config_id}-{uidl}>'
+                )
+            except Exception as e:
+                print(f"Erreur lors de la lecture du message IMAP {uidl}: {e}")
+                continue
+            email_data['uidl'] = uidl
+            email_data['body_complete'] = False
+            email_data['is_read'] = '\\Seen' in record['flags']
+            emails_data.append(email_data)
+        
+        read_flags = []
+        if (same_mailbox and state['highestmodseq'] and mailbox['highestmodseq']
+                and mailbox['highestmodseq'] > state['highestmodseq'] and state['uidnext'] > 1):
+            changed = EmailService._imap_fetch(
+                server, [f"1:{state['uidnext'] - 1}"], '(UID FLAGS)',
+                f"(CHANGEDSINCE {state['highestmodseq']})"
+            )
+            read_flags = [(f"{uidvalidity}:{record['uid']}", '\\Seen' in record['flags']) for record in changed]
+        
+        uidnext = max([mailbox['uidnext'] or 1, state['uidnext'] if same_mailbox else 1]
+                      + [uid + 1 for uid in new_uids])
+        EmailService._save_imap_sync(config_id, emails_data, dict(mailbox, uidnext=uidnext), read_flags,
+                                     reset=not same_mailbox)
+        return emails_data
+    
+    @staticmethod
+    def _fetch_imap(config: Dict, limit: int) -> List[Dict]:
+        """Relève IMAP ponctuelle (connexion, synchronisation, déconnexion)"""
+        try:
+            server = EmailService._imap_connect(config)
+            try:
+                emails_data = EmailService._imap_sync(server, config, limit)
+                server.logout()
+            except Exception:
+                server.shutdown()
+                raise
+            return emails_data
+        except Exception as e:
+            print(f"Erreur lors de la récupération des emails IMAP: {e}")
+            raise
+    
+    @staticmethod
+    def _imap_download(config: Dict, uidl: str) -> Optional[List[bytes]]:
+        """Message complet désigné par « uidvalidity:uid », None s'il n'est plus sur le serveur"""
+        uidvalidity, uid = (int(value) for value in uidl.split(':', 1))
+        server = EmailService._imap_connect(config)
+        try:
+            mailbox = EmailService._imap_select(server, config)
+            records = []
+            if mailbox['uidvalidity'] == uidvalidity:
+                records = EmailService._imap_fetch(server, [uid], '(UID BODY.PEEK[])')
+            server.logout()
+        except Exception:
+            server.shutdown()
+            raise
+        literal = records[0]['literal'] if records else None
+        return literal.split(b'\r\n') if literal is not None else None
+    
+    @staticmethod
+    def _imap_state(config_id: int) -> Optional[Dict]:
+        """État de la dernière synchronisation IMAP de la configuration"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('SELECT * FROM mail_imap_state WHERE mail_config_id = %s', (config_id,))
+        state = cur.fetchone()
+        
+        cur.close()
+        conn.close()
+        
+        return dict(state) if state else None
+    
+    @staticmethod
+    def ensure_full_body(email_data: Dict) -> Dict:
+        """
+        Télécharger le message complet d'un email relevé en aperçu (TOP POP3, en-têtes IMAP)
+        
+        Si le message n'est plus sur le serveur ou si le serveur est
+        injoignable, l'aperçu est retourné tel quel.
+        """
+        if email_data.get('body_complete', True):
+            return email_data
+        
+        config = MailConfig.get_by_id(email_data['mail_config_id'])
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('SELECT uidl FROM mail_uidls WHERE email_id = %s', (email_data['id'],))
+        row = cur.fetchone()
+        cur.close()
+        conn.close()
+        if not config or not row:
+            return email_data
+        
+        try:
+            if config.get('incoming_protocol') == 'imap':
+                lines = EmailService._imap_download(config, row['uidl'])
+            else:
+                lines = EmailService._pop_download(config, row['uidl'])
+        except Exception as e:
+            print(f"Erreur lors du téléchargement du message {row['uidl']}: {e}")
+            return email_data
+        if lines is None:
+            return email_data
+        
+        full = EmailService._parse_message(lines, email_data['message_id'])
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        cur.execute('''
+            INSERT INTO email_bodies (email_id, body_text, body_html) VALUES (%s, %s, %s)
+            ON CONFLICT (email_id) DO UPDATE SET body_text = EXCLUDED.body_text, body_html = EXCLUDED.body_html
+        ''', (email_data['id'], full['body_text'], full['body_html']))
         cur.execute('''
-            SELECT * FROM emails 
+            UPDATE emails SET body_complete = TRUE, snippet = email_snippet(%s, %s)
+            WHERE id = %s
+        ''', (full['body_text'], full['body_html'], email_data['id']))
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return dict(email_data, body_text=full['body_text'], body_html=full['body_html'], body_complete=True)
+    
+    @staticmethod
+    def get_emails_by_folder(config_id: int, folder: str = 'inbox', limit: int = 100) -> List[Dict]:
+        """Récupérer les emails stockés par dossier (en-têtes et aperçu, corps chargé à l'ouverture)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(f'''
+            SELECT {EMAIL_LIST_COLUMNS} FROM emails
             WHERE mail_config_id = %s AND folder = %s
             ORDER BY date_received DESC
             LIMIT %s
@@ -155,13 +573,115 @@ class EmailService:
         
         return [dict(email) for email in emails] if emails else []
     
+    @staticmethod
+    def search_emails(etablissement_id: int, query: str = '', config_id: Optional[int] = None,
+                      guest_emails: Optional[List[str]] = None, folder: Optional[str] = None,
+                      page: int = 1, per_page: int = 20) -> Dict:
+        """
+        Rechercher dans les emails d'un établissement (objet, adresses, corps)
+        
+        La requête accepte la syntaxe des moteurs de recherche (mots, "phrase
+        exacte", -exclu, or) ; elle est interprétée en français, en anglais et
+        sans racinisation, et les résultats sont classés par pertinence puis par
+        date. Sans requête, les emails sont simplement triés par date.
+        
+        Args:
+            etablissement_id: Établissement dont les configurations mail sont cherchées
+            query: Texte recherché
+            config_id: Limiter à une configuration mail
+            guest_emails: Limiter à la correspondance avec ces adresses (expéditeur,
+                destinataires, copie ou email indexé avec le contact client)
+            folder: Limiter à un dossier
+            page: Page demandée (à partir de 1)
+            per_page: Résultats par page
+        
+        Returns:
+            Dict: results (en-têtes, aperçu et score), total
+        """
+        conditions = ['c.etablissement_id = %(etablissement_id)s']
+        params = {
+            'etablissement_id': etablissement_id,
+            'query': query,
+            'limit': per_page,
+            'offset': (page - 1) * per_page
+        }
+        if config_id:
+            conditions.append('e.mail_config_id = %(config_id)s')
+            params['config_id'] = config_id
+        if folder:
+            conditions.append('e.folder = %(folder)s')
+            params['folder'] = folder
+        if guest_emails:
+            # Une condition par adresse et par colonne : chacune peut utiliser l'index trigrammes
+            guest_conditions = ['lower(e.client_email_indexed) = ANY(%(guest_emails)s)']
+            for index, guest_email in enumerate(guest_emails):
+                key = f'guest_pattern_{index}'
+                params[key] = '%' + guest_email.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+                guest_conditions += [f'e.{column} ILIKE %({key})s' for column in ('from_email', 'to_email', 'cc_email')]
+            conditions.append('(' + ' OR '.join(guest_conditions) + ')')
+            params['guest_emails'] = [guest_email.lower() for guest_email in guest_emails]
+        
+        if query:
+            search_join = '''
+                JOIN email_search s ON s.email_id = e.id
+                CROSS JOIN (
+                    SELECT websearch_to_tsquery('french', %(query)s)
+                        || websearch_to_tsquery('english', %(query)s)
+                        || websearch_to_tsquery('simple', %(query)s) AS tsquery
+                ) q
+            '''
+            conditions.append('s.document @@ q.tsquery')
+            rank = 'ts_rank_cd(s.document, q.tsquery)'
+        else:
+            search_join = ''
+            rank = '0'
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        from_where = f'''
+            FROM emails e
+            JOIN mail_configs c ON c.id = e.mail_config_id
+            {search_join}
+            WHERE {' AND '.join(conditions)}
+        '''
+        cur.execute(f'''
+            SELECT {', '.join('e.' + column.strip() for column in EMAIL_LIST_COLUMNS.split(','))},
+                   {rank} AS rank, COUNT(*) OVER () AS total
+            {from_where}
+            ORDER BY rank DESC, e.date_received DESC, e.id DESC
+            LIMIT %(limit)s OFFSET %(offset)s
+        ''', params)
+        results = [dict(row) for row in cur.fetchall()]
+        if results:
+            total = results[0]['total']
+        elif params['offset']:
+            # Page au-delà des résultats : le total reste utile à la pagination
+            cur.execute(f'SELECT COUNT(*) AS total {from_where}', params)
+            total = cur.fetchone()['total']
+        else:
+            total = 0
+        
+        cur.close()
+        conn.close()
+        
+        for result in results:
+            del result['total']
+            result['rank'] = round(float(result['rank']), 4)
+        return {'results': results, 'total': total}
+    
     @staticmethod
     def get_email_by_id(email_id: int) -> Optional[Dict]:
-        """Récupérer un email par son ID"""
+        """Récupérer un email par son ID, avec son corps"""
         conn = get_db_connection()
         cur = conn.cursor()
         
-        cur.execute('SELECT * FROM emails WHERE id = %s', (email_id,))
+        cur.execute('''
+            SELECT e.*, b.body_text, b.body_html
+            FROM emails e
+            LEFT JOIN email_bodies b ON b.email_id = e.id
+            WHERE e.id = %s
+        ''', (email_id,))
         email_data = cur.fetchone()
         
         cur.close()
@@ -206,69 +726,174 @@ class EmailService:
         conn.close()
     
     @staticmethod
-    def _save_sent_email(config_id: int, to_email: str, subject: str, body_html: str,
-                        cc_email: Optional[str] = None, bcc_email: Optional[str] = None):
-        """Enregistrer un email envoyé dans la base de données"""
-        config = MailConfig.get_by_id(config_id)
+    def _save_sent_emails(config: Dict, messages: List[Dict]):
+        """Enregistrer des emails envoyés dans la base de données (une seule transaction)"""
         conn = get_db_connection()
         cur = conn.cursor()
         
+        # Identifiants réservés d'avance pour rattacher chaque corps à son email
         cur.execute('''
+            SELECT nextval(pg_get_serial_sequence('emails', 'id')) AS id FROM generate_series(1, %s)
+        ''', (len(messages),))
+        ids = [row['id'] for row in cur.fetchall()]
+        
+        now = datetime.now()
+        execute_values(cur, '''
             INSERT INTO emails (
-                mail_config_id, subject, from_email, to_email, cc_email, bcc_email,
-                body_html, folder, is_read, date_sent
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ''', (
-            config_id,
-            subject,
+                id, mail_config_id, subject, from_email, to_email, cc_email, bcc_email,
+                folder, is_read, date_sent, snippet
+            ) VALUES %s
+        ''', [(
+            email_id,
+            config['id'],
+            message['subject'],
             config['email_address'],
-            to_email,
-            cc_email,
-            bcc_email,
-            body_html,
+            message['to_email'],
+            message.get('cc_email'),
+            message.get('bcc_email'),
             'sent',
             True,
-            datetime.now()
-        ))
+            now,
+            message['body_html']
+        ) for email_id, message in zip(ids, messages)],
+            template='(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, email_snippet(NULL, %s))')
+        execute_values(cur, 'INSERT INTO email_bodies (email_id, body_html) VALUES %s',
+                       [(email_id, message['body_html']) for email_id, message in zip(ids, messages)])
         
         conn.commit()
         cur.close()
         conn.close()
     
     @staticmethod
-    def _save_received_email(config_id: int, email_data: Dict):
-        """Enregistrer un email reçu dans la base de données"""
+    def _save_received_emails(config_id: int, emails_data: List[Dict], skipped_uidls: List[str],
+                              server_uidls: List[str]):
+        """
+        Enregistrer les emails reçus et les UIDL vus en une transaction
+        
+        Les emails déjà présents dans cette boîte (même Message-ID) ne sont pas dupliqués mais
+        rattachés à leur UIDL ; les UIDL qui ne sont plus sur le serveur sont oubliés.
+        """
         conn = get_db_connection()
         cur = conn.cursor()
         
+        ids_by_message_id = EmailService._insert_received_emails(cur, config_id, emails_data)
+        
+        seen = [(config_id, e['uidl'], ids_by_message_id.get(e['message_id'])) for e in emails_data]
+        seen += [(config_id, uidl, None) for uidl in skipped_uidls]
+        if seen:
+            execute_values(cur, '''
+                INSERT INTO mail_uidls (mail_config_id, uidl, email_id) VALUES %s
+                ON CONFLICT (mail_config_id, uidl) DO NOTHING
+            ''', seen)
+        
         cur.execute('''
-            SELECT id FROM emails WHERE message_id = %s
-        ''', (email_data['message_id'],))
+            DELETE FROM mail_uidls
+            WHERE mail_config_id = %s AND uidl <> ALL(%s)
+        ''', (config_id, server_uidls))
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        for email_data in emails_data:
+            email_data['id'] = ids_by_message_id.get(email_data['message_id'])
+    
+    @staticmethod
+    def _save_imap_sync(config_id: int, emails_data: List[Dict], mailbox: Dict,
+                        read_flags: List, reset: bool):
+        """
+        Enregistrer une synchronisation IMAP en une transaction : nouveaux emails
+        et leurs UID, drapeaux lu / non lu modifiés, état du dossier
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
         
-        existing = cur.fetchone()
+        if reset:
+            cur.execute('DELETE FROM mail_uidls WHERE mail_config_id = %s', (config_id,))
         
-        if not existing:
-            cur.execute('''
-                INSERT INTO emails (
-                    mail_config_id, message_id, subject, from_email, to_email,
-                    body_text, body_html, folder, date_sent
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ''', (
-                config_id,
-                email_data['message_id'],
-                email_data['subject'],
-                email_data['from_email'],
-                email_data['to_email'],
-                email_data['body_text'],
-                email_data['body_html'],
-                email_data['folder'],
-                email_data.get('date_sent')
-            ))
-            
-            conn.commit()
+        ids_by_message_id = EmailService._insert_received_emails(cur, config_id, emails_data)
+        seen = [(config_id, e['uidl'], ids_by_message_id.get(e['message_id'])) for e in emails_data]
+        if seen:
+            execute_values(cur, '''
+                INSERT INTO mail_uidls (mail_config_id, uidl, email_id) VALUES %s
+                ON CONFLICT (mail_config_id, uidl) DO NOTHING
+            ''', seen)
+        
+        if read_flags:
+            cur.executemany('''
+                UPDATE emails SET is_read = %s
+                WHERE id = (SELECT email_id FROM mail_uidls WHERE mail_config_id = %s AND uidl = %s)
+            ''', [(is_read, config_id, uidl) for uidl, is_read in read_flags])
+        
+        cur.execute('''
+            INSERT INTO mail_imap_state (mail_config_id, folder, uidvalidity, uidnext, highestmodseq, synced_at)
+            VALUES (%(config_id)s, %(folder)s, %(uidvalidity)s, %(uidnext)s, %(highestmodseq)s, CURRENT_TIMESTAMP)
+            ON CONFLICT (mail_config_id) DO UPDATE SET
+                folder = EXCLUDED.folder,
+                uidvalidity = EXCLUDED.uidvalidity,
+                uidnext = CASE WHEN %(reset)s THEN EXCLUDED.uidnext
+                    ELSE GREATEST(mail_imap_state.uidnext, EXCLUDED.uidnext) END,
+                highestmodseq = CASE WHEN %(reset)s THEN EXCLUDED.highestmodseq
+                    ELSE GREATEST(mail_imap_state.highestmodseq, EXCLUDED.highestmodseq) END,
+                synced_at = EXCLUDED.synced_at
+        ''', dict(mailbox, config_id=config_id, reset=reset))
         
+        conn.commit()
         cur.close()
         conn.close()
+        
+        for email_data in emails_data:
+            email_data['id'] = ids_by_message_id.get(email_data['message_id'])
+    
+    @staticmethod
+    def _insert_received_emails(cur, config_id: int, emails_data: List[Dict]) -> Dict[str, int]:
+        """
+        Insérer des emails reçus (sans dupliquer un Message-ID déjà présent dans cette boîte)
+        
+        Returns:
+            L'ID de chaque email de cette configuration par Message-ID, existant ou nouvellement inséré
+        """
+        if not emails_data:
+            return {}
+        
+        inserted = execute_values(cur, '''
+            INSERT INTO emails (
+                mail_config_id, message_id, subject, from_email, to_email,
+                folder, date_sent, body_complete, is_read, snippet
+            ) VALUES %s
+            ON CONFLICT (mail_config_id, message_id) DO NOTHING
+            RETURNING id, message_id
+        ''', [(
+            config_id,
+            email_data['message_id'],
+            email_data['subject'],
+            email_data['from_email'],
+            email_data['to_email'],
+            email_data['folder'],
+            email_data['date_sent'],
+            email_data['body_complete'],
+            email_data.get('is_read', False),
+            email_data['body_text'],
+            email_data['body_html']
+        ) for email_data in emails_data],
+            template='(%s, %s, %s, %s, %s, %s, %s, %s, %s, email_snippet(%s, %s))', fetch=True)
+        ids_by_message_id = {row['message_id']: row['id'] for row in inserted}
+        
+        bodies = [
+            (ids_by_message_id[e['message_id']], e['body_text'], e['body_html'])
+            for e in emails_data if e['message_id'] in ids_by_message_id and (e['body_text'] or e['body_html'])
+        ]
+        if bodies:
+            execute_values(cur, 'INSERT INTO email_bodies (email_id, body_text, body_html) VALUES %s', bodies)
+        
+        existing = [e['message_id'] for e in emails_data if e['message_id'] not in ids_by_message_id]
+        if existing:
+            cur.execute('''
+                SELECT id, message_id FROM emails
+                WHERE mail_config_id = %s AND message_id = ANY(%s)
+            ''', (config_id, existing))
+            ids_by_message_id.update({row['message_id']: row['id'] for row in cur.fetchall()})
+        return ids_by_message_id
     
     @staticmethod
     def _decode_header_value(value: str) -> str:
@@ -0,0 +1,275 @@
+"""
+Client HTTP sortant partagé (flux iCal, REST Countries, logos distants, SendGrid)
+
+Une session requests est conservée par hôte : les connexions keep-alive (TCP +
+TLS) sont réutilisées d'un appel à l'autre au lieu d'être rouvertes à chaque
+requête. Chaque hôte a ses délais (connexion, lecture), ses nouvelles
+tentatives avec recul exponentiel et gigue, et un disjoncteur : après
+HTTP_BREAKER_FAILURES échecs consécutifs, les appels vers l'hôte échouent
+immédiatement (CircuitOpenError) pendant HTTP_BREAKER_RESET secondes, puis un
+seul appel d'essai est laissé passer.
+
+Les sessions, disjoncteurs et mesures sont propres à chaque worker gunicorn ;
+les latences et résultats par hôte sont exposés au format Prometheus.
+"""
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+from .request_metrics import DURATION_BUCKETS_SECONDS, Histogram, _escape
+
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+HTTP_MAX_HOSTS = int(os.environ.get('HTTP_MAX_HOSTS', 256))
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_READ_TIMEOUT = 30
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', 2))
+HTTP_RETRY_BACKOFF = 0.5
+HTTP_RETRY_MAX_BACKOFF = 8
+HTTP_BREAKER_FAILURES = int(os.environ.get('HTTP_BREAKER_FAILURES', 5))
+HTTP_BREAKER_RESET = int(os.environ.get('HTTP_BREAKER_RESET', 30))
+
+# Délais (connexion, lecture) des hôtes connus ; les autres utilisent les valeurs par défaut
+HOST_TIMEOUTS = {
+    'restcountries.com': (3, 10),
+    'api.sendgrid.com': (5, 30),
+}
+
+RETRY_STATUSES = (429, 502, 503, 504)
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+_BREAKER_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Appel refusé sans tentative réseau : le disjoncteur de l'hôte est ouvert"""
+
+
+class HostState:
+    """Session, disjoncteur et mesures d'un hôte"""
+    
+    def __init__(self, host: str):
+        self.host = host
+        self.lock = threading.Lock()
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.breaker = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.duration_us = Histogram()
+        self.outcomes = {}
+        self.retries = 0
+        self.rejected = 0
+        self.opens = 0
+    
+    def allow(self):
+        """Laisser passer une tentative ou lever CircuitOpenError"""
+        with self.lock:
+            if self.breaker == OPEN:
+                if time.monotonic() - self.opened_at < HTTP_BREAKER_RESET:
+                    self.rejected += 1
+                    raise CircuitOpenError(f'{self.host}: disjoncteur ouvert après {self.consecutive_failures} échec(s)')
+                self.breaker = HALF_OPEN
+                self.trial_in_flight = False
+            if self.breaker == HALF_OPEN:
+                if self.trial_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError(f'{self.host}: appel d\'essai en cours')
+                self.trial_in_flight = True
+    
+    def record(self, outcome: str, duration: float, failed: bool):
+        """Enregistrer le résultat d'une tentative et mettre à jour le disjoncteur"""
+        with self.lock:
+            self.duration_us.record(duration * 1_000_000)
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+            self.trial_in_flight = False
+            if not failed:
+                self.consecutive_failures = 0
+                self.breaker = CLOSED
+                return
+            self.consecutive_failures += 1
+            if self.breaker == HALF_OPEN or self.consecutive_failures >= HTTP_BREAKER_FAILURES:
+                if self.breaker != OPEN:
+                    self.opens += 1
+                self.breaker = OPEN
+                self.opened_at = time.monotonic()
+
+
+def _retry_delay(attempt: int, response: Optional[requests.Response] = None) -> float:
+    """Recul exponentiel avec gigue complète, ou Retry-After s'il est raisonnable"""
+    if response is not None:
+        retry_after = response.headers.get('Retry-After', '')
+        if retry_after.isdigit() and int(retry_after) <= HTTP_RETRY_MAX_BACKOFF:
+            return float(retry_after)
+    return random.uniform(0, min(HTTP_RETRY_MAX_BACKOFF, HTTP_RETRY_BACKOFF * 2 ** attempt))
+
+
+class HttpClient:
+    """
+    Client HTTP sortant avec sessions par hôte, nouvelles tentatives et disjoncteurs
+    
+    Les méthodes acceptent les mêmes arguments que requests (headers, json,
+    stream, timeout...) et lèvent les mêmes exceptions.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts = OrderedDict()
+    
+    def init_app(self, app, registry=None):
+        """Exposer les mesures du client dans le registre Prometheus"""
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+    
+    def _host_state(self, url: str) -> HostState:
+        parsed = urlparse(url)
+        key = f'{parsed.scheme}://{parsed.netloc.lower()}'
+        with self._lock:
+            state = self._hosts.get(key)
+            if state is None:
+                state = self._hosts[key] = HostState(parsed.netloc.lower())
+                # Les sessions évincées sont libérées par le ramasse-miettes, sans
+                # couper les téléchargements encore en cours
+                while len(self._hosts) > HTTP_MAX_HOSTS:
+                    self._hosts.popitem(last=False)
+            else:
+                self._hosts.move_to_end(key)
+            return state
+    
+    def request(self, method: str, url: str, retries: Optional[int] = None, **kwargs) -> requests.Response:
+        """
+        Envoyer une requête via la session de l'hôte
+        
+        Les erreurs réseau, délais dépassés et réponses 429/502/503/504 sont
+        retentés (retries fois, HTTP_RETRIES par défaut). Pour les méthodes non
+        idempotentes (POST...), seuls les échecs de connexion et les 429 le sont,
+        la requête n'ayant alors pas été traitée.
+        
+        Raises:
+            CircuitOpenError: Si le disjoncteur de l'hôte est ouvert
+            requests.exceptions.RequestException: Après la dernière tentative
+        """
+        method = method.upper()
+        state = self._host_state(url)
+        idempotent = method in IDEMPOTENT_METHODS
+        retries = HTTP_RETRIES if retries is None else retries
+        kwargs.setdefault('timeout', HOST_TIMEOUTS.get(state.host, (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT)))
+        
+        attempt = 0
+        while True:
+            state.allow()
+            started = time.perf_counter()
+            try:
+                response = state.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                network = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                state.record('timeout' if isinstance(e, requests.exceptions.Timeout) else 'error',
+                             time.perf_counter() - started, failed=network)
+                retriable = network and (idempotent or isinstance(e, requests.exceptions.ConnectTimeout))
+                if attempt >= retries or not retriable:
+                    raise
+                delay = _retry_delay(attempt)
+            else:
+                state.record(f'{response.status_code // 100}xx', time.perf_counter() - started,
+                             failed=response.status_code >= 500)
+                retriable = response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+                if attempt >= retries or not retriable:
+                    return response
+                delay = _retry_delay(attempt, response)
+                response.close()
+            
+            with state.lock:
+                state.retries += 1
+            attempt += 1
+            time.sleep(delay)
+    
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+    
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+    
+    def reset(self):
+        """Fermer toutes les sessions et réinitialiser disjoncteurs et mesures"""
+        with self._lock:
+            hosts, self._hosts = list(self._hosts.values()), OrderedDict()
+        for state in hosts:
+            state.session.close()
+    
+    def status(self) -> Dict:
+        """État des hôtes contactés par ce worker"""
+        with self._lock:
+            hosts = list(self._hosts.values())
+        
+        result = []
+        for state in hosts:
+            with state.lock:
+                result.append({
+                    'host': state.host,
+                    'breaker': state.breaker,
+                    'consecutive_failures': state.consecutive_failures,
+                    'requests': state.duration_us.count,
+                    'outcomes': dict(state.outcomes),
+                    'retries': state.retries,
+                    'rejected': state.rejected,
+                    'opens': state.opens,
+                    'p50_ms': state.duration_us.percentile(0.5) / 1000,
+                    'p99_ms': state.duration_us.percentile(0.99) / 1000,
+                })
+        return {'worker': os.getpid(), 'hosts': sorted(result, key=lambda h: h['host'])}
+    
+    def prometheus_lines(self):
+        """Latences et compteurs par hôte au format texte Prometheus"""
+        worker = os.getpid()
+        with self._lock:
+            hosts = sorted(self._hosts.values(), key=lambda s: s.host)
+        
+        name = 'guestadmission_http_client_request_duration_seconds'
+        lines = [
+            f'# HELP {name} Durée des tentatives HTTP sortantes jusqu\'aux en-têtes de réponse',
+            f'# TYPE {name} histogram',
+        ]
+        scaled_bounds = [int(round(bound * 1_000_000)) for bound in DURATION_BUCKETS_SECONDS]
+        outcomes = []
+        counters = []
+        for state in hosts:
+            labels = f'host="{_escape(state.host)}",worker="{worker}"'
+            with state.lock:
+                histogram = state.duration_us
+                for bound, cumulative in zip(DURATION_BUCKETS_SECONDS, histogram.cumulative(scaled_bounds)):
+                    lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                lines.append(f'{name}_sum{{{labels}}} {histogram.total / 1_000_000}')
+                lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+                for outcome, count in sorted(state.outcomes.items()):
+                    outcomes.append(f'guestadmission_http_client_requests_total{{{labels},outcome="{outcome}"}} {count}')
+                counters.append((labels, state.retries, state.rejected, state.opens, _BREAKER_GAUGE[state.breaker]))
+        
+        lines += [
+            '# HELP guestadmission_http_client_requests_total Tentatives HTTP sortantes par hôte et résultat',
+            '# TYPE guestadmission_http_client_requests_total counter',
+        ] + outcomes
+        for index, (metric, kind, help_text) in enumerate((
+            ('retries_total', 'counter', 'Nouvelles tentatives HTTP sortantes'),
+            ('rejected_total', 'counter', 'Appels refusés par un disjoncteur ouvert'),
+            ('breaker_opens_total', 'counter', 'Ouvertures du disjoncteur'),
+            ('breaker_state', 'gauge', 'État du disjoncteur (0 fermé, 1 essai, 2 ouvert)'),
+        ), start=1):
+            lines.append(f'# HELP guestadmission_http_client_{metric} {help_text}')
+            lines.append(f'# TYPE guestadmission_http_client_{metric} {kind}')
+            for counter in counters:
+                lines.append(f'guestadmission_http_client_{metric}{{{counter[0]}}} {counter[index]}')
+        return lines
+
+
+http_client = HttpClient()
@@ -0,0 +1,199 @@
+"""
+Service d'export iCal des séjours (flux .ics par établissement et par chambre)
+
+Les channel managers et OTA interrogent ces flux très souvent. Chaque
+établissement porte une version de données (table ical_exports) incrémentée
+par trigger à chaque modification de reservations / reservations_chambres.
+Le corps rendu (et sa version gzip) est mis en cache par worker, indexé par
+cette version : un flux inchangé ne coûte qu'une lecture de clé primaire.
+Lors d'un nouveau rendu, seuls les VEVENT des séjours modifiés sont resérialisés.
+"""
+import gzip
+import hashlib
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import date, timedelta
+from typing import Dict, Optional
+from ..config.database import get_db_connection
+
+ICAL_EXPORT_PAST_DAYS = int(os.environ.get('ICAL_EXPORT_PAST_DAYS', 30))
+ICAL_EXPORT_CACHE_SIZE = int(os.environ.get('ICAL_EXPORT_CACHE_SIZE', 512))
+ICAL_EXPORT_EVENT_CACHE_SIZE = 50000
+ICAL_EXPORT_MAX_AGE = 300
+
+_PRODID = '-//GuestAdmission//Export iCal//FR'
+# Séjours non publiés : clôturés ou annulés (le statut d'annulation est écrit de plusieurs façons)
+_HIDDEN_STATUSES = ('closed', 'annulee', 'annulée', 'cancelled')
+_cache_lock = threading.Lock()
+_feeds = OrderedDict()
+_events = OrderedDict()
+
+
+def _cache_put(cache: OrderedDict, key, value, max_size: int):
+    with _cache_lock:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+
+class IcalExportService:
+    """Service pour publier les séjours locaux au format iCal"""
+    
+    @staticmethod
+    def get_export(etablissement_id: int) -> Dict:
+        """
+        Récupérer le jeton d'export d'un établissement, en le créant si besoin
+        
+        Returns:
+            Dict: etablissement_id, token, version, modifie_le
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            INSERT INTO ical_exports (etablissement_id, token)
+            VALUES (%s, %s)
+            ON CONFLICT (etablissement_id) DO UPDATE SET
+                token = COALESCE(ical_exports.token, EXCLUDED.token)
+            RETURNING etablissement_id, token, version, modifie_le
+        ''', (etablissement_id, secrets.token_urlsafe(24)))
+        export = cur.fetchone()
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return dict(export)
+    
+    @staticmethod
+    def regenerate_token(etablissement_id: int) -> Dict:
+        """Remplacer le jeton d'export (les anciens liens cessent de fonctionner)"""
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            INSERT INTO ical_exports (etablissement_id, token)
+            VALUES (%s, %s)
+            ON CONFLICT (etablissement_id) DO UPDATE SET token = EXCLUDED.token
+            RETURNING etablissement_id, token, version, modifie_le
+        ''', (etablissement_id, secrets.token_urlsafe(24)))
+        export = cur.fetchone()
+        
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        return dict(export)
+    
+    @staticmethod
+    def get_feed(token: str, chambre_id: Optional[int] = None) -> Optional[Dict]:
+        """
+        Obtenir le flux rendu d'un établissement ou d'une de ses chambres
+        
+        Args:
+            token: Jeton d'export de l'établissement
+            chambre_id: Chambre à exporter (None = tout l'établissement)
+        
+        Returns:
+            Dict: body, gzipped, etag, last_modified - ou None si le jeton ou la chambre est inconnu
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        try:
+            cur.execute('''
+                SELECT etablissement_id, version, modifie_le FROM ical_exports WHERE token = %s
+            ''', (token,))
+            export = cur.fetchone()
+            if not export:
+                return None
+            
+            key = (export['etablissement_id'], chambre_id)
+            today = date.today()
+            with _cache_lock:
+                feed = _feeds.get(key)
+                if feed and feed['version'] == export['version'] and feed['day'] == today:
+                    _feeds.move_to_end(key)
+                    return feed
+            
+            feed = IcalExportService._render(cur, export, chambre_id, today)
+            if feed is not None:
+                _cache_put(_feeds, key, feed, ICAL_EXPORT_CACHE_SIZE)
+            return feed
+        finally:
+            cur.close()
+            conn.close()
+    
+    @staticmethod
+    def _render(cur, export: Dict, chambre_id: Optional[int], today: date) -> Optional[Dict]:
+        """Rendre un flux à partir des séjours actifs (ni clôturés, ni annulés) de la fenêtre exportée"""
+        etablissement_id = export['etablissement_id']
+        since = today - timedelta(days=ICAL_EXPORT_PAST_DAYS)
+        
+        if chambre_id is None:
+            cur.execute('''
+                SELECT r.id, r.date_arrivee, r.date_depart, COALESCE(r.updated_at, r.created_at) AS modifie_le
+                FROM reservations r
+                WHERE r.etablissement_id = %s AND r.statut NOT IN %s AND r.date_depart >= %s
+                ORDER BY r.date_arrivee, r.id
+            ''', (etablissement_id, _HIDDEN_STATUSES, since))
+        else:
+            cur.execute('SELECT 1 FROM chambres WHERE id = %s AND etablissement_id = %s',
+                        (chambre_id, etablissement_id))
+            if not cur.fetchone():
+                return None
+            cur.execute('''
+                SELECT r.id, r.date_arrivee, r.date_depart, COALESCE(r.updated_at, r.created_at) AS modifie_le
+                FROM reservations r
+                JOIN reservations_chambres rc ON rc.reservation_id = r.id
+                WHERE rc.chambre_id = %s AND r.statut NOT IN %s AND r.date_depart >= %s
+                ORDER BY r.date_arrivee, r.id
+            ''', (chambre_id, _HIDDEN_STATUSES, since))
+        
+        parts = [
+            b'BEGIN:VCALENDAR\r\n',
+            b'VERSION:2.0\r\n',
+            f'PRODID:{_PRODID}\r\n'.encode('utf-8'),
+            b'CALSCALE:GREGORIAN\r\n',
+            b'METHOD:PUBLISH\r\n',
+        ]
+        for row in cur.fetchall():
+            parts.append(IcalExportService._vevent(row, chambre_id))
+        parts.append(b'END:VCALENDAR\r\n')
+        
+        body = b''.join(parts)
+        return {
+            'version': export['version'],
+            'day': today,
+            'body': body,
+            'gzipped': gzip.compress(body, compresslevel=6, mtime=0),
+            'etag': hashlib.sha256(body).hexdigest()[:32],
+            'last_modified': export['modifie_le'],
+        }
+    
+    @staticmethod
+    def _vevent(row: Dict, chambre_id: Optional[int]) -> bytes:
+        """VEVENT d'un séjour, mis en cache tant que ses dates et son horodatage ne changent pas"""
+        key = (row['id'], chambre_id, row['date_arrivee'], row['date_depart'], row['modifie_le'])
+        with _cache_lock:
+            event = _events.get(key)
+        if event is not None:
+            return event
+        
+        uid = f'sejour-{row["id"]}' + (f'-chambre-{chambre_id}' if chambre_id else '')
+        stamp = row['modifie_le'].strftime('%Y%m%dT%H%M%SZ') if row['modifie_le'] else '19700101T000000Z'
+        event = (
+            'BEGIN:VEVENT\r\n'
+            f'UID:{uid}@guestadmission\r\n'
+            f'DTSTAMP:{stamp}\r\n'
+            f'DTSTART;VALUE=DATE:{row["date_arrivee"].strftime("%Y%m%d")}\r\n'
+            f'DTEND;VALUE=DATE:{row["date_depart"].strftime("%Y%m%d")}\r\n'
+            'SUMMARY:Réservé\r\n'
+            'TRANSP:OPAQUE\r\n'
+            'END:VEVENT\r\n'
+        ).encode('utf-8')
+        _cache_put(_events, key, event, ICAL_EXPORT_EVENT_CACHE_SIZE)
+        return event
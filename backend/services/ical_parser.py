@@ -0,0 +1,154 @@
+"""
+Analyseur iCal en flux pour les calendriers externes volumineux
+
+Contrairement à icalendar (Calendar.from_ical), qui charge tout le flux puis
+construit l'arbre complet des composants, cet analyseur lit le fichier ligne
+par ligne, déplie les lignes de continuation (RFC 5545 §3.1) et produit les
+VEVENT un par un. La mémoire utilisée ne dépend que de l'événement en cours.
+
+Seules les propriétés enregistrées dans reservations_ical sont conservées
+(UID, SUMMARY, DESCRIPTION, DTSTART, DTEND) ; les sous-composants (VALARM...)
+sont ignorés.
+"""
+from datetime import date
+from typing import BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+_KEPT_PROPERTIES = ('UID', 'SUMMARY', 'DESCRIPTION', 'DTSTART', 'DTEND')
+_TEXT_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+
+
+def _unfold(stream: BinaryIO) -> Iterator[str]:
+    """Produire les lignes logiques d'un flux iCal (lignes de continuation rattachées)"""
+    current = None
+    for raw in stream:
+        line = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+        if current is None:
+            line = line.lstrip('\ufeff')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+def _split_property(line: str) -> Tuple[str, str]:
+    """Séparer le nom d'une propriété (sans paramètres) de sa valeur"""
+    quoted = False
+    name_end = None
+    for index, char in enumerate(line):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted:
+            if char == ';' and name_end is None:
+                name_end = index
+            elif char == ':':
+                return line[:name_end if name_end is not None else index].upper(), line[index + 1:]
+    return line.upper(), ''
+
+
+def _unescape_text(value: str) -> str:
+    """Décoder une valeur TEXT (\\n, \\, ...)"""
+    if '\\' not in value:
+        return value
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            following = next(chars, '')
+            result.append(_TEXT_ESCAPES.get(following, following))
+        else:
+            result.append(char)
+    return ''.join(result)
+
+
+def _parse_date(value: str) -> date:
+    """Date d'une valeur DATE ou DATE-TIME (AAAAMMJJ[THHMMSS[Z]])"""
+    value = value.strip()
+    return date(int(value[0:4]), int(value[4:6]), int(value[6:8]))
+
+
+def iter_vevents(stream: BinaryIO, errors: Optional[List[str]] = None,
+                 skipped_uids: Optional[Set[str]] = None) -> Iterator[Dict]:
+    """
+    Produire les événements d'un flux iCal au fil de la lecture
+
+    Args:
+        stream: Fichier binaire positionné au début du flux
+        errors: Liste complétée avec les événements ignorés pour cause d'erreur
+        skipped_uids: Ensemble complété avec l'UID des événements ignorés
+            (toujours présents dans le flux, ils ne doivent pas être annulés)
+
+    Returns:
+        Itérateur de dicts uid, titre, date_debut, date_fin, description
+        (les événements sans DTSTART ou DTEND sont ignorés)
+
+    Raises:
+        ValueError: Si le flux ne commence pas par BEGIN:VCALENDAR ou n'est pas
+            terminé par END:VCALENDAR (page d'erreur HTML, réponse vide,
+            téléchargement tronqué) ; levée au fil de la lecture, elle doit
+            annuler l'enregistrement des événements déjà produits
+    """
+    properties = None
+    depth = 0
+    started = False
+    finished = False
+
+    for line in _unfold(stream):
+        if not line:
+            continue
+        name, value = _split_property(line)
+
+        if not started:
+            if name != 'BEGIN' or value.strip().upper() != 'VCALENDAR':
+                raise ValueError('flux iCal invalide (BEGIN:VCALENDAR absent)')
+            started = True
+            continue
+
+        if name == 'BEGIN':
+            if properties is not None:
+                depth += 1
+            elif value.strip().upper() == 'VEVENT':
+                properties = {}
+                depth = 0
+            continue
+
+        if name == 'END' and properties is not None:
+            if depth:
+                depth -= 1
+                continue
+            event, properties = properties, None
+            uid = _unescape_text(event.get('UID', ''))
+            try:
+                if 'DTSTART' not in event or 'DTEND' not in event:
+                    raise ValueError('DTSTART ou DTEND absent')
+                parsed = {
+                    'uid': uid,
+                    'titre': _unescape_text(event.get('SUMMARY', 'Séjour')),
+                    'date_debut': _parse_date(event['DTSTART']),
+                    'date_fin': _parse_date(event['DTEND']),
+                    'description': _unescape_text(event.get('DESCRIPTION', ''))
+                }
+            except ValueError as e:
+                if errors is not None:
+                    errors.append(f"Erreur événement {uid or '?'}: {str(e)}")
+                if skipped_uids is not None and uid:
+                    skipped_uids.add(uid)
+                continue
+            yield parsed
+            continue
+
+        if name == 'END' and value.strip().upper() == 'VCALENDAR':
+            finished = True
+            break
+
+        if properties is not None and not depth and name in _KEPT_PROPERTIES:
+            properties[name] = value
+
+    if not started:
+        raise ValueError('flux iCal vide')
+    if not finished:
+        raise ValueError('flux iCal tronqué (END:VCALENDAR absent)')
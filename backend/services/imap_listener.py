@@ -0,0 +1,325 @@
+"""
+Réception IMAP en temps réel (IDLE)
+
+Un thread superviseur relit toutes les IMAP_LISTENER_REFRESH secondes les
+configurations actives en IMAP et démarre un thread d'écoute par boîte. Le
+thread d'écoute prend un verrou consultatif PostgreSQL de session
+(pg_try_advisory_lock) : une boîte n'est écoutée que par un seul worker
+gunicorn, les autres restent en attente et prennent le relais au tour suivant
+si le worker titulaire s'arrête.
+
+Le thread d'écoute synchronise la boîte (EmailService._imap_sync : nouveaux UID
+au-delà du UIDNEXT mémorisé, drapeaux modifiés depuis HIGHESTMODSEQ), puis
+attend en IDLE qu'elle change (EXISTS, EXPUNGE, FETCH) et synchronise de
+nouveau. L'IDLE est renouvelé toutes les IMAP_IDLE_TIMEOUT secondes ; un
+serveur resté muet aussi longtemps est considéré comme perdu et la session est
+rouverte. Sans IDLE, la boîte est synchronisée toutes les IMAP_POLL_INTERVAL
+secondes. Une modification de l'hôte, du port, des identifiants ou du dossier
+redémarre l'écoute.
+"""
+import itertools
+import os
+import re
+import socket
+import threading
+import time
+from typing import Dict, Tuple
+from ..config.database import get_db_connection
+from ..models.mail_config import MailConfig
+from .email_service import EmailService, IMAP_TIMEOUT
+from .request_metrics import _escape
+
+IMAP_LISTENER_ENABLED = os.environ.get('IMAP_LISTENER_ENABLED', 'true').lower() == 'true'
+IMAP_LISTENER_REFRESH = int(os.environ.get('IMAP_LISTENER_REFRESH', 60))
+IMAP_IDLE_TIMEOUT = int(os.environ.get('IMAP_IDLE_TIMEOUT', 600))
+IMAP_POLL_INTERVAL = int(os.environ.get('IMAP_POLL_INTERVAL', 120))
+IMAP_RETRY_DELAY = 5
+IMAP_MAX_RETRY_DELAY = 300
+
+# Espace de noms des verrous consultatifs (pg_try_advisory_lock(espace, mail_config_id))
+LISTENER_LOCK_NAMESPACE = 7241503
+
+# Réponses non sollicitées qui signalent un changement de la boîte pendant l'IDLE
+_IDLE_EVENT_RE = re.compile(rb'^\* \d+ (EXISTS|EXPUNGE|FETCH|RECENT)\b', re.IGNORECASE)
+
+
+def _signature(config: Dict) -> Tuple:
+    return (config['pop_host'], config['pop_port'], config['pop_username'], config['pop_password'],
+            bool(config['pop_use_ssl']), config.get('imap_folder') or 'INBOX')
+
+
+class MailboxListener:
+    """Thread d'écoute d'une boîte IMAP et ses compteurs"""
+    
+    def __init__(self, config_id: int, signature: Tuple):
+        self.config_id = config_id
+        self.signature = signature
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.server = None
+        self.state = 'starting'
+        self.idling = False
+        self.syncs = 0
+        self.messages = 0
+        self.errors = 0
+        self.last_sync = None
+        self.last_error = None
+    
+    def is_alive(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+
+class ImapListener:
+    """Écoute IDLE des boîtes IMAP actives, une boîte par worker au plus"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._listeners: Dict[int, MailboxListener] = {}
+        self._supervisor = None
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._tags = itertools.count(1)
+    
+    def init_app(self, app, registry=None):
+        """
+        Démarrer le superviseur dans ce worker si IMAP_LISTENER_ENABLED est actif
+        
+        À appeler dans chaque worker (pas de --preload gunicorn : les threads ne
+        survivraient pas au fork).
+        """
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+        if IMAP_LISTENER_ENABLED:
+            self.start()
+    
+    def start(self):
+        """Démarrer le superviseur (sans effet s'il tourne déjà)"""
+        with self._lock:
+            if self._supervisor is not None and self._supervisor.is_alive():
+                return
+            self._stop_event = threading.Event()
+            self._supervisor = threading.Thread(target=self._supervise, name='imap-listener', daemon=True)
+            self._supervisor.start()
+    
+    def stop(self):
+        """Arrêter le superviseur et toutes les écoutes"""
+        self._stop_event.set()
+        self._wakeup.set()
+        with self._lock:
+            listeners, self._listeners = list(self._listeners.values()), {}
+        for listener in listeners:
+            self._stop_listener(listener)
+        if self._supervisor is not None and self._supervisor is not threading.current_thread():
+            self._supervisor.join(timeout=10)
+    
+    def notify(self):
+        """Relire les configurations sans attendre le prochain tour (configuration modifiée)"""
+        self._wakeup.set()
+    
+    def _supervise(self):
+        while not self._stop_event.is_set():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Erreur dans la supervision des boîtes IMAP: {e}")
+            if self._wakeup.wait(IMAP_LISTENER_REFRESH):
+                self._wakeup.clear()
+    
+    def refresh(self):
+        """Démarrer, redémarrer ou arrêter les écoutes selon les configurations IMAP actives"""
+        wanted = {
+            config['id']: _signature(config)
+            for config in MailConfig.get_active_configs()
+            if config.get('incoming_protocol') == 'imap' and config.get('pop_host')
+        }
+        
+        with self._lock:
+            stopped = [
+                self._listeners.pop(config_id) for config_id, listener in list(self._listeners.items())
+                if config_id not in wanted or listener.signature != wanted[config_id] or not listener.is_alive()
+            ]
+        # Arrêter d'abord les anciennes écoutes : leur verrou consultatif est libéré pour la relance
+        for listener in stopped:
+            self._stop_listener(listener)
+        previous = {listener.config_id: listener for listener in stopped}
+        
+        with self._lock:
+            for config_id, signature in wanted.items():
+                if config_id in self._listeners or self._stop_event.is_set():
+                    continue
+                listener = MailboxListener(config_id, signature)
+                # Les compteurs d'une écoute relancée (boîte en attente, erreur) sont conservés
+                old = previous.get(config_id)
+                if old is not None:
+                    listener.syncs, listener.messages, listener.errors = old.syncs, old.messages, old.errors
+                    listener.last_sync, listener.last_error = old.last_sync, old.last_error
+                listener.thread = threading.Thread(target=self._run, args=(listener,),
+                                                   name=f'imap-listener-{config_id}', daemon=True)
+                self._listeners[config_id] = listener
+                listener.thread.start()
+    
+    def _stop_listener(self, listener: MailboxListener):
+        listener.stop_event.set()
+        server = listener.server
+        if server is not None:
+            # Débloquer une lecture en cours (IDLE) ; le thread d'écoute ferme lui-même la session
+            try:
+                server.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if listener.thread is not None and listener.thread is not threading.current_thread():
+            listener.thread.join(timeout=10)
+    
+    def _run(self, listener: MailboxListener):
+        conn = get_db_connection()
+        conn.autocommit = True
+        try:
+            cur = conn.cursor()
+            cur.execute('SELECT pg_try_advisory_lock(%s, %s) AS acquired', (LISTENER_LOCK_NAMESPACE, listener.config_id))
+            acquired = cur.fetchone()['acquired']
+            cur.close()
+            if not acquired:
+                # Boîte écoutée par un autre worker : nouvel essai au prochain tour du superviseur
+                listener.state = 'standby'
+                return
+            
+            delay = IMAP_RETRY_DELAY
+            while not listener.stop_event.is_set():
+                try:
+                    self._listen(listener)
+                    delay = IMAP_RETRY_DELAY
+                except Exception as e:
+                    if listener.stop_event.is_set():
+                        break
+                    print(f"Erreur d'écoute IMAP (configuration {listener.config_id}): {e}")
+                    listener.state = 'error'
+                    listener.errors += 1
+                    listener.last_error = str(e)
+                    listener.stop_event.wait(delay)
+                    delay = min(delay * 2, IMAP_MAX_RETRY_DELAY)
+        finally:
+            if listener.state != 'standby':
+                listener.state = 'stopped'
+            # Fermer la connexion libère le verrou consultatif
+            conn.close()
+    
+    def _listen(self, listener: MailboxListener):
+        """Une session IMAP : synchroniser, attendre un changement, recommencer"""
+        config = MailConfig.get_by_id(listener.config_id)
+        if not config:
+            listener.stop_event.set()
+            return
+        
+        server = EmailService._imap_connect(config)
+        listener.server = server
+        try:
+            supports_idle = 'IDLE' in server.capabilities
+            while not listener.stop_event.is_set():
+                emails = EmailService._imap_sync(server, config)
+                listener.state = 'listening'
+                listener.syncs += 1
+                listener.messages += len(emails)
+                listener.last_sync = time.time()
+                
+                if listener.stop_event.is_set():
+                    break
+                if supports_idle:
+                    if not self._idle(server, listener):
+                        break
+                else:
+                    listener.stop_event.wait(IMAP_POLL_INTERVAL)
+        finally:
+            listener.server = None
+            try:
+                server.logout()
+            except Exception:
+                server.shutdown()
+    
+    def _idle(self, server, listener: MailboxListener) -> bool:
+        """
+        Attendre en IDLE un changement de la boîte ou l'échéance IMAP_IDLE_TIMEOUT
+        
+        Returns:
+            False si le serveur est resté muet (session à rouvrir), True sinon
+        """
+        tag = f'IDLE{next(self._tags)}'.encode('ascii')
+        deadline = time.monotonic() + IMAP_IDLE_TIMEOUT
+        server.sock.settimeout(IMAP_IDLE_TIMEOUT)
+        try:
+            server.send(tag + b' IDLE\r\n')
+            while True:
+                line = server.readline()
+                if line.startswith(b'+'):
+                    break
+                if not line or line.startswith(tag):
+                    raise server.abort(f"IDLE refusé: {line!r}")
+            
+            listener.idling = True
+            try:
+                while time.monotonic() < deadline:
+                    line = server.readline()
+                    if not line or line.startswith(b'* BYE'):
+                        raise server.abort('Connexion IMAP fermée par le serveur')
+                    if _IDLE_EVENT_RE.match(line):
+                        break
+            finally:
+                listener.idling = False
+            
+            server.send(b'DONE\r\n')
+            while True:
+                line = server.readline()
+                if not line:
+                    raise server.abort('Connexion IMAP fermée par le serveur')
+                if line.startswith(tag):
+                    if not line[len(tag):].strip().upper().startswith(b'OK'):
+                        raise server.error(f"Fin d'IDLE refusée: {line!r}")
+                    break
+        except socket.timeout:
+            return False
+        server.sock.settimeout(IMAP_TIMEOUT)
+        return True
+    
+    def status(self) -> Dict:
+        """Écoutes IMAP de ce worker"""
+        now = time.time()
+        with self._lock:
+            listeners = sorted(self._listeners.values(), key=lambda listener: listener.config_id)
+            mailboxes = [{
+                'config_id': listener.config_id,
+                'host': listener.signature[0],
+                'folder': listener.signature[5],
+                'state': listener.state,
+                'idling': listener.idling,
+                'syncs': listener.syncs,
+                'messages': listener.messages,
+                'errors': listener.errors,
+                'last_sync_seconds_ago': round(now - listener.last_sync, 1) if listener.last_sync else None,
+                'last_error': listener.last_error,
+            } for listener in listeners]
+        return {
+            'enabled': self._supervisor is not None and self._supervisor.is_alive(),
+            'worker': os.getpid(),
+            'mailboxes': mailboxes,
+        }
+    
+    def prometheus_lines(self):
+        """Écoutes et synchronisations IMAP au format texte Prometheus"""
+        worker = os.getpid()
+        mailboxes = [mailbox for mailbox in self.status()['mailboxes'] if mailbox['state'] != 'standby']
+        lines = []
+        for key, kind, help_text in (
+            ('syncs', 'counter', 'Synchronisations IMAP effectuées'),
+            ('messages', 'counter', 'Emails reçus par synchronisation IMAP'),
+            ('errors', 'counter', 'Erreurs de connexion ou de synchronisation IMAP'),
+            ('idling', 'gauge', 'Boîtes IMAP en attente IDLE'),
+        ):
+            metric = f'guestadmission_imap_{key}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for mailbox in mailboxes:
+                labels = f'config_id="{mailbox["config_id"]}",host="{_escape(mailbox["host"])}",worker="{worker}"'
+                lines.append(f'{metric}{{{labels}}} {int(mailbox[key])}')
+        return lines
+
+
+imap_listener = ImapListener()
@@ -0,0 +1,258 @@
+"""
+Cache disque des factures PDF des séjours clôturés
+
+Un séjour clôturé ne change plus : sa facture est générée une fois (à la
+clôture, en arrière-plan) puis servie depuis le disque. Chaque fichier est
+adressé par son contenu : son nom porte la version des données facturées
+(empreinte calculée en SQL sur le séjour, l'établissement, les extras et les
+personnes, plus la mise en page et le logo local). Une modification, par
+n'importe quel chemin, change la version et la facture est régénérée ; la
+réouverture ou la modification d'un séjour depuis l'application supprime en
+plus ses fichiers tout de suite.
+
+La version sert d'ETag (réponse 304 sans lecture du fichier). Le fichier est
+envoyé par send_file (sendfile du serveur WSGI) ou, si
+INVOICE_ACCEL_REDIRECT_PREFIX est défini, délégué à nginx par X-Accel-Redirect :
+    location /_factures/ { internal; alias <INVOICE_CACHE_DIR>/; }
+Avec plusieurs serveurs d'application, INVOICE_CACHE_DIR doit être partagé.
+"""
+import glob
+import hashlib
+import os
+import threading
+import time
+from typing import Dict, Optional
+from flask import make_response, request, send_file
+from .invoice_service import InvoiceService
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+INVOICE_CACHE_ENABLED = os.environ.get('INVOICE_CACHE_ENABLED', 'true').lower() == 'true'
+INVOICE_CACHE_DIR = os.environ.get('INVOICE_CACHE_DIR', os.path.join(BASE_DIR, 'instance', 'invoices'))
+INVOICE_CACHE_PREFILL = os.environ.get('INVOICE_CACHE_PREFILL', 'true').lower() == 'true'
+INVOICE_ACCEL_REDIRECT_PREFIX = os.environ.get('INVOICE_ACCEL_REDIRECT_PREFIX', '')
+
+# À incrémenter quand la mise en page de InvoiceService change : toutes les factures sont régénérées
+INVOICE_LAYOUT_VERSION = 1
+# Séjours par sous-répertoire (évite les répertoires de centaines de milliers de fichiers)
+INVOICE_DIR_BUCKET = 1000
+
+
+class InvoiceCache:
+    """Factures PDF des séjours clôturés, générées une fois et servies depuis le disque"""
+    
+    def __init__(self, directory: str = INVOICE_CACHE_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+        self.prefilled = 0
+        self.invalidated = 0
+        self.errors = 0
+        self.incomplete = 0
+        self.generation_seconds = 0.0
+    
+    def init_app(self, app, registry=None):
+        """Enregistrer les compteurs du cache auprès du registre de métriques"""
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+    
+    def version(self, signature: Dict) -> str:
+        """Version d'une facture : empreinte des données facturées, de la mise en page et du logo local"""
+        logo = signature.get('logo_url') or ''
+        logo_state = ''
+        if logo and not logo.startswith(('http://', 'https://')):
+            try:
+                stat = os.stat(os.path.join(BASE_DIR, logo.lstrip('/')))
+                logo_state = f'{stat.st_mtime_ns}:{stat.st_size}'
+            except OSError:
+                pass
+        key = f"{INVOICE_LAYOUT_VERSION}|{signature['data_hash']}|{logo}|{logo_state}"
+        return hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+    
+    def _path(self, sejour_id: int, version: str) -> str:
+        return os.path.join(self.directory, str(sejour_id // INVOICE_DIR_BUCKET), f'{sejour_id}-{version}.pdf')
+    
+    def get(self, sejour_id: int, known_etags=None) -> Dict:
+        """
+        Facture d'un séjour clôturé : fichier en cache, généré au premier appel
+        
+        Args:
+            sejour_id: ID du séjour
+            known_etags: Versions déjà détenues par le client (If-None-Match) ;
+                si la version courante en fait partie, rien n'est lu ni généré
+        
+        Raises:
+            ValueError: Séjour non trouvé ou non clôturé (mêmes messages que InvoiceService)
+        
+        Returns:
+            dict avec path, etag, numero_reservation, not_modified et cached
+            (False si la facture vient d'être générée ; son contenu est alors dans pdf,
+            et complete vaut False si elle l'a été sans le logo distant)
+        """
+        signature = InvoiceService._get_invoice_signature(sejour_id)
+        if not signature:
+            raise ValueError(f"Séjour {sejour_id} non trouvé")
+        if signature.get('statut') != 'closed' and not signature.get('closed_at'):
+            raise ValueError("La facture ne peut être générée que pour un séjour clôturé")
+        
+        version = self.version(signature)
+        path = self._path(sejour_id, version)
+        invoice = {'path': path, 'etag': version, 'numero_reservation': signature['numero_reservation'],
+                   'not_modified': False}
+        if known_etags is not None and known_etags.contains(version):
+            with self._lock:
+                self.not_modified += 1
+            return {**invoice, 'not_modified': True, 'cached': True}
+        if os.path.exists(path):
+            with self._lock:
+                self.hits += 1
+            return {**invoice, 'cached': True}
+        
+        started = time.perf_counter()
+        buffer, complete = InvoiceService._render_sejour_invoice(sejour_id)
+        pdf = buffer.getvalue()
+        # Données modifiées pendant la génération : ne pas enregistrer sous l'ancienne version
+        current = InvoiceService._get_invoice_signature(sejour_id)
+        if complete and current and self.version(current) == version:
+            self._write(sejour_id, path, pdf)
+        else:
+            # Logo distant indisponible : la facture est servie telle quelle et régénérée au prochain appel
+            path = None
+        with self._lock:
+            self.misses += 1
+            if not complete:
+                self.incomplete += 1
+            self.generation_seconds += time.perf_counter() - started
+        return {**invoice, 'path': path, 'pdf': pdf, 'cached': False, 'complete': complete}
+    
+    def _write(self, sejour_id: int, path: str, pdf: bytes):
+        """Écrire la facture (renommage atomique) et supprimer les versions précédentes du séjour"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(pdf)
+        os.replace(temp_path, path)
+        self._remove(sejour_id, keep=path)
+    
+    def _remove(self, sejour_id: int, keep: Optional[str] = None) -> int:
+        removed = 0
+        for old_path in glob.glob(self._path(sejour_id, '*')):
+            if old_path != keep:
+                try:
+                    os.remove(old_path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+    
+    def invalidate(self, sejour_id: int):
+        """Supprimer les factures en cache d'un séjour (réouverture, modification, suppression)"""
+        if not INVOICE_CACHE_ENABLED:
+            return
+        try:
+            removed = self._remove(sejour_id)
+        except OSError as e:
+            print(f"Erreur lors de l'invalidation de la facture du séjour {sejour_id}: {e}")
+            removed = 0
+        with self._lock:
+            self.invalidated += removed
+    
+    def prefill(self, sejour_id: int):
+        """Générer la facture d'un séjour qui vient d'être clôturé, dans un thread d'arrière-plan"""
+        if not (INVOICE_CACHE_ENABLED and INVOICE_CACHE_PREFILL):
+            return
+        threading.Thread(target=self._prefill, args=(sejour_id,), name=f'invoice-prefill-{sejour_id}', daemon=True).start()
+    
+    def _prefill(self, sejour_id: int):
+        try:
+            invoice = self.get(sejour_id)
+            if not invoice['cached'] and invoice['complete']:
+                with self._lock:
+                    self.prefilled += 1
+        except Exception as e:
+            print(f"Erreur lors de la génération anticipée de la facture du séjour {sejour_id}: {e}")
+            with self._lock:
+                self.errors += 1
+    
+    def send(self, sejour_id: int):
+        """
+        Réponse Flask de téléchargement de la facture d'un séjour clôturé
+        
+        304 si le navigateur a déjà cette version ; sinon le fichier en cache
+        (X-Accel-Redirect ou send_file), ou le PDF tout juste généré (sans
+        ETag s'il manque le logo distant).
+        """
+        download_name = f'facture_sejour_{sejour_id}.pdf'
+        if not INVOICE_CACHE_ENABLED:
+            return send_file(InvoiceService.generate_sejour_invoice(sejour_id), mimetype='application/pdf',
+                             as_attachment=True, download_name=download_name)
+        
+        invoice = self.get(sejour_id, known_etags=request.if_none_match)
+        if invoice['not_modified']:
+            response = make_response('', 304)
+        elif invoice['path'] and INVOICE_ACCEL_REDIRECT_PREFIX:
+            response = make_response('')
+            response.headers['X-Accel-Redirect'] = (
+                INVOICE_ACCEL_REDIRECT_PREFIX.rstrip('/') + '/' + os.path.relpath(invoice['path'], self.directory)
+            )
+            response.headers['Content-Type'] = 'application/pdf'
+            response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+        elif invoice['path']:
+            response = send_file(invoice['path'], mimetype='application/pdf', as_attachment=True,
+                                 download_name=download_name, conditional=False, etag=False)
+        else:
+            response = make_response(invoice['pdf'])
+            response.headers['Content-Type'] = 'application/pdf'
+            response.headers['Content-Disposition'] = f'attachment; filename={download_name}'
+        
+        response.cache_control.private = True
+        if invoice.get('complete', True):
+            # Facture immuable pour cette version : le navigateur la garde et la revalide par ETag
+            response.set_etag(invoice['etag'])
+            response.cache_control.no_cache = True
+        else:
+            # Facture sans le logo distant : ni ETag ni copie, le prochain téléchargement la régénère
+            response.cache_control.no_store = True
+        return response
+    
+    def status(self) -> dict:
+        """Compteurs du cache des factures dans ce worker"""
+        with self._lock:
+            generated = self.misses
+            return {
+                'enabled': INVOICE_CACHE_ENABLED,
+                'directory': self.directory,
+                'accel_redirect': bool(INVOICE_ACCEL_REDIRECT_PREFIX),
+                'worker': os.getpid(),
+                'hits': self.hits,
+                'misses': generated,
+                'not_modified': self.not_modified,
+                'prefilled': self.prefilled,
+                'invalidated': self.invalidated,
+                'errors': self.errors,
+                'incomplete': self.incomplete,
+                'avg_generation_ms': round(1000 * self.generation_seconds / generated, 1) if generated else None,
+            }
+    
+    def prometheus_lines(self):
+        """Compteurs du cache des factures au format texte Prometheus"""
+        worker = os.getpid()
+        with self._lock:
+            results = (('hit', self.hits), ('miss', self.misses), ('not_modified', self.not_modified))
+            generation_seconds = self.generation_seconds
+        lines = [
+            '# HELP guestadmission_invoice_requests_total Téléchargements de factures par origine de la réponse',
+            '# TYPE guestadmission_invoice_requests_total counter',
+        ]
+        for result, count in results:
+            lines.append(f'guestadmission_invoice_requests_total{{result="{result}",worker="{worker}"}} {count}')
+        lines += [
+            '# HELP guestadmission_invoice_generation_seconds_total Temps passé à générer des factures PDF',
+            '# TYPE guestadmission_invoice_generation_seconds_total counter',
+            f'guestadmission_invoice_generation_seconds_total{{worker="{worker}"}} {generation_seconds:.3f}',
+        ]
+        return lines
+
+
+invoice_cache = InvoiceCache()
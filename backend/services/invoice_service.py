@@ -9,10 +9,10 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
 from io import BytesIO
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from ..config.database import get_db_connection
+from .http_client import http_client
 import os
-import requests
 
 
 class InvoiceService:
@@ -21,7 +21,17 @@ class InvoiceService:
     @staticmethod
     def generate_sejour_invoice(sejour_id: int) -> BytesIO:
         """Générer une facture PDF pour un séjour"""
+        return InvoiceService._render_sejour_invoice(sejour_id)[0]
+    
+    @staticmethod
+    def _render_sejour_invoice(sejour_id: int) -> Tuple[BytesIO, bool]:
+        """
+        Générer la facture PDF d'un séjour
         
+        Returns:
+            (PDF, complète) : complète vaut False si le logo distant n'a pas pu
+            être téléchargé (facture générée sans logo, à ne pas mettre en cache)
+        """
         sejour_data = InvoiceService._get_sejour_data(sejour_id)
         if not sejour_data:
             raise ValueError(f"Séjour {sejour_id} non trouvé")
@@ -65,16 +75,19 @@ class InvoiceService:
             spaceBefore=12
         )
         
+        logo_complete = True
         if etablissement.get('logo_url'):
             try:
                 logo_path = etablissement['logo_url']
                 img = None
                 
                 if logo_path.startswith('http://') or logo_path.startswith('https://'):
-                    response = requests.get(logo_path, timeout=5)
+                    response = http_client.get(logo_path, timeout=5, retries=1)
                     if response.status_code == 200:
                         logo_temp = BytesIO(response.content)
                         img = Image(logo_temp, width=60*mm, height=30*mm, kind='proportional')
+                    else:
+                        logo_complete = False
                 else:
                     base_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
                     full_logo_path = os.path.join(base_dir, logo_path.lstrip('/'))
@@ -86,6 +99,7 @@ class InvoiceService:
                     story.append(img)
                     story.append(Spacer(1, 5*mm))
             except Exception as e:
+                logo_complete = False
                 print(f"Erreur lors du chargement du logo: {e}")
         
         story.append(Paragraph(f"FACTURE N° {sejour_data.get('numero_reservation', 'N/A')}", title_style))
@@ -275,7 +289,46 @@ class InvoiceService:
         
         doc.build(story)
         buffer.seek(0)
-        return buffer
+        return buffer, logo_complete
+    
+    @staticmethod
+    def _get_invoice_signature(sejour_id: int) -> Optional[Dict]:
+        """
+        Statut du séjour et empreinte de toutes les données reprises sur sa facture
+        
+        Une seule requête : séjour, établissement, extras et personnes sont
+        sérialisés et résumés par md5 côté base, sans générer le document.
+        """
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute('''
+            SELECT r.statut, r.closed_at, r.numero_reservation, e.logo_url,
+                   md5(concat_ws('|',
+                       row_to_json(r)::text,
+                       row_to_json(e)::text,
+                       (SELECT json_agg(x ORDER BY x.id)::text FROM (
+                           SELECT se.id, se.quantite, se.montant_total, se.date_ajout,
+                                  ex.nom, ex.prix_unitaire, ex.unite
+                           FROM sejours_extras se
+                           JOIN extras ex ON se.extra_id = ex.id
+                           WHERE se.reservation_id = r.id
+                       ) x),
+                       (SELECT json_agg(p ORDER BY p.id)::text FROM (
+                           SELECT id, nom, prenom, email, telephone, pays, est_contact_principal
+                           FROM personnes WHERE reservation_id = r.id
+                       ) p)
+                   )) AS data_hash
+            FROM reservations r
+            LEFT JOIN etablissements e ON e.id = r.etablissement_id
+            WHERE r.id = %s
+        ''', (sejour_id,))
+        signature = cur.fetchone()
+        
+        cur.close()
+        conn.close()
+        
+        return dict(signature) if signature else None
     
     @staticmethod
     def _get_sejour_data(sejour_id: int) -> Optional[Dict]:
@@ -0,0 +1,214 @@
+"""
+Distribution des emails mis en file d'attente (table mail_queue)
+
+Chaque worker gunicorn démarre MAIL_QUEUE_WORKERS threads d'envoi. Chaque thread
+réserve un lot de messages échus (FOR UPDATE SKIP LOCKED, dans la limite de
+débit de chaque configuration), les envoie configuration par configuration sur
+une session SMTP du pool (backend/services/smtp_pool.py), puis enregistre le
+résultat : envoyé (copie dans le dossier 'sent'), nouvelle tentative avec recul
+exponentiel, ou abandon (dead) après MAIL_QUEUE_MAX_ATTEMPTS tentatives ou un
+refus définitif du serveur.
+
+Les threads du worker qui a mis un message en file sont réveillés
+immédiatement ; les autres workers le voient au plus tard après
+MAIL_QUEUE_POLL secondes. La distribution peut aussi tourner dans un processus
+dédié :
+    python -m backend.services.mail_dispatcher
+"""
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from ..models.mail_config import MailConfig
+from ..models.mail_queue import MailQueue
+from .email_service import EmailService
+from .sampling_profiler import profiler
+from .smtp_pool import smtp_pool
+
+MAIL_QUEUE_ENABLED = os.environ.get('MAIL_QUEUE_ENABLED', 'true').lower() == 'true'
+MAIL_QUEUE_WORKERS = int(os.environ.get('MAIL_QUEUE_WORKERS', 2))
+MAIL_QUEUE_POLL = float(os.environ.get('MAIL_QUEUE_POLL', 2))
+MAIL_QUEUE_BATCH = int(os.environ.get('MAIL_QUEUE_BATCH', 50))
+MAIL_QUEUE_LEASE = int(os.environ.get('MAIL_QUEUE_LEASE', 300))
+MAIL_QUEUE_MAX_ATTEMPTS = int(os.environ.get('MAIL_QUEUE_MAX_ATTEMPTS', 8))
+MAIL_QUEUE_RETRY_DELAY = int(os.environ.get('MAIL_QUEUE_RETRY_DELAY', 30))
+MAIL_QUEUE_MAX_RETRY_DELAY = int(os.environ.get('MAIL_QUEUE_MAX_RETRY_DELAY', 3600))
+MAIL_QUEUE_RATE_PER_MINUTE = int(os.environ.get('MAIL_QUEUE_RATE_PER_MINUTE', 60))
+MAIL_QUEUE_RETENTION_DAYS = int(os.environ.get('MAIL_QUEUE_RETENTION_DAYS', 30))
+PURGE_INTERVAL = 3600
+
+
+class MailDispatcher:
+    """Threads d'envoi des emails en file d'attente"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self._last_purge = 0.0
+        self.batches = 0
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.errors = 0
+        self.last_batch = None
+    
+    def init_app(self, app, registry=None):
+        """
+        Démarrer les threads d'envoi dans ce worker si MAIL_QUEUE_ENABLED est actif
+        
+        À appeler dans chaque worker (pas de --preload gunicorn : les threads ne
+        survivraient pas au fork).
+        """
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+        if MAIL_QUEUE_ENABLED:
+            self.start()
+    
+    def start(self, workers: int = MAIL_QUEUE_WORKERS):
+        """Démarrer les threads d'envoi (sans effet s'ils tournent déjà)"""
+        with self._lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._stop_event = threading.Event()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'mail-dispatcher-{index}', daemon=True)
+                for index in range(workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+    
+    def stop(self):
+        """Arrêter les threads d'envoi (les messages réservés sont terminés avant l'arrêt)"""
+        self._stop_event.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=30)
+    
+    def notify(self):
+        """Réveiller les threads d'envoi de ce worker (un message vient d'être mis en file)"""
+        self._wakeup.set()
+    
+    def _run(self):
+        # Décaler le premier passage pour que les workers ne démarrent pas ensemble
+        self._stop_event.wait(random.uniform(0, min(MAIL_QUEUE_POLL, 1)))
+        while not self._stop_event.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"Erreur dans la distribution des emails: {e}")
+                with self._lock:
+                    self.errors += 1
+                claimed = 0
+            if claimed == 0 and self._wakeup.wait(MAIL_QUEUE_POLL):
+                self._wakeup.clear()
+    
+    def run_once(self) -> int:
+        """Réserver et envoyer un lot de messages ; retourner le nombre de messages réservés"""
+        self._purge_if_due()
+        with profiler.tracked_thread():
+            rows = MailQueue.claim(MAIL_QUEUE_BATCH, MAIL_QUEUE_LEASE, MAIL_QUEUE_RATE_PER_MINUTE)
+            if not rows:
+                return 0
+            
+            started = time.perf_counter()
+            by_config = defaultdict(list)
+            for row in rows:
+                by_config[row['mail_config_id']].append(row)
+            
+            summary = {'total': len(rows), 'sent': 0, 'retried': 0, 'dead': 0}
+            for config_id, config_rows in by_config.items():
+                result = self._deliver(config_id, config_rows)
+                for key in ('sent', 'retried', 'dead'):
+                    summary[key] += result[key]
+        
+        with self._lock:
+            self.batches += 1
+            self.sent += summary['sent']
+            self.retried += summary['retried']
+            self.dead += summary['dead']
+            self.last_batch = dict(summary, duration_ms=round((time.perf_counter() - started) * 1000, 1), at=time.time())
+        return len(rows)
+    
+    def _deliver(self, config_id: int, rows) -> dict:
+        """Envoyer les messages d'une configuration sur une même session SMTP"""
+        config = MailConfig.get_by_id(config_id)
+        if not config:
+            # Configuration supprimée entre-temps : ses messages sont supprimés en cascade
+            return {'sent': 0, 'retried': 0, 'dead': 0}
+        
+        prepared = []
+        for row in rows:
+            msg, recipients = EmailService._build_message(
+                config, row['to_email'], row['subject'], row['body_html'], row['cc_email'], row['bcc_email']
+            )
+            prepared.append((recipients, msg.as_string()))
+        
+        outcomes = smtp_pool.send_many(config, config['email_address'], prepared)
+        
+        sent_ids = []
+        notes = {}
+        failures = []
+        for row, outcome in zip(rows, outcomes):
+            if outcome['success']:
+                sent_ids.append(row['id'])
+                if outcome['refused']:
+                    notes[row['id']] = 'Destinataires refusés: ' + ', '.join(sorted(outcome['refused']))
+            else:
+                failures.append({'id': row['id'], 'error': outcome['error'], 'permanent': outcome['permanent']})
+        
+        MailQueue.mark_sent(sent_ids, config['email_address'], notes)
+        result = MailQueue.mark_failed(failures, MAIL_QUEUE_MAX_ATTEMPTS, MAIL_QUEUE_RETRY_DELAY, MAIL_QUEUE_MAX_RETRY_DELAY)
+        return dict(result, sent=len(sent_ids))
+    
+    def _purge_if_due(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_purge < PURGE_INTERVAL:
+                return
+            self._last_purge = now
+        MailQueue.purge_sent(MAIL_QUEUE_RETENTION_DAYS)
+    
+    def status(self) -> dict:
+        """État des threads d'envoi dans ce worker"""
+        with self._lock:
+            return {
+                'enabled': any(thread.is_alive() for thread in self._threads),
+                'threads': sum(1 for thread in self._threads if thread.is_alive()),
+                'worker': os.getpid(),
+                'batches': self.batches,
+                'sent': self.sent,
+                'retried': self.retried,
+                'dead': self.dead,
+                'errors': self.errors,
+                'last_batch': self.last_batch,
+            }
+    
+    def prometheus_lines(self):
+        """Compteurs de distribution au format texte Prometheus"""
+        worker = os.getpid()
+        with self._lock:
+            counts = (('sent', self.sent), ('retried', self.retried), ('dead', self.dead))
+        lines = [
+            '# HELP guestadmission_mail_queue_messages_total Messages de la file traités par résultat',
+            '# TYPE guestadmission_mail_queue_messages_total counter',
+        ]
+        for result, count in counts:
+            lines.append(f'guestadmission_mail_queue_messages_total{{result="{result}",worker="{worker}"}} {count}')
+        return lines
+
+
+mail_dispatcher = MailDispatcher()
+
+
+if __name__ == '__main__':
+    print(f"📨 Distribution des emails ({MAIL_QUEUE_WORKERS} threads, pid {os.getpid()})")
+    mail_dispatcher.start()
+    try:
+        while any(thread.is_alive() for thread in mail_dispatcher._threads):
+            mail_dispatcher._threads[0].join(timeout=1)
+    except KeyboardInterrupt:
+        mail_dispatcher.stop()
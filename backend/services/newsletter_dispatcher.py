@@ -0,0 +1,238 @@
+"""
+Distribution des newsletters par lots (tables newsletter_chunks et newsletter_recipients)
+
+Une newsletter est découpée à sa création en lots de NEWSLETTER_CHUNK_SIZE
+destinataires au plus (limite SendGrid de 1 000 personnalisations par appel).
+Chaque worker gunicorn démarre NEWSLETTER_WORKERS threads ; chaque thread
+réserve un lot échu (FOR UPDATE SKIP LOCKED, dans la limite de
+NEWSLETTER_RATE_PER_MINUTE appels par minute et par établissement) et l'envoie
+en un appel SendGrid. Les lots d'une même campagne partent donc en parallèle.
+
+Un échec n'affecte que son lot : nouvelle tentative avec recul exponentiel
+(429, 5xx, erreur réseau), abandon après NEWSLETTER_MAX_ATTEMPTS tentatives ou
+un refus définitif, et renvoi immédiat sans les adresses refusées quand
+SendGrid désigne des destinataires invalides. Un lot réservé par un worker
+arrêté est repris à l'expiration de son bail. La distribution peut aussi
+tourner dans un processus dédié :
+    python -m backend.services.newsletter_dispatcher
+"""
+import os
+import random
+import threading
+import time
+from ..models.newsletter import NewsletterChunk, NewsletterConfig
+from ..models.personne import Personne
+from . import newsletter_template
+from .newsletter_service import NewsletterService
+from .sampling_profiler import profiler
+
+NEWSLETTER_DISPATCH_ENABLED = os.environ.get('NEWSLETTER_DISPATCH_ENABLED', 'true').lower() == 'true'
+NEWSLETTER_WORKERS = int(os.environ.get('NEWSLETTER_WORKERS', 4))
+NEWSLETTER_POLL = float(os.environ.get('NEWSLETTER_POLL', 2))
+NEWSLETTER_LEASE = int(os.environ.get('NEWSLETTER_LEASE', 300))
+NEWSLETTER_MAX_ATTEMPTS = int(os.environ.get('NEWSLETTER_MAX_ATTEMPTS', 6))
+NEWSLETTER_RETRY_DELAY = int(os.environ.get('NEWSLETTER_RETRY_DELAY', 30))
+NEWSLETTER_MAX_RETRY_DELAY = int(os.environ.get('NEWSLETTER_MAX_RETRY_DELAY', 1800))
+NEWSLETTER_RATE_PER_MINUTE = int(os.environ.get('NEWSLETTER_RATE_PER_MINUTE', 60))
+
+
+class NewsletterDispatcher:
+    """Threads d'envoi des lots de newsletters"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stop_event = threading.Event()
+        self._wakeup = threading.Event()
+        self.outcomes = {'sent': 0, 'retried': 0, 'failed': 0, 'rejected': 0}
+        self.sent = 0
+        self.rejected = 0
+        self.errors = 0
+        self.last_chunk = None
+    
+    def init_app(self, app, registry=None):
+        """
+        Démarrer les threads d'envoi dans ce worker si NEWSLETTER_DISPATCH_ENABLED est actif
+        
+        À appeler dans chaque worker (pas de --preload gunicorn : les threads ne
+        survivraient pas au fork).
+        """
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+        if NEWSLETTER_DISPATCH_ENABLED:
+            self.start()
+    
+    def start(self, workers: int = NEWSLETTER_WORKERS):
+        """Démarrer les threads d'envoi (sans effet s'ils tournent déjà)"""
+        with self._lock:
+            if any(thread.is_alive() for thread in self._threads):
+                return
+            self._stop_event = threading.Event()
+            self._threads = [
+                threading.Thread(target=self._run, name=f'newsletter-dispatcher-{index}', daemon=True)
+                for index in range(workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+    
+    def stop(self):
+        """Arrêter les threads d'envoi (les lots en cours sont terminés avant l'arrêt)"""
+        self._stop_event.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout=60)
+    
+    def notify(self):
+        """Réveiller les threads d'envoi de ce worker (une newsletter vient d'être planifiée)"""
+        self._wakeup.set()
+    
+    def _run(self):
+        # Décaler le premier passage pour que les workers ne démarrent pas ensemble
+        self._stop_event.wait(random.uniform(0, min(NEWSLETTER_POLL, 1)))
+        while not self._stop_event.is_set():
+            try:
+                claimed = self.run_once()
+            except Exception as e:
+                print(f"Erreur dans la distribution des newsletters: {e}")
+                with self._lock:
+                    self.errors += 1
+                claimed = False
+            if not claimed and self._wakeup.wait(NEWSLETTER_POLL):
+                self._wakeup.clear()
+    
+    def run_once(self) -> bool:
+        """Réserver et envoyer un lot ; retourner False s'il n'y avait rien à envoyer"""
+        with profiler.tracked_thread():
+            chunk = NewsletterChunk.claim(NEWSLETTER_LEASE, NEWSLETTER_RATE_PER_MINUTE)
+            if not chunk:
+                return False
+            
+            started = time.perf_counter()
+            outcome = self._deliver(chunk)
+        
+        with self._lock:
+            self.outcomes[outcome] += 1
+            self.last_chunk = {
+                'newsletter_id': chunk['newsletter_id'],
+                'chunk_index': chunk['chunk_index'],
+                'recipients': len(chunk['recipients']),
+                'outcome': outcome,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 1),
+                'at': time.time(),
+            }
+        return True
+    
+    def _deliver(self, chunk: dict) -> str:
+        """Rendre le lot pour chaque destinataire, l'envoyer à SendGrid et enregistrer le résultat"""
+        recipients = chunk['recipients']
+        config = NewsletterConfig.get_by_etablissement(chunk['etablissement_id']) if recipients else None
+        
+        sent_ids = []
+        rejected = {}
+        error = None
+        permanent = False
+        if not recipients:
+            # Tous les destinataires ont déjà été traités (reprise après un arrêt)
+            pass
+        elif not config:
+            error, permanent = 'Configuration SendGrid non trouvée ou désactivée', True
+        else:
+            emails = [recipient['email'] for recipient in recipients]
+            from_name = config.get('from_name') or config['from_email']
+            compiled = newsletter_template.get_compiled(
+                chunk['newsletter_id'], chunk['subject'], chunk['html_content'],
+                {'from_name': from_name, 'etablissement': chunk['nom_etablissement']}
+            )
+            profiles = {}
+            if set(compiled.fields) - {'email'}:
+                profiles = Personne.get_newsletter_profiles(chunk['etablissement_id'], emails)
+            try:
+                rendered = compiled.render_many(
+                    [newsletter_template.merge_fields(email, profiles.get(email.lower())) for email in emails]
+                )
+            except Exception as e:
+                # Erreur du modèle (ex. opération refusée par le bac à sable) : inutile de réessayer
+                rendered = []
+                error, permanent = f'Erreur de rendu du modèle: {e}', True
+            
+            for batch in NewsletterService._sendgrid_batches(emails, rendered) if rendered else []:
+                result = NewsletterService._send_via_sendgrid(
+                    api_key=config['sendgrid_api_key'],
+                    from_email=config['from_email'],
+                    from_name=from_name,
+                    to_emails=None,
+                    subject=batch['personalizations'][0]['subject'],
+                    html_content=batch['html_content'],
+                    personalizations=batch['personalizations']
+                )
+                batch_ids = [recipients[index]['id'] for index in batch['indexes']]
+                if result['success']:
+                    sent_ids += batch_ids
+                elif result.get('rejected'):
+                    rejected.update({
+                        batch_ids[position]: message
+                        for position, message in result['rejected'].items() if position < len(batch_ids)
+                    })
+                else:
+                    # Les destinataires des appels suivants restent en attente pour la prochaine tentative
+                    error, permanent = result['error'], result['permanent']
+                    break
+        
+        status = NewsletterChunk.record_delivery(
+            chunk['id'], chunk['newsletter_id'], sent_ids, rejected, error, permanent,
+            NEWSLETTER_MAX_ATTEMPTS, NEWSLETTER_RETRY_DELAY, NEWSLETTER_MAX_RETRY_DELAY
+        )
+        with self._lock:
+            self.sent += len(sent_ids)
+            self.rejected += len(rejected)
+        if error:
+            return 'failed' if status == 'failed' else 'retried'
+        return 'rejected' if rejected else 'sent'
+    
+    def status(self) -> dict:
+        """État des threads d'envoi dans ce worker"""
+        with self._lock:
+            return {
+                'enabled': any(thread.is_alive() for thread in self._threads),
+                'threads': sum(1 for thread in self._threads if thread.is_alive()),
+                'worker': os.getpid(),
+                'chunks': dict(self.outcomes),
+                'recipients_sent': self.sent,
+                'recipients_rejected': self.rejected,
+                'errors': self.errors,
+                'last_chunk': self.last_chunk,
+            }
+    
+    def prometheus_lines(self):
+        """Compteurs de distribution au format texte Prometheus"""
+        worker = os.getpid()
+        with self._lock:
+            outcomes = sorted(self.outcomes.items())
+            recipients = (('sent', self.sent), ('rejected', self.rejected))
+        lines = [
+            '# HELP guestadmission_newsletter_chunks_total Appels SendGrid des lots de newsletter par résultat',
+            '# TYPE guestadmission_newsletter_chunks_total counter',
+        ]
+        for result, count in outcomes:
+            lines.append(f'guestadmission_newsletter_chunks_total{{result="{result}",worker="{worker}"}} {count}')
+        lines += [
+            '# HELP guestadmission_newsletter_recipients_total Destinataires de newsletter envoyés ou refusés',
+            '# TYPE guestadmission_newsletter_recipients_total counter',
+        ]
+        for result, count in recipients:
+            lines.append(f'guestadmission_newsletter_recipients_total{{result="{result}",worker="{worker}"}} {count}')
+        return lines
+
+
+newsletter_dispatcher = NewsletterDispatcher()
+
+
+if __name__ == '__main__':
+    print(f"📰 Distribution des newsletters ({NEWSLETTER_WORKERS} threads, pid {os.getpid()})")
+    newsletter_dispatcher.start()
+    try:
+        while any(thread.is_alive() for thread in newsletter_dispatcher._threads):
+            newsletter_dispatcher._threads[0].join(timeout=1)
+    except KeyboardInterrupt:
+        newsletter_dispatcher.stop()
@@ -1,30 +1,42 @@
 import os
-import requests
-from backend.models.newsletter import Newsletter, NewsletterConfig
-import markdown
+import re
+from backend.models.newsletter import Newsletter, NewsletterConfig, NewsletterSegment
+from backend.services.http_client import http_client
+from backend.services.newsletter_template import NewsletterTemplateError, compile_source
 import logging
 
 logger = logging.getLogger(__name__)
 
+SENDGRID_API_URL = os.environ.get('SENDGRID_API_URL', 'https://api.sendgrid.com/v3/mail/send')
+# Corps personnalisés : partie propre à chaque destinataire passée en substitution
+# (SendGrid limite les substitutions à 10 000 octets par personnalisation)
+SUBSTITUTION_TAG = '-guestadmission-contenu-'
+SUBSTITUTION_MAX_BYTES = 9000
+
 
 class NewsletterService:
     """Service pour l'envoi de newsletters via SendGrid"""
     
     @staticmethod
-    def send_newsletter(etablissement_id, subject, content, content_type, recipient_emails, sent_by_user_id):
+    def send_newsletter(etablissement_id, subject, content, content_type, recipient_emails, sent_by_user_id,
+                        segment_id=None):
         """
-        Envoyer une newsletter à plusieurs destinataires
+        Enregistrer une newsletter et planifier son envoi par lots
+        
+        L'envoi lui-même est fait par les threads de distribution
+        (backend/services/newsletter_dispatcher.py).
         
         Args:
             etablissement_id: ID de l'établissement
             subject: Sujet de l'email
             content: Contenu (markdown ou HTML)
             content_type: Type de contenu ('markdown' ou 'html')
-            recipient_emails: Liste des emails destinataires
+            recipient_emails: Liste des emails destinataires (ignorée si segment_id est fourni)
             sent_by_user_id: ID de l'utilisateur qui envoie
+            segment_id: Segment enregistré, résolu en destinataires à l'envoi
         
         Returns:
-            dict avec success et message
+            dict avec success, message, newsletter_id et total_recipients
         """
         try:
             config = NewsletterConfig.get_by_etablissement(etablissement_id)
@@ -35,44 +47,48 @@ class NewsletterService:
                     'error': 'Configuration SendGrid non trouvée. Veuillez configurer SendGrid dans les paramètres.'
                 }
             
-            newsletter_id = Newsletter.create(
+            segment = None
+            recipients = None
+            if segment_id:
+                segment = NewsletterSegment.get_by_id(segment_id, etablissement_id)
+                if not segment:
+                    return {'success': False, 'error': 'Segment non trouvé'}
+            else:
+                recipients = NewsletterService._normalize_recipients(recipient_emails)
+                if not recipients:
+                    return {
+                        'success': False,
+                        'error': 'Aucune adresse email valide parmi les destinataires'
+                    }
+            
+            try:
+                html_content = compile_source(subject, content, content_type)
+            except NewsletterTemplateError as e:
+                return {'success': False, 'error': str(e)}
+            
+            created = Newsletter.create(
                 etablissement_id=etablissement_id,
                 subject=subject,
                 content=content,
                 content_type=content_type,
-                recipient_emails=recipient_emails,
-                sent_by_user_id=sent_by_user_id
+                recipient_emails=recipients,
+                sent_by_user_id=sent_by_user_id,
+                html_content=html_content,
+                segment=segment
             )
-            
-            html_content = content
-            if content_type == 'markdown':
-                html_content = markdown.markdown(content)
-            
-            html_content = NewsletterService._wrap_html_template(html_content, subject, config.get('from_name', ''))
-            
-            result = NewsletterService._send_via_sendgrid(
-                api_key=config['sendgrid_api_key'],
-                from_email=config['from_email'],
-                from_name=config.get('from_name', config['from_email']),
-                to_emails=recipient_emails,
-                subject=subject,
-                html_content=html_content
-            )
-            
-            if result['success']:
-                Newsletter.update_status(newsletter_id, 'sent')
-                return {
-                    'success': True,
-                    'message': f'Newsletter envoyée avec succès à {len(recipient_emails)} destinataire(s)',
-                    'newsletter_id': newsletter_id
-                }
-            else:
-                Newsletter.update_status(newsletter_id, 'failed', result.get('error'))
+            if not created:
                 return {
                     'success': False,
-                    'error': result.get('error', 'Erreur lors de l\'envoi')
+                    'error': 'Aucun destinataire abonné pour cette newsletter'
                 }
-        
+            
+            return {
+                'success': True,
+                'message': f'Newsletter en cours d\'envoi à {created["total_recipients"]} destinataire(s)',
+                'newsletter_id': created['newsletter_id'],
+                'total_recipients': created['total_recipients']
+            }
+            
         except Exception as e:
             logger.error(f"Erreur lors de l'envoi de la newsletter: {str(e)}")
             return {
@@ -81,20 +97,92 @@ class NewsletterService:
             }
     
     @staticmethod
-    def _send_via_sendgrid(api_key, from_email, from_name, to_emails, subject, html_content):
-        """Envoyer un email via l'API SendGrid"""
+    def _normalize_recipients(recipient_emails):
+        """Adresses nettoyées, sans doublon (casse ignorée), dans l'ordre d'origine"""
+        recipients = []
+        seen = set()
+        for email in recipient_emails:
+            email = (email or '').strip()
+            if '@' not in email or email.lower() in seen:
+                continue
+            seen.add(email.lower())
+            recipients.append(email)
+        return recipients
+    
+    @staticmethod
+    def _sendgrid_batches(emails, rendered):
+        """
+        Regrouper les rendus d'un lot en appels SendGrid
+        
+        Un seul appel quand le corps est identique pour tous. Sinon, le début et
+        la fin communs à tous les rendus forment le contenu de l'appel et la
+        partie propre à chaque destinataire est passée en substitution ; les
+        destinataires dont cette partie dépasse SUBSTITUTION_MAX_BYTES sont
+        envoyés à part, un appel par corps distinct.
+        
+        Args:
+            emails: Adresses du lot
+            rendered: (sujet, html) de chaque adresse, dans le même ordre
+        
+        Returns:
+            Liste de dicts (indexes, html_content, personalizations) ; indexes
+            donne la position dans le lot de chaque personnalisation
+        """
+        bodies = list(dict.fromkeys(html for _, html in rendered))
+        if len(bodies) == 1:
+            return [{
+                'indexes': list(range(len(emails))),
+                'html_content': bodies[0],
+                'personalizations': [
+                    {'to': [{'email': email}], 'subject': subject}
+                    for email, (subject, _) in zip(emails, rendered)
+                ]
+            }]
+        
+        prefix = os.path.commonprefix(bodies)
+        suffix_length = min(
+            len(os.path.commonprefix([body[::-1] for body in bodies])),
+            min(len(body) for body in bodies) - len(prefix)
+        )
+        suffix = bodies[0][len(bodies[0]) - suffix_length:]
+        shared = {'indexes': [], 'html_content': prefix + SUBSTITUTION_TAG + suffix, 'personalizations': []}
+        separate = {}
+        for index, (email, (subject, html)) in enumerate(zip(emails, rendered)):
+            part = html[len(prefix):len(html) - suffix_length]
+            if SUBSTITUTION_TAG not in html and len(part.encode('utf-8')) <= SUBSTITUTION_MAX_BYTES:
+                shared['indexes'].append(index)
+                shared['personalizations'].append({
+                    'to': [{'email': email}], 'subject': subject, 'substitutions': {SUBSTITUTION_TAG: part}
+                })
+            else:
+                batch = separate.setdefault(html, {'indexes': [], 'html_content': html, 'personalizations': []})
+                batch['indexes'].append(index)
+                batch['personalizations'].append({'to': [{'email': email}], 'subject': subject})
+        
+        return ([shared] if shared['indexes'] else []) + list(separate.values())
+    
+    @staticmethod
+    def _send_via_sendgrid(api_key, from_email, from_name, to_emails, subject, html_content, personalizations=None):
+        """
+        Envoyer un email via l'API SendGrid (une personnalisation par destinataire,
+        ou celles fournies par personalizations)
+        
+        Returns:
+            dict avec success ; en cas d'échec error, permanent (inutile de
+            réessayer) et rejected (message par index de destinataire refusé)
+        """
         try:
-            url = 'https://api.sendgrid.com/v3/mail/send'
             headers = {
                 'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
             }
             
-            personalizations = []
-            for email in to_emails:
-                personalizations.append({
-                    'to': [{'email': email}]
-                })
+            if personalizations is None:
+                personalizations = []
+                for email in to_emails:
+                    personalizations.append({
+                        'to': [{'email': email}]
+                    })
             
             data = {
                 'personalizations': personalizations,
@@ -109,79 +197,37 @@ class NewsletterService:
                 }]
             }
             
-            response = requests.post(url, headers=headers, json=data, timeout=30)
+            response = http_client.post(SENDGRID_API_URL, headers=headers, json=data)
             
             if response.status_code in [200, 202]:
                 return {'success': True}
-            else:
-                error_message = f'SendGrid API error: {response.status_code} - {response.text}'
-                logger.error(error_message)
-                return {'success': False, 'error': error_message}
-        
+            
+            error_message = f'SendGrid API error: {response.status_code} - {response.text[:500]}'
+            logger.error(error_message)
+            return {
+                'success': False,
+                'error': error_message,
+                'permanent': response.status_code != 429 and response.status_code < 500,
+                'rejected': NewsletterService._rejected_recipients(response) if response.status_code == 400 else {}
+            }
+            
         except Exception as e:
             logger.error(f"Erreur lors de l'appel SendGrid: {str(e)}")
-            return {'success': False, 'error': str(e)}
+            return {'success': False, 'error': str(e), 'permanent': False, 'rejected': {}}
     
     @staticmethod
-    def _wrap_html_template(content, subject, from_name):
-        """Envelopper le contenu dans un template HTML responsive"""
-        return f'''
-<!DOCTYPE html>
-<html lang="fr">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>{subject}</title>
-    <style>
-        body {{
-            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-            line-height: 1.6;
-            color: #333;
-            max-width: 600px;
-            margin: 0 auto;
-            padding: 20px;
-            background-color: #f5f5f5;
-        }}
-        .email-container {{
-            background-color: white;
-            padding: 30px;
-            border-radius: 8px;
-            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
-        }}
-        h1, h2, h3 {{
-            color: #1a1a1a;
-        }}
-        a {{
-            color: #3b82f6;
-            text-decoration: none;
-        }}
-        a:hover {{
-            text-decoration: underline;
-        }}
-        .footer {{
-            margin-top: 30px;
-            padding-top: 20px;
-            border-top: 1px solid #e5e7eb;
-            font-size: 0.875rem;
-            color: #6b7280;
-            text-align: center;
-        }}
-        img {{
-            max-width: 100%;
-            height: auto;
-        }}
-    </style>
-</head>
-<body>
-    <div class="email-container">
-        {content}
-        <div class="footer">
-            <p>Envoyé par {from_name}</p>
-        </div>
-    </div>
-</body>
-</html>
-'''
+    def _rejected_recipients(response):
+        """Destinataires désignés par les erreurs SendGrid (champ personalizations.<index>...)"""
+        try:
+            errors = response.json().get('errors') or []
+        except ValueError:
+            return {}
+        rejected = {}
+        for error in errors:
+            match = re.match(r'personalizations\.(\d+)', (error or {}).get('field') or '')
+            if match:
+                rejected[int(match.group(1))] = error.get('message') or 'Adresse refusée'
+        return rejected
     
     @staticmethod
     def test_configuration(api_key, from_email, from_name):
@@ -0,0 +1,208 @@
+"""
+Modèles de newsletter : compilation unique et rendu par destinataire
+
+Le contenu d'une newsletter (markdown ou HTML) est converti une seule fois en
+HTML, inséré dans la mise en page commune et enregistré comme source de modèle
+Jinja (newsletters.html_content). À l'envoi, chaque newsletter est compilée une
+fois par worker (environnement isolé : les modèles sont écrits par les
+administrateurs d'établissement) puis rendue pour les destinataires d'un lot
+en une boucle. Seuls les champs de fusion présents dans le modèle entrent dans
+le rendu : les destinataires qui partagent ces valeurs partagent le même rendu.
+
+Champs de fusion : {{ prenom }}, {{ nom }}, {{ email }}, {{ pays }},
+{{ ville }}, {{ etablissement }}, {{ dernier_sejour }} et {{ dernier_depart }}
+(dates du dernier séjour), {{ nombre_sejours }}. Les valeurs inconnues sont
+vides : {{ prenom | default('cher client', true) }}.
+"""
+import threading
+from collections import OrderedDict
+import markdown
+from jinja2 import TemplateSyntaxError, meta
+from jinja2.sandbox import SandboxedEnvironment
+
+MERGE_FIELDS = (
+    'prenom', 'nom', 'email', 'pays', 'ville', 'etablissement',
+    'dernier_sejour', 'dernier_depart', 'nombre_sejours',
+)
+# Variables fournies par la mise en page et communes à tous les destinataires
+LAYOUT_FIELDS = ('subject', 'from_name', 'etablissement')
+
+COMPILED_CACHE_SIZE = 16
+RENDER_CACHE_SIZE = 10000
+CONTENT_MARKER = '{# contenu #}'
+
+NEWSLETTER_LAYOUT = '''
+<!DOCTYPE html>
+<html lang="fr">
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>{{ subject }}</title>
+    <style>
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+            background-color: #f5f5f5;
+        }
+        .email-container {
+            background-color: white;
+            padding: 30px;
+            border-radius: 8px;
+            box-shadow: 0 2px 4px rgba(0,0,0,0.1);
+        }
+        h1, h2, h3 {
+            color: #1a1a1a;
+        }
+        a {
+            color: #3b82f6;
+            text-decoration: none;
+        }
+        a:hover {
+            text-decoration: underline;
+        }
+        .footer {
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #e5e7eb;
+            font-size: 0.875rem;
+            color: #6b7280;
+            text-align: center;
+        }
+        img {
+            max-width: 100%;
+            height: auto;
+        }
+    </style>
+</head>
+<body>
+    <div class="email-container">
+        {# contenu #}
+        <div class="footer">
+            <p>Envoyé par {{ from_name }}</p>
+        </div>
+    </div>
+</body>
+</html>
+'''
+
+_html_env = SandboxedEnvironment(autoescape=True)
+_text_env = SandboxedEnvironment(autoescape=False)
+
+
+class NewsletterTemplateError(ValueError):
+    """Modèle de newsletter invalide (syntaxe ou champ de fusion inconnu)"""
+
+
+def _referenced_fields(env, source):
+    try:
+        return meta.find_undeclared_variables(env.parse(source))
+    except TemplateSyntaxError as e:
+        raise NewsletterTemplateError(f'Modèle invalide (ligne {e.lineno}) : {e.message}')
+
+
+def compile_source(subject, content, content_type):
+    """
+    Construire la source du modèle d'une newsletter (markdown converti, mise en page incluse)
+    
+    Raises:
+        NewsletterTemplateError: Si le sujet ou le contenu n'est pas un modèle valide
+    """
+    body = markdown.markdown(content) if content_type == 'markdown' else content
+    source = NEWSLETTER_LAYOUT.replace(CONTENT_MARKER, body)
+    
+    unknown = (_referenced_fields(_text_env, subject) | _referenced_fields(_html_env, source)) \
+        - set(MERGE_FIELDS) - set(LAYOUT_FIELDS)
+    if unknown:
+        raise NewsletterTemplateError('Champ(s) de fusion inconnu(s) : ' + ', '.join(sorted(unknown))
+                                      + '. Champs disponibles : ' + ', '.join(MERGE_FIELDS))
+    
+    # Rendu d'essai sans destinataire : erreurs du bac à sable signalées dès la création
+    try:
+        _text_env.from_string(subject).render()
+        _html_env.from_string(source).render(subject=subject)
+    except Exception as e:
+        raise NewsletterTemplateError(f'Modèle invalide : {e}')
+    return source
+
+
+class CompiledNewsletter:
+    """Sujet et corps compilés d'une newsletter, avec le cache de ses rendus"""
+    
+    def __init__(self, subject, source, shared):
+        self.subject_template = _text_env.from_string(subject)
+        self.html_template = _html_env.from_string(source)
+        used = _referenced_fields(_text_env, subject) | _referenced_fields(_html_env, source)
+        self.fields = tuple(field for field in MERGE_FIELDS if field in used and field not in shared)
+        self.shared = shared
+        self._renders = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def render_many(self, profiles):
+        """
+        Rendre le sujet et le corps pour chaque profil (dicts des champs de fusion)
+        
+        Returns:
+            Liste de (sujet, html) dans l'ordre des profils ; un même tuple est
+            retourné pour les profils qui ont les mêmes valeurs de fusion
+        """
+        rendered = []
+        for profile in profiles:
+            key = tuple(profile.get(field) for field in self.fields)
+            with self._lock:
+                output = self._renders.get(key)
+                if output is not None:
+                    self._renders.move_to_end(key)
+            if output is None:
+                # Valeur absente : variable non définie (rendu vide, filtre default applicable)
+                context = dict(self.shared, **{
+                    field: profile[field] for field in self.fields if profile.get(field) is not None
+                })
+                subject = self.subject_template.render(context)
+                output = (subject, self.html_template.render(context, subject=subject))
+                with self._lock:
+                    self._renders[key] = output
+                    while len(self._renders) > RENDER_CACHE_SIZE:
+                        self._renders.popitem(last=False)
+            rendered.append(output)
+        return rendered
+
+
+def merge_fields(email, profile):
+    """Champs de fusion d'un destinataire à partir de son profil (None : adresse sans séjour)"""
+    profile = profile or {}
+    arrival = profile.get('date_arrivee')
+    departure = profile.get('date_depart')
+    return {
+        'email': email,
+        'prenom': profile.get('prenom'),
+        'nom': profile.get('nom'),
+        'pays': profile.get('pays'),
+        'ville': profile.get('ville'),
+        'dernier_sejour': arrival.strftime('%d/%m/%Y') if arrival else None,
+        'dernier_depart': departure.strftime('%d/%m/%Y') if departure else None,
+        'nombre_sejours': profile.get('nombre_sejours') or 0,
+    }
+
+
+_compiled = OrderedDict()
+_compiled_lock = threading.Lock()
+
+
+def get_compiled(newsletter_id, subject, source, shared):
+    """Modèle compilé d'une newsletter (compilé au premier lot envoyé par ce worker)"""
+    key = (newsletter_id, hash(subject), hash(source))
+    with _compiled_lock:
+        compiled = _compiled.get(key)
+        if compiled is not None:
+            _compiled.move_to_end(key)
+            return compiled
+    compiled = CompiledNewsletter(subject, source, shared)
+    with _compiled_lock:
+        compiled = _compiled.setdefault(key, compiled)
+        while len(_compiled) > COMPILED_CACHE_SIZE:
+            _compiled.popitem(last=False)
+    return compiled
@@ -0,0 +1,270 @@
+"""
+Traceur de requêtes SQL : détection des N+1 et journal des requêtes lentes
+
+Le traçage s'active et se désactive à chaud (par worker). Lorsqu'il est
+désactivé, le curseur instrumenté ne fait qu'un test `trace is None`.
+"""
+import logging
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from flask import g, request
+from ..config.database import get_db_stats
+
+slow_query_logger = logging.getLogger('backend.slow_queries')
+n_plus_one_logger = logging.getLogger('backend.n_plus_one')
+
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_IGNORED_FILES = ('database.py', 'query_tracer.py')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%\(\w+\)s|%s')
+_IN_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+
+_NORMALIZE_CACHE_SIZE = 2048
+
+
+def normalize_sql(query):
+    """
+    Réduire une instruction SQL à sa forme (littéraux et paramètres remplacés par ?)
+
+    Les listes IN de longueur variable sont repliées pour que
+    `IN (%s, %s)` et `IN (%s, %s, %s)` aient la même forme.
+    """
+    text = _STRING_LITERAL.sub('?', query)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER_LITERAL.sub('?', text)
+    text = _IN_LIST.sub('(?+)', text)
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+def _capture_stack(limit=8):
+    """Retourner les derniers appels du code applicatif (hors instrumentation)"""
+    frames = []
+    for frame in traceback.extract_stack()[:-2]:
+        if not frame.filename.startswith(_PROJECT_DIR):
+            continue
+        if frame.filename.endswith(_IGNORED_FILES):
+            continue
+        relative = os.path.relpath(frame.filename, os.path.dirname(_PROJECT_DIR))
+        frames.append(f'{relative}:{frame.lineno} in {frame.name}')
+    return frames[-limit:]
+
+
+class RequestTrace:
+    """
+    Trace des instructions SQL d'une requête HTTP
+
+    Les statistiques sont agrégées par forme d'instruction ; la pile d'appels
+    n'est capturée que pour les requêtes lentes et au moment où une forme
+    franchit le seuil N+1, afin de limiter le surcoût.
+    """
+
+    def __init__(self, tracer, endpoint, route, method):
+        self.tracer = tracer
+        self.endpoint = endpoint
+        self.route = route
+        self.method = method
+        self.shapes = {}
+
+    def record(self, query, duration, rowcount):
+        """Enregistrer une instruction exécutée"""
+        shape = self.tracer.normalize(query)
+        entry = self.shapes.get(shape)
+        if entry is None:
+            entry = self.shapes[shape] = {'count': 0, 'total_time': 0.0, 'rows': 0, 'stack': None}
+
+        entry['count'] += 1
+        entry['total_time'] += duration
+        if rowcount and rowcount > 0:
+            entry['rows'] += rowcount
+
+        if entry['count'] == self.tracer.n_plus_one_threshold:
+            entry['stack'] = _capture_stack()
+
+        if duration * 1000 >= self.tracer.slow_threshold_ms:
+            self.tracer.report_slow_query(self, shape, duration, rowcount, _capture_stack())
+
+    def summary(self):
+        """Retourner les statistiques par forme, triées par temps cumulé"""
+        return sorted(
+            (
+                {
+                    'sql': shape,
+                    'count': entry['count'],
+                    'total_ms': round(entry['total_time'] * 1000, 3),
+                    'rows': entry['rows'],
+                }
+                for shape, entry in self.shapes.items()
+            ),
+            key=lambda item: item['total_ms'],
+            reverse=True
+        )
+
+
+class QueryTracer:
+    """
+    Traceur de requêtes SQL activable à chaud pour le worker courant
+
+    Configuration initiale par variables d'environnement :
+        SQL_TRACE_ENABLED: 'true' pour activer le traçage au démarrage
+        SLOW_QUERY_THRESHOLD_MS: Seuil des requêtes lentes (défaut 200 ms)
+        N_PLUS_ONE_THRESHOLD: Répétitions d'une même forme signalées comme N+1 (défaut 5)
+        SLOW_QUERY_LOG: Fichier où écrire le journal des requêtes lentes et des N+1
+    """
+
+    def __init__(self):
+        self.enabled = os.environ.get('SQL_TRACE_ENABLED', 'false').lower() == 'true'
+        self.slow_threshold_ms = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', 200))
+        self.n_plus_one_threshold = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+        self._lock = threading.Lock()
+        self._normalized = {}
+        self.recent_slow_queries = deque(maxlen=100)
+        self.recent_n_plus_one = deque(maxlen=100)
+        self.slow_query_count = 0
+        self.n_plus_one_count = {}
+
+        log_path = os.environ.get('SLOW_QUERY_LOG')
+        if log_path and not slow_query_logger.handlers:
+            handler = logging.FileHandler(log_path, encoding='utf-8')
+            handler.setFormatter(logging.Formatter('%(asctime)s %(name)s %(levelname)s %(message)s'))
+            slow_query_logger.addHandler(handler)
+            n_plus_one_logger.addHandler(handler)
+
+    def init_app(self, app, registry=None):
+        """
+        Brancher le traceur sur les hooks de requête Flask
+
+        Doit être appelé après RequestMetricsMiddleware, qui ouvre les compteurs
+        base de données de la requête.
+        """
+
+        @app.before_request
+        def start_query_trace():
+            if not self.enabled:
+                return
+            stats = get_db_stats()
+            if stats is not None:
+                stats.trace = RequestTrace(self, request.endpoint or 'unmatched', request.path, request.method)
+
+        @app.after_request
+        def finish_query_trace(response):
+            stats = g.get('db_stats')
+            if stats is not None and stats.trace is not None:
+                try:
+                    self.finish_request(stats.trace)
+                except Exception as e:
+                    print(f"Erreur dans QueryTracer: {e}")
+                stats.trace = None
+            return response
+
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+
+    def configure(self, enabled=None, slow_threshold_ms=None, n_plus_one_threshold=None):
+        """Modifier la configuration du traceur à chaud"""
+        if enabled is not None:
+            self.enabled = bool(enabled)
+        if slow_threshold_ms is not None:
+            self.slow_threshold_ms = max(float(slow_threshold_ms), 0.0)
+        if n_plus_one_threshold is not None:
+            self.n_plus_one_threshold = max(int(n_plus_one_threshold), 2)
+
+    def normalize(self, query):
+        """Normaliser une instruction avec mise en cache par texte brut"""
+        if isinstance(query, bytes):
+            query = query.decode('utf-8', errors='replace')
+        elif not isinstance(query, str):
+            query = str(query)
+
+        shape = self._normalized.get(query)
+        if shape is None:
+            shape = normalize_sql(query)
+            if len(self._normalized) >= _NORMALIZE_CACHE_SIZE:
+                self._normalized.clear()
+            self._normalized[query] = shape
+        return shape
+
+    def report_slow_query(self, trace, shape, duration, rowcount, stack):
+        """Journaliser une requête dépassant le seuil de lenteur"""
+        entry = {
+            'at': time.time(),
+            'endpoint': trace.endpoint,
+            'route': trace.route,
+            'method': trace.method,
+            'sql': shape,
+            'duration_ms': round(duration * 1000, 3),
+            'rows': rowcount,
+            'stack': stack,
+        }
+        with self._lock:
+            self.recent_slow_queries.append(entry)
+            self.slow_query_count += 1
+
+        slow_query_logger.warning(
+            "Requête lente %.1f ms (%s lignes) sur %s %s [%s]: %s\n  %s",
+            entry['duration_ms'], rowcount, trace.method, trace.route, trace.endpoint,
+            shape, '\n  '.join(stack)
+        )
+
+    def finish_request(self, trace):
+        """Analyser la trace d'une requête terminée et signaler les N+1"""
+        for shape, entry in trace.shapes.items():
+            if entry['count'] < self.n_plus_one_threshold:
+                continue
+
+            finding = {
+                'at': time.time(),
+                'endpoint': trace.endpoint,
+                'route': trace.route,
+                'method': trace.method,
+                'sql': shape,
+                'count': entry['count'],
+                'total_ms': round(entry['total_time'] * 1000, 3),
+                'stack': entry['stack'] or [],
+            }
+            with self._lock:
+                self.recent_n_plus_one.append(finding)
+                self.n_plus_one_count[trace.endpoint] = self.n_plus_one_count.get(trace.endpoint, 0) + 1
+
+            n_plus_one_logger.warning(
+                "N+1 probable: %d exécutions (%.1f ms) sur %s %s [%s]: %s\n  %s",
+                finding['count'], finding['total_ms'], trace.method, trace.route, trace.endpoint,
+                shape, '\n  '.join(finding['stack'])
+            )
+
+    def status(self):
+        """Retourner la configuration et les derniers signalements"""
+        with self._lock:
+            return {
+                'worker': os.getpid(),
+                'enabled': self.enabled,
+                'slow_threshold_ms': self.slow_threshold_ms,
+                'n_plus_one_threshold': self.n_plus_one_threshold,
+                'slow_query_count': self.slow_query_count,
+                'recent_slow_queries': list(self.recent_slow_queries),
+                'recent_n_plus_one': list(self.recent_n_plus_one),
+            }
+
+    def prometheus_lines(self):
+        """Compteurs du traceur au format texte Prometheus"""
+        worker = os.getpid()
+        lines = [
+            '# HELP guestadmission_sql_slow_queries_total Requêtes SQL au-dessus du seuil de lenteur',
+            '# TYPE guestadmission_sql_slow_queries_total counter',
+            f'guestadmission_sql_slow_queries_total{{worker="{worker}"}} {self.slow_query_count}',
+            '# HELP guestadmission_sql_n_plus_one_total Requêtes HTTP contenant un motif N+1',
+            '# TYPE guestadmission_sql_n_plus_one_total counter',
+        ]
+        with self._lock:
+            for endpoint, count in sorted(self.n_plus_one_count.items()):
+                lines.append(f'guestadmission_sql_n_plus_one_total{{endpoint="{endpoint}",worker="{worker}"}} {count}')
+        return lines
+
+
+query_tracer = QueryTracer()
@@ -0,0 +1,409 @@
+"""
+Données de référence embarquées (pays, devises, villes), chargées une fois par worker
+
+Le jeu de données backend/data/countries.json est livré avec l'application :
+aucune requête HTTP ne dépend plus d'un appel réseau. Au chargement, les pays
+sont indexés par code ISO (alpha-2 et alpha-3), la liste des devises est
+précalculée et un index de préfixes, insensible aux accents et à la casse,
+sert la recherche. Les listes complètes sont sérialisées une seule fois, avec
+leur version gzip et leur ETag.
+
+Les villes (backend/data/villes.json, ou un export GeoNames via
+CITIES_DATA_FILE) sont chargées dans un CityIndex immuable.
+
+Mise à jour hors ligne depuis REST Countries (puis commit du fichier) :
+    python -m backend.services.reference_data --refresh
+"""
+import argparse
+import gzip
+import hashlib
+import heapq
+import json
+import os
+import threading
+from array import array
+from bisect import bisect_left
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from ..utils.formatters import normalize_search_text
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+COUNTRIES_DATA_FILE = os.environ.get('COUNTRIES_DATA_FILE', os.path.join(DATA_DIR, 'countries.json'))
+CITIES_DATA_FILE = os.environ.get('CITIES_DATA_FILE', os.path.join(DATA_DIR, 'villes.json'))
+PAYS_DATA_FILE = os.path.join(DATA_DIR, 'pays.json')
+REFERENCE_DATA_MAX_AGE = 3600
+
+CITY_SEARCH_LIMIT = 50
+# Les meilleurs résultats des préfixes jusqu'à cette longueur sont précalculés,
+# ainsi que ceux des préfixes plus longs couvrant plus de CITY_TOP_RANGE entrées
+CITY_TOP_PREFIX_LENGTH = 3
+CITY_TOP_RANGE = 256
+
+RESTCOUNTRIES_URL = 'https://restcountries.com/v3.1/all'
+# REST Countries limite /all à 10 champs par appel : deux appels fusionnés par code alpha-3
+RESTCOUNTRIES_FIELDS = (
+    'name,cca2,cca3,capital,region,subregion,population,currencies,languages,flags',
+    'cca3,flag,timezones,latlng,translations',
+)
+
+_load_lock = threading.Lock()
+_loaded = {}
+
+
+def serialize_payload(data) -> Dict:
+    """Sérialiser une réponse JSON une fois : corps, version gzip et ETag"""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return {
+        'body': body,
+        'gzipped': gzip.compress(body, compresslevel=6, mtime=0),
+        'etag': hashlib.sha256(body).hexdigest()[:32],
+    }
+
+
+class CountryCatalog:
+    """Pays indexés par code, devises précalculées et index de recherche par préfixe"""
+    
+    def __init__(self, countries: List[Dict]):
+        self.countries = sorted(countries, key=lambda c: c['name'])
+        self.by_code = {}
+        for country in self.countries:
+            self.by_code[country['code'].upper()] = country
+            if country.get('code3'):
+                self.by_code[country['code3'].upper()] = country
+        
+        self.currencies = self._build_currencies()
+        
+        # Chaque préfixe de chaque mot des noms (courant, officiel, français)
+        # renvoie l'ensemble des positions des pays correspondants
+        self._search_texts = []
+        self._prefixes = {}
+        for position, country in enumerate(self.countries):
+            text = normalize_search_text(' '.join(filter(None, (
+                country['name'], country.get('official_name'), country.get('name_fr')
+            ))))
+            self._search_texts.append(text)
+            for word in set(text.split()):
+                for end in range(1, len(word) + 1):
+                    self._prefixes.setdefault(word[:end], set()).add(position)
+        
+        self.countries_payload = serialize_payload(self.countries)
+        self.currencies_payload = serialize_payload(self.currencies)
+    
+    def _build_currencies(self) -> List[Dict]:
+        currencies = {}
+        for country in self.countries:
+            for code, details in (country.get('currencies') or {}).items():
+                currency = currencies.get(code)
+                if currency is None:
+                    currency = currencies[code] = {
+                        'code': code,
+                        'name': details.get('name', ''),
+                        'symbol': details.get('symbol', ''),
+                        'countries': []
+                    }
+                currency['countries'].append(country['name'])
+        return [currencies[code] for code in sorted(currencies)]
+    
+    def get(self, code: str) -> Optional[Dict]:
+        """Pays par code ISO alpha-2 ou alpha-3"""
+        return self.by_code.get(code.upper())
+    
+    def search(self, query: str) -> List[Dict]:
+        """
+        Pays dont chaque mot de la recherche commence un mot du nom
+        
+        « cote iv » trouve « Côte d'Ivoire », « etats » trouve « États-Unis ».
+        Si aucun préfixe ne correspond, la recherche porte sur une sous-chaîne
+        des noms normalisés.
+        """
+        normalized = normalize_search_text(query)
+        if not normalized:
+            return []
+        
+        positions = None
+        for term in normalized.split():
+            matches = self._prefixes.get(term, set())
+            positions = matches if positions is None else positions & matches
+            if not positions:
+                break
+        
+        if not positions:
+            positions = {p for p, text in enumerate(self._search_texts) if normalized in text}
+        return [self.countries[position] for position in sorted(positions)]
+
+
+class CityIndex:
+    """
+    Index immuable des villes, partagé sans verrou entre les threads du worker
+    
+    - par pays : noms triés (ordre alphabétique sans accents) et réponses
+      pré-sérialisées ;
+    - autocomplétion : tableau trié des noms normalisés pris à chaque début de
+      mot, parcouru par dichotomie (équivalent d'un trie) ; les meilleurs
+      résultats des préfixes courts ou très partagés sont précalculés ;
+    - sous-chaînes : index de trigrammes, utilisé quand les préfixes ne
+      remplissent pas la page de résultats.
+    
+    Les résultats sont classés : début du nom, puis début d'un autre mot, puis
+    sous-chaîne ; à égalité, par rang (population GeoNames, ou position dans la
+    liste du pays pour villes.json) puis par nom.
+    """
+    
+    def __init__(self, cities: Iterable[Tuple[str, str, int]]):
+        best = {}
+        for country, name, rank in cities:
+            key = (country.upper(), name)
+            if key not in best or rank < best[key]:
+                best[key] = rank
+        
+        entries = sorted((normalize_search_text(name), name, country, rank)
+                         for (country, name), rank in best.items())
+        self.keys = [entry[0] for entry in entries]
+        self.names = [entry[1] for entry in entries]
+        self.countries = [entry[2] for entry in entries]
+        self.ranks = array('q', (entry[3] for entry in entries))
+        del entries, best
+        
+        self._country_payloads = {}
+        by_country = {}
+        for city_id, country in enumerate(self.countries):
+            by_country.setdefault(country, []).append(city_id)
+        for country, ids in by_country.items():
+            self._country_payloads[country] = self._serialize_country(country, [self.names[i] for i in ids])
+        
+        starts = []
+        for city_id, key in enumerate(self.keys):
+            position = 0
+            for word_index, word in enumerate(key.split(' ')):
+                starts.append((key[position:], word_index > 0, city_id))
+                position += len(word) + 1
+        starts.sort()
+        self._prefix_keys = [start[0] for start in starts]
+        self._prefix_inner = array('b', (start[1] for start in starts))
+        self._prefix_ids = array('I', (start[2] for start in starts))
+        del starts
+        
+        # Meilleurs résultats précalculés pour les préfixes courts et pour tout
+        # préfixe couvrant plus de CITY_TOP_RANGE entrées : une recherche par
+        # préfixe ne classe jamais plus de CITY_TOP_RANGE entrées
+        self._top = {}
+        pending = [(0, len(self._prefix_keys), 1)]
+        while pending:
+            lo, end, length = pending.pop()
+            while lo < end:
+                prefix = self._prefix_keys[lo][:length]
+                if len(prefix) < length:
+                    lo += 1
+                    continue
+                hi = bisect_left(self._prefix_keys, prefix + '\uffff', lo, end)
+                if length <= CITY_TOP_PREFIX_LENGTH or hi - lo > CITY_TOP_RANGE:
+                    self._top[prefix] = tuple(self._ranked(lo, hi, CITY_SEARCH_LIMIT))
+                if length < CITY_TOP_PREFIX_LENGTH or hi - lo > CITY_TOP_RANGE:
+                    pending.append((lo, hi, length + 1))
+                lo = hi
+        
+        # Listes de trigrammes ordonnées par rang : la recherche s'arrête dès
+        # que la page de résultats est remplie
+        self._trigrams = {}
+        for city_id in sorted(range(len(self.keys)), key=lambda i: (self.ranks[i], self.keys[i])):
+            key = self.keys[city_id]
+            for gram in {key[i:i + 3] for i in range(len(key) - 2)}:
+                postings = self._trigrams.get(gram)
+                if postings is None:
+                    postings = self._trigrams[gram] = array('I')
+                postings.append(city_id)
+    
+    @staticmethod
+    def _serialize_country(country: str, names: List[str]) -> Tuple[Dict, Dict]:
+        return serialize_payload(names), serialize_payload({'country_code': country, 'cities': names})
+    
+    def country_payloads(self, country: str) -> Tuple[Dict, Dict]:
+        """Réponses pré-sérialisées d'un pays : liste des noms, et objet {country_code, cities}"""
+        country = country.upper()
+        payloads = self._country_payloads.get(country)
+        if payloads is None:
+            payloads = self._serialize_country(country, [])
+        return payloads
+    
+    def _entry_order(self, position: int):
+        city_id = self._prefix_ids[position]
+        return self._prefix_inner[position], self.ranks[city_id], self.keys[city_id]
+    
+    def _ranked(self, lo: int, hi: int, limit: int) -> List[int]:
+        """Meilleures villes d'une plage du tableau des préfixes (sans doublons)"""
+        ids = []
+        seen = set()
+        for position in heapq.nsmallest(limit * 4, range(lo, hi), key=self._entry_order):
+            city_id = self._prefix_ids[position]
+            if city_id not in seen:
+                seen.add(city_id)
+                ids.append(city_id)
+                if len(ids) == limit:
+                    break
+        return ids
+    
+    def _substring_ids(self, normalized: str, limit: int, excluded: set) -> List[int]:
+        """Villes dont le nom normalisé contient la recherche (liste de trigrammes la plus courte, puis vérification)"""
+        postings = [self._trigrams.get(normalized[i:i + 3]) for i in range(len(normalized) - 2)]
+        if not all(postings):
+            return []
+        ids = []
+        for city_id in min(postings, key=len):
+            if city_id not in excluded and normalized in self.keys[city_id]:
+                ids.append(city_id)
+                if len(ids) == limit:
+                    break
+        return ids
+    
+    def search(self, query: str, limit: int = CITY_SEARCH_LIMIT) -> List[Dict]:
+        """Autocomplétion classée : {name, country_code} des meilleures villes"""
+        normalized = normalize_search_text(query)
+        limit = max(1, min(limit, CITY_SEARCH_LIMIT))
+        if not normalized:
+            return []
+        
+        top = self._top.get(normalized)
+        if top is not None:
+            ids = list(top[:limit])
+        elif len(normalized) <= CITY_TOP_PREFIX_LENGTH:
+            ids = []
+        else:
+            lo = bisect_left(self._prefix_keys, normalized)
+            hi = bisect_left(self._prefix_keys, normalized + '\uffff', lo)
+            ids = self._ranked(lo, hi, limit)
+        
+        if len(ids) < limit and len(normalized) >= 3:
+            ids += self._substring_ids(normalized, limit - len(ids), set(ids))
+        return [{'name': self.names[city_id], 'country_code': self.countries[city_id]} for city_id in ids]
+
+
+def _load_once(name: str, loader):
+    """Charger une donnée de référence une seule fois par worker"""
+    value = _loaded.get(name)
+    if value is None:
+        with _load_lock:
+            value = _loaded.get(name)
+            if value is None:
+                value = _loaded[name] = loader()
+    return value
+
+
+def _read_json(path: str):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def read_cities(path: str) -> Iterator[Tuple[str, str, int]]:
+    """
+    Lire un fichier de villes : (code pays, nom, rang)
+    
+    Formats acceptés :
+        *.json: {"MA": ["Casablanca", ...]} - rang = position dans la liste
+        *.txt:  export GeoNames (cities500.txt, cities15000.txt...) - rang = -population
+    """
+    if path.endswith('.txt'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) > 14 and fields[8]:
+                    yield fields[8], fields[1], -int(fields[14] or 0)
+    else:
+        for country, names in _read_json(path).items():
+            for position, name in enumerate(names):
+                yield country, name, position
+
+
+def get_country_catalog() -> CountryCatalog:
+    """Catalogue des pays du worker, chargé au premier appel"""
+    return _load_once('countries', lambda: CountryCatalog(_read_json(COUNTRIES_DATA_FILE)))
+
+
+def get_city_index() -> CityIndex:
+    """Index des villes du worker, chargé au premier appel"""
+    return _load_once('cities', lambda: CityIndex(read_cities(CITIES_DATA_FILE)))
+
+
+def get_pays_payload() -> Dict:
+    """Liste courte des pays proposés dans les formulaires (pays.json), pré-sérialisée"""
+    return _load_once('pays', lambda: serialize_payload(_read_json(PAYS_DATA_FILE)))
+
+
+def _format_country(country: Dict, extra: Dict) -> Dict:
+    """Convertir un pays REST Countries au format servi par /api/countries"""
+    currencies = {}
+    for code, details in (country.get('currencies') or {}).items():
+        currencies[code] = {
+            'name': details.get('name', ''),
+            'symbol': details.get('symbol', '')
+        }
+    flags = country.get('flags', {})
+    names = country.get('name', {})
+    
+    return {
+        'name': names.get('common', ''),
+        'official_name': names.get('official', ''),
+        'name_fr': extra.get('translations', {}).get('fra', {}).get('common', names.get('common', '')),
+        'code': country.get('cca2', ''),
+        'code3': country.get('cca3', ''),
+        'capital': country['capital'][0] if country.get('capital') else '',
+        'region': country.get('region', ''),
+        'subregion': country.get('subregion', ''),
+        'population': country.get('population', 0),
+        'currencies': currencies,
+        'languages': country.get('languages', {}),
+        'flag': {
+            'png': flags.get('png', ''),
+            'svg': flags.get('svg', ''),
+            'alt': flags.get('alt', ''),
+            'emoji': extra.get('flag', '')
+        },
+        'timezones': extra.get('timezones', []),
+        'latlng': extra.get('latlng', [])
+    }
+
+
+def refresh_countries(output: str = COUNTRIES_DATA_FILE) -> int:
+    """
+    Télécharger REST Countries et réécrire le jeu de données embarqué
+    
+    Returns:
+        Nombre de pays écrits
+    """
+    from .http_client import http_client
+    
+    responses = []
+    for fields in RESTCOUNTRIES_FIELDS:
+        response = http_client.get(RESTCOUNTRIES_URL, params={'fields': fields})
+        response.raise_for_status()
+        responses.append(response.json())
+    
+    extras = {country['cca3']: country for country in responses[1]}
+    countries = [_format_country(country, extras.get(country.get('cca3'), {})) for country in responses[0]]
+    countries = [country for country in countries if country['code'] and country['name']]
+    countries.sort(key=lambda c: c['name'])
+    
+    temp_path = f'{output}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(countries, f, ensure_ascii=False, indent=1)
+        f.write('\n')
+    os.replace(temp_path, output)
+    return len(countries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Données de référence embarquées')
+    parser.add_argument('--refresh', action='store_true', help='Télécharger REST Countries et réécrire le jeu de données')
+    parser.add_argument('--output', default=COUNTRIES_DATA_FILE, help='Fichier à écrire (défaut: backend/data/countries.json)')
+    args = parser.parse_args()
+    
+    if args.refresh:
+        count = refresh_countries(args.output)
+        print(f"✅ {count} pays écrits dans {args.output}")
+    else:
+        catalog = get_country_catalog()
+        cities = get_city_index()
+        print(f"{len(catalog.countries)} pays, {len(catalog.currencies)} devises ({COUNTRIES_DATA_FILE})")
+        print(f"{len(cities.names)} villes ({CITIES_DATA_FILE})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,339 @@
+"""
+Instrumentation des requêtes HTTP (latence, temps base de données, taille des réponses)
+
+Les mesures sont agrégées en mémoire, par worker, dans des histogrammes
+log-linéaires (style HDR) et exposées au format texte Prometheus.
+"""
+import os
+import threading
+import time
+from flask import g, request
+from ..config.database import start_db_stats, stop_db_stats
+
+METRIC_PREFIX = 'guestadmission'
+
+# Bornes exposées pour les histogrammes Prometheus (alignées sur les seaux internes)
+DURATION_BUCKETS_SECONDS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+REPORTED_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+
+class Histogram:
+    """
+    Histogramme log-linéaire à précision relative bornée (style HDR)
+
+    Les valeurs entières jusqu'à 10**precision sont comptées exactement, au-delà
+    chaque décade est découpée en seaux de largeur constante. Chaque seau est
+    identifié par sa borne supérieure inclusive, ce qui rend exacts les cumuls
+    sur toute borne ayant au plus `precision` chiffres significatifs.
+    """
+    __slots__ = ('precision', '_limit', 'counts', 'count', 'total', 'max')
+
+    def __init__(self, precision=3):
+        self.precision = precision
+        self._limit = 10 ** precision
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _bucket(self, value):
+        if value <= self._limit:
+            return value
+        magnitude = 10 ** (len(str(value - 1)) - self.precision)
+        return ((value - 1) // magnitude + 1) * magnitude
+
+    def record(self, value):
+        """Enregistrer une valeur entière positive"""
+        value = max(int(value), 0)
+        bucket = self._bucket(value)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def cumulative(self, bounds):
+        """Retourner le nombre de valeurs <= chaque borne (bornes triées)"""
+        result = []
+        items = sorted(self.counts.items())
+        index = 0
+        running = 0
+        for bound in bounds:
+            while index < len(items) and items[index][0] <= bound:
+                running += items[index][1]
+                index += 1
+            result.append(running)
+        return result
+
+    def percentile(self, quantile):
+        """Retourner la borne supérieure du seau contenant le quantile demandé"""
+        if not self.count:
+            return 0
+        target = quantile * self.count
+        running = 0
+        for bucket, count in sorted(self.counts.items()):
+            running += count
+            if running >= target:
+                return min(bucket, self.max)
+        return self.max
+
+
+class EndpointMetrics:
+    """Mesures agrégées pour un endpoint Flask"""
+
+    def __init__(self):
+        self.duration_us = Histogram()
+        self.db_time_us = Histogram()
+        self.queries = Histogram()
+        self.responses = {}
+        self.connections = 0
+        self.response_bytes = 0
+
+
+class RequestMetricsRegistry:
+    """
+    Registre en mémoire des mesures par endpoint pour le worker courant
+
+    Chaque worker gunicorn possède son propre registre : le label `worker`
+    permet d'agréger les séries côté Prometheus.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self._extra_collectors = []
+        self.started_at = time.time()
+
+    def observe(self, endpoint, method, status_code, duration, db_time, queries, connections, response_size):
+        """
+        Enregistrer une requête terminée
+
+        Args:
+            endpoint: Nom de l'endpoint Flask (ex: 'sejours.get_sejours')
+            method: Méthode HTTP
+            status_code: Code de statut HTTP
+            duration: Durée totale en secondes
+            db_time: Temps passé dans la base de données en secondes
+            queries: Nombre de requêtes SQL
+            connections: Nombre de connexions ouvertes
+            response_size: Taille de la réponse en octets (None si inconnue)
+        """
+        with self._lock:
+            metrics = self._endpoints.get(endpoint)
+            if metrics is None:
+                metrics = self._endpoints[endpoint] = EndpointMetrics()
+
+            metrics.duration_us.record(duration * 1_000_000)
+            metrics.db_time_us.record(db_time * 1_000_000)
+            metrics.queries.record(queries)
+            key = (method, status_code)
+            metrics.responses[key] = metrics.responses.get(key, 0) + 1
+            metrics.connections += connections
+            if response_size:
+                metrics.response_bytes += response_size
+
+    def register_collector(self, collector):
+        """
+        Ajouter une source de métriques supplémentaire
+
+        Args:
+            collector: Fonction sans argument retournant des lignes au format texte Prometheus
+        """
+        self._extra_collectors.append(collector)
+
+    def reset(self):
+        """Vider toutes les mesures du worker"""
+        with self._lock:
+            self._endpoints = {}
+            self.started_at = time.time()
+
+    def snapshot(self):
+        """Retourner un résumé JSON-compatible des mesures par endpoint"""
+        with self._lock:
+            result = {}
+            for endpoint, metrics in self._endpoints.items():
+                count = metrics.duration_us.count
+                result[endpoint] = {
+                    'requests': count,
+                    'duration_ms': {
+                        f'p{int(q * 100)}': metrics.duration_us.percentile(q) / 1000
+                        for q in REPORTED_QUANTILES
+                    },
+                    'duration_max_ms': metrics.duration_us.max / 1000,
+                    'db_time_ms_avg': (metrics.db_time_us.total / count / 1000) if count else 0,
+                    'queries_avg': (metrics.queries.total / count) if count else 0,
+                    'queries_max': metrics.queries.max,
+                    'connections_avg': (metrics.connections / count) if count else 0,
+                    'response_bytes_avg': (metrics.response_bytes / count) if count else 0,
+                }
+            return result
+
+    def render_prometheus(self):
+        """Produire l'exposition au format texte Prometheus"""
+        worker = str(os.getpid())
+        lines = []
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+
+            self._render_histogram(
+                lines, 'http_request_duration_seconds',
+                'Durée de traitement des requêtes HTTP par endpoint',
+                endpoints, 'duration_us', DURATION_BUCKETS_SECONDS, 1_000_000, worker
+            )
+            self._render_histogram(
+                lines, 'http_request_db_seconds',
+                'Temps passé dans PostgreSQL par requête HTTP',
+                endpoints, 'db_time_us', DURATION_BUCKETS_SECONDS, 1_000_000, worker
+            )
+            self._render_histogram(
+                lines, 'http_request_db_queries',
+                'Nombre de requêtes SQL par requête HTTP',
+                endpoints, 'queries', QUERY_COUNT_BUCKETS, 1, worker
+            )
+
+            name = f'{METRIC_PREFIX}_http_request_duration_quantile_seconds'
+            lines.append(f'# HELP {name} Quantiles de latence calculés par le worker')
+            lines.append(f'# TYPE {name} gauge')
+            for endpoint, metrics in endpoints:
+                for quantile in REPORTED_QUANTILES:
+                    value = metrics.duration_us.percentile(quantile) / 1_000_000
+                    lines.append(
+                        f'{name}{{endpoint="{_escape(endpoint)}",worker="{worker}",quantile="{quantile}"}} {value}'
+                    )
+
+            name = f'{METRIC_PREFIX}_http_requests_total'
+            lines.append(f'# HELP {name} Nombre de requêtes HTTP traitées')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, metrics in endpoints:
+                for (method, status_code), count in sorted(metrics.responses.items()):
+                    lines.append(
+                        f'{name}{{endpoint="{_escape(endpoint)}",method="{method}",'
+                        f'status="{status_code}",worker="{worker}"}} {count}'
+                    )
+
+            for suffix, attribute, help_text in (
+                ('http_db_connections_total', 'connections', 'Connexions PostgreSQL ouvertes'),
+                ('http_response_bytes_total', 'response_bytes', 'Octets envoyés dans les réponses'),
+            ):
+                name = f'{METRIC_PREFIX}_{suffix}'
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} counter')
+                for endpoint, metrics in endpoints:
+                    lines.append(
+                        f'{name}{{endpoint="{_escape(endpoint)}",worker="{worker}"}} {getattr(metrics, attribute)}'
+                    )
+
+        name = f'{METRIC_PREFIX}_worker_start_time_seconds'
+        lines.append(f'# HELP {name} Démarrage de la collecte pour ce worker')
+        lines.append(f'# TYPE {name} gauge')
+        lines.append(f'{name}{{worker="{worker}"}} {self.started_at}')
+
+        for collector in self._extra_collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                print(f"Erreur dans un collecteur de métriques: {e}")
+
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(lines, suffix, help_text, endpoints, attribute, bounds, scale, worker):
+        name = f'{METRIC_PREFIX}_{suffix}'
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        scaled_bounds = [int(round(bound * scale)) for bound in bounds]
+
+        for endpoint, metrics in endpoints:
+            histogram = getattr(metrics, attribute)
+            labels = f'endpoint="{_escape(endpoint)}",worker="{worker}"'
+            for bound, cumulative in zip(bounds, histogram.cumulative(scaled_bounds)):
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f'{name}_sum{{{labels}}} {histogram.total / scale}')
+            lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+
+
+def _escape(value):
+    """Échapper une valeur de label Prometheus"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+request_metrics = RequestMetricsRegistry()
+
+
+class RequestMetricsMiddleware:
+    """
+    Middleware mesurant chaque requête : durée, temps base de données,
+    nombre de requêtes SQL, connexions ouvertes et taille de la réponse
+
+    Les mesures de la requête courante sont disponibles dans `g.request_timing`
+    pour les autres hooks (ex: journal d'activité).
+    """
+
+    def __init__(self, app, registry=None):
+        self.app = app
+        self.registry = registry or request_metrics
+        app.config.setdefault(
+            'REQUEST_METRICS_HEADERS',
+            os.environ.get('REQUEST_METRICS_HEADERS', 'false').lower() == 'true'
+        )
+
+        @app.before_request
+        def start_request_timer():
+            g.request_started_at = time.perf_counter()
+            g.db_stats, g.db_stats_token = start_db_stats()
+
+        @app.after_request
+        def record_request_metrics(response):
+            try:
+                started_at = g.get('request_started_at')
+                stats = g.get('db_stats')
+                if started_at is None or stats is None:
+                    return response
+
+                duration = time.perf_counter() - started_at
+                endpoint = request.endpoint or 'unmatched'
+                response_size = response.calculate_content_length()
+
+                g.request_timing = {
+                    'endpoint': endpoint,
+                    'duration_ms': round(duration * 1000, 2),
+                    'db_time_ms': round(stats.db_time * 1000, 2),
+                    'db_queries': stats.queries,
+                    'db_connections': stats.connections,
+                    'response_bytes': response_size,
+                }
+
+                self.registry.observe(
+                    endpoint=endpoint,
+                    method=request.method,
+                    status_code=response.status_code,
+                    duration=duration,
+                    db_time=stats.db_time,
+                    queries=stats.queries,
+                    connections=stats.connections,
+                    response_size=response_size
+                )
+
+                if app.config.get('REQUEST_METRICS_HEADERS'):
+                    response.headers['Server-Timing'] = (
+                        f'app;dur={duration * 1000:.2f}, '
+                        f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} queries"'
+                    )
+                    response.headers['X-DB-Queries'] = str(stats.queries)
+                    response.headers['X-DB-Connections'] = str(stats.connections)
+            except Exception as e:
+                print(f"Erreur dans RequestMetricsMiddleware: {e}")
+
+            return response
+
+        @app.teardown_request
+        def stop_request_timer(exc):
+            token = g.pop('db_stats_token', None)
+            if token is not None:
+                try:
+                    stop_db_stats(token)
+                except ValueError:
+                    pass
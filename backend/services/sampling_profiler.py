@@ -0,0 +1,267 @@
+"""
+Profileur par échantillonnage activable en production
+
+Un thread d'échantillonnage relève périodiquement la pile des threads qui
+traitent une requête HTTP (génération PDF reportlab, parsing iCal, etc.) et
+les agrège au format « collapsed stacks » compatible flamegraph.
+
+La collecte est locale au worker gunicorn qui a reçu l'ordre de démarrage.
+"""
+import os
+import sys
+import sysconfig
+import threading
+import time
+from contextlib import contextmanager
+from flask import request
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_STDLIB_DIR = sysconfig.get_paths()['stdlib'] + os.sep
+
+MAX_DURATION_SECONDS = 300
+MAX_REQUESTS = 10000
+MIN_INTERVAL_MS = 1
+MAX_INTERVAL_MS = 1000
+MAX_OVERHEAD_PERCENT = 5.0
+MAX_DISTINCT_STACKS = 20000
+MAX_STACK_DEPTH = 128
+
+
+class ProfilerBusyError(Exception):
+    """Une session de profilage est déjà en cours sur ce worker"""
+
+
+class SamplingProfiler:
+    """
+    Profileur statistique à budget de surcoût borné
+
+    Le temps passé à relever les piles (pendant lequel le GIL est tenu) est
+    mesuré en continu. S'il dépasse le budget, l'intervalle d'échantillonnage
+    est doublé ; si le budget reste dépassé à l'intervalle maximal, la session
+    est arrêtée.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tracked = {}
+        self._labels = {}
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._stacks = {}
+        self._session = None
+        self._last_result = None
+        self._excluded_endpoints = set()
+
+    def init_app(self, app, excluded_endpoints=()):
+        """
+        Suivre les threads de requête Flask pour les échantillonner
+
+        Args:
+            app: Application Flask
+            excluded_endpoints: Endpoints à ne pas compter (ex: ceux qui pilotent le profileur)
+        """
+        self._excluded_endpoints = set(excluded_endpoints)
+
+        @app.before_request
+        def track_request_thread():
+            if self._session is None or request.endpoint in self._excluded_endpoints:
+                return
+            with self._lock:
+                self._tracked[threading.get_ident()] = self._tracked.get(threading.get_ident(), 0) + 1
+
+        @app.teardown_request
+        def untrack_request_thread(exc):
+            if self._session is None or request.endpoint in self._excluded_endpoints:
+                return
+            self._untrack(threading.get_ident())
+            self._count_request()
+
+    @contextmanager
+    def tracked_thread(self):
+        """Inclure le thread courant dans l'échantillonnage (ex: threads de travail hors requête)"""
+        ident = threading.get_ident()
+        with self._lock:
+            self._tracked[ident] = self._tracked.get(ident, 0) + 1
+        try:
+            yield
+        finally:
+            self._untrack(ident)
+
+    def _untrack(self, ident):
+        with self._lock:
+            remaining = self._tracked.get(ident, 0) - 1
+            if remaining > 0:
+                self._tracked[ident] = remaining
+            else:
+                self._tracked.pop(ident, None)
+
+    def _count_request(self):
+        with self._lock:
+            session = self._session
+            if session is None:
+                return
+            session['requests'] += 1
+            if session['max_requests'] and session['requests'] >= session['max_requests']:
+                session['stop_reason'] = 'max_requests'
+                self._stop_event.set()
+
+    def start(self, duration_seconds=30, max_requests=None, interval_ms=10, overhead_budget_percent=1.0):
+        """
+        Démarrer une session de profilage
+
+        Args:
+            duration_seconds: Durée maximale de la session
+            max_requests: Arrêt après ce nombre de requêtes traitées (optionnel)
+            interval_ms: Intervalle initial entre deux échantillons
+            overhead_budget_percent: Part maximale du temps consacrée à l'échantillonnage
+
+        Raises:
+            ProfilerBusyError: Si une session est déjà en cours
+        """
+        duration_seconds = min(max(float(duration_seconds), 1.0), MAX_DURATION_SECONDS)
+        interval_ms = min(max(float(interval_ms), MIN_INTERVAL_MS), MAX_INTERVAL_MS)
+        overhead_budget_percent = min(max(float(overhead_budget_percent), 0.1), MAX_OVERHEAD_PERCENT)
+        if max_requests is not None:
+            max_requests = min(max(int(max_requests), 1), MAX_REQUESTS)
+
+        with self._lock:
+            if self._session is not None:
+                raise ProfilerBusyError('Une session de profilage est déjà en cours sur ce worker')
+
+            self._stacks = {}
+            self._stop_event = threading.Event()
+            self._session = {
+                'worker': os.getpid(),
+                'started_at': time.time(),
+                'duration_seconds': duration_seconds,
+                'max_requests': max_requests,
+                'interval_ms': interval_ms,
+                'overhead_budget_percent': overhead_budget_percent,
+                'requests': 0,
+                'samples': 0,
+                'sampling_seconds': 0.0,
+                'truncated_samples': 0,
+                'stop_reason': None,
+            }
+            self._last_result = None
+            self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+            self._thread.start()
+
+        return self.status()
+
+    def stop(self, reason='manual'):
+        """Arrêter la session en cours et attendre la fin de l'échantillonnage"""
+        with self._lock:
+            session = self._session
+            thread = self._thread
+            if session is not None and not session['stop_reason']:
+                session['stop_reason'] = reason
+        self._stop_event.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        return self.status()
+
+    def _run(self):
+        session = self._session
+        own_ident = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + session['duration_seconds']
+        interval = session['interval_ms'] / 1000.0
+        budget = session['overhead_budget_percent'] / 100.0
+
+        while not self._stop_event.wait(interval):
+            now = time.perf_counter()
+            if now >= deadline:
+                session['stop_reason'] = session['stop_reason'] or 'duration'
+                break
+
+            sample_start = time.perf_counter()
+            self._sample(session, own_ident)
+            session['sampling_seconds'] += time.perf_counter() - sample_start
+
+            elapsed = time.perf_counter() - started
+            if elapsed > 0 and session['sampling_seconds'] / elapsed > budget:
+                if interval * 1000 >= MAX_INTERVAL_MS:
+                    session['stop_reason'] = 'overhead_budget'
+                    break
+                interval = min(interval * 2, MAX_INTERVAL_MS / 1000.0)
+                session['interval_ms'] = interval * 1000
+
+        with self._lock:
+            session['ended_at'] = time.time()
+            session['stop_reason'] = session['stop_reason'] or 'manual'
+            self._last_result = (dict(session), self._stacks)
+            self._session = None
+            self._tracked = {}
+
+    def _sample(self, session, own_ident):
+        with self._lock:
+            idents = list(self._tracked)
+        if not idents:
+            return
+
+        frames = sys._current_frames()
+        for ident in idents:
+            if ident == own_ident:
+                continue
+            frame = frames.get(ident)
+            if frame is None:
+                continue
+
+            labels = []
+            depth = 0
+            while frame is not None and depth < MAX_STACK_DEPTH:
+                labels.append(self._label(frame.f_code))
+                frame = frame.f_back
+                depth += 1
+            labels.reverse()
+            stack = ';'.join(labels)
+
+            if stack not in self._stacks and len(self._stacks) >= MAX_DISTINCT_STACKS:
+                session['truncated_samples'] += 1
+                stack = '[pile tronquée]'
+            self._stacks[stack] = self._stacks.get(stack, 0) + 1
+            session['samples'] += 1
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            marker = 'site-packages' + os.sep
+            if marker in filename:
+                filename = filename.split(marker, 1)[1]
+            elif filename.startswith(_STDLIB_DIR):
+                filename = filename[len(_STDLIB_DIR):]
+            elif filename.startswith(_PROJECT_ROOT):
+                filename = os.path.relpath(filename, _PROJECT_ROOT)
+            label = f'{filename}:{code.co_name}'.replace(';', ':').replace(' ', '_')
+            self._labels[code] = label
+        return label
+
+    def status(self):
+        """Retourner l'état de la session en cours ou de la dernière session"""
+        with self._lock:
+            if self._session is not None:
+                return {'running': True, 'session': dict(self._session)}
+            last = self._last_result
+            return {
+                'running': False,
+                'worker': os.getpid(),
+                'session': last[0] if last else None,
+            }
+
+    def collapsed_stacks(self):
+        """
+        Retourner les piles de la dernière session au format « collapsed »
+
+        Chaque ligne contient les cadres de la racine vers la feuille séparés
+        par des points-virgules, suivis du nombre d'échantillons.
+        """
+        with self._lock:
+            last = self._last_result
+            stacks = dict(last[1]) if last else {}
+        lines = [f'{stack} {count}' for stack, count in sorted(stacks.items(), key=lambda item: -item[1])]
+        return '\n'.join(lines) + ('\n' if lines else '')
+
+
+profiler = SamplingProfiler()
@@ -0,0 +1,329 @@
+"""
+Pool de sessions SMTP sortantes par configuration mail
+
+Ouvrir une connexion, négocier STARTTLS (ou TLS implicite) puis s'authentifier
+coûte plusieurs allers-retours ; les sessions authentifiées sont donc conservées
+par mail_configs.id (au plus SMTP_POOL_SIZE inactives) et réutilisées :
+- une session inactive depuis plus de SMTP_IDLE_TIMEOUT secondes est fermée
+  (les serveurs coupent d'eux-mêmes les connexions silencieuses) ;
+- avant réutilisation, un NOOP vérifie qu'elle répond encore ;
+- une session est renouvelée après SMTP_MAX_MESSAGES_PER_SESSION messages ;
+- si une session réutilisée est coupée pendant l'envoi, le message est
+  renvoyé une fois sur une nouvelle connexion ;
+- la modification de l'hôte, du port, des identifiants ou du mode TLS d'une
+  configuration invalide ses sessions.
+
+Les sessions et compteurs sont propres à chaque worker gunicorn.
+"""
+import os
+import smtplib
+import threading
+import time
+from typing import Dict, List, Tuple
+from .request_metrics import _escape
+
+SMTP_POOL_SIZE = int(os.environ.get('SMTP_POOL_SIZE', 2))
+SMTP_IDLE_TIMEOUT = int(os.environ.get('SMTP_IDLE_TIMEOUT', 60))
+SMTP_MAX_MESSAGES_PER_SESSION = int(os.environ.get('SMTP_MAX_MESSAGES_PER_SESSION', 100))
+SMTP_TIMEOUT = 30
+
+# Coupures de connexion : la session est abandonnée (et le message renvoyé si elle était réutilisée)
+DISCONNECT_ERRORS = (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError)
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """
+    Refus définitif du message (réponse 5xx) : le renvoyer n'y changerait rien
+    
+    Les échecs d'authentification restent temporaires, la configuration pouvant
+    être corrigée entre deux tentatives.
+    """
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPAuthenticationError):
+        return False
+    return isinstance(error, smtplib.SMTPResponseException) and error.smtp_code >= 500
+
+
+def _signature(config: Dict) -> Tuple:
+    return (config['smtp_host'], config['smtp_port'], config['smtp_username'],
+            config['smtp_password'], bool(config['smtp_use_tls']))
+
+
+class SmtpSession:
+    """Connexion SMTP authentifiée et son usage"""
+    
+    def __init__(self, server: smtplib.SMTP):
+        self.server = server
+        self.messages = 0
+        self.last_used = time.monotonic()
+        self.reused = False
+    
+    def close(self):
+        try:
+            self.server.quit()
+        except Exception:
+            try:
+                self.server.close()
+            except Exception:
+                pass
+
+
+class ConfigSessions:
+    """Sessions inactives et compteurs d'une configuration mail"""
+    
+    def __init__(self, config_id: int, signature: Tuple):
+        self.config_id = config_id
+        self.signature = signature
+        self.idle: List[SmtpSession] = []
+        self.connections = 0
+        self.reuses = 0
+        self.stale = 0
+        self.resends = 0
+        self.messages = 0
+        self.failures = 0
+
+
+class SmtpSessionPool:
+    """Sessions SMTP réutilisables, indexées par identifiant de configuration mail"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._configs: Dict[int, ConfigSessions] = {}
+    
+    def init_app(self, app, registry=None):
+        """Exposer les compteurs du pool dans le registre Prometheus"""
+        if registry is not None:
+            registry.register_collector(self.prometheus_lines)
+    
+    def _config_sessions(self, config: Dict) -> Tuple[ConfigSessions, List[SmtpSession]]:
+        """Entrée de la configuration ; renvoie aussi les sessions devenues obsolètes à fermer"""
+        signature = _signature(config)
+        with self._lock:
+            entry = self._configs.get(config['id'])
+            if entry is None or entry.signature != signature:
+                obsolete = entry.idle if entry is not None else []
+                entry = self._configs[config['id']] = ConfigSessions(config['id'], signature)
+                return entry, obsolete
+            return entry, []
+    
+    def _connect(self, config: Dict, entry: ConfigSessions) -> SmtpSession:
+        if config['smtp_use_tls']:
+            server = smtplib.SMTP(config['smtp_host'], config['smtp_port'], timeout=SMTP_TIMEOUT)
+            server.starttls()
+        else:
+            server = smtplib.SMTP_SSL(config['smtp_host'], config['smtp_port'], timeout=SMTP_TIMEOUT)
+        try:
+            server.login(config['smtp_username'], config['smtp_password'])
+        except Exception:
+            server.close()
+            raise
+        with self._lock:
+            entry.connections += 1
+        return SmtpSession(server)
+    
+    def _acquire(self, config: Dict, entry: ConfigSessions, obsolete: List[SmtpSession]) -> SmtpSession:
+        """Reprendre une session inactive valide, sinon en ouvrir une nouvelle"""
+        session = None
+        now = time.monotonic()
+        while session is None:
+            with self._lock:
+                candidate = entry.idle.pop() if entry.idle else None
+            if candidate is None:
+                break
+            if now - candidate.last_used > SMTP_IDLE_TIMEOUT:
+                obsolete.append(candidate)
+                continue
+            try:
+                code, _ = candidate.server.noop()
+            except (smtplib.SMTPException, OSError):
+                code = None
+            if code != 250:
+                with self._lock:
+                    entry.stale += 1
+                obsolete.append(candidate)
+                continue
+            session = candidate
+        
+        for stale_session in obsolete:
+            stale_session.close()
+        
+        if session is None:
+            return self._connect(config, entry)
+        session.reused = True
+        with self._lock:
+            entry.reuses += 1
+        return session
+    
+    def _release(self, entry: ConfigSessions, session: SmtpSession):
+        session.last_used = time.monotonic()
+        with self._lock:
+            # Une entrée remplacée (configuration modifiée) ou retirée ne reçoit plus de sessions
+            keep = (self._configs.get(entry.config_id) is entry
+                    and session.messages < SMTP_MAX_MESSAGES_PER_SESSION
+                    and len(entry.idle) < SMTP_POOL_SIZE)
+            if keep:
+                entry.idle.append(session)
+        if not keep:
+            session.close()
+    
+    def _sendmail(self, config: Dict, entry: ConfigSessions, session: SmtpSession,
+                  from_addr: str, recipients: List[str], message: str) -> Tuple[SmtpSession, Dict]:
+        """
+        Envoyer un message sur la session ; si une session réutilisée a été
+        coupée, la remplacer et renvoyer le message une fois
+        """
+        try:
+            refused = session.server.sendmail(from_addr, recipients, message)
+        except DISCONNECT_ERRORS:
+            session.close()
+            if not session.reused:
+                raise
+            with self._lock:
+                entry.stale += 1
+                entry.resends += 1
+            session = self._connect(config, entry)
+            refused = session.server.sendmail(from_addr, recipients, message)
+        session.messages += 1
+        return session, refused
+    
+    def send(self, config: Dict, from_addr: str, recipients: List[str], message: str) -> Dict:
+        """
+        Envoyer un message via une session du pool
+        
+        Returns:
+            Destinataires refusés par le serveur (les autres ont été acceptés)
+        
+        Raises:
+            smtplib.SMTPException, OSError: Si le message n'a pas pu être envoyé
+        """
+        entry, obsolete = self._config_sessions(config)
+        session = self._acquire(config, entry, obsolete)
+        try:
+            session, refused = self._sendmail(config, entry, session, from_addr, recipients, message)
+        except BaseException:
+            session.close()
+            with self._lock:
+                entry.failures += 1
+            raise
+        with self._lock:
+            entry.messages += 1
+        self._release(entry, session)
+        return refused
+    
+    def send_many(self, config: Dict, from_addr: str, messages: List[Tuple[List[str], str]]) -> List[Dict]:
+        """
+        Envoyer une série de messages sur une même session authentifiée
+        
+        Un message refusé (destinataire, contenu) n'interrompt pas la série ; une
+        coupure de connexion est suivie d'une reconnexion pour les messages
+        restants. Si le serveur est injoignable ou refuse l'authentification, les
+        messages restants échouent sans nouvelle tentative de connexion. La
+        session est renouvelée tous les SMTP_MAX_MESSAGES_PER_SESSION messages.
+        
+        Returns:
+            Un résultat par message : {'success', 'refused', 'error', 'permanent'}
+        """
+        entry, obsolete = self._config_sessions(config)
+        session = None
+        connect_error = None
+        results = []
+        try:
+            for recipients, message in messages:
+                if connect_error is not None:
+                    results.append({'success': False, 'refused': {}, 'error': connect_error, 'permanent': False})
+                    continue
+                try:
+                    if session is None:
+                        session = self._acquire(config, entry, obsolete)
+                        obsolete = []
+                    elif session.messages >= SMTP_MAX_MESSAGES_PER_SESSION:
+                        session.close()
+                        session = self._connect(config, entry)
+                except (smtplib.SMTPException, OSError) as e:
+                    session = None
+                    connect_error = str(e)
+                    with self._lock:
+                        entry.failures += 1
+                    results.append({'success': False, 'refused': {}, 'error': connect_error, 'permanent': False})
+                    continue
+                try:
+                    session, refused = self._sendmail(config, entry, session, from_addr, recipients, message)
+                except (smtplib.SMTPException, OSError) as e:
+                    # Session coupée (ou remplacement impossible) : reconnexion au message suivant
+                    if isinstance(e, DISCONNECT_ERRORS) or session.server.sock is None:
+                        session.close()
+                        session = None
+                    with self._lock:
+                        entry.failures += 1
+                    results.append({'success': False, 'refused': {}, 'error': str(e),
+                                    'permanent': is_permanent_error(e)})
+                    continue
+                with self._lock:
+                    entry.messages += 1
+                results.append({'success': True, 'refused': refused, 'error': None, 'permanent': False})
+        except BaseException:
+            if session is not None:
+                session.close()
+            raise
+        if session is not None:
+            self._release(entry, session)
+        return results
+    
+    def discard(self, config_id: int):
+        """Fermer les sessions d'une configuration (modifiée ou supprimée)"""
+        with self._lock:
+            entry = self._configs.pop(config_id, None)
+        for session in (entry.idle if entry else []):
+            session.close()
+    
+    def reset(self):
+        """Fermer toutes les sessions et réinitialiser les compteurs"""
+        with self._lock:
+            entries, self._configs = list(self._configs.values()), {}
+        for entry in entries:
+            for session in entry.idle:
+                session.close()
+    
+    def status(self) -> Dict:
+        """Sessions et compteurs par configuration mail (worker courant)"""
+        now = time.monotonic()
+        with self._lock:
+            configs = [{
+                'config_id': config_id,
+                'host': entry.signature[0],
+                'idle_sessions': len(entry.idle),
+                'oldest_idle_seconds': round(max((now - s.last_used for s in entry.idle), default=0), 1),
+                'connections': entry.connections,
+                'reuses': entry.reuses,
+                'stale': entry.stale,
+                'resends': entry.resends,
+                'messages': entry.messages,
+                'failures': entry.failures,
+            } for config_id, entry in sorted(self._configs.items())]
+        return {'worker': os.getpid(), 'configs': configs}
+    
+    def prometheus_lines(self):
+        """Compteurs par configuration mail au format texte Prometheus"""
+        worker = os.getpid()
+        status = self.status()['configs']
+        lines = []
+        for key, kind, help_text in (
+            ('connections', 'counter', 'Connexions SMTP ouvertes et authentifiées'),
+            ('reuses', 'counter', 'Sessions SMTP réutilisées depuis le pool'),
+            ('stale', 'counter', 'Sessions SMTP écartées car coupées par le serveur'),
+            ('resends', 'counter', 'Messages renvoyés après la coupure d\'une session réutilisée'),
+            ('messages', 'counter', 'Messages acceptés par le serveur SMTP'),
+            ('failures', 'counter', 'Messages non envoyés'),
+            ('idle_sessions', 'gauge', 'Sessions SMTP inactives dans le pool'),
+        ):
+            metric = f'guestadmission_smtp_{key}' + ('_total' if kind == 'counter' else '')
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for config in status:
+                labels = f'config_id="{config["config_id"]}",host="{_escape(config["host"])}",worker="{worker}"'
+                lines.append(f'{metric}{{{labels}}} {config[key]}')
+        return lines
+
+
+smtp_pool = SmtpSessionPool()
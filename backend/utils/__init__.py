@@ -2,6 +2,7 @@
 Utilitaires pour l'application
 """
 from .serializers import serialize_row, serialize_rows
-from .formatters import format_currency, format_date, format_numero_sejour
+from .formatters import format_currency, format_date, format_numero_sejour, normalize_search_text
 
-__all__ = ['serialize_row', 'serialize_rows', 'format_currency', 'format_date', 'format_numero_sejour']
+__all__ = ['serialize_row', 'serialize_rows', 'format_currency', 'format_date', 'format_numero_sejour',
+           'normalize_search_text']
@@ -1,6 +1,8 @@
 """
 Utilitaires pour le formatage des données
 """
+import re
+import unicodedata
 from datetime import datetime
 from typing import Optional
 
@@ -35,3 +37,12 @@ def format_numero_sejour(format_template: str, sequence: int) -> str:
     numero = numero.replace('{DD}', now.strftime('%d'))
     numero = numero.replace('{NUM}', str(sequence).zfill(4))
     return numero
+
+
+def normalize_search_text(text: Optional[str]) -> str:
+    """Normaliser un texte pour la recherche (sans accents ni casse, ponctuation remplacée par des espaces)"""
+    if not text:
+        return ''
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.split(r'[\W_]+', stripped)).strip()
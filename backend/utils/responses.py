@@ -0,0 +1,24 @@
+"""
+Utilitaires pour les réponses HTTP pré-sérialisées
+"""
+from flask import Response, request
+
+
+def payload_response(payload, max_age: int, public: bool = False, mimetype: str = 'application/json'):
+    """
+    Servir un corps pré-sérialisé (body, gzipped, etag) avec ETag et, si accepté, en gzip
+    
+    Le client qui renvoie l'ETag reçoit une réponse 304 sans corps.
+    """
+    use_gzip = request.accept_encodings['gzip'] > 0
+    response = Response(payload['gzipped'] if use_gzip else payload['body'], mimetype=mimetype)
+    if use_gzip:
+        response.headers['Content-Encoding'] = 'gzip'
+    response.headers['Vary'] = 'Accept-Encoding'
+    response.set_etag(payload['etag'] + ('-gz' if use_gzip else ''))
+    if public:
+        response.cache_control.public = True
+    else:
+        response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
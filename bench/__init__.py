@@ -0,0 +1,7 @@
+"""
+Banc de performance de l'API HTTP
+
+    python -m bench.seed --scale 2                 # Générer un jeu de données
+    python -m bench.runner run --boot --duration 60 # Lancer les parcours utilisateurs
+    python -m bench.runner compare bench/baselines/main.json bench/results/courant.json
+"""
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Banc de l'autocomplétion des villes : parcours linéaire historique contre CityIndex
+
+Génère un export de style GeoNames (tabulations, population) de façon
+déterministe, construit l'index (durée, pic mémoire) puis mesure la latence
+des recherches (p50, p99) sur un mélange de préfixes courts et longs, de
+recherches accentuées et de sous-chaînes.
+
+Usage:
+    python -m bench.city_index
+    python -m bench.city_index --cities 25000 200000 --queries 2000
+"""
+import argparse
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import datetime
+
+from backend.services.reference_data import CityIndex, read_cities
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GENERATED_DIR = os.path.join(ROOT_DIR, 'bench', 'fixtures', 'cities', 'generated')
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+
+SYLLABLES = ('sa', 'ma', 'ra', 'ka', 'ta', 'be', 'ne', 'lé', 'fè', 'ou', 'al', 'el', 'ji', 'da', 'za',
+             'on', 'an', 'ville', 'bourg', 'mont', 'san', 'to', 'ri', 'no', 'ça', 'ho', 'ka', 'ïs')
+PREFIXES = ('', '', '', '', 'Saint-', 'San ', 'El ', 'Le ', 'Béni ', 'Sidi ', 'Port ')
+COUNTRIES = ('MA', 'FR', 'ES', 'IT', 'DE', 'US', 'BR', 'IN', 'CN', 'SN', 'CI', 'TN', 'DZ', 'EG', 'PT')
+
+
+def generate_cities(path, count, seed=42):
+    """Écrire un export GeoNames déterministe (colonnes 1: nom, 8: pays, 14: population)"""
+    rng = random.Random(f'{seed}:{count}')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        for index in range(count):
+            name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+            name = rng.choice(PREFIXES) + name
+            population = int(rng.paretovariate(1.2) * 1000)
+            fields = [str(index), name, name, '', '0', '0', 'P', 'PPL', rng.choice(COUNTRIES),
+                      '', '', '', '', '', str(population)]
+            f.write('\t'.join(fields) + '\n')
+
+
+class LinearSearch:
+    """Chemin historique : sous-chaîne en minuscules sur toutes les villes, 50 premières"""
+
+    def __init__(self, cities):
+        self.cities = [(name, country) for country, name, _ in cities]
+
+    def search(self, query):
+        query = query.lower()
+        results = []
+        for name, country in self.cities:
+            if query in name.lower():
+                results.append({'name': name, 'country_code': country})
+        return results[:50]
+
+
+def _queries(index, count, seed):
+    rng = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        name = rng.choice(index.names)
+        kind = rng.random()
+        if kind < 0.5:
+            queries.append(name[:rng.randint(1, 3)])
+        elif kind < 0.85:
+            queries.append(name[:rng.randint(4, max(4, len(name)))])
+        else:
+            start = rng.randrange(max(1, len(name) - 3))
+            queries.append(name[start:start + 4])
+    return queries
+
+
+def _latencies(search, queries):
+    timings = []
+    for query in queries:
+        started = time.perf_counter()
+        search(query)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+    return {
+        'p50_ms': round(timings[len(timings) // 2] * 1000, 4),
+        'p99_ms': round(timings[int(len(timings) * 0.99)] * 1000, 4),
+    }
+
+
+def bench_dataset(path, queries_count, seed):
+    cities = list(read_cities(path))
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    index = CityIndex(cities)
+    build_s = time.perf_counter() - started
+    index_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    queries = _queries(index, queries_count, seed)
+    linear = LinearSearch(cities)
+    return {
+        'dataset': os.path.relpath(path, ROOT_DIR),
+        'cities': len(index.names),
+        'build_seconds': round(build_s, 3),
+        'index_memory_bytes': index_bytes,
+        'linear': _latencies(linear.search, queries),
+        'index': _latencies(index.search, queries),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banc de l\'autocomplétion des villes')
+    parser.add_argument('--cities', type=int, nargs='+', default=[25000, 200000],
+                        help='Tailles des jeux générés (défaut: 25000 200000)')
+    parser.add_argument('--queries', type=int, default=2000, help='Recherches mesurées par jeu (défaut: 2000)')
+    parser.add_argument('--seed', type=int, default=42, help='Graine (défaut: 42)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (défaut: bench/results/city_index-<date>.json)')
+    args = parser.parse_args()
+
+    datasets = [os.path.join(ROOT_DIR, 'backend', 'data', 'villes.json')]
+    for count in args.cities:
+        path = os.path.join(GENERATED_DIR, f'cities_{count}_seed{args.seed}.txt')
+        if not os.path.exists(path):
+            print(f"🛠️  Génération de {os.path.relpath(path, ROOT_DIR)}...")
+            generate_cities(path, count, seed=args.seed)
+        datasets.append(path)
+
+    results = []
+    print(f"{'Jeu':<36} {'Villes':>8} {'Index':>8} {'Mémoire':>9} {'linéaire p50/p99':>18} {'index p50/p99':>16}")
+    for path in datasets:
+        result = bench_dataset(path, args.queries, args.seed)
+        results.append(result)
+        print(f"{os.path.basename(path):<36} {result['cities']:>8} {result['build_seconds']:>7.2f}s "
+              f"{result['index_memory_bytes'] / 1048576:>7.1f}Mo "
+              f"{result['linear']['p50_ms']:>8.3f}/{result['linear']['p99_ms']:<8.3f}ms "
+              f"{result['index']['p50_ms']:>6.3f}/{result['index']['p99_ms']:<6.3f}ms")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'city_index-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Rapport: {os.path.relpath(output, ROOT_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
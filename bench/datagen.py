@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Générateur de jeux de données multi-tenant à l'échelle de la production
+
+Les lignes sont produites à la volée et chargées par `COPY ... FROM STDIN`,
+par lots répartis sur plusieurs processus. Les index secondaires des tables
+chargées sont supprimés avant le chargement puis reconstruits en parallèle.
+
+Chaque lot est généré de façon déterministe à partir de (graine, table, lot) :
+les tables filles recalculent les séjours de leur lot au lieu de les relire
+en base, ce qui permet de charger plusieurs tables simultanément.
+
+Usage:
+    python -m bench.datagen --tenants 20 --etablissements 3 --chambres 15 --sejours 50000 --workers 8
+    python -m bench.datagen --purge
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+
+import psycopg2
+from psycopg2.extras import RealDictCursor
+from werkzeug.security import generate_password_hash
+
+from .seed import EXTRAS, NOMS, PAYS, PRENOMS
+
+TENANT_PREFIX = 'Gen'
+USERNAME_PREFIX = 'gen_admin_'
+DEFAULT_PASSWORD = 'gen123'
+
+# Saisonnalité des arrivées (tourisme au Maroc : printemps, automne et fêtes de fin d'année)
+MONTH_WEIGHTS = (0.8, 0.9, 1.2, 1.45, 1.3, 0.9, 0.75, 0.85, 1.1, 1.4, 1.0, 1.35)
+WEEKDAY_WEIGHTS = (0.8, 0.8, 0.9, 1.0, 1.35, 1.4, 0.95)
+YEARLY_GROWTH = 0.15
+STAY_NIGHTS = (1, 2, 3, 4, 5, 6, 7, 10, 14)
+STAY_NIGHTS_WEIGHTS = (12, 22, 20, 14, 9, 6, 10, 4, 3)
+PAYS_WEIGHTS = (22, 30, 10, 9, 9, 7, 6, 7)
+
+ROOM_TYPES = (('Simple', 1, 450), ('Double', 2, 650), ('Double', 2, 800), ('Suite', 3, 1400), ('Familiale', 4, 1100))
+CANCELLED_RATIO = 0.04
+CLOSED_RATIO = 0.9
+ACTIVITY_ROUTES = (
+    ('view_dashboard', '/dashboard', 'GET', 200),
+    ('view_sejours_list', '/api/sejours', 'GET', 200),
+    ('view_sejour_detail', '/api/sejours/{id}', 'GET', 200),
+    ('create_sejour', '/api/sejours', 'POST', 201),
+    ('view_extras', '/api/sejours/{id}/extras', 'GET', 200),
+    ('view_statistics', '/api/statistics/global', 'GET', 200),
+    ('view_clients_list', '/api/clients', 'GET', 200),
+    ('create_or_update', '/api/sejours/{id}/close', 'POST', 200),
+)
+ACTIVITY_WEIGHTS = (20, 25, 25, 5, 10, 8, 5, 2)
+
+# Tables chargées par vagues : une table n'est chargée qu'après celles qu'elle référence
+WAVES = (
+    ('tenant_accounts',),
+    ('etablissements',),
+    ('users', 'chambres', 'extras'),
+    ('user_etablissements', 'reservations', 'activity_logs'),
+    ('personnes', 'reservations_chambres', 'sejours_extras'),
+)
+EXPLICIT_ID_TABLES = ('tenant_accounts', 'etablissements', 'users', 'chambres', 'extras', 'reservations')
+
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+        sys.exit(1)
+    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+
+
+class Layout:
+    """
+    Plan de génération : volumes et plages d'identifiants réservées
+
+    Les identifiants des tables parentes sont attribués de façon contiguë
+    (ex: séjours de l'établissement i = reservations_base + i * sejours ...),
+    ce qui permet à chaque lot de retrouver ses parents par calcul.
+    """
+
+    def __init__(self, tenants, etablissements_per_tenant, chambres, sejours, logs, years, seed, id_bases, password_hash):
+        self.tenants = tenants
+        self.etablissements_per_tenant = etablissements_per_tenant
+        self.etablissements = tenants * etablissements_per_tenant
+        self.chambres = chambres
+        self.sejours_per_etablissement = sejours
+        self.sejours = self.etablissements * sejours
+        self.logs_per_etablissement = logs
+        self.logs = self.etablissements * logs
+        self.seed = seed
+        self.id_bases = id_bases
+        self.password_hash = password_hash
+
+        today = date.today()
+        self.today = today
+        self.first_day = date(today.year - years, today.month, 1)
+        self.last_day = today + timedelta(days=180)
+        self.days = []
+        weights = []
+        for offset in range((self.last_day - self.first_day).days + 1):
+            day = self.first_day + timedelta(days=offset)
+            growth = 1 + YEARLY_GROWTH * (day - self.first_day).days / 365
+            self.days.append(day)
+            weights.append(MONTH_WEIGHTS[day.month - 1] * WEEKDAY_WEIGHTS[day.weekday()] * growth)
+        self.day_cum_weights = list(accumulate(weights))
+
+    def units(self, table):
+        """Nombre d'unités de génération d'une table (découpées en lots)"""
+        if table in ('tenant_accounts', 'users'):
+            return self.tenants
+        if table in ('etablissements', 'user_etablissements', 'chambres', 'extras'):
+            return self.etablissements
+        if table == 'activity_logs':
+            return self.logs
+        return self.sejours
+
+    def tenant_id(self, tenant_index):
+        return self.id_bases['tenant_accounts'] + tenant_index
+
+    def user_id(self, tenant_index):
+        return self.id_bases['users'] + tenant_index
+
+    def etablissement_id(self, etablissement_index):
+        return self.id_bases['etablissements'] + etablissement_index
+
+    def chambre_id(self, etablissement_index, number):
+        return self.id_bases['chambres'] + etablissement_index * self.chambres + number
+
+    def extra_id(self, etablissement_index, number):
+        return self.id_bases['extras'] + etablissement_index * len(EXTRAS) + number
+
+    def sejour_id(self, offset):
+        return self.id_bases['reservations'] + offset
+
+
+def _rng(layout, table, start):
+    return random.Random(f'{layout.seed}:{table}:{start}')
+
+
+def _room(layout, etablissement_index, number):
+    """Caractéristiques déterministes d'une chambre : (nom, type, capacité, prix)"""
+    room_type, capacite, prix = ROOM_TYPES[(etablissement_index * 7 + number * 3) % len(ROOM_TYPES)]
+    return f'Chambre {number + 1}', room_type, capacite, prix + 50 * (etablissement_index % 4)
+
+
+def _sejours(layout, start, stop):
+    """
+    Séjours des positions [start, stop) : arrivées saisonnières, durée,
+    chambre, statut. Recalculé à l'identique par les tables filles.
+    """
+    rng = _rng(layout, 'reservations', start)
+    for offset in range(start, stop):
+        etablissement_index = offset // layout.sejours_per_etablissement
+        number = rng.randrange(layout.chambres)
+        _, _, capacite, prix = _room(layout, etablissement_index, number)
+        arrivee = rng.choices(layout.days, cum_weights=layout.day_cum_weights)[0]
+        nuits = rng.choices(STAY_NIGHTS, STAY_NIGHTS_WEIGHTS)[0]
+        depart = arrivee + timedelta(days=nuits)
+        draw = rng.random()
+        if draw < CANCELLED_RATIO:
+            statut = 'annulée'
+        elif depart < layout.today and draw < CLOSED_RATIO:
+            statut = 'closed'
+        else:
+            statut = 'active'
+        yield {
+            'id': layout.sejour_id(offset),
+            'etablissement_index': etablissement_index,
+            'chambre_id': layout.chambre_id(etablissement_index, number),
+            'capacite': capacite,
+            'prix': prix,
+            'arrivee': arrivee,
+            'depart': depart,
+            'nuits': nuits,
+            'statut': statut,
+        }
+
+
+def gen_tenant_accounts(layout, start, stop):
+    for tenant_index in range(start, stop):
+        yield (
+            layout.tenant_id(tenant_index), f'{TENANT_PREFIX} {layout.tenant_id(tenant_index)}',
+            layout.user_id(tenant_index), 'Données générées par bench/datagen.py', True
+        )
+
+
+def gen_etablissements(layout, start, stop):
+    rng = _rng(layout, 'etablissements', start)
+    villes = ('Marrakech', 'Essaouira', 'Fès', 'Chefchaouen', 'Agadir', 'Ouarzazate')
+    for etablissement_index in range(start, stop):
+        etablissement_id = layout.etablissement_id(etablissement_index)
+        yield (
+            etablissement_id, layout.tenant_id(etablissement_index // layout.etablissements_per_tenant),
+            f'{TENANT_PREFIX} Riad {etablissement_id}', 'Maroc', rng.choice(villes), 'MAD', 2.5, 20.0,
+            rng.choice((10.0, 15.0, 18.0)), True
+        )
+
+
+def gen_users(layout, start, stop):
+    for tenant_index in range(start, stop):
+        user_id = layout.user_id(tenant_index)
+        yield (
+            user_id, f'{USERNAME_PREFIX}{user_id}', layout.password_hash, 'Admin', f'Tenant {user_id}',
+            f'{USERNAME_PREFIX}{user_id}@example.com', 'admin',
+            layout.etablissement_id(tenant_index * layout.etablissements_per_tenant)
+        )
+
+
+def gen_user_etablissements(layout, start, stop):
+    for etablissement_index in range(start, stop):
+        yield (
+            layout.user_id(etablissement_index // layout.etablissements_per_tenant),
+            layout.etablissement_id(etablissement_index), 'admin', True
+        )
+
+
+def gen_chambres(layout, start, stop):
+    for etablissement_index in range(start, stop):
+        for number in range(layout.chambres):
+            nom, room_type, capacite, prix = _room(layout, etablissement_index, number)
+            yield (
+                layout.chambre_id(etablissement_index, number), layout.etablissement_id(etablissement_index),
+                nom, room_type, capacite, prix, 'disponible'
+            )
+
+
+def gen_extras(layout, start, stop):
+    for etablissement_index in range(start, stop):
+        for number, (nom, prix, unite) in enumerate(EXTRAS):
+            yield (
+                layout.extra_id(etablissement_index, number), layout.etablissement_id(etablissement_index),
+                nom, prix, unite, True
+            )
+
+
+def gen_reservations(layout, start, stop):
+    for sejour in _sejours(layout, start, stop):
+        facture = sejour['prix'] * sejour['nuits']
+        closed_at = (
+            datetime.combine(sejour['depart'], datetime.min.time()) + timedelta(hours=11)
+            if sejour['statut'] == 'closed' else None
+        )
+        yield (
+            sejour['id'], layout.etablissement_id(sejour['etablissement_index']), f'GEN-{sejour["id"]:09d}',
+            sejour['arrivee'], sejour['depart'], sejour['nuits'], facture, round(facture * 0.15, 2),
+            2.5 * sejour['nuits'] * sejour['capacite'], sejour['statut'], closed_at,
+            datetime.combine(sejour['arrivee'] - timedelta(days=14), datetime.min.time())
+        )
+
+
+def gen_reservations_chambres(layout, start, stop):
+    for sejour in _sejours(layout, start, stop):
+        yield sejour['id'], sejour['chambre_id']
+
+
+def gen_personnes(layout, start, stop):
+    rng = _rng(layout, 'personnes', start)
+    for sejour in _sejours(layout, start, stop):
+        for index in range(rng.randint(1, sejour['capacite'])):
+            prenom, nom = rng.choice(PRENOMS), rng.choice(NOMS)
+            yield (
+                sejour['id'], sejour['chambre_id'], index == 0, nom, prenom,
+                f'{prenom.lower()}.{nom.lower()}.{sejour["id"]}.{index}@example.com' if index == 0 else None,
+                rng.choices(PAYS, PAYS_WEIGHTS)[0],
+                date(rng.randint(1950, 2005), rng.randint(1, 12), rng.randint(1, 28))
+            )
+
+
+def gen_sejours_extras(layout, start, stop):
+    rng = _rng(layout, 'sejours_extras', start)
+    for sejour in _sejours(layout, start, stop):
+        if sejour['statut'] == 'annulée':
+            continue
+        for _ in range(rng.choices((0, 1, 2, 3, 5), (30, 30, 20, 12, 8))[0]):
+            number = rng.randrange(len(EXTRAS))
+            prix = EXTRAS[number][1]
+            quantite = rng.randint(1, max(sejour['nuits'], 1))
+            ajout = sejour['arrivee'] + timedelta(days=rng.randrange(sejour['nuits']))
+            yield (
+                sejour['id'], layout.extra_id(sejour['etablissement_index'], number),
+                quantite, prix, prix * quantite, datetime.combine(ajout, datetime.min.time()) + timedelta(hours=20)
+            )
+
+
+def gen_activity_logs(layout, start, stop):
+    rng = _rng(layout, 'activity_logs', start)
+    span = (layout.today - layout.first_day).days * 86400
+    first = datetime.combine(layout.first_day, datetime.min.time())
+    for offset in range(start, stop):
+        etablissement_index = offset // layout.logs_per_etablissement
+        user_id = layout.user_id(etablissement_index // layout.etablissements_per_tenant)
+        action, route, method, status_code = rng.choices(ACTIVITY_ROUTES, ACTIVITY_WEIGHTS)[0]
+        sejour_offset = etablissement_index * layout.sejours_per_etablissement + rng.randrange(layout.sejours_per_etablissement)
+        yield (
+            user_id, f'{USERNAME_PREFIX}{user_id}', action,
+            route.replace('{id}', str(layout.sejour_id(sejour_offset))), method,
+            f'10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}', 'Mozilla/5.0 (bench)',
+            status_code, layout.etablissement_id(etablissement_index), round(rng.lognormvariate(3.2, 0.8), 2),
+            first + timedelta(seconds=rng.randrange(span))
+        )
+
+
+TABLES = {
+    'tenant_accounts': (
+        ('id', 'nom_compte', 'primary_admin_user_id', 'notes', 'actif'), gen_tenant_accounts),
+    'etablissements': (
+        ('id', 'tenant_account_id', 'nom_etablissement', 'pays', 'ville', 'devise',
+         'taux_taxe_sejour', 'taux_tva', 'taux_charge_plateforme', 'actif'), gen_etablissements),
+    'users': (
+        ('id', 'username', 'password_hash', 'nom', 'prenom', 'email', 'role', 'etablissement_id'), gen_users),
+    'user_etablissements': (
+        ('user_id', 'etablissement_id', 'role', 'is_primary_admin'), gen_user_etablissements),
+    'chambres': (
+        ('id', 'etablissement_id', 'nom', 'type_chambre', 'capacite', 'prix_par_nuit', 'statut'), gen_chambres),
+    'extras': (
+        ('id', 'etablissement_id', 'nom', 'prix_unitaire', 'unite', 'actif'), gen_extras),
+    'reservations': (
+        ('id', 'etablissement_id', 'numero_reservation', 'date_arrivee', 'date_depart', 'nombre_jours',
+         'facture_hebergement', 'charge_plateforme', 'taxe_sejour', 'statut', 'closed_at', 'created_at'),
+        gen_reservations),
+    'reservations_chambres': (('reservation_id', 'chambre_id'), gen_reservations_chambres),
+    'personnes': (
+        ('reservation_id', 'chambre_id', 'est_contact_principal', 'nom', 'prenom', 'email', 'pays',
+         'date_naissance'), gen_personnes),
+    'sejours_extras': (
+        ('reservation_id', 'extra_id', 'quantite', 'prix_unitaire', 'montant_total', 'date_ajout'),
+        gen_sejours_extras),
+    'activity_logs': (
+        ('user_id', 'username', 'action', 'route', 'method', 'ip_address', 'user_agent', 'status_code',
+         'etablissement_id', 'duration_ms', 'created_at'), gen_activity_logs),
+}
+
+
+def _copy_value(value):
+    """Encoder une valeur au format texte de COPY"""
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, str):
+        return value.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+    return str(value)
+
+
+class CopyStream:
+    """
+    Objet fichier en lecture seule alimenté par un itérateur de lignes
+
+    Passé à `copy_expert`, il produit le flux COPY au fur et à mesure des
+    lectures sans matérialiser le lot en mémoire.
+    """
+
+    def __init__(self, rows):
+        self._rows = rows
+        self._buffer = bytearray()
+        self.rows = 0
+
+    def read(self, size=-1):
+        while size < 0 or len(self._buffer) < size:
+            lines = []
+            for row in self._rows:
+                lines.append('\t'.join(map(_copy_value, row)))
+                if len(lines) >= 500:
+                    break
+            if not lines:
+                break
+            self.rows += len(lines)
+            self._buffer += ('\n'.join(lines) + '\n').encode('utf-8')
+
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+def copy_chunk(layout, table, start, stop):
+    """Charger le lot [start, stop) d'une table par COPY (exécuté dans un processus de travail)"""
+    columns, generator = TABLES[table]
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute('SET synchronous_commit TO off')
+        stream = CopyStream(generator(layout, start, stop))
+        cur.copy_expert(f'COPY {table} ({", ".join(columns)}) FROM STDIN', stream, size=256 * 1024)
+        conn.commit()
+        return table, stream.rows
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        conn.close()
+
+
+def create_index(definition, maintenance_work_mem):
+    """Reconstruire un index (exécuté dans un processus de travail)"""
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    try:
+        cur.execute('SET maintenance_work_mem TO %s', (maintenance_work_mem,))
+        cur.execute(definition)
+    finally:
+        cur.close()
+        conn.close()
+    return definition
+
+
+def _secondary_indexes(cur, tables):
+    """Index non portés par une contrainte (clé primaire, unicité) sur les tables chargées"""
+    cur.execute('''
+        SELECT ic.relname AS name, pg_get_indexdef(i.indexrelid) AS definition
+        FROM pg_index i
+        JOIN pg_class ic ON ic.oid = i.indexrelid
+        JOIN pg_class t ON t.oid = i.indrelid
+        JOIN pg_namespace n ON n.oid = t.relnamespace
+        LEFT JOIN pg_constraint c ON c.conindid = i.indexrelid
+        WHERE n.nspname = current_schema() AND t.relname = ANY(%s) AND c.oid IS NULL
+        ORDER BY t.relname, ic.relname
+    ''', (list(tables),))
+    return cur.fetchall()
+
+
+def _reserve_id_bases(cur):
+    bases = {}
+    for table in EXPLICIT_ID_TABLES:
+        cur.execute(f'SELECT COALESCE(MAX(id), 0) + 1 AS base FROM {table}')
+        bases[table] = cur.fetchone()['base']
+    return bases
+
+
+def _reset_sequences(cur):
+    for table in EXPLICIT_ID_TABLES:
+        cur.execute(f'''
+            SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT COALESCE(MAX(id), 1) FROM {table}))
+        ''', (table,))
+
+
+def purge():
+    """Supprimer les données d'une génération précédente"""
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        print("🗑️  Suppression des données générées...")
+        cur.execute('''
+            DELETE FROM activity_logs WHERE etablissement_id IN (
+                SELECT e.id FROM etablissements e
+                JOIN tenant_accounts t ON t.id = e.tenant_account_id
+                WHERE t.nom_compte LIKE %s
+            )
+        ''', (f'{TENANT_PREFIX} %',))
+        cur.execute('DELETE FROM users WHERE username LIKE %s', (USERNAME_PREFIX.replace('_', '\\_') + '%',))
+        cur.execute('DELETE FROM tenant_accounts WHERE nom_compte LIKE %s', (f'{TENANT_PREFIX} %',))
+        conn.commit()
+        print("✅ Données générées supprimées")
+    finally:
+        cur.close()
+        conn.close()
+
+
+def generate(tenants, etablissements, chambres, sejours, logs, years=3, workers=4, chunk_size=50000,
+             seed=42, keep_indexes=False, maintenance_work_mem='256MB'):
+    """
+    Générer et charger un jeu de données complet
+
+    Args:
+        tenants: Nombre de comptes clients
+        etablissements: Établissements par compte client
+        chambres: Chambres par établissement
+        sejours: Séjours par établissement
+        logs: Entrées du journal d'activité par établissement
+        years: Profondeur de l'historique en années
+        workers: Nombre de processus de chargement
+        chunk_size: Unités (séjours, entrées de journal...) par lot COPY
+        seed: Graine aléatoire
+        keep_indexes: Conserver les index secondaires pendant le chargement
+        maintenance_work_mem: Mémoire allouée à la reconstruction des index
+    """
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    layout = Layout(
+        tenants, etablissements, chambres, sejours, logs, years, seed,
+        _reserve_id_bases(cur), generate_password_hash(DEFAULT_PASSWORD)
+    )
+    print(f"📦 {layout.tenants} comptes, {layout.etablissements} établissements, "
+          f"{layout.etablissements * chambres} chambres, {layout.sejours} séjours, {layout.logs} entrées de journal "
+          f"({workers} processus, lots de {chunk_size})")
+
+    indexes = [] if keep_indexes else _secondary_indexes(cur, TABLES)
+    for index in indexes:
+        cur.execute(f'DROP INDEX IF EXISTS {index["name"]}')
+    if indexes:
+        print(f"🔧 {len(indexes)} index secondaires supprimés pendant le chargement")
+
+    started = time.perf_counter()
+    totals = {}
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for wave in WAVES:
+                wave_started = time.perf_counter()
+                futures = []
+                for table in wave:
+                    units = layout.units(table)
+                    step = chunk_size if table in ('reservations', 'personnes', 'reservations_chambres',
+                                                   'sejours_extras', 'activity_logs') else max(units, 1)
+                    for start in range(0, units, step):
+                        futures.append(executor.submit(copy_chunk, layout, table, start, min(start + step, units)))
+                for future in futures:
+                    table, rows = future.result()
+                    totals[table] = totals.get(table, 0) + rows
+                print(f"   ✅ {', '.join(f'{t}: {totals.get(t, 0)}' for t in wave)} "
+                      f"({time.perf_counter() - wave_started:.1f} s)")
+
+            _reset_sequences(cur)
+    finally:
+        if indexes:
+            index_started = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                list(executor.map(
+                    create_index, [index['definition'] for index in indexes],
+                    [maintenance_work_mem] * len(indexes)
+                ))
+            print(f"🔧 Index reconstruits ({time.perf_counter() - index_started:.1f} s)")
+
+    for table in TABLES:
+        cur.execute(f'ANALYZE {table}')
+    cur.close()
+    conn.close()
+
+    elapsed = time.perf_counter() - started
+    rows = sum(totals.values())
+    print(f"\n✅ {rows} lignes chargées en {elapsed:.1f} s ({rows / elapsed:.0f} lignes/s)")
+    print(f"   Connexion: {USERNAME_PREFIX}<id> / {DEFAULT_PASSWORD}")
+    return totals
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Générer un jeu de données multi-tenant par COPY')
+    parser.add_argument('--tenants', type=int, default=10, help='Comptes clients (défaut: 10)')
+    parser.add_argument('--etablissements', type=int, default=3, help='Établissements par compte (défaut: 3)')
+    parser.add_argument('--chambres', type=int, default=15, help='Chambres par établissement (défaut: 15)')
+    parser.add_argument('--sejours', type=int, default=20000, help='Séjours par établissement (défaut: 20000)')
+    parser.add_argument('--logs', type=int, default=50000, help='Entrées de journal par établissement (défaut: 50000)')
+    parser.add_argument('--years', type=int, default=3, help='Profondeur de l\'historique (défaut: 3 ans)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help='Processus de chargement')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='Unités par lot COPY (défaut: 50000)')
+    parser.add_argument('--seed', type=int, default=42, help='Graine aléatoire (défaut: 42)')
+    parser.add_argument('--keep-indexes', action='store_true', help='Ne pas différer la construction des index')
+    parser.add_argument('--maintenance-work-mem', default='256MB', help='Mémoire de reconstruction des index')
+    parser.add_argument('--purge', action='store_true', help='Supprimer les données générées puis quitter')
+    args = parser.parse_args()
+
+    if args.purge:
+        purge()
+        return
+
+    generate(
+        tenants=max(args.tenants, 1),
+        etablissements=max(args.etablissements, 1),
+        chambres=max(args.chambres, 1),
+        sejours=max(args.sejours, 1),
+        logs=max(args.logs, 0),
+        years=max(args.years, 1),
+        workers=max(args.workers, 1),
+        chunk_size=max(args.chunk_size, 1000),
+        seed=args.seed,
+        keep_indexes=args.keep_indexes,
+        maintenance_work_mem=args.maintenance_work_mem,
+    )
+
+
+if __name__ == '__main__':
+    main()
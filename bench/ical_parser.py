@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Banc de l'analyseur iCal : icalendar (Calendar.from_ical) contre l'analyseur en flux
+
+Pour chaque flux, mesure le temps d'analyse (meilleur de N passages) et le pic
+mémoire (tracemalloc, passage séparé), et vérifie que les deux chemins
+produisent exactement les mêmes événements.
+
+Les échantillons réels de bench/fixtures/ical/ couvrent les cas particuliers
+(lignes repliées, VALARM, TZID, échappements, BOM). Les gros flux pluriannuels
+sont générés de façon déterministe dans bench/fixtures/ical/generated/.
+
+Usage:
+    python -m bench.ical_parser
+    python -m bench.ical_parser --events 2000 20000 100000 --repeat 3
+"""
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from icalendar import Calendar
+
+from backend.services.ical_parser import iter_vevents
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(ROOT_DIR, 'bench', 'fixtures', 'ical')
+GENERATED_DIR = os.path.join(FIXTURES_DIR, 'generated')
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+
+
+def parse_with_icalendar(path):
+    """Chemin historique : flux entier en mémoire puis arbre de composants icalendar"""
+    with open(path, 'rb') as f:
+        ical_data = Calendar.from_ical(f.read())
+    events = []
+    for component in ical_data.walk():
+        if component.name == "VEVENT":
+            dtstart = component.get('dtstart')
+            dtend = component.get('dtend')
+            if dtstart and dtend:
+                date_debut = dtstart.dt
+                date_fin = dtend.dt
+                if isinstance(date_debut, datetime):
+                    date_debut = date_debut.date()
+                if isinstance(date_fin, datetime):
+                    date_fin = date_fin.date()
+                events.append({
+                    'uid': str(component.get('uid', '')),
+                    'titre': str(component.get('summary', 'Séjour')),
+                    'date_debut': date_debut,
+                    'date_fin': date_fin,
+                    'description': str(component.get('description', ''))
+                })
+    return events
+
+
+def parse_streaming(path):
+    """Analyseur en flux, tel qu'utilisé par CalendarService"""
+    with open(path, 'rb') as f:
+        return list(iter_vevents(f))
+
+
+def count_streaming(path):
+    """Analyseur en flux sans conserver les événements (consommation par lots en production)"""
+    with open(path, 'rb') as f:
+        return sum(1 for _ in iter_vevents(f))
+
+
+def _fold(line):
+    """Replier une ligne à 75 octets (RFC 5545 §3.1)"""
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def generate_feed(path, events, seed=42, years=5):
+    """Écrire un flux pluriannuel déterministe de style Airbnb / Booking"""
+    rng = random.Random(f'{seed}:{events}')
+    start = date(2026, 1, 1) - timedelta(days=365 * years)
+    day_span = 365 * (years + 1)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        f.write('BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//GuestAdmission//Bench iCal//FR\r\n'
+                'CALSCALE:GREGORIAN\r\nMETHOD:PUBLISH\r\n')
+        for index in range(events):
+            arrival = start + timedelta(days=rng.randrange(day_span))
+            departure = arrival + timedelta(days=rng.randint(1, 14))
+            lines = ['BEGIN:VEVENT', f'UID:{seed:x}-{index:08d}-{rng.getrandbits(64):016x}@bench.example']
+            if rng.random() < 0.6:
+                lines += [
+                    f'DTSTART;VALUE=DATE:{arrival:%Y%m%d}',
+                    f'DTEND;VALUE=DATE:{departure:%Y%m%d}',
+                    'SUMMARY:Reserved',
+                    f'DESCRIPTION:Reservation URL: https://www.airbnb.com/hosting/reservations/details/'
+                    f'HM{rng.getrandbits(40):010X}\\nPhone Number (Last 4 Digits): {rng.randrange(10000):04d}',
+                ]
+            else:
+                lines += [
+                    f'DTSTAMP:{arrival:%Y%m%d}T080000Z',
+                    f'DTSTART;TZID=Africa/Casablanca:{arrival:%Y%m%d}T150000',
+                    f'DTEND;TZID=Africa/Casablanca:{departure:%Y%m%d}T110000',
+                    f'SUMMARY:Séjour Booking n°{index}',
+                    'DESCRIPTION:Chambre double\\, vue jardin\\; petit-déjeuner inclus',
+                ]
+                if rng.random() < 0.2:
+                    lines += ['BEGIN:VALARM', 'ACTION:DISPLAY', 'DESCRIPTION:Arrivée', 'TRIGGER:-PT24H', 'END:VALARM']
+            lines.append('END:VEVENT')
+            f.write(''.join(_fold(line) + '\r\n' for line in lines))
+        f.write('END:VCALENDAR\r\n')
+
+
+def _best_time(fn, path, repeat):
+    best = None
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        fn(path)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _peak_memory(fn, path):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn(path)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_feed(path, repeat):
+    """Comparer les deux chemins sur un flux"""
+    legacy_events = parse_with_icalendar(path)
+    streamed_events = parse_streaming(path)
+    if legacy_events != streamed_events:
+        mismatch = next(
+            (pair for pair in zip(legacy_events, streamed_events) if pair[0] != pair[1]),
+            (len(legacy_events), len(streamed_events))
+        )
+        raise AssertionError(f'{os.path.basename(path)}: résultats différents {mismatch!r}')
+
+    legacy_s = _best_time(parse_with_icalendar, path, repeat)
+    streaming_s = _best_time(count_streaming, path, repeat)
+    return {
+        'feed': os.path.relpath(path, ROOT_DIR),
+        'bytes': os.path.getsize(path),
+        'events': len(streamed_events),
+        'icalendar': {
+            'seconds': round(legacy_s, 4),
+            'peak_memory_bytes': _peak_memory(parse_with_icalendar, path),
+        },
+        'streaming': {
+            'seconds': round(streaming_s, 4),
+            'peak_memory_bytes': _peak_memory(count_streaming, path),
+        },
+        'speedup': round(legacy_s / streaming_s, 2) if streaming_s else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banc de l\'analyseur iCal')
+    parser.add_argument('--events', type=int, nargs='+', default=[2000, 20000, 100000],
+                        help='Tailles des flux générés (défaut: 2000 20000 100000)')
+    parser.add_argument('--repeat', type=int, default=3, help='Passages chronométrés par flux (défaut: 3)')
+    parser.add_argument('--seed', type=int, default=42, help='Graine des flux générés (défaut: 42)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (défaut: bench/results/ical_parser-<date>.json)')
+    args = parser.parse_args()
+
+    feeds = sorted(
+        os.path.join(FIXTURES_DIR, name) for name in os.listdir(FIXTURES_DIR) if name.endswith('.ics')
+    )
+    for events in args.events:
+        path = os.path.join(GENERATED_DIR, f'feed_{events}_seed{args.seed}.ics')
+        if not os.path.exists(path):
+            print(f"🛠️  Génération de {os.path.relpath(path, ROOT_DIR)}...")
+            generate_feed(path, events, seed=args.seed)
+        feeds.append(path)
+
+    results = []
+    print(f"{'Flux':<48} {'Ko':>8} {'VEVENT':>8} {'icalendar':>11} {'flux':>9} {'x':>6} "
+          f"{'mém. ical':>11} {'mém. flux':>10}")
+    for path in feeds:
+        result = bench_feed(path, max(args.repeat, 1))
+        results.append(result)
+        print(f"{os.path.basename(path):<48} {result['bytes'] / 1024:>8.0f} {result['events']:>8} "
+              f"{result['icalendar']['seconds']:>10.3f}s {result['streaming']['seconds']:>8.3f}s "
+              f"{result['speedup'] or 0:>6.1f} "
+              f"{result['icalendar']['peak_memory_bytes'] / 1048576:>9.1f}Mo "
+              f"{result['streaming']['peak_memory_bytes'] / 1048576:>8.2f}Mo")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'ical_parser-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'results': results}, f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Rapport: {os.path.relpath(output, ROOT_DIR)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Bouchon IMAP local (IMAP4rev1 sans TLS, une seule boîte INBOX en mémoire)
+
+Reproduit les commandes dont dépendent la synchronisation IMAP
+(EmailService._imap_sync) et l'écoute IDLE (backend/services/imap_listener.py) :
+CAPABILITY, LOGIN, EXAMINE/SELECT (UIDVALIDITY, UIDNEXT, HIGHESTMODSEQ),
+UID SEARCH, UID FETCH (UID, FLAGS, MODSEQ, BODY.PEEK[HEADER], BODY.PEEK[] et
+modificateur CHANGEDSINCE), IDLE/DONE, NOOP et LOGOUT.
+
+Capacités réglables : idle=False simule un serveur sans IDLE, condstore=False
+un serveur sans CONDSTORE (ni HIGHESTMODSEQ, ni MODSEQ, ni CHANGEDSINCE). La
+boîte peut changer pendant que les clients sont connectés :
+- deliver() : nouveau message (UID suivant), annoncé en EXISTS aux sessions en IDLE
+- set_seen() : drapeau \\Seen modifié (MODSEQ incrémenté), annoncé en FETCH
+- recreate() : dossier recréé (nouvelle UIDVALIDITY, UID renumérotés depuis 1)
+
+Utilisé par bench.imap_sync ; peut aussi tourner seul pour essayer
+l'application à la main (configuration IMAP sans SSL sur 127.0.0.1, port 1143,
+mot de passe « bench ») :
+    python -m bench.imap_stub --port 1143 --messages 20
+"""
+import argparse
+import re
+import select
+import socketserver
+import threading
+import time
+from email.message import EmailMessage
+from email.utils import formatdate
+
+PASSWORD = 'bench'
+
+_COMMAND_RE = re.compile(rb'^(\S+) (\S+)(?: (.*))?$')
+_ARG_RE = re.compile(rb'"((?:[^"\\]|\\.)*)"|(\S+)')
+_FETCH_RE = re.compile(rb'^(\S+) (\([^)]*\)|\S+)(?: \(CHANGEDSINCE (\d+)\))?$', re.IGNORECASE)
+
+
+class Message:
+    """Message de la boîte : UID, drapeaux et MODSEQ de sa dernière modification"""
+
+    def __init__(self, uid, raw, flags, modseq):
+        self.uid = uid
+        self.raw = raw
+        self.flags = flags
+        self.modseq = modseq
+
+    @property
+    def header(self):
+        return self.raw.split(b'\r\n\r\n', 1)[0] + b'\r\n\r\n'
+
+
+class Session:
+    """Connexion d'un client : dossier ouvert, attente IDLE et changements à lui annoncer"""
+
+    def __init__(self):
+        self.selected = False
+        self.idling = False
+        self.events = []
+
+
+class ImapStub:
+    """Serveur bouchon, contenu de la boîte et journal des commandes reçues"""
+
+    def __init__(self, idle=True, condstore=True):
+        self.idle = idle
+        self.condstore = condstore
+        self.lock = threading.Condition()
+        self.uidvalidity = 1000
+        self.uidnext = 1
+        self.modseq = 1
+        self.messages = []
+        self.commands = []
+        self.fetches = []
+        self.logins = 0
+        self._sessions = set()
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    @property
+    def capabilities(self):
+        names = ['IMAP4rev1'] + (['IDLE'] if self.idle else []) + (['CONDSTORE'] if self.condstore else [])
+        return ' '.join(names)
+
+    def start(self, port=0):
+        """Démarrer le serveur dans un thread (port 0 = port libre) ; retourner son port"""
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stub._serve(self)
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='imap-stub', daemon=True).start()
+        return self.port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_log(self):
+        """Vider le journal des commandes entre deux scénarios"""
+        with self.lock:
+            self.commands = []
+            self.fetches = []
+
+    def deliver(self, subject=None, seen=False):
+        """Ajouter un message à la boîte ; retourner son UID"""
+        with self.lock:
+            uid = self.uidnext
+            message = EmailMessage()
+            message['From'] = 'Client Bench <client@bench.test>'
+            message['To'] = 'reception@bench.test'
+            message['Subject'] = subject or f'Réservation {uid}'
+            message['Date'] = formatdate(localtime=True)
+            message['Message-ID'] = f'<bench-imap-{self.uidvalidity}-{uid}@bench.test>'
+            message.set_content(f'Bonjour,\n\nDemande de réservation numéro {uid}.\n')
+            raw = message.as_bytes().replace(b'\r\n', b'\n').replace(b'\n', b'\r\n')
+            self.modseq += 1
+            self.messages.append(Message(uid, raw, {'\\Seen'} if seen else set(), self.modseq))
+            self.uidnext += 1
+            self._notify(f'* {len(self.messages)} EXISTS')
+            return uid
+
+    def set_seen(self, uid, seen=True):
+        """Marquer un message lu ou non lu (MODSEQ incrémenté)"""
+        with self.lock:
+            for number, message in enumerate(self.messages, 1):
+                if message.uid == uid:
+                    if seen:
+                        message.flags.add('\\Seen')
+                    else:
+                        message.flags.discard('\\Seen')
+                    self.modseq += 1
+                    message.modseq = self.modseq
+                    self._notify(f'* {number} FETCH ({self._flags(message)})')
+                    return
+            raise KeyError(uid)
+
+    def recreate(self):
+        """Recréer le dossier : nouvelle UIDVALIDITY, mêmes messages renumérotés depuis l'UID 1"""
+        with self.lock:
+            self.uidvalidity += 1
+            for uid, message in enumerate(self.messages, 1):
+                message.uid = uid
+            self.uidnext = len(self.messages) + 1
+
+    def wait_idle(self, timeout):
+        """Attendre qu'une session soit en IDLE ; False à l'échéance"""
+        with self.lock:
+            return self.lock.wait_for(lambda: any(session.idling for session in self._sessions), timeout)
+
+    def _notify(self, line):
+        """Annoncer un changement aux sessions en IDLE (verrou tenu)"""
+        for session in self._sessions:
+            if session.idling:
+                session.events.append(line)
+
+    def _flags(self, message):
+        flags = f"FLAGS ({' '.join(sorted(message.flags))})"
+        return f'{flags} MODSEQ ({message.modseq})' if self.condstore else flags
+
+    def _serve(self, handler):
+        session = Session()
+
+        def send(data):
+            handler.wfile.write(data if isinstance(data, bytes) else data.encode('utf-8') + b'\r\n')
+
+        send(f'* OK [CAPABILITY {self.capabilities}] Bouchon IMAP prêt')
+        with self.lock:
+            self._sessions.add(session)
+        try:
+            while True:
+                line = handler.rfile.readline()
+                if not line:
+                    return
+                match = _COMMAND_RE.match(line.rstrip(b'\r\n'))
+                if not match:
+                    send('* BAD Commande illisible')
+                    continue
+                tag, name, args = match.group(1).decode(), match.group(2).decode().upper(), match.group(3) or b''
+                if name == 'UID':
+                    name, _, args = args.partition(b' ')
+                    name = 'UID ' + name.decode().upper()
+                with self.lock:
+                    self.commands.append(name)
+                if name == 'LOGOUT':
+                    send('* BYE Déconnexion')
+                    send(f'{tag} OK LOGOUT terminé')
+                    return
+                if name == 'IDLE' and self.idle:
+                    if not self._idle(handler, session, send):
+                        return
+                    send(f'{tag} OK IDLE terminé')
+                    continue
+                status = self._command(name, args, session, send)
+                send(f'{tag} {status}')
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self._sessions.discard(session)
+
+    def _command(self, name, args, session, send):
+        """Exécuter une commande ; retourner le statut de la réponse étiquetée"""
+        if name == 'CAPABILITY':
+            send(f'* CAPABILITY {self.capabilities}')
+            return 'OK CAPABILITY terminé'
+        if name == 'NOOP':
+            return 'OK NOOP terminé'
+        if name == 'LOGIN':
+            values = [quoted if quoted else plain for quoted, plain in _ARG_RE.findall(args)]
+            if len(values) != 2 or values[1].replace(b'\\"', b'"') != PASSWORD.encode():
+                return 'NO [AUTHENTICATIONFAILED] Identifiants refusés'
+            with self.lock:
+                self.logins += 1
+            return f'OK [CAPABILITY {self.capabilities}] Connecté'
+        if name in ('EXAMINE', 'SELECT'):
+            if args.strip(b'"').upper() != b'INBOX':
+                return 'NO [NONEXISTENT] Dossier inconnu'
+            with self.lock:
+                send('* FLAGS (\\Answered \\Flagged \\Deleted \\Seen \\Draft)')
+                send(f'* {len(self.messages)} EXISTS')
+                send('* 0 RECENT')
+                send(f'* OK [UIDVALIDITY {self.uidvalidity}] UID valides')
+                send(f'* OK [UIDNEXT {self.uidnext}] Prochain UID')
+                if self.condstore:
+                    send(f'* OK [HIGHESTMODSEQ {self.modseq}] Dernière modification')
+            session.selected = True
+            return f"OK [{'READ-ONLY' if name == 'EXAMINE' else 'READ-WRITE'}] {name} terminé"
+        if not session.selected or name not in ('UID SEARCH', 'UID FETCH'):
+            return f'BAD Commande non prise en charge: {name}'
+
+        if name == 'UID SEARCH':
+            criteria = args.decode().split()
+            with self.lock:
+                if criteria[:1] == ['UID'] and len(criteria) == 2:
+                    uids = [message.uid for message in self.messages if self._in_set(message.uid, criteria[1])]
+                else:
+                    uids = [message.uid for message in self.messages]
+            send(' '.join(['* SEARCH'] + [str(uid) for uid in uids]))
+            return 'OK UID SEARCH terminé'
+
+        match = _FETCH_RE.match(args)
+        if not match:
+            return 'BAD Arguments de UID FETCH illisibles'
+        uid_set, items, changed_since = match.group(1).decode(), match.group(2).decode().upper(), match.group(3)
+        if changed_since is not None and not self.condstore:
+            return 'BAD CHANGEDSINCE nécessite CONDSTORE'
+        if 'BODY.PEEK[HEADER]' in items or 'BODY[HEADER]' in items:
+            part = 'HEADER'
+        elif 'BODY.PEEK[]' in items or 'BODY[]' in items:
+            part = ''
+        else:
+            part = None
+        with self.lock:
+            selected = [
+                (number, message) for number, message in enumerate(self.messages, 1)
+                if self._in_set(message.uid, uid_set)
+                and (changed_since is None or message.modseq > int(changed_since))
+            ]
+            self.fetches.append({
+                'part': {'HEADER': 'header', '': 'body', None: 'flags'}[part],
+                'uids': [message.uid for _, message in selected],
+                'changed_since': int(changed_since) if changed_since is not None else None,
+            })
+            for number, message in selected:
+                head = f'* {number} FETCH (UID {message.uid} {self._flags(message)}'
+                if part is None:
+                    send(head + ')')
+                else:
+                    literal = message.header if part == 'HEADER' else message.raw
+                    send(f'{head} BODY[{part}] {{{len(literal)}}}\r\n'.encode('utf-8') + literal + b')\r\n')
+        return 'OK UID FETCH terminé'
+
+    def _in_set(self, uid, uid_set):
+        """UID compris dans un ensemble IMAP (« 3,5:9,12:* ») ; « * » désigne le plus grand UID"""
+        largest = self.messages[-1].uid if self.messages else 0
+        for part in uid_set.split(','):
+            first, _, last = part.partition(':')
+            low = largest if first == '*' else int(first)
+            high = low if not last else (largest if last == '*' else int(last))
+            if min(low, high) <= uid <= max(low, high):
+                return True
+        return False
+
+    def _idle(self, handler, session, send):
+        """Attente IDLE : transmettre les changements jusqu'au DONE ; False si le client a coupé"""
+        send('+ En attente')
+        with self.lock:
+            session.idling = True
+            self.lock.notify_all()
+        try:
+            sock = handler.connection
+            while True:
+                with self.lock:
+                    events, session.events = session.events, []
+                for event in events:
+                    send(event)
+                readable, _, _ = select.select([sock], [], [], 0.05)
+                if readable:
+                    line = handler.rfile.readline()
+                    if not line:
+                        return False
+                    if line.strip().upper() == b'DONE':
+                        return True
+        finally:
+            with self.lock:
+                session.idling = False
+                session.events = []
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bouchon IMAP local')
+    parser.add_argument('--port', type=int, default=1143, help='Port d\'écoute (défaut: 1143)')
+    parser.add_argument('--messages', type=int, default=20, help='Messages initiaux de la boîte (défaut: 20)')
+    parser.add_argument('--no-idle', action='store_true', help='Ne pas annoncer IDLE')
+    parser.add_argument('--no-condstore', action='store_true', help='Ne pas annoncer CONDSTORE')
+    parser.add_argument('--every', type=float, default=0, help='Livrer un message toutes les N secondes (défaut: 0, jamais)')
+    args = parser.parse_args()
+
+    stub = ImapStub(idle=not args.no_idle, condstore=not args.no_condstore)
+    for _ in range(args.messages):
+        stub.deliver()
+    print(f"📥 Bouchon IMAP sur 127.0.0.1:{stub.start(args.port)}, mot de passe « {PASSWORD} » (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(args.every or 5)
+            if args.every:
+                print(f"  message UID {stub.deliver()} livré")
+            with stub.lock:
+                print(f"  {len(stub.messages)} message(s), {stub.logins} connexion(s), {len(stub.commands)} commande(s)")
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Scénarios de synchronisation IMAP contre un bouchon local
+
+Démarre bench.imap_stub et relève sa boîte dans une configuration mail IMAP
+d'un établissement « Bench IMAP » créé pour l'occasion :
+
+- nouveaux UID : première relève des `limit` messages les plus récents, puis
+  seuls les UID au-delà du UIDNEXT mémorisé sont demandés (aucun FETCH si la
+  boîte n'a pas bougé) ; le corps n'est téléchargé qu'à l'ouverture
+- drapeaux CONDSTORE : seuls les messages modifiés depuis le HIGHESTMODSEQ
+  mémorisé sont relus (UID FETCH … CHANGEDSINCE) et leur statut lu / non lu
+  mis à jour
+- UIDVALIDITY : dossier recréé, les UID connus sont oubliés et la
+  synchronisation repart des messages les plus récents sans dupliquer les emails
+- IDLE : l'écoute (backend/services/imap_listener.py) attend en IDLE et
+  enregistre un message livré dès l'annonce EXISTS
+- sans IDLE : serveur qui n'annonce pas IDLE, la boîte est relevée toutes les
+  IMAP_POLL_INTERVAL secondes
+
+L'écoute IDLE suit toutes les configurations IMAP actives de la base : lancer
+sur une base de test. Code de sortie 1 si une vérification échoue.
+
+Usage:
+    python -m bench.imap_sync
+    python -m bench.imap_sync --messages 500 --limit 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from bench.imap_stub import PASSWORD, ImapStub
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+BENCH_ETABLISSEMENT = 'Bench IMAP'
+SCENARIO_ENV = {
+    'IMAP_LISTENER_ENABLED': 'false',
+    'IMAP_LISTENER_REFRESH': '1',
+    'IMAP_IDLE_TIMEOUT': '30',
+    'IMAP_POLL_INTERVAL': '2',
+}
+
+
+class Scenario:
+    """Vérifications et mesures d'un scénario"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checks = []
+        self.metrics = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def check(self, label, expected, actual):
+        self.checks.append({'check': label, 'expected': expected, 'actual': actual, 'ok': expected == actual})
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self.started, 2)
+        return self
+
+    @property
+    def ok(self):
+        return all(check['ok'] for check in self.checks)
+
+    def report(self):
+        return {
+            'scenario': self.name,
+            'ok': self.ok,
+            'seconds': self.seconds,
+            'metrics': self.metrics,
+            'checks': self.checks,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scénarios de synchronisation IMAP')
+    parser.add_argument('--messages', type=int, default=120, help='Messages initiaux de la boîte (défaut: 120)')
+    parser.add_argument('--limit', type=int, default=50, help='Messages récupérés à la première relève (défaut: 50)')
+    parser.add_argument('--timeout', type=float, default=10, help='Attente maximale d\'un message (défaut: 10 s)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (défaut: bench/results/imap_sync-<date>.json)')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+        sys.exit(1)
+
+    stub = ImapStub()
+    for _ in range(args.messages):
+        stub.deliver()
+    port = stub.start()
+    for name, value in SCENARIO_ENV.items():
+        os.environ[name] = value
+
+    # Les réglages sont lus à l'import : importer l'application après l'environnement
+    from backend.config.database import get_db_connection
+    from backend.models.mail_config import MailConfig
+    from backend.services import imap_listener as listener_module
+    from backend.services.email_service import EmailService
+    from backend.services.imap_listener import imap_listener
+
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute('DELETE FROM etablissements WHERE nom_etablissement = %s', (BENCH_ETABLISSEMENT,))
+    cur.execute('INSERT INTO etablissements (nom_etablissement) VALUES (%s) RETURNING id', (BENCH_ETABLISSEMENT,))
+    etablissement_id = cur.fetchone()['id']
+    config_id = MailConfig.create({
+        'etablissement_id': etablissement_id,
+        'nom_config': 'Bench IMAP',
+        'email_address': 'reception@bench.test',
+        'smtp_host': '127.0.0.1',
+        'smtp_username': 'reception@bench.test',
+        'smtp_password': PASSWORD,
+        'pop_host': '127.0.0.1',
+        'pop_port': port,
+        'pop_username': 'reception@bench.test',
+        'pop_password': PASSWORD,
+        'pop_use_ssl': False,
+        'incoming_protocol': 'imap',
+    })
+
+    def fetch():
+        stub.reset_log()
+        return EmailService.fetch_emails(config_id, limit=args.limit)
+
+    def fetched(part):
+        with stub.lock:
+            return [fetch_log for fetch_log in stub.fetches if fetch_log['part'] == part]
+
+    def stored_uidls():
+        cur.execute('SELECT uidl FROM mail_uidls WHERE mail_config_id = %s', (config_id,))
+        return sorted(row['uidl'] for row in cur.fetchall())
+
+    def email_count():
+        cur.execute('SELECT COUNT(*) AS total FROM emails WHERE mail_config_id = %s', (config_id,))
+        return cur.fetchone()['total']
+
+    def is_read(uid):
+        cur.execute('''
+            SELECT e.is_read FROM emails e
+            JOIN mail_uidls u ON u.email_id = e.id
+            WHERE u.mail_config_id = %s AND u.uidl = %s
+        ''', (config_id, f'{stub.uidvalidity}:{uid}'))
+        row = cur.fetchone()
+        return row['is_read'] if row else None
+
+    def wait_stored(uid):
+        """Secondes écoulées jusqu'à l'enregistrement du message, None à l'échéance"""
+        started = time.perf_counter()
+        message_id = f'<bench-imap-{stub.uidvalidity}-{uid}@bench.test>'
+        while time.perf_counter() - started < args.timeout:
+            cur.execute('SELECT 1 FROM emails WHERE mail_config_id = %s AND message_id = %s', (config_id, message_id))
+            if cur.fetchone():
+                return round(time.perf_counter() - started, 3)
+            time.sleep(0.02)
+        return None
+
+    def wait_read(uid, expected):
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline and is_read(uid) != expected:
+            time.sleep(0.02)
+        return is_read(uid)
+
+    scenarios = []
+    try:
+        # 1. Première relève, relève sans changement, nouveaux messages
+        scenario = Scenario('nouveaux UID')
+        first = fetch()
+        newest = list(range(args.messages - args.limit + 1, args.messages + 1))
+        scenario.check('première relève : messages les plus récents', newest, [
+            int(email_data['uidl'].split(':')[1]) for email_data in first
+        ])
+        scenario.check('en-têtes seulement', [newest], [fetch_log['uids'] for fetch_log in fetched('header')])
+        unchanged = fetch()
+        scenario.check('boîte inchangée : aucun message', 0, len(unchanged))
+        with stub.lock:
+            scenario.check('boîte inchangée : EXAMINE seul', ['EXAMINE'], [
+                command for command in stub.commands if command not in ('CAPABILITY', 'LOGIN', 'LOGOUT')
+            ])
+        delivered = [stub.deliver() for _ in range(3)]
+        new = fetch()
+        scenario.check('nouveaux messages', delivered, [int(email_data['uidl'].split(':')[1]) for email_data in new])
+        scenario.check('seuls les nouveaux UID sont demandés', [delivered],
+                       [fetch_log['uids'] for fetch_log in fetched('header')])
+        scenario.check('corps non téléchargé', [False], list({email_data['body_complete'] for email_data in new}))
+        stub.reset_log()
+        opened = EmailService.ensure_full_body(dict(new[0], mail_config_id=config_id))
+        scenario.check('corps téléchargé à l\'ouverture', [[delivered[0]]],
+                       [fetch_log['uids'] for fetch_log in fetched('body')])
+        scenario.check('corps complet', True, opened['body_complete'] and 'réservation' in opened['body_text'])
+        scenario.metrics['uidls'] = len(stored_uidls())
+        scenarios.append(scenario.finish())
+
+        # 2. Drapeaux modifiés sur le serveur (CONDSTORE)
+        scenario = Scenario('drapeaux CONDSTORE')
+        with stub.lock:
+            highest = stub.modseq
+        stub.set_seen(newest[-1])
+        stub.set_seen(delivered[1])
+        scenario.check('aucun nouveau message', 0, len(fetch()))
+        scenario.check('seuls les messages modifiés sont relus', [(highest, sorted([newest[-1], delivered[1]]))],
+                       [(fetch_log['changed_since'], fetch_log['uids']) for fetch_log in fetched('flags')])
+        scenario.check('lus', [True, True, False], [is_read(newest[-1]), is_read(delivered[1]), is_read(delivered[2])])
+        stub.set_seen(newest[-1], seen=False)
+        fetch()
+        scenario.check('remis non lu', False, is_read(newest[-1]))
+        fetch()
+        scenario.check('MODSEQ inchangé : aucune relecture des drapeaux', [], fetched('flags'))
+        scenarios.append(scenario.finish())
+
+        # 3. Dossier recréé : nouvelle UIDVALIDITY
+        scenario = Scenario('UIDVALIDITY')
+        before = email_count()
+        stub.recreate()
+        extra = stub.deliver()
+        rebased = fetch()
+        with stub.lock:
+            uidvalidity, total = stub.uidvalidity, len(stub.messages)
+        expected = [f'{uidvalidity}:{uid}' for uid in range(total - args.limit + 1, total + 1)]
+        scenario.check('relève des messages les plus récents', args.limit, len(rebased))
+        scenario.check('UID oubliés puis réenregistrés', sorted(expected), stored_uidls())
+        scenario.check('emails non dupliqués', before + 1, email_count())
+        scenario.check('UIDNEXT mémorisé', extra + 1, EmailService._imap_state(config_id)['uidnext'])
+        scenario.check('UIDVALIDITY mémorisée', uidvalidity, EmailService._imap_state(config_id)['uidvalidity'])
+        scenarios.append(scenario.finish())
+
+        # 4. Écoute IDLE : message enregistré dès l'annonce EXISTS
+        scenario = Scenario('IDLE')
+        stub.reset_log()
+        imap_listener.start()
+        scenario.check('écoute en IDLE', True, stub.wait_idle(args.timeout))
+        uid = stub.deliver()
+        scenario.metrics['delivery_seconds'] = wait_stored(uid)
+        scenario.check('message enregistré', True, scenario.metrics['delivery_seconds'] is not None)
+        scenario.check('de nouveau en IDLE', True, stub.wait_idle(args.timeout))
+        stub.set_seen(uid)
+        scenario.check('drapeau reçu pendant l\'IDLE', True, wait_read(uid, True))
+        with stub.lock:
+            scenario.metrics['idle_commands'] = stub.commands.count('IDLE')
+        mailbox = next((m for m in imap_listener.status()['mailboxes'] if m['config_id'] == config_id), {})
+        scenario.check('état de l\'écoute', 'listening', mailbox.get('state'))
+        scenario.check('sans erreur', 0, mailbox.get('errors'))
+        imap_listener.stop()
+        scenarios.append(scenario.finish())
+
+        # 5. Serveur sans IDLE : relève périodique
+        scenario = Scenario('sans IDLE')
+        stub.idle = False
+        stub.reset_log()
+        with stub.lock:
+            logins = stub.logins
+        imap_listener.start()
+        deadline = time.perf_counter() + args.timeout
+        while time.perf_counter() < deadline and 'EXAMINE' not in stub.commands:
+            time.sleep(0.02)
+        uid = stub.deliver()
+        scenario.metrics['delivery_seconds'] = wait_stored(uid)
+        poll = listener_module.IMAP_POLL_INTERVAL
+        scenario.check('message enregistré', True, scenario.metrics['delivery_seconds'] is not None)
+        scenario.check('dans l\'intervalle de relève', True, (scenario.metrics['delivery_seconds'] or poll + 1) <= poll + 1)
+        with stub.lock:
+            scenario.check('aucune commande IDLE', 0, stub.commands.count('IDLE'))
+            scenario.check('une seule connexion', logins + 1, stub.logins)
+        imap_listener.stop()
+        scenarios.append(scenario.finish())
+    finally:
+        imap_listener.stop()
+        stub.stop()
+        cur.execute('DELETE FROM etablissements WHERE id = %s', (etablissement_id,))
+        cur.close()
+        conn.close()
+
+    for scenario in scenarios:
+        report = scenario.report()
+        print(f"{'✅' if report['ok'] else '❌'} {report['scenario']:<22} {report['seconds']:>6.1f}s  {report['metrics'] or ''}")
+        for check in report['checks']:
+            if not check['ok']:
+                print(f"     ✗ {check['check']}: attendu {check['expected']!r}, obtenu {check['actual']!r}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'imap_sync-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'scenarios': [s.report() for s in scenarios]},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Rapport: {os.path.relpath(output, ROOT_DIR)}")
+
+    if not all(scenario.ok for scenario in scenarios):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
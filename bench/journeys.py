@@ -0,0 +1,221 @@
+"""
+Parcours utilisateurs rejoués par le banc de performance
+
+Chaque parcours est une fonction (client, context, rng) qui enchaîne des
+appels HTTP nommés ; les mesures sont agrégées par nom d'étape.
+"""
+import re
+import threading
+import time
+import uuid
+from datetime import date, timedelta
+
+import requests
+
+from .seed import BENCH_USERNAME, BENCH_PASSWORD
+
+_SERVER_TIMING_DB = re.compile(r'db;dur=([\d.]+)')
+
+
+class Recorder:
+    """Collecte thread-safe des mesures par étape"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.steps = {}
+        self.recording = True
+
+    def record(self, step, latency, status_code, queries, db_ms, error=None):
+        if not self.recording:
+            return
+        with self._lock:
+            entry = self.steps.get(step)
+            if entry is None:
+                entry = self.steps[step] = {
+                    'latencies': [], 'statuses': {}, 'queries': [], 'db_ms': [], 'errors': [], 'error_count': 0
+                }
+            entry['latencies'].append(latency)
+            entry['statuses'][status_code] = entry['statuses'].get(status_code, 0) + 1
+            if queries is not None:
+                entry['queries'].append(queries)
+            if db_ms is not None:
+                entry['db_ms'].append(db_ms)
+            if error:
+                entry['error_count'] += 1
+                if len(entry['errors']) < 20:
+                    entry['errors'].append(error)
+
+
+class BenchClient:
+    """Session HTTP authentifiée qui mesure chaque appel"""
+
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def login(self, step='login'):
+        response = self.call(step, 'POST', '/login', json={'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+        if response is None or response.status_code != 200:
+            raise RuntimeError(f"Connexion impossible avec {BENCH_USERNAME} (lancer python -m bench.seed)")
+
+    def call(self, step, method, path, expected=(200, 201), **kwargs):
+        """Exécuter un appel et enregistrer latence, statut et requêtes SQL"""
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, timeout=self.timeout, **kwargs)
+            response.content
+        except requests.RequestException as e:
+            self.recorder.record(step, time.perf_counter() - start, 'exception', None, None, str(e))
+            return None
+        latency = time.perf_counter() - start
+
+        queries = response.headers.get('X-DB-Queries')
+        match = _SERVER_TIMING_DB.search(response.headers.get('Server-Timing', ''))
+        error = None if response.status_code in expected else f'{response.status_code} {response.text[:200]}'
+        self.recorder.record(
+            step, latency, response.status_code,
+            int(queries) if queries is not None else None,
+            float(match.group(1)) if match else None,
+            error
+        )
+        return response
+
+
+class JourneyContext:
+    """Identifiants des données générées, relevés une fois avant la mesure"""
+
+    def __init__(self, etablissement_ids, open_sejours, closed_sejour_ids, extras, chambres):
+        self.etablissement_ids = etablissement_ids
+        self.open_sejours = open_sejours
+        self.closed_sejour_ids = closed_sejour_ids
+        self.extras = extras
+        self.chambres = chambres
+
+    @classmethod
+    def discover(cls, base_url):
+        """Interroger l'API pour retrouver les données du compte de performance"""
+        recorder = Recorder()
+        recorder.recording = False
+        client = BenchClient(base_url, recorder)
+        client.login()
+
+        user = client.session.get(f'{client.base_url}/api/current-user').json()
+        etablissement_ids = [e['id'] for e in user.get('etablissements', [])]
+        sejours = client.session.get(f'{client.base_url}/api/sejours').json()
+        extras = {}
+        chambres = {}
+        for etablissement_id in etablissement_ids:
+            extras[etablissement_id] = [
+                e['id'] for e in client.session.get(
+                    f'{client.base_url}/api/extras', params={'etablissement_id': etablissement_id}
+                ).json()
+            ]
+            chambres[etablissement_id] = [
+                c['id'] for c in client.session.get(
+                    f'{client.base_url}/api/chambres', params={'etablissement_id': etablissement_id}
+                ).json()
+            ]
+
+        open_sejours = {etablissement_id: [] for etablissement_id in etablissement_ids}
+        closed_sejour_ids = []
+        for sejour in sejours:
+            if sejour.get('statut') == 'closed':
+                closed_sejour_ids.append(sejour['id'])
+            elif sejour.get('etablissement_id') in open_sejours:
+                open_sejours[sejour['etablissement_id']].append(sejour['id'])
+
+        context = cls(
+            etablissement_ids=[e for e in etablissement_ids if open_sejours[e]],
+            open_sejours=open_sejours,
+            closed_sejour_ids=closed_sejour_ids,
+            extras=extras,
+            chambres=chambres,
+        )
+        if not context.etablissement_ids or not context.closed_sejour_ids:
+            raise RuntimeError("Aucune donnée de performance trouvée (lancer python -m bench.seed)")
+        return context
+
+
+def journey_login(client, context, rng):
+    """Connexion depuis une nouvelle session"""
+    fresh = BenchClient(client.base_url, client.recorder, client.timeout)
+    fresh.login()
+
+
+def journey_dashboard(client, context, rng):
+    """Chargement du tableau de bord et de ses statistiques"""
+    etablissement_id = rng.choice(context.etablissement_ids)
+    client.call('current_user', 'GET', '/api/current-user')
+    client.call('statistics_global', 'GET', '/api/statistics/global')
+    client.call('statistics_occupancy', 'GET', '/api/statistics/occupancy', params={'etablissement_id': etablissement_id})
+    client.call('statistics_monthly', 'GET', '/api/statistics/monthly-trends', params={'etablissement_id': etablissement_id})
+
+
+def journey_sejours(client, context, rng):
+    """Liste des séjours puis consultation d'un séjour"""
+    client.call('sejours_list', 'GET', '/api/sejours')
+    if rng.random() < 0.5:
+        sejour_id = rng.choice(context.closed_sejour_ids)
+    else:
+        sejour_id = rng.choice(context.open_sejours[rng.choice(context.etablissement_ids)])
+    client.call('sejour_detail', 'GET', f'/api/sejours/{sejour_id}')
+    client.call('sejour_extras', 'GET', f'/api/sejours/{sejour_id}/extras')
+
+
+def journey_create_sejour(client, context, rng):
+    """Recherche de disponibilité puis création d'un séjour"""
+    etablissement_id = rng.choice(context.etablissement_ids)
+    arrivee = date.today() + timedelta(days=rng.randint(30, 400))
+    depart = arrivee + timedelta(days=rng.randint(1, 7))
+    client.call('chambres_disponibles', 'GET', '/api/chambres/disponibles', params={
+        'etablissement_id': etablissement_id,
+        'date_debut': arrivee.isoformat(),
+        'date_fin': depart.isoformat(),
+    })
+    client.call('sejour_generer_numero', 'GET', '/api/sejours/generer-numero')
+    response = client.call('sejour_create', 'POST', '/api/sejours', json={
+        'sejour': {
+            'etablissement_id': etablissement_id,
+            'numero_reservation': f'BENCH-{uuid.uuid4().hex[:12]}',
+            'date_arrivee': arrivee.isoformat(),
+            'date_depart': depart.isoformat(),
+            'statut': 'active',
+        },
+        'personnes': [{'nom': 'Bench', 'prenom': 'Client', 'email': 'client@example.com', 'pays': 'France'}],
+        'chambres': [rng.choice(context.chambres[etablissement_id])],
+    })
+    if response is not None and response.status_code == 201:
+        sejour_id = response.json().get('sejour_id')
+        if sejour_id:
+            context.open_sejours[etablissement_id].append(sejour_id)
+
+
+def journey_extras(client, context, rng):
+    """Point de vente : catalogue des extras puis ajout à un séjour ouvert"""
+    etablissement_id = rng.choice(context.etablissement_ids)
+    client.call('extras_list', 'GET', '/api/extras', params={'etablissement_id': etablissement_id})
+    sejour_id = rng.choice(context.open_sejours[etablissement_id])
+    extra_ids = context.extras.get(etablissement_id) or []
+    if extra_ids:
+        client.call('sejour_extra_add', 'POST', f'/api/sejours/{sejour_id}/extras', expected=(201, 403), json={
+            'extra_id': rng.choice(extra_ids),
+            'quantite': rng.randint(1, 3),
+        })
+
+
+def journey_invoice(client, context, rng):
+    """Téléchargement de la facture PDF d'un séjour clôturé"""
+    sejour_id = rng.choice(context.closed_sejour_ids)
+    client.call('sejour_facture', 'POST', f'/api/sejours/{sejour_id}/facture')
+
+
+JOURNEYS = {
+    'login': (journey_login, 1),
+    'dashboard': (journey_dashboard, 3),
+    'sejours': (journey_sejours, 5),
+    'create_sejour': (journey_create_sejour, 2),
+    'extras': (journey_extras, 3),
+    'invoice': (journey_invoice, 1),
+}
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Scénarios de distribution des newsletters contre un bouchon SendGrid local
+
+Démarre bench.sendgrid_stub, pointe SENDGRID_API_URL dessus et fait tourner
+les threads de distribution (backend/services/newsletter_dispatcher.py) sur
+un établissement « Bench newsletters » créé pour l'occasion :
+
+- transitoires : 3 500 destinataires (doublon de casse, 2 adresses refusées),
+  premiers appels en 503 puis 429 ; les lots sont retentés, les adresses
+  refusées retirées du lot renvoyé, chaque adresse valide reçue une seule fois
+- bail expiré : un lot réservé par un worker « mort » est repris à
+  l'expiration de son bail, sans doublon
+- clé refusée : un 401 fait échouer le lot sans nouvelle tentative
+- tentatives épuisées : un 500 persistant fait échouer le lot après
+  NEWSLETTER_MAX_ATTEMPTS tentatives
+
+Les retentatives internes du client HTTP sont désactivées (HTTP_RETRIES=0)
+pour que chaque réponse du bouchon corresponde à une tentative de lot. Les
+threads de distribution traitent les lots de tous les établissements : lancer
+sur une base de test. Code de sortie 1 si une vérification échoue.
+
+Usage:
+    python -m bench.newsletter_delivery
+    python -m bench.newsletter_delivery --recipients 10000 --workers 8
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from bench.sendgrid_stub import SendGridStub
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+BENCH_ETABLISSEMENT = 'Bench newsletters'
+SCENARIO_ENV = {
+    'NEWSLETTER_DISPATCH_ENABLED': 'false',
+    'NEWSLETTER_POLL': '0.3',
+    'NEWSLETTER_LEASE': '2',
+    'NEWSLETTER_RETRY_DELAY': '1',
+    'NEWSLETTER_MAX_ATTEMPTS': '3',
+    'HTTP_RETRIES': '0',
+}
+
+
+class Scenario:
+    """Vérifications et mesures d'un scénario"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checks = []
+        self.metrics = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def check(self, label, expected, actual):
+        self.checks.append({'check': label, 'expected': expected, 'actual': actual, 'ok': expected == actual})
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self.started, 2)
+        return self
+
+    @property
+    def ok(self):
+        return all(check['ok'] for check in self.checks)
+
+    def report(self):
+        return {
+            'scenario': self.name,
+            'ok': self.ok,
+            'seconds': self.seconds,
+            'metrics': self.metrics,
+            'checks': self.checks,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scénarios de distribution des newsletters')
+    parser.add_argument('--recipients', type=int, default=3500,
+                        help='Destinataires du scénario principal (défaut: 3500)')
+    parser.add_argument('--workers', type=int, default=4, help='Threads de distribution (défaut: 4)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Délai de réponse du bouchon (défaut: 0.05 s)')
+    parser.add_argument('--timeout', type=float, default=60, help='Attente maximale par scénario (défaut: 60 s)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (défaut: bench/results/newsletter_delivery-<date>.json)')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+        sys.exit(1)
+
+    stub = SendGridStub(latency=args.latency)
+    os.environ['SENDGRID_API_URL'] = stub.start()
+    for name, value in SCENARIO_ENV.items():
+        os.environ[name] = value
+
+    # Les réglages sont lus à l'import : importer l'application après l'environnement
+    from backend.config.database import get_db_connection
+    from backend.models.newsletter import Newsletter, NewsletterChunk, NewsletterConfig
+    from backend.services import newsletter_dispatcher as dispatcher_module
+    from backend.services.newsletter_dispatcher import newsletter_dispatcher
+    from backend.services.newsletter_service import NewsletterService
+
+    max_attempts = dispatcher_module.NEWSLETTER_MAX_ATTEMPTS
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute('DELETE FROM etablissements WHERE nom_etablissement = %s', (BENCH_ETABLISSEMENT,))
+    cur.execute('INSERT INTO etablissements (nom_etablissement) VALUES (%s) RETURNING id', (BENCH_ETABLISSEMENT,))
+    etablissement_id = cur.fetchone()['id']
+    conn.commit()
+    NewsletterConfig.create_or_update(etablissement_id, 'SG.bench', 'newsletter@bench.test', 'Bench')
+
+    def enqueue(subject, recipients):
+        result = NewsletterService.send_newsletter(
+            etablissement_id, subject, '<p>Bonjour {{ email }}</p>', 'html', recipients, None
+        )
+        if not result.get('success'):
+            raise RuntimeError(result.get('error'))
+        newsletter_dispatcher.notify()
+        return result
+
+    def wait(newsletter_id):
+        deadline = time.monotonic() + args.timeout
+        while True:
+            progress = Newsletter.get_progress(newsletter_id, etablissement_id)
+            if not progress['pending'] or time.monotonic() > deadline:
+                return progress
+            time.sleep(0.2)
+
+    def statuses():
+        with stub.lock:
+            return [call['status'] for call in stub.calls]
+
+    scenarios = []
+    newsletter_dispatcher.start(args.workers)
+    try:
+        # 1. Erreurs transitoires et adresses refusées
+        scenario = Scenario('transitoires')
+        stub.reset()
+        stub.fail_next = [503, 429]
+        valid = [f'client{i}@bench.test' for i in range(args.recipients)]
+        rejected = ['invalid1@bench.test', 'invalid2@bench.test']
+        started = time.perf_counter()
+        result = enqueue('Transitoires', valid + ['CLIENT1@bench.test'] + rejected)
+        progress = wait(result['newsletter_id'])
+        scenario.metrics.update({
+            'delivery_seconds': round(time.perf_counter() - started, 2),
+            'calls': len(stub.calls),
+            'max_parallel_calls': stub.max_inflight,
+        })
+        scenario.check('destinataires dédoublonnés', args.recipients + len(rejected), result['total_recipients'])
+        scenario.check('503 et 429 reçus puis retentés', True, {503, 429} <= set(statuses()))
+        scenario.check('statut', 'partial', progress['status'])
+        scenario.check('envoyés', args.recipients, progress['sent'])
+        scenario.check('refusés', sorted(rejected), sorted(
+            recipient['email'] for recipient in Newsletter.get_recipients(result['newsletter_id'], 'failed')
+        ))
+        scenario.check('chaque adresse reçue une seule fois', args.recipients, len(set(stub.delivered)))
+        scenario.check('aucun doublon livré', len(set(stub.delivered)), len(stub.delivered))
+        scenarios.append(scenario.finish())
+
+        # 2. Reprise d'un lot dont le worker s'est arrêté
+        scenario = Scenario('bail expiré')
+        newsletter_dispatcher.stop()
+        stub.reset()
+        result = enqueue('Bail expiré', [f'reprise{i}@bench.test' for i in range(2500)])
+        orphan = NewsletterChunk.claim(int(os.environ['NEWSLETTER_LEASE']), dispatcher_module.NEWSLETTER_RATE_PER_MINUTE)
+        newsletter_dispatcher.start(args.workers)
+        newsletter_dispatcher.notify()
+        time.sleep(1)
+        before = Newsletter.get_progress(result['newsletter_id'], etablissement_id)
+        progress = wait(result['newsletter_id'])
+        scenario.metrics['orphan_recipients'] = len(orphan['recipients']) if orphan else 0
+        scenario.check('lot réservé par le worker arrêté', True, orphan is not None)
+        scenario.check('lot en attente avant expiration du bail', len(orphan['recipients']) if orphan else None,
+                       before['pending'])
+        scenario.check('statut', 'sent', progress['status'])
+        scenario.check('envoyés', 2500, progress['sent'])
+        scenario.check('aucun doublon livré', 2500, len(stub.delivered))
+        scenarios.append(scenario.finish())
+
+        # 3. Refus définitif : pas de nouvelle tentative
+        scenario = Scenario('clé refusée')
+        stub.reset()
+        NewsletterConfig.create_or_update(etablissement_id, 'cle-invalide', 'newsletter@bench.test', 'Bench')
+        result = enqueue('Clé refusée', ['refus@bench.test'])
+        progress = wait(result['newsletter_id'])
+        NewsletterConfig.create_or_update(etablissement_id, 'SG.bench', 'newsletter@bench.test', 'Bench')
+        scenario.check('statut', 'failed', progress['status'])
+        scenario.check('appels', [401], statuses())
+        scenarios.append(scenario.finish())
+
+        # 4. Erreur serveur persistante : abandon après NEWSLETTER_MAX_ATTEMPTS tentatives
+        scenario = Scenario('tentatives épuisées')
+        stub.reset()
+        stub.fail_next = [500] * max_attempts
+        result = enqueue('Tentatives épuisées', ['panne1@bench.test', 'panne2@bench.test'])
+        progress = wait(result['newsletter_id'])
+        scenario.check('statut', 'failed', progress['status'])
+        scenario.check('échecs', 2, progress['failed'])
+        scenario.check('appels', [500] * max_attempts, statuses())
+        scenario.check('lots en échec', 1, progress['chunks']['failed'])
+        scenarios.append(scenario.finish())
+    finally:
+        newsletter_dispatcher.stop()
+        stub.stop()
+        cur.execute('DELETE FROM etablissements WHERE id = %s', (etablissement_id,))
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    for scenario in scenarios:
+        report = scenario.report()
+        print(f"{'✅' if report['ok'] else '❌'} {report['scenario']:<22} {report['seconds']:>6.1f}s  {report['metrics'] or ''}")
+        for check in report['checks']:
+            if not check['ok']:
+                print(f"     ✗ {check['check']}: attendu {check['expected']!r}, obtenu {check['actual']!r}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'newsletter_delivery-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'scenarios': [s.report() for s in scenarios]},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Rapport: {os.path.relpath(output, ROOT_DIR)}")
+
+    if not all(scenario.ok for scenario in scenarios):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
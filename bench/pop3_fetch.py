@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Scénarios de relève POP3 incrémentale contre un bouchon local
+
+Démarre bench.pop3_stub avec une boîte de 10 000 messages et la relève par
+EmailService.fetch_emails dans une configuration mail d'un établissement
+« Bench POP3 » créé pour l'occasion :
+
+- première relève : un UIDL, les `limit` messages les plus récents
+  téléchargés (RETR), les plus anciens marqués comme vus sans téléchargement
+- boîte inchangée : un UIDL et rien d'autre
+- nouveaux messages : seuls les messages nouveaux sont demandés, en aperçu
+  (TOP) avec headers_only ; le message complet n'est téléchargé qu'à l'ouverture
+- messages supprimés du serveur : leurs UIDL sont oubliés, les emails
+  enregistrés restent
+
+Code de sortie 1 si une vérification échoue.
+
+Usage:
+    python -m bench.pop3_fetch
+    python -m bench.pop3_fetch --messages 50000 --limit 100
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+from bench.pop3_stub import PASSWORD, Pop3Stub
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+BENCH_ETABLISSEMENT = 'Bench POP3'
+
+
+class Scenario:
+    """Vérifications et mesures d'un scénario"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checks = []
+        self.metrics = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def check(self, label, expected, actual):
+        self.checks.append({'check': label, 'expected': expected, 'actual': actual, 'ok': expected == actual})
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self.started, 2)
+        return self
+
+    @property
+    def ok(self):
+        return all(check['ok'] for check in self.checks)
+
+    def report(self):
+        return {
+            'scenario': self.name,
+            'ok': self.ok,
+            'seconds': self.seconds,
+            'metrics': self.metrics,
+            'checks': self.checks,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scénarios de relève POP3 incrémentale')
+    parser.add_argument('--messages', type=int, default=10000, help='Messages initiaux de la boîte (défaut: 10000)')
+    parser.add_argument('--limit', type=int, default=50, help='Messages téléchargés par relève (défaut: 50)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (défaut: bench/results/pop3_fetch-<date>.json)')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+        sys.exit(1)
+
+    stub = Pop3Stub()
+    initial = stub.deliver(args.messages)
+    port = stub.start()
+
+    from backend.config.database import get_db_connection
+    from backend.models.mail_config import MailConfig
+    from backend.services.email_service import EmailService
+
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute('DELETE FROM etablissements WHERE nom_etablissement = %s', (BENCH_ETABLISSEMENT,))
+    cur.execute('INSERT INTO etablissements (nom_etablissement) VALUES (%s) RETURNING id', (BENCH_ETABLISSEMENT,))
+    etablissement_id = cur.fetchone()['id']
+    config_id = MailConfig.create({
+        'etablissement_id': etablissement_id,
+        'nom_config': 'Bench POP3',
+        'email_address': 'reception@bench.test',
+        'smtp_host': '127.0.0.1',
+        'smtp_username': 'reception@bench.test',
+        'smtp_password': PASSWORD,
+        'pop_host': '127.0.0.1',
+        'pop_port': port,
+        'pop_username': 'reception@bench.test',
+        'pop_password': PASSWORD,
+        'pop_use_ssl': False,
+        'incoming_protocol': 'pop3',
+    })
+
+    def fetch(scenario, headers_only=False):
+        stub.reset_log()
+        started = time.perf_counter()
+        emails = EmailService.fetch_emails(config_id, limit=args.limit, headers_only=headers_only)
+        scenario.metrics.update({
+            'fetch_ms': round(1000 * (time.perf_counter() - started), 1),
+            'bytes_received': stub.bytes_sent,
+        })
+        return emails
+
+    def commands():
+        with stub.lock:
+            return {name: count for name, count in stub.commands.items() if name not in ('USER', 'PASS', 'QUIT')}
+
+    def retrieved():
+        with stub.lock:
+            return list(stub.retrieved)
+
+    def stored_uidls():
+        cur.execute('SELECT uidl FROM mail_uidls WHERE mail_config_id = %s', (config_id,))
+        return {row['uidl'] for row in cur.fetchall()}
+
+    def email_count():
+        cur.execute('SELECT COUNT(*) AS total FROM emails WHERE mail_config_id = %s', (config_id,))
+        return cur.fetchone()['total']
+
+    scenarios = []
+    try:
+        # 1. Première relève d'une boîte volumineuse
+        scenario = Scenario('première relève')
+        emails = fetch(scenario)
+        newest = initial[-args.limit:]
+        scenario.check('commandes', {'UIDL': 1, 'RETR': args.limit}, commands())
+        scenario.check('messages les plus récents téléchargés', [('RETR', uidl) for uidl in newest], retrieved())
+        scenario.check('emails enregistrés', args.limit, email_count())
+        scenario.check('tous les UIDL marqués comme vus', True, stored_uidls() == set(initial))
+        scenario.check('corps complet et point initial restitué', True, all(
+            email_data['body_complete'] and '\n.Ligne commençant' in email_data['body_text'] for email_data in emails
+        ))
+        scenarios.append(scenario.finish())
+
+        # 2. Boîte inchangée : un seul UIDL
+        scenario = Scenario('boîte inchangée')
+        emails = fetch(scenario)
+        scenario.check('aucun message', 0, len(emails))
+        scenario.check('commandes', {'UIDL': 1}, commands())
+        scenarios.append(scenario.finish())
+
+        # 3. Nouveaux messages en aperçu, message complet à l'ouverture
+        scenario = Scenario('nouveaux messages')
+        delivered = stub.deliver(5)
+        emails = fetch(scenario, headers_only=True)
+        scenario.check('seuls les nouveaux messages sont demandés', [('TOP', uidl) for uidl in delivered], retrieved())
+        scenario.check('commandes', {'UIDL': 1, 'TOP': 5}, commands())
+        scenario.check('aperçu seulement', [False], list({email_data['body_complete'] for email_data in emails}))
+        stub.reset_log()
+        opened = EmailService.ensure_full_body(dict(emails[0], mail_config_id=config_id))
+        scenario.check('message complet téléchargé à l\'ouverture', [('RETR', delivered[0])], retrieved())
+        scenario.check('corps complet', True, opened['body_complete'] and 'Ligne 39 du message.' in opened['body_text'])
+        scenarios.append(scenario.finish())
+
+        # 4. Messages supprimés du serveur
+        scenario = Scenario('messages supprimés')
+        removed = [initial[0], initial[-1], delivered[-1]]
+        before = email_count()
+        stub.remove(removed)
+        emails = fetch(scenario)
+        scenario.check('aucun message', 0, len(emails))
+        scenario.check('commandes', {'UIDL': 1}, commands())
+        scenario.check('UIDL supprimés oubliés', [], sorted(stored_uidls() & set(removed)))
+        scenario.check('UIDL restants', args.messages + len(delivered) - len(removed), len(stored_uidls()))
+        scenario.check('emails conservés', before, email_count())
+        scenarios.append(scenario.finish())
+    finally:
+        stub.stop()
+        cur.execute('DELETE FROM etablissements WHERE id = %s', (etablissement_id,))
+        cur.close()
+        conn.close()
+
+    for scenario in scenarios:
+        report = scenario.report()
+        print(f"{'✅' if report['ok'] else '❌'} {report['scenario']:<22} {report['seconds']:>6.1f}s  {report['metrics'] or ''}")
+        for check in report['checks']:
+            if not check['ok']:
+                print(f"     ✗ {check['check']}: attendu {check['expected']!r}, obtenu {check['actual']!r}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'pop3_fetch-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'scenarios': [s.report() for s in scenarios]},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Rapport: {os.path.relpath(output, ROOT_DIR)}")
+
+    if not all(scenario.ok for scenario in scenarios):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
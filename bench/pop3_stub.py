@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Bouchon POP3 local (sans TLS, une boîte en mémoire)
+
+Reproduit les commandes dont dépend la relève POP3 (EmailService.fetch_emails) :
+USER/PASS (mot de passe « bench »), STAT, LIST, UIDL, TOP, RETR, NOOP, RSET et
+QUIT. Chaque message a un UIDL stable ; la boîte peut changer entre deux
+relèves :
+- deliver() : nouveaux messages en fin de boîte
+- remove() : messages supprimés par un autre client (les numéros des
+  suivants décalent, leur UIDL reste le même)
+
+Le journal compte les commandes reçues et les octets envoyés, pour vérifier
+qu'une relève ne coûte qu'un UIDL plus les messages nouveaux.
+
+Utilisé par bench.pop3_fetch ; peut aussi tourner seul pour essayer
+l'application à la main (configuration POP3 sans SSL sur 127.0.0.1, port 1110) :
+    python -m bench.pop3_stub --port 1110 --messages 200
+"""
+import argparse
+import itertools
+import socketserver
+import threading
+import time
+from collections import Counter
+from email.utils import formatdate
+
+PASSWORD = 'bench'
+
+
+class Pop3Stub:
+    """Serveur bouchon, contenu de la boîte et journal des commandes reçues"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.messages = []
+        self.commands = Counter()
+        self.retrieved = []
+        self.bytes_sent = 0
+        self.logins = 0
+        self._numbers = itertools.count(1)
+        self._server = None
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def start(self, port=0):
+        """Démarrer le serveur dans un thread (port 0 = port libre) ; retourner son port"""
+        stub = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                stub._serve(self)
+
+        self._server = socketserver.ThreadingTCPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='pop3-stub', daemon=True).start()
+        return self.port
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset_log(self):
+        """Vider le journal entre deux relèves"""
+        with self.lock:
+            self.commands = Counter()
+            self.retrieved = []
+            self.bytes_sent = 0
+
+    def deliver(self, count=1):
+        """Ajouter des messages en fin de boîte ; retourner leurs UIDL"""
+        uidls = []
+        with self.lock:
+            for _ in range(count):
+                number = next(self._numbers)
+                uidl = f'bench-{number:08d}'
+                body = '\r\n'.join(
+                    [f'Demande de réservation numéro {number}.'] + [f'Ligne {line} du message.' for line in range(40)]
+                    + ['.Ligne commençant par un point.']
+                )
+                raw = (
+                    'From: Client Bench <client@bench.test>\r\n'
+                    'To: reception@bench.test\r\n'
+                    f'Subject: Réservation {number}\r\n'
+                    f'Date: {formatdate(localtime=True)}\r\n'
+                    f'Message-ID: <{uidl}@bench.test>\r\n'
+                    'MIME-Version: 1.0\r\n'
+                    'Content-Type: text/plain; charset=utf-8\r\n'
+                    'Content-Transfer-Encoding: 8bit\r\n'
+                    '\r\n'
+                    f'{body}\r\n'
+                ).encode('utf-8')
+                self.messages.append((uidl, raw))
+                uidls.append(uidl)
+        return uidls
+
+    def remove(self, uidls):
+        """Supprimer des messages de la boîte (relevés ailleurs, par exemple)"""
+        with self.lock:
+            self.messages = [message for message in self.messages if message[0] not in set(uidls)]
+
+    def _serve(self, handler):
+        authenticated = False
+
+        def send(*lines):
+            data = b''.join((line if isinstance(line, bytes) else line.encode('utf-8')) + b'\r\n' for line in lines)
+            handler.wfile.write(data)
+            with self.lock:
+                self.bytes_sent += len(data)
+
+        def multiline(status, lines):
+            # Octet-stuffing : une ligne commençant par « . » est préfixée d'un point
+            send(status, *[b'.' + line if line.startswith(b'.') else line for line in lines], b'.')
+
+        send('+OK Bouchon POP3 prêt')
+        try:
+            while True:
+                line = handler.rfile.readline()
+                if not line:
+                    return
+                parts = line.decode('utf-8', errors='replace').strip().split(' ')
+                name, args = parts[0].upper(), parts[1:]
+                with self.lock:
+                    self.commands[name] += 1
+                    messages = list(self.messages)
+
+                if name == 'QUIT':
+                    send('+OK Au revoir')
+                    return
+                if name == 'USER':
+                    send('+OK Utilisateur accepté')
+                elif name == 'PASS':
+                    authenticated = ' '.join(args) == PASSWORD
+                    if authenticated:
+                        with self.lock:
+                            self.logins += 1
+                        send('+OK Boîte ouverte')
+                    else:
+                        send('-ERR [AUTH] Identifiants refusés')
+                elif not authenticated:
+                    send('-ERR Authentification requise')
+                elif name in ('NOOP', 'RSET'):
+                    send('+OK')
+                elif name == 'STAT':
+                    send(f'+OK {len(messages)} {sum(len(raw) for _, raw in messages)}')
+                elif name in ('LIST', 'UIDL') and not args:
+                    multiline(f'+OK {len(messages)} messages', [
+                        f'{number} {len(raw) if name == "LIST" else uidl}'.encode('ascii')
+                        for number, (uidl, raw) in enumerate(messages, 1)
+                    ])
+                elif name in ('LIST', 'UIDL', 'TOP', 'RETR'):
+                    number = int(args[0]) if args and args[0].isdigit() else 0
+                    if not 1 <= number <= len(messages):
+                        send('-ERR Message inconnu')
+                        continue
+                    uidl, raw = messages[number - 1]
+                    if name == 'LIST':
+                        send(f'+OK {number} {len(raw)}')
+                    elif name == 'UIDL':
+                        send(f'+OK {number} {uidl}')
+                    else:
+                        header, _, body = raw.partition(b'\r\n\r\n')
+                        lines = header.split(b'\r\n') + [b'']
+                        body_lines = body.split(b'\r\n')[:-1]
+                        lines += body_lines[:int(args[1])] if name == 'TOP' else body_lines
+                        with self.lock:
+                            self.retrieved.append((name, uidl))
+                        multiline(f'+OK {len(raw)} octets', lines)
+                else:
+                    send(f'-ERR Commande non prise en charge: {name}')
+        except OSError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bouchon POP3 local')
+    parser.add_argument('--port', type=int, default=1110, help='Port d\'écoute (défaut: 1110)')
+    parser.add_argument('--messages', type=int, default=200, help='Messages initiaux de la boîte (défaut: 200)')
+    args = parser.parse_args()
+
+    stub = Pop3Stub()
+    stub.deliver(args.messages)
+    print(f"📥 Bouchon POP3 sur 127.0.0.1:{stub.start(args.port)}, mot de passe « {PASSWORD} » (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(5)
+            with stub.lock:
+                print(f"  {len(stub.messages)} message(s), {stub.logins} connexion(s), {dict(stub.commands)}")
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
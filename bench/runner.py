@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Lanceur du banc de performance de l'API HTTP
+
+Rejoue les parcours de bench/journeys.py avec N utilisateurs virtuels et
+produit un rapport JSON (p50/p95/p99, débit, requêtes SQL par appel). Le
+nombre de requêtes SQL provient de l'en-tête X-DB-Queries : le serveur doit
+tourner avec REQUEST_METRICS_HEADERS=true (automatique avec --boot).
+
+Usage:
+    python -m bench.runner run --boot --seed-scale 1 --concurrency 8 --duration 60
+    python -m bench.runner run --url http://127.0.0.1:5000 --save-baseline main
+    python -m bench.runner compare bench/baselines/main.json bench/results/dernier.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+from .journeys import JOURNEYS, BenchClient, JourneyContext, Recorder
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+BASELINES_DIR = os.path.join(ROOT_DIR, 'bench', 'baselines')
+REPORTED_PERCENTILES = (50, 95, 99)
+
+
+def percentile(sorted_values, pct):
+    """Percentile au rang le plus proche sur une liste triée"""
+    if not sorted_values:
+        return None
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def _git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class AppServer:
+    """Application démarrée sous gunicorn pour la durée du banc"""
+
+    def __init__(self, port, workers):
+        self.port = port
+        self.workers = workers
+        self.url = f'http://127.0.0.1:{port}'
+        self.process = None
+
+    def start(self, timeout=30):
+        env = dict(os.environ, REQUEST_METRICS_HEADERS='true', ICAL_SCHEDULER_ENABLED='false')
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{self.port}',
+             '--workers', str(self.workers), 'main:app'],
+            cwd=ROOT_DIR, env=env
+        )
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'gunicorn s\'est arrêté (code {self.process.returncode})')
+            try:
+                requests.get(f'{self.url}/login', timeout=1)
+                return
+            except requests.RequestException:
+                time.sleep(0.25)
+        self.stop()
+        raise RuntimeError(f'Le serveur n\'a pas répondu sur {self.url} après {timeout} s')
+
+    def stop(self):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+
+def prepare_database(seed_scale):
+    """Initialiser le schéma, appliquer les migrations et générer les données"""
+    subprocess.check_call([sys.executable, 'init_database.py'], cwd=ROOT_DIR)
+    migrations_dir = os.path.join(ROOT_DIR, 'migrations')
+    for name in sorted(os.listdir(migrations_dir)):
+        if name.endswith('.py') and name[:3].isdigit():
+            subprocess.check_call([sys.executable, os.path.join(migrations_dir, name)], cwd=ROOT_DIR)
+
+    from .seed import seed
+    seed(scale=seed_scale)
+
+
+def run_load(base_url, journeys, concurrency, duration, warmup, seed_value):
+    """
+    Rejouer les parcours pondérés avec `concurrency` utilisateurs virtuels
+
+    Returns:
+        Tuple (recorder, durée mesurée en secondes)
+    """
+    context = JourneyContext.discover(base_url)
+    recorder = Recorder()
+    recorder.recording = warmup <= 0
+    names = list(journeys)
+    weights = [JOURNEYS[name][1] for name in names]
+    stop_event = threading.Event()
+
+    def virtual_user(index):
+        rng = random.Random(seed_value + index)
+        client = BenchClient(base_url, recorder)
+        client.login(step='login_initial')
+        while not stop_event.is_set():
+            name = rng.choices(names, weights)[0]
+            try:
+                JOURNEYS[name][0](client, context, rng)
+            except Exception as e:
+                recorder.record(f'journey_{name}', 0.0, 'exception', None, None, str(e))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(virtual_user, index) for index in range(concurrency)]
+        if warmup > 0:
+            time.sleep(warmup)
+            recorder.recording = True
+        started = time.perf_counter()
+        time.sleep(duration)
+        stop_event.set()
+        for future in futures:
+            future.result()
+        elapsed = time.perf_counter() - started
+
+    return recorder, elapsed
+
+
+def build_report(recorder, elapsed, metadata):
+    """Construire le rapport JSON à partir des mesures"""
+    steps = {}
+    total_requests = 0
+    total_errors = 0
+
+    for step, entry in sorted(recorder.steps.items()):
+        latencies = sorted(entry['latencies'])
+        count = len(latencies)
+        errors = entry['error_count']
+        total_requests += count
+        total_errors += errors
+        steps[step] = {
+            'requests': count,
+            'errors': errors,
+            'throughput_rps': round(count / elapsed, 3) if elapsed else None,
+            'latency_ms': {
+                f'p{pct}': round(percentile(latencies, pct) * 1000, 2) for pct in REPORTED_PERCENTILES
+            },
+            'latency_ms_mean': round(sum(latencies) / count * 1000, 2) if count else None,
+            'latency_ms_max': round(latencies[-1] * 1000, 2) if count else None,
+            'queries_per_request': (
+                round(sum(entry['queries']) / len(entry['queries']), 2) if entry['queries'] else None
+            ),
+            'db_ms_mean': round(sum(entry['db_ms']) / len(entry['db_ms']), 2) if entry['db_ms'] else None,
+            'statuses': {str(status): n for status, n in entry['statuses'].items()},
+            'sample_errors': entry['errors'][:5],
+        }
+
+    return {
+        'metadata': dict(metadata, measured_seconds=round(elapsed, 2)),
+        'totals': {
+            'requests': total_requests,
+            'errors': total_errors,
+            'throughput_rps': round(total_requests / elapsed, 3) if elapsed else None,
+        },
+        'steps': steps,
+    }
+
+
+def print_report(report):
+    totals = report['totals']
+    print(f"\n📊 {totals['requests']} requêtes, {totals['errors']} erreurs, "
+          f"{totals['throughput_rps']} req/s")
+    print(f"{'étape':<26}{'req':>7}{'err':>5}{'p50':>9}{'p95':>9}{'p99':>9}{'req/s':>9}{'SQL':>7}")
+    for step, data in report['steps'].items():
+        latency = data['latency_ms']
+        queries = data['queries_per_request']
+        print(
+            f"{step:<26}{data['requests']:>7}{data['errors']:>5}"
+            f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}"
+            f"{data['throughput_rps']:>9}{queries if queries is not None else '-':>7}"
+        )
+
+
+def write_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+    print(f"💾 Rapport écrit dans {os.path.relpath(path, ROOT_DIR)}")
+
+
+def compare_reports(baseline, current, tolerance_percent, min_delta_ms):
+    """
+    Comparer deux rapports étape par étape
+
+    Une régression est signalée lorsque le p95 augmente de plus de
+    `tolerance_percent` (et d'au moins `min_delta_ms`), ou lorsque le nombre
+    moyen de requêtes SQL augmente.
+
+    Returns:
+        list: Descriptions des régressions détectées
+    """
+    regressions = []
+    print(f"{'étape':<26}{'p95 réf.':>10}{'p95':>10}{'écart':>9}{'SQL réf.':>10}{'SQL':>7}")
+    for step, base in sorted(baseline['steps'].items()):
+        data = current['steps'].get(step)
+        if data is None:
+            print(f"{step:<26}{'absente du rapport courant':>46}")
+            continue
+
+        base_p95 = base['latency_ms']['p95']
+        p95 = data['latency_ms']['p95']
+        delta = ((p95 - base_p95) / base_p95 * 100) if base_p95 else 0.0
+        print(
+            f"{step:<26}{base_p95:>10}{p95:>10}{delta:>+8.1f}%"
+            f"{base['queries_per_request'] if base['queries_per_request'] is not None else '-':>10}"
+            f"{data['queries_per_request'] if data['queries_per_request'] is not None else '-':>7}"
+        )
+
+        if delta > tolerance_percent and p95 - base_p95 >= min_delta_ms:
+            regressions.append(f'{step}: p95 {base_p95} ms -> {p95} ms ({delta:+.1f} %)')
+        if (
+            base['queries_per_request'] is not None and data['queries_per_request'] is not None
+            and data['queries_per_request'] > base['queries_per_request']
+        ):
+            regressions.append(
+                f"{step}: requêtes SQL {base['queries_per_request']} -> {data['queries_per_request']}"
+            )
+    return regressions
+
+
+def command_run(args):
+    journeys = [name.strip() for name in args.journeys.split(',')] if args.journeys else list(JOURNEYS)
+    unknown = [name for name in journeys if name not in JOURNEYS]
+    if unknown:
+        print(f"❌ Parcours inconnus: {', '.join(unknown)} (disponibles: {', '.join(JOURNEYS)})")
+        return 2
+
+    if args.seed_scale:
+        prepare_database(args.seed_scale)
+
+    server = None
+    base_url = args.url
+    if args.boot:
+        server = AppServer(args.port, args.workers)
+        server.start()
+        base_url = server.url
+
+    try:
+        print(f"🚀 {args.concurrency} utilisateurs virtuels, {args.duration} s "
+              f"(+{args.warmup} s de chauffe) sur {base_url}")
+        recorder, elapsed = run_load(
+            base_url, journeys, args.concurrency, args.duration, args.warmup, args.seed
+        )
+    finally:
+        if server:
+            server.stop()
+
+    report = build_report(recorder, elapsed, {
+        'label': args.label,
+        'git_revision': _git_revision(),
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'url': base_url,
+        'workers': args.workers if args.boot else None,
+        'concurrency': args.concurrency,
+        'duration_seconds': args.duration,
+        'warmup_seconds': args.warmup,
+        'journeys': journeys,
+        'seed': args.seed,
+    })
+    print_report(report)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{report['metadata']['git_revision'] or 'local'}.json"
+    )
+    write_json(output, report)
+    if args.save_baseline:
+        write_json(os.path.join(BASELINES_DIR, f'{args.save_baseline}.json'), report)
+    return 0
+
+
+def command_compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+
+    print(f"Référence: {baseline['metadata'].get('git_revision')} ({baseline['metadata'].get('date')})")
+    print(f"Courant:   {current['metadata'].get('git_revision')} ({current['metadata'].get('date')})\n")
+    regressions = compare_reports(baseline, current, args.tolerance, args.min_delta_ms)
+
+    if regressions:
+        print("\n❌ Régressions détectées:")
+        for regression in regressions:
+            print(f"   - {regression}")
+        return 1
+    print("\n✅ Aucune régression")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Banc de performance de l\'API HTTP')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run = subparsers.add_parser('run', help='Rejouer les parcours utilisateurs')
+    run.add_argument('--url', default='http://127.0.0.1:5000', help='Serveur déjà démarré à mesurer')
+    run.add_argument('--boot', action='store_true', help='Démarrer l\'application sous gunicorn')
+    run.add_argument('--port', type=int, default=5050, help='Port utilisé avec --boot (défaut: 5050)')
+    run.add_argument('--workers', type=int, default=4, help='Workers gunicorn avec --boot (défaut: 4)')
+    run.add_argument('--seed-scale', type=int, default=0,
+                     help='Initialiser la base et générer les données à cette échelle avant la mesure')
+    run.add_argument('--concurrency', type=int, default=8, help='Utilisateurs virtuels (défaut: 8)')
+    run.add_argument('--duration', type=float, default=30, help='Durée de mesure en secondes (défaut: 30)')
+    run.add_argument('--warmup', type=float, default=5, help='Chauffe non mesurée en secondes (défaut: 5)')
+    run.add_argument('--journeys', help=f"Parcours à rejouer, séparés par des virgules ({','.join(JOURNEYS)})")
+    run.add_argument('--seed', type=int, default=1, help='Graine aléatoire des utilisateurs virtuels')
+    run.add_argument('--label', help='Libellé libre enregistré dans le rapport')
+    run.add_argument('--output', help='Fichier de rapport (défaut: bench/results/<date>-<commit>.json)')
+    run.add_argument('--save-baseline', metavar='NOM', help='Enregistrer aussi dans bench/baselines/NOM.json')
+    run.set_defaults(handler=command_run)
+
+    compare = subparsers.add_parser('compare', help='Comparer un rapport à une référence')
+    compare.add_argument('baseline', help='Rapport de référence (ex: bench/baselines/main.json)')
+    compare.add_argument('current', help='Rapport à comparer')
+    compare.add_argument('--tolerance', type=float, default=10.0, help='Hausse du p95 tolérée en %% (défaut: 10)')
+    compare.add_argument('--min-delta-ms', type=float, default=2.0,
+                         help='Écart absolu minimal du p95 pour signaler une régression (défaut: 2 ms)')
+    compare.set_defaults(handler=command_compare)
+
+    args = parser.parse_args()
+    sys.exit(args.handler(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Générateur de données de performance
+
+Crée un compte client « Bench », ses établissements, chambres, extras et un
+historique de séjours dont le volume est proportionnel à --scale. Les données
+d'un précédent passage sont supprimées (ON DELETE CASCADE depuis le compte).
+
+Usage:
+    python -m bench.seed --scale 1
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+import psycopg2
+from psycopg2.extras import RealDictCursor, execute_values
+from werkzeug.security import generate_password_hash
+
+BENCH_ACCOUNT = 'Bench'
+BENCH_USERNAME = 'bench_admin'
+BENCH_PASSWORD = 'bench123'
+
+ETABLISSEMENTS_PER_SCALE = 2
+CHAMBRES_PER_ETABLISSEMENT = 12
+SEJOURS_PER_ETABLISSEMENT = 500
+CLOSED_RATIO = 0.6
+
+PRENOMS = ['Yasmine', 'Karim', 'Sophie', 'Lucas', 'Emma', 'Omar', 'Julia', 'Noah', 'Lina', 'Hugo']
+NOMS = ['Benali', 'Martin', 'Dubois', 'Garcia', 'Smith', 'Rossi', 'Müller', 'Alaoui', 'Lopez', 'Bernard']
+PAYS = ['Maroc', 'France', 'Espagne', 'Allemagne', 'Royaume-Uni', 'Italie', 'États-Unis', 'Belgique']
+EXTRAS = [
+    ('Petit-déjeuner', 80, 'personne'),
+    ('Dîner', 180, 'personne'),
+    ('Transfert aéroport', 250, 'trajet'),
+    ('Hammam', 150, 'séance'),
+    ('Excursion Atlas', 600, 'personne'),
+]
+
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    database_url = os.environ.get('DATABASE_URL')
+    if not database_url:
+        print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+        sys.exit(1)
+    return psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+
+
+def seed(scale=1, seed_value=42):
+    """
+    Générer le jeu de données de performance
+
+    Args:
+        scale: Facteur de volume (nombre d'établissements = 2 x scale)
+        seed_value: Graine aléatoire, pour des jeux reproductibles
+
+    Returns:
+        dict: Volumes créés par table
+    """
+    rng = random.Random(seed_value)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    counts = {}
+
+    try:
+        print("🗑️  Suppression des données de performance précédentes...")
+        cur.execute('DELETE FROM users WHERE username = %s', (BENCH_USERNAME,))
+        cur.execute('DELETE FROM tenant_accounts WHERE nom_compte = %s', (BENCH_ACCOUNT,))
+
+        cur.execute('''
+            INSERT INTO tenant_accounts (nom_compte, notes)
+            VALUES (%s, %s) RETURNING id
+        ''', (BENCH_ACCOUNT, 'Données générées par bench/seed.py'))
+        tenant_id = cur.fetchone()['id']
+
+        cur.execute('''
+            INSERT INTO users (username, password_hash, nom, prenom, email, role)
+            VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
+        ''', (BENCH_USERNAME, generate_password_hash(BENCH_PASSWORD), 'Bench', 'Admin', 'bench@example.com', 'admin'))
+        user_id = cur.fetchone()['id']
+        cur.execute('UPDATE tenant_accounts SET primary_admin_user_id = %s WHERE id = %s', (user_id, tenant_id))
+
+        etablissement_ids = [
+            row['id'] for row in execute_values(cur, '''
+                INSERT INTO etablissements (
+                    tenant_account_id, nom_etablissement, pays, ville, devise,
+                    taux_taxe_sejour, taux_tva, taux_charge_plateforme, actif
+                ) VALUES %s RETURNING id
+            ''', [
+                (tenant_id, f'Bench Riad {i + 1}', 'Maroc', 'Marrakech', 'MAD', 2.5, 20.0, 15.0, True)
+                for i in range(ETABLISSEMENTS_PER_SCALE * scale)
+            ], fetch=True)
+        ]
+        counts['etablissements'] = len(etablissement_ids)
+
+        execute_values(cur, '''
+            INSERT INTO user_etablissements (user_id, etablissement_id, role, is_primary_admin) VALUES %s
+        ''', [(user_id, etablissement_id, 'admin', True) for etablissement_id in etablissement_ids])
+        cur.execute('UPDATE users SET etablissement_id = %s WHERE id = %s', (etablissement_ids[0], user_id))
+
+        chambres = {}
+        extras = {}
+        for etablissement_id in etablissement_ids:
+            chambres[etablissement_id] = [
+                (row['id'], float(row['prix_par_nuit'])) for row in execute_values(cur, '''
+                    INSERT INTO chambres (etablissement_id, nom, type_chambre, capacite, prix_par_nuit)
+                    VALUES %s RETURNING id, prix_par_nuit
+                ''', [
+                    (etablissement_id, f'Chambre {n + 1}', 'Double', rng.choice([2, 2, 3, 4]), rng.choice([450, 600, 800, 1200]))
+                    for n in range(CHAMBRES_PER_ETABLISSEMENT)
+                ], fetch=True)
+            ]
+            extras[etablissement_id] = [
+                (row['id'], float(row['prix_unitaire'])) for row in execute_values(cur, '''
+                    INSERT INTO extras (etablissement_id, nom, prix_unitaire, unite)
+                    VALUES %s RETURNING id, prix_unitaire
+                ''', [(etablissement_id, nom, prix, unite) for nom, prix, unite in EXTRAS], fetch=True)
+            ]
+        counts['chambres'] = sum(len(rows) for rows in chambres.values())
+        counts['extras'] = sum(len(rows) for rows in extras.values())
+
+        today = date.today()
+        counts.update({'sejours': 0, 'personnes': 0, 'sejours_extras': 0})
+        for etablissement_id in etablissement_ids:
+            sejours = []
+            for n in range(SEJOURS_PER_ETABLISSEMENT):
+                arrivee = today - timedelta(days=rng.randint(-60, 540))
+                nuits = rng.randint(1, 10)
+                depart = arrivee + timedelta(days=nuits)
+                chambre_id, prix = rng.choice(chambres[etablissement_id])
+                closed = depart < today and rng.random() < CLOSED_RATIO
+                sejours.append({
+                    'chambre_id': chambre_id,
+                    'row': (
+                        etablissement_id, f'BENCH-{etablissement_id}-{n + 1:06d}', arrivee, depart, nuits,
+                        prix * nuits, prix * nuits * 0.15, 2.5 * nuits,
+                        'closed' if closed else 'active', arrivee if closed else None
+                    ),
+                })
+
+            sejour_ids = [
+                row['id'] for row in execute_values(cur, '''
+                    INSERT INTO reservations (
+                        etablissement_id, numero_reservation, date_arrivee, date_depart, nombre_jours,
+                        facture_hebergement, charge_plateforme, taxe_sejour, statut, closed_at
+                    ) VALUES %s RETURNING id
+                ''', [sejour['row'] for sejour in sejours], fetch=True, page_size=1000)
+            ]
+
+            execute_values(cur, '''
+                INSERT INTO reservations_chambres (reservation_id, chambre_id) VALUES %s
+            ''', [(sejour_id, sejour['chambre_id']) for sejour_id, sejour in zip(sejour_ids, sejours)], page_size=1000)
+
+            personnes = []
+            sejours_extras = []
+            for sejour_id, sejour in zip(sejour_ids, sejours):
+                for index in range(rng.randint(1, 3)):
+                    prenom, nom = rng.choice(PRENOMS), rng.choice(NOMS)
+                    personnes.append((
+                        sejour_id, sejour['chambre_id'], index == 0, nom, prenom,
+                        f'{prenom.lower()}.{nom.lower()}.{sejour_id}@example.com', rng.choice(PAYS)
+                    ))
+                for _ in range(rng.randint(0, 3)):
+                    extra_id, prix = rng.choice(extras[etablissement_id])
+                    quantite = rng.randint(1, 4)
+                    sejours_extras.append((sejour_id, extra_id, quantite, prix, prix * quantite))
+
+            execute_values(cur, '''
+                INSERT INTO personnes (
+                    reservation_id, chambre_id, est_contact_principal, nom, prenom, email, pays
+                ) VALUES %s
+            ''', personnes, page_size=1000)
+            if sejours_extras:
+                execute_values(cur, '''
+                    INSERT INTO sejours_extras (reservation_id, extra_id, quantite, prix_unitaire, montant_total)
+                    VALUES %s
+                ''', sejours_extras, page_size=1000)
+
+            counts['sejours'] += len(sejour_ids)
+            counts['personnes'] += len(personnes)
+            counts['sejours_extras'] += len(sejours_extras)
+
+        conn.commit()
+        cur.execute('ANALYZE')
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la génération: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+    print("✅ Données de performance générées:")
+    for table, count in counts.items():
+        print(f"   - {table}: {count}")
+    print(f"   Connexion: {BENCH_USERNAME} / {BENCH_PASSWORD}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Générer les données du banc de performance')
+    parser.add_argument('--scale', type=int, default=1, help='Facteur de volume (défaut: 1)')
+    parser.add_argument('--seed', type=int, default=42, help='Graine aléatoire (défaut: 42)')
+    args = parser.parse_args()
+    seed(scale=max(args.scale, 1), seed_value=args.seed)
+
+
+if __name__ == '__main__':
+    main()
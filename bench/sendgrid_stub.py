@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Bouchon local de l'API SendGrid (POST /v3/mail/send)
+
+Reproduit les réponses dont dépend la distribution des newsletters :
+- 202 : lot accepté (les destinataires sont enregistrés comme livrés)
+- 400 avec une erreur par personnalisation : adresses contenant « invalid »
+- 400 : plus de 1 000 personnalisations dans un appel
+- 401 : clé API ne commençant pas par « SG. »
+- statuts imposés aux appels suivants (fail_next), ex. [503, 429]
+
+Utilisé par bench.newsletter_delivery ; peut aussi tourner seul pour essayer
+l'application à la main (SENDGRID_API_URL=http://127.0.0.1:8090/v3/mail/send) :
+    python -m bench.sendgrid_stub --port 8090
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MAX_PERSONALIZATIONS = 1000
+
+
+class SendGridStub:
+    """Serveur bouchon et journal des appels reçus"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.fail_next = []
+        self.calls = []
+        self.delivered = []
+        self.inflight = 0
+        self.max_inflight = 0
+        self._server = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/v3/mail/send'
+
+    def start(self, port=0):
+        """Démarrer le serveur dans un thread (port 0 = port libre) ; retourner son URL"""
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                status, errors = stub._respond(self.headers.get('Authorization', ''), body)
+                payload = json.dumps({'errors': errors}).encode('utf-8') if errors else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='sendgrid-stub', daemon=True).start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+    def reset(self):
+        """Vider le journal des appels entre deux scénarios"""
+        with self.lock:
+            self.fail_next = []
+            self.calls = []
+            self.delivered = []
+            self.max_inflight = 0
+
+    def _respond(self, authorization, body):
+        personalizations = body.get('personalizations') or []
+        with self.lock:
+            self.inflight += 1
+            self.max_inflight = max(self.max_inflight, self.inflight)
+            forced = self.fail_next.pop(0) if self.fail_next else None
+        time.sleep(self.latency)
+
+        if not authorization.startswith('Bearer SG.'):
+            status, errors = 401, [{'message': 'The provided authorization grant is invalid.'}]
+        elif len(personalizations) > MAX_PERSONALIZATIONS:
+            status, errors = 400, [{'field': 'personalizations', 'message': 'Too many personalizations.'}]
+        elif forced:
+            status, errors = forced, [{'message': f'Statut imposé {forced}'}]
+        else:
+            errors = [
+                {'field': f'personalizations.{index}.to', 'message': 'Does not contain a valid address.'}
+                for index, personalization in enumerate(personalizations)
+                if 'invalid' in personalization['to'][0]['email']
+            ]
+            status = 400 if errors else 202
+
+        with self.lock:
+            self.inflight -= 1
+            self.calls.append({'recipients': len(personalizations), 'status': status})
+            if status == 202:
+                self.delivered += [personalization['to'][0]['email'] for personalization in personalizations]
+        return status, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bouchon local de l\'API SendGrid')
+    parser.add_argument('--port', type=int, default=8090, help='Port d\'écoute (défaut: 8090)')
+    parser.add_argument('--latency', type=float, default=0.05, help='Délai de réponse en secondes (défaut: 0.05)')
+    args = parser.parse_args()
+
+    stub = SendGridStub(latency=args.latency)
+    print(f"📮 Bouchon SendGrid sur {stub.start(args.port)} (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(5)
+            with stub.lock:
+                print(f"  {len(stub.calls)} appel(s), {len(stub.delivered)} destinataire(s) livré(s)")
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Scénarios d'envoi SMTP par le pool de sessions contre un bouchon local
+
+Démarre bench.smtp_stub (STARTTLS, AUTH) et envoie par EmailService
+(backend/services/smtp_pool.py) depuis une configuration mail d'un
+établissement « Bench SMTP » créé pour l'occasion :
+
+- sessions réutilisées : 40 envois successifs sur deux connexions
+  (renouvellement après SMTP_MAX_MESSAGES_PER_SESSION messages), un NOOP avant
+  chaque réutilisation ; coût par message comparé à une connexion par message
+- envoi groupé : send_bulk sur une même session, les destinataires refusés
+  (550) n'interrompent pas la série
+- coupures : une session inactive coupée par le serveur est écartée au NOOP ;
+  une session coupée pendant l'envoi est remplacée et le message renvoyé une fois
+- refus : 554 définitif, 451 temporaire dans une série, authentification
+  refusée sans nouvelle connexion pour les messages suivants
+
+Les envois réussis sont copiés dans le dossier « sent » de la configuration.
+Code de sortie 1 si une vérification échoue.
+
+Usage:
+    python -m bench.smtp_delivery
+    python -m bench.smtp_delivery --messages 100 --bulk 200
+"""
+import argparse
+import json
+import os
+import smtplib
+import sys
+import time
+from datetime import datetime
+
+from bench.smtp_stub import PASSWORD, SmtpStub
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT_DIR, 'bench', 'results')
+BENCH_ETABLISSEMENT = 'Bench SMTP'
+SCENARIO_ENV = {
+    'SMTP_POOL_SIZE': '2',
+    'SMTP_IDLE_TIMEOUT': '60',
+    'SMTP_MAX_MESSAGES_PER_SESSION': '25',
+}
+
+
+class Scenario:
+    """Vérifications et mesures d'un scénario"""
+
+    def __init__(self, name):
+        self.name = name
+        self.checks = []
+        self.metrics = {}
+        self.started = time.perf_counter()
+        self.seconds = None
+
+    def check(self, label, expected, actual):
+        self.checks.append({'check': label, 'expected': expected, 'actual': actual, 'ok': expected == actual})
+
+    def finish(self):
+        self.seconds = round(time.perf_counter() - self.started, 2)
+        return self
+
+    @property
+    def ok(self):
+        return all(check['ok'] for check in self.checks)
+
+    def report(self):
+        return {
+            'scenario': self.name,
+            'ok': self.ok,
+            'seconds': self.seconds,
+            'metrics': self.metrics,
+            'checks': self.checks,
+        }
+
+
+def split(total, size):
+    """Messages par session pour `total` messages renouvelées tous les `size` messages"""
+    return [size] * (total // size) + ([total % size] if total % size else [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scénarios d\'envoi SMTP par le pool de sessions')
+    parser.add_argument('--messages', type=int, default=40, help='Envois successifs (défaut: 40)')
+    parser.add_argument('--bulk', type=int, default=60, help='Messages de l\'envoi groupé (défaut: 60)')
+    parser.add_argument('--output', help='Fichier JSON du rapport (défaut: bench/results/smtp_delivery-<date>.json)')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+        sys.exit(1)
+
+    stub = SmtpStub()
+    port = stub.start()
+    for name, value in SCENARIO_ENV.items():
+        os.environ[name] = value
+
+    # Les réglages sont lus à l'import : importer l'application après l'environnement
+    from backend.config.database import get_db_connection
+    from backend.models.mail_config import MailConfig
+    from backend.services import smtp_pool as pool_module
+    from backend.services.email_service import EmailService
+    from backend.services.smtp_pool import is_permanent_error, smtp_pool
+
+    per_session = pool_module.SMTP_MAX_MESSAGES_PER_SESSION
+    conn = get_db_connection()
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute('DELETE FROM etablissements WHERE nom_etablissement = %s', (BENCH_ETABLISSEMENT,))
+    cur.execute('INSERT INTO etablissements (nom_etablissement) VALUES (%s) RETURNING id', (BENCH_ETABLISSEMENT,))
+    etablissement_id = cur.fetchone()['id']
+
+    def create_config(name, password):
+        return MailConfig.create({
+            'etablissement_id': etablissement_id,
+            'nom_config': name,
+            'email_address': 'reception@bench.test',
+            'smtp_host': '127.0.0.1',
+            'smtp_port': port,
+            'smtp_username': 'reception@bench.test',
+            'smtp_password': password,
+            'smtp_use_tls': True,
+        })
+
+    config_id = create_config('Bench SMTP', PASSWORD)
+    wrong_config_id = create_config('Bench SMTP (mot de passe refusé)', 'refuse')
+
+    def pool_status(config):
+        return next((entry for entry in smtp_pool.status()['configs'] if entry['config_id'] == config), {})
+
+    def sent_count():
+        cur.execute("SELECT COUNT(*) AS total FROM emails WHERE mail_config_id = %s AND folder = 'sent'", (config_id,))
+        return cur.fetchone()['total']
+
+    def bulk(count, invalid=()):
+        return [{
+            'to_email': f'invalid{i}@bench.test' if i in invalid else f'client{i}@bench.test',
+            'subject': f'Confirmation {i}',
+            'body_html': f'<p>Confirmation de séjour {i}</p>',
+        } for i in range(count)]
+
+    def start(name):
+        smtp_pool.reset()
+        stub.reset()
+        return Scenario(name)
+
+    scenarios = []
+    try:
+        # 1. Envois successifs sur des sessions réutilisées
+        scenario = start('sessions réutilisées')
+        for i in range(args.messages):
+            EmailService.send_email(config_id, f'client{i}@bench.test', f'Confirmation {i}', '<p>Bonjour</p>')
+        status = pool_status(config_id)
+        scenario.check('messages par connexion', split(args.messages, per_session), stub.per_connection())
+        scenario.check('NOOP avant chaque réutilisation', args.messages - len(stub.per_connection()), stub.noops)
+        scenario.check('réutilisations', args.messages - len(stub.per_connection()), status.get('reuses'))
+        scenario.check('copiés dans « sent »', args.messages, sent_count())
+
+        # Coût SMTP seul (sans enregistrement dans « sent ») : pool contre une connexion par message
+        config = MailConfig.get_by_id(config_id)
+        message = 'Subject: Confirmation\r\n\r\nBonjour'
+        started = time.perf_counter()
+        for i in range(args.messages):
+            smtp_pool.send(config, config['email_address'], [f'client{i}@bench.test'], message)
+        pooled = time.perf_counter() - started
+        started = time.perf_counter()
+        for i in range(args.messages):
+            server = smtplib.SMTP(config['smtp_host'], config['smtp_port'], timeout=10)
+            server.starttls()
+            server.login(config['smtp_username'], config['smtp_password'])
+            server.sendmail(config['email_address'], [f'client{i}@bench.test'], message)
+            server.quit()
+        scenario.metrics.update({
+            'pool_ms_per_message': round(1000 * pooled / args.messages, 2),
+            'new_connection_ms_per_message': round(1000 * (time.perf_counter() - started) / args.messages, 2),
+        })
+        scenarios.append(scenario.finish())
+
+        # 2. Envoi groupé avec destinataires refusés
+        scenario = start('envoi groupé')
+        before = sent_count()
+        invalid = {3, args.bulk // 2}
+        started = time.perf_counter()
+        results = EmailService.send_bulk(config_id, bulk(args.bulk, invalid))
+        scenario.metrics['ms_per_message'] = round(1000 * (time.perf_counter() - started) / args.bulk, 2)
+        failed = [index for index, result in enumerate(results) if not result['success']]
+        scenario.check('destinataires refusés', sorted(invalid), failed)
+        scenario.check('erreur 550 rapportée', True, all('550' in results[index]['error'] for index in failed))
+        scenario.check('messages par connexion', split(args.bulk - len(invalid), per_session), stub.per_connection())
+        scenario.check('aucun NOOP sur un pool vide', 0, stub.noops)
+        scenario.check('copiés dans « sent »', args.bulk - len(invalid), sent_count() - before)
+        scenarios.append(scenario.finish())
+
+        # 3. Sessions coupées par le serveur
+        scenario = start('coupures')
+        EmailService.send_email(config_id, 'avant@bench.test', 'Avant coupure', '<p>1</p>')
+        stub.drop_connections()
+        EmailService.send_email(config_id, 'apres@bench.test', 'Après coupure', '<p>2</p>')
+        status = pool_status(config_id)
+        scenario.check('session inactive coupée écartée au NOOP', (1, 0), (status.get('stale'), status.get('resends')))
+        stub.drop_next_mail = True
+        EmailService.send_email(config_id, 'pendant@bench.test', 'Coupure pendant l\'envoi', '<p>3</p>')
+        status = pool_status(config_id)
+        scenario.check('message renvoyé sur une nouvelle connexion', (2, 1), (status.get('stale'), status.get('resends')))
+        scenario.check('chaque message reçu une fois', ['avant@bench.test', 'apres@bench.test', 'pendant@bench.test'],
+                       [delivery['recipients'][0] for delivery in stub.deliveries])
+        scenario.check('connexions', 3, status.get('connections'))
+        scenario.check('aucun échec', 0, status.get('failures'))
+        scenarios.append(scenario.finish())
+
+        # 4. Refus définitifs et temporaires, authentification refusée
+        scenario = start('refus')
+        stub.fail_next = [554]
+        try:
+            EmailService.send_email(config_id, 'refus@bench.test', 'Refus', '<p>554</p>')
+            error = None
+        except smtplib.SMTPException as e:
+            error = e
+        scenario.check('554 définitif', (554, True),
+                       (getattr(error, 'smtp_code', None), error is not None and is_permanent_error(error)))
+        stub.fail_next = [451]
+        logins = stub.logins
+        results = EmailService.send_bulk(config_id, bulk(3))
+        scenario.check('451 n\'interrompt pas la série', [False, True, True], [result['success'] for result in results])
+        scenario.check('une seule connexion pour la série', 1, stub.logins - logins)
+        stub.reset()
+        try:
+            EmailService.send_email(wrong_config_id, 'auth@bench.test', 'Auth', '<p>535</p>')
+        except smtplib.SMTPAuthenticationError:
+            pass
+        attempt = stub.auth_failures
+        results = EmailService.send_bulk(wrong_config_id, bulk(5))
+        scenario.check('authentification refusée : tous en échec', [False] * 5, [result['success'] for result in results])
+        scenario.check('une seule tentative de connexion pour la série', attempt * 2, stub.auth_failures)
+        scenario.check('aucun message reçu', 0, len(stub.deliveries))
+        scenarios.append(scenario.finish())
+    finally:
+        smtp_pool.reset()
+        stub.stop()
+        cur.execute('DELETE FROM etablissements WHERE id = %s', (etablissement_id,))
+        cur.close()
+        conn.close()
+
+    for scenario in scenarios:
+        report = scenario.report()
+        print(f"{'✅' if report['ok'] else '❌'} {report['scenario']:<22} {report['seconds']:>6.1f}s  {report['metrics'] or ''}")
+        for check in report['checks']:
+            if not check['ok']:
+                print(f"     ✗ {check['check']}: attendu {check['expected']!r}, obtenu {check['actual']!r}")
+
+    output = args.output or os.path.join(RESULTS_DIR, f'smtp_delivery-{datetime.now():%Y%m%d-%H%M%S}.json')
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'generated_at': datetime.now().isoformat(), 'scenarios': [s.report() for s in scenarios]},
+                  f, indent=2, ensure_ascii=False)
+    print(f"\n📄 Rapport: {os.path.relpath(output, ROOT_DIR)}")
+
+    if not all(scenario.ok for scenario in scenarios):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
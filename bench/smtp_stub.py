@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Bouchon SMTP local (aiosmtpd) avec STARTTLS et authentification
+
+Reproduit le serveur auquel parle le pool de sessions SMTP
+(backend/services/smtp_pool.py) : STARTTLS obligatoire avant AUTH (certificat
+auto-signé généré au démarrage avec openssl, que smtplib ne vérifie pas),
+AUTH PLAIN/LOGIN, NOOP, plusieurs messages par connexion. Réponses :
+- 535 : mot de passe différent de « bench » (auth_failures compte chaque
+  mécanisme essayé par smtplib)
+- 550 : destinataire contenant « invalid »
+- statuts imposés aux messages suivants (fail_next), ex. [451, 554]
+- drop_connections() : coupure des connexions ouvertes (serveur redémarré,
+  délai d'inactivité atteint)
+- drop_next_mail : coupure de la connexion au MAIL FROM suivant, après un NOOP
+  réussi (session coupée pendant l'envoi)
+
+Nécessite aiosmtpd, qui ne sert qu'au banc (pip install aiosmtpd). Utilisé par
+bench.smtp_delivery ; peut aussi tourner seul pour essayer l'application à la
+main (configuration SMTP avec TLS sur 127.0.0.1, port 8025) :
+    python -m bench.smtp_stub --port 8025
+"""
+import argparse
+import itertools
+import logging
+import os
+import socket
+import ssl
+import subprocess
+import tempfile
+import threading
+import time
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+PASSWORD = 'bench'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _tls_context():
+    """Contexte TLS serveur avec un certificat auto-signé jetable"""
+    with tempfile.TemporaryDirectory() as directory:
+        cert, key = os.path.join(directory, 'cert.pem'), os.path.join(directory, 'key.pem')
+        subprocess.run(['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1',
+                        '-subj', '/CN=127.0.0.1', '-keyout', key, '-out', cert],
+                       check=True, capture_output=True)
+        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+        context.load_cert_chain(cert, key)
+    return context
+
+
+class SmtpStub:
+    """Serveur bouchon et journal des connexions et messages reçus"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.fail_next = []
+        self.drop_next_mail = False
+        self.logins = 0
+        self.auth_failures = 0
+        self.noops = 0
+        self.deliveries = []
+        self._transports = {}
+        self._connections = itertools.count(1)
+        self._controller = None
+
+    @property
+    def port(self):
+        return self._controller.port
+
+    def start(self, port=0):
+        """Démarrer le serveur dans un thread (port 0 = port libre) ; retourner son port"""
+        # aiosmtpd journalise un avertissement d'obsolescence à chaque AUTH réussi
+        logging.getLogger('mail.log').setLevel(logging.ERROR)
+        self._controller = Controller(
+            self, hostname='127.0.0.1', port=port or _free_port(),
+            tls_context=_tls_context(), require_starttls=True,
+            authenticator=self._authenticate, auth_require_tls=True,
+        )
+        self._controller.start()
+        return self.port
+
+    def stop(self):
+        if self._controller is not None:
+            self._controller.stop()
+
+    def reset(self):
+        """Vider le journal entre deux scénarios"""
+        with self.lock:
+            self.fail_next = []
+            self.drop_next_mail = False
+            self.logins = 0
+            self.auth_failures = 0
+            self.noops = 0
+            self.deliveries = []
+
+    def drop_connections(self):
+        """Couper toutes les connexions ouvertes, comme un serveur redémarré"""
+        with self.lock:
+            transports, self._transports = list(self._transports.values()), {}
+        for transport in transports:
+            self._controller.loop.call_soon_threadsafe(transport.close)
+        time.sleep(0.1)
+
+    def per_connection(self):
+        """Messages acceptés par connexion, dans l'ordre d'ouverture"""
+        with self.lock:
+            counts = {}
+            for delivery in self.deliveries:
+                if delivery['status'] == 250:
+                    counts[delivery['connection']] = counts.get(delivery['connection'], 0) + 1
+            return list(counts.values())
+
+    def _authenticate(self, server, session, envelope, mechanism, auth_data):
+        with self.lock:
+            if auth_data.password.decode('utf-8') != PASSWORD:
+                self.auth_failures += 1
+                return AuthResult(success=False, handled=False)
+            self.logins += 1
+            session.connection = next(self._connections)
+            self._transports[session.connection] = server.transport
+        return AuthResult(success=True, auth_data=auth_data)
+
+    async def handle_NOOP(self, server, session, envelope, arg):
+        with self.lock:
+            self.noops += 1
+        return '250 OK'
+
+    async def handle_MAIL(self, server, session, envelope, address, mail_options):
+        with self.lock:
+            drop, self.drop_next_mail = self.drop_next_mail, False
+        if drop:
+            server.transport.close()
+            return '421 Connexion coupée'
+        envelope.mail_from = address
+        envelope.mail_options.extend(mail_options)
+        return '250 OK'
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if 'invalid' in address:
+            return '550 5.1.1 Destinataire inconnu'
+        envelope.rcpt_tos.append(address)
+        return '250 OK'
+
+    async def handle_DATA(self, server, session, envelope):
+        with self.lock:
+            forced = self.fail_next.pop(0) if self.fail_next else None
+            status = forced or 250
+            self.deliveries.append({
+                'connection': session.connection, 'recipients': list(envelope.rcpt_tos), 'status': status,
+            })
+        return f'{status} Statut imposé' if forced else '250 Message accepté'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bouchon SMTP local')
+    parser.add_argument('--port', type=int, default=8025, help='Port d\'écoute (défaut: 8025)')
+    args = parser.parse_args()
+
+    stub = SmtpStub()
+    print(f"📤 Bouchon SMTP (STARTTLS) sur 127.0.0.1:{stub.start(args.port)}, "
+          f"mot de passe « {PASSWORD} » (Ctrl+C pour arrêter)")
+    try:
+        while True:
+            time.sleep(5)
+            with stub.lock:
+                print(f"  {stub.logins} connexion(s), {len(stub.deliveries)} message(s)")
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == '__main__':
+    main()
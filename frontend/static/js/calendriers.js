@@ -74,6 +74,7 @@ function displayCalendars(calendars) {
                     <th>Établissement</th>
                     <th>Plateforme</th>
                     <th>Dernière synchro</th>
+                    <th>Prochaine synchro</th>
                     <th>Statut</th>
                     <th>Actions</th>
                 </tr>
@@ -83,6 +84,11 @@ function displayCalendars(calendars) {
                     const lastSync = cal.derniere_synchronisation 
                         ? new Date(cal.derniere_synchronisation).toLocaleString('fr-FR')
                         : 'Jamais';
+                    const nextSync = !cal.actif
+                        ? '—'
+                        : cal.prochaine_synchronisation
+                            ? new Date(cal.prochaine_synchronisation).toLocaleString('fr-FR')
+                            : 'Imminente';
                     const statusBadge = getStatusBadge(cal.statut_derniere_synchro);
                     const platformBadge = getPlatformBadge(cal.plateforme);
                     
@@ -92,6 +98,7 @@ function displayCalendars(calendars) {
                         <td>${cal.nom_etablissement || 'N/A'}</td>
                         <td>${platformBadge}</td>
                         <td>${lastSync}</td>
+                        <td>${nextSync}${cal.echecs_consecutifs > 1 ? ` <small title="Échecs consécutifs">(${cal.echecs_consecutifs} échecs)</small>` : ''}</td>
                         <td>${statusBadge}</td>
                         <td>
                             <button class="btn-icon" onclick="synchronizeCalendar(${cal.id})" title="Synchroniser">
@@ -218,6 +225,104 @@ async function synchronizeCalendar(calendarId) {
     }
 }
 
+async function synchronizeAllCalendars() {
+    const btn = document.getElementById('syncAllBtn');
+    const etablissementId = document.getElementById('filterEtablissement').value;
+    btn.disabled = true;
+    btn.textContent = '⏳ Synchronisation...';
+    
+    try {
+        const response = await fetch('/api/calendriers/synchroniser', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(etablissementId ? { etablissement_id: parseInt(etablissementId) } : {})
+        });
+        
+        const result = await response.json();
+        
+        if (!response.ok) {
+            alert('Erreur: ' + (result.error || result.message));
+            return;
+        }
+        
+        if (response.status === 202) {
+            // Plusieurs établissements : synchronisation confiée au planificateur
+            alert(result.message);
+            return;
+        }
+        
+        const failures = result.results
+            .filter(r => !r.success)
+            .map(r => `- ${r.nom} (${r.plateforme}): ${r.message}`);
+        
+        alert(`${result.message} en ${(result.duration_ms / 1000).toFixed(1)} s` +
+            (failures.length ? `\n\nÉchecs:\n${failures.join('\n')}` : ''));
+        loadCalendars();
+        loadSejours();
+    } catch (error) {
+        console.error('Erreur:', error);
+        alert('Erreur lors de la synchronisation');
+    } finally {
+        btn.disabled = false;
+        btn.textContent = '🔄 Tout synchroniser';
+    }
+}
+
+async function loadExportLinks(regenerate = false) {
+    const etablissementId = document.getElementById('filterEtablissement').value;
+    const container = document.getElementById('exportLinks');
+    
+    if (!etablissementId) {
+        alert('Sélectionnez d\'abord un établissement');
+        return;
+    }
+    
+    try {
+        const response = await fetch(
+            `/api/calendriers/export/${etablissementId}` + (regenerate ? '/regenerer' : ''),
+            { method: regenerate ? 'POST' : 'GET' }
+        );
+        const result = await response.json();
+        
+        if (!response.ok) {
+            alert('Erreur: ' + (result.error || result.message));
+            return;
+        }
+        
+        const rows = [{ nom: 'Tout l\'établissement', url: result.etablissement_url }]
+            .concat(result.chambres.map(c => ({ nom: c.nom, url: c.url })));
+        
+        container.innerHTML = `
+            <table>
+                <thead>
+                    <tr>
+                        <th>Flux</th>
+                        <th>URL à renseigner sur la plateforme</th>
+                    </tr>
+                </thead>
+                <tbody>
+                    ${rows.map(row => `
+                    <tr>
+                        <td><strong>${row.nom}</strong></td>
+                        <td><input type="text" readonly value="${row.url}" onclick="this.select()" style="width: 100%;"></td>
+                    </tr>
+                    `).join('')}
+                </tbody>
+            </table>
+        `;
+    } catch (error) {
+        console.error('Erreur:', error);
+        alert('Erreur lors du chargement des liens d\'export');
+    }
+}
+
+async function regenerateExportLinks() {
+    if (!confirm('Les liens actuels cesseront de fonctionner. Continuer ?')) {
+        return;
+    }
+    await loadExportLinks(true);
+}
+
 document.getElementById('calendarForm').addEventListener('submit', async function(e) {
     e.preventDefault();
     
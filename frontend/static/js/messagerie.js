@@ -137,7 +137,7 @@ function displayEmails(emails) {
                 ${currentFolder === 'sent' ? 'À: ' + escapeHtml(email.to_email || '') : 'De: ' + escapeHtml(email.from_email || '')}
             </div>
             <div class="email-item-preview">
-                ${escapeHtml((email.body_text || email.body_html || '').substring(0, 100))}...
+                ${escapeHtml((email.snippet || '').substring(0, 100))}...
             </div>
         </div>
     `).join('');
@@ -149,7 +149,7 @@ function filterEmails(searchTerm) {
         (email.subject || '').toLowerCase().includes(term) ||
         (email.from_email || '').toLowerCase().includes(term) ||
         (email.to_email || '').toLowerCase().includes(term) ||
-        (email.body_text || '').toLowerCase().includes(term)
+        (email.snippet || '').toLowerCase().includes(term)
     );
     displayEmails(filtered);
 }
@@ -234,7 +234,7 @@ async function sendEmail(event) {
         const result = await response.json();
         
         if (response.ok) {
-            showAlert('Email envoyé avec succès', 'success');
+            showAlert(result.message || 'Email mis en file d\'envoi', 'success');
             closeComposeModal();
             await loadEmails();
         } else {
@@ -1,10 +1,17 @@
 let selectedClients = new Set();
 let allClients = [];
+let segments = [];
+let editingSegmentId = null;
+let historyRefreshTimer = null;
+
+const MERGE_FIELDS_HELP = 'Personnalisation : {{ prenom }}, {{ nom }}, {{ etablissement }}, {{ dernier_sejour }}, {{ nombre_sejours }}... (ex. {{ prenom | default("cher client", true) }}).';
 
 document.addEventListener('DOMContentLoaded', function() {
     loadClients();
+    loadSegments();
     loadNewsletterHistory();
     loadSendGridConfig();
+    updateEditorPlaceholder();
 });
 
 function showTab(tabName) {
@@ -14,6 +21,7 @@ function showTab(tabName) {
     
     const tabs = {
         'compose': 'composeTab',
+        'segments': 'segmentsTab',
         'history': 'historyTab',
         'config': 'configTab'
     };
@@ -25,6 +33,10 @@ function showTab(tabName) {
     
     if (tabName === 'history') {
         loadNewsletterHistory();
+    } else if (tabName === 'segments') {
+        loadSegments();
+        loadSegmentOptions();
+        loadOptOuts();
     } else if (tabName === 'config') {
         loadSendGridConfig();
     }
@@ -37,6 +49,11 @@ function loadClients() {
             if (data.success) {
                 allClients = data.clients;
                 renderClientsList(allClients);
+                
+                // La sélection manuelle est limitée aux premiers clients : au-delà, utiliser un segment
+                const truncated = document.getElementById('clientsTruncated');
+                truncated.style.display = data.total > allClients.length ? 'block' : 'none';
+                truncated.textContent = `${allClients.length} premiers clients sur ${data.total} : utilisez un segment pour les autres.`;
             } else {
                 document.getElementById('clientsList').innerHTML = 
                     `<tr><td colspan="6" style="text-align: center; color: #ef4444;">Erreur: ${data.error}</td></tr>`;
@@ -63,10 +80,10 @@ function renderClientsList(clients) {
                 <input type="checkbox" 
                     class="client-checkbox" 
                     data-email="${client.email}"
-                    data-client-id="${client.id}"
+                    ${client.desabonne ? 'disabled title="Adresse désabonnée"' : ''}
                     onchange="updateSelectedClients()">
             </td>
-            <td>${client.nom || '-'}</td>
+            <td>${client.nom || '-'}${client.desabonne ? ' <span class="badge badge-red">Désabonné</span>' : ''}</td>
             <td>${client.prenom || '-'}</td>
             <td>${client.email}</td>
             <td>${client.pays || '-'}</td>
@@ -81,7 +98,7 @@ function toggleSelectAllClients() {
     
     headerCheckbox.checked = selectAll;
     
-    document.querySelectorAll('.client-checkbox').forEach(checkbox => {
+    document.querySelectorAll('.client-checkbox:not(:disabled)').forEach(checkbox => {
         checkbox.checked = selectAll;
     });
     
@@ -97,14 +114,16 @@ function updateSelectedClients() {
     
     const selectAllCheckbox = document.getElementById('selectAllClients');
     const headerCheckbox = document.getElementById('headerCheckbox');
-    const totalCheckboxes = document.querySelectorAll('.client-checkbox').length;
+    const totalCheckboxes = document.querySelectorAll('.client-checkbox:not(:disabled)').length;
     const checkedCheckboxes = document.querySelectorAll('.client-checkbox:checked').length;
     
     selectAllCheckbox.checked = checkedCheckboxes === totalCheckboxes && totalCheckboxes > 0;
     headerCheckbox.checked = selectAllCheckbox.checked;
     
-    document.getElementById('selectedCount').innerHTML = 
-        `<strong>${selectedClients.size}</strong> destinataire(s) sélectionné(s)`;
+    if (getRecipientMode() === 'manual') {
+        document.getElementById('selectedCount').innerHTML = 
+            `<strong>${selectedClients.size}</strong> destinataire(s) sélectionné(s)`;
+    }
 }
 
 function sendNewsletter() {
@@ -122,13 +141,32 @@ function sendNewsletter() {
         return;
     }
     
-    if (selectedClients.size === 0) {
-        alert('❌ Veuillez sélectionner au moins un destinataire');
-        return;
-    }
+    const payload = {
+        subject: subject,
+        content: content,
+        content_type: contentType
+    };
     
-    if (!confirm(`Voulez-vous vraiment envoyer cette newsletter à ${selectedClients.size} destinataire(s) ?`)) {
-        return;
+    if (getRecipientMode() === 'segment') {
+        const segmentId = document.getElementById('segmentSelect').value;
+        if (!segmentId) {
+            alert('❌ Veuillez choisir un segment');
+            return;
+        }
+        const segmentName = segments.find(segment => String(segment.id) === segmentId).nom;
+        if (!confirm(`Voulez-vous vraiment envoyer cette newsletter au segment « ${segmentName} » ?`)) {
+            return;
+        }
+        payload.segment_id = parseInt(segmentId);
+    } else {
+        if (selectedClients.size === 0) {
+            alert('❌ Veuillez sélectionner au moins un destinataire');
+            return;
+        }
+        if (!confirm(`Voulez-vous vraiment envoyer cette newsletter à ${selectedClients.size} destinataire(s) ?`)) {
+            return;
+        }
+        payload.recipient_emails = Array.from(selectedClients);
     }
     
     const btn = event.target;
@@ -140,12 +178,7 @@ function sendNewsletter() {
         headers: {
             'Content-Type': 'application/json'
         },
-        body: JSON.stringify({
-            subject: subject,
-            content: content,
-            content_type: contentType,
-            recipient_emails: Array.from(selectedClients)
-        })
+        body: JSON.stringify(payload)
     })
     .then(response => response.json())
     .then(data => {
@@ -177,6 +210,348 @@ function resetNewsletterForm() {
     document.getElementById('selectAllClients').checked = false;
     document.getElementById('headerCheckbox').checked = false;
     updateSelectedClients();
+    updateRecipientMode();
+}
+
+function getRecipientMode() {
+    return document.querySelector('input[name="recipientMode"]:checked').value;
+}
+
+function updateRecipientMode() {
+    const mode = getRecipientMode();
+    document.getElementById('segmentRecipients').style.display = mode === 'segment' ? 'block' : 'none';
+    document.getElementById('manualRecipients').style.display = mode === 'manual' ? 'block' : 'none';
+    
+    if (mode === 'segment') {
+        updateSegmentCount();
+    } else {
+        updateSelectedClients();
+    }
+}
+
+function updateSegmentCount() {
+    const segmentId = document.getElementById('segmentSelect').value;
+    const selectedCount = document.getElementById('selectedCount');
+    
+    if (!segmentId) {
+        selectedCount.innerHTML = '<strong>0</strong> destinataire(s) sélectionné(s)';
+        return;
+    }
+    
+    selectedCount.innerHTML = '⏳ Calcul des destinataires...';
+    fetch(`/api/newsletters/segments/${segmentId}/audience?limit=0`)
+        .then(response => response.json())
+        .then(data => {
+            if (document.getElementById('segmentSelect').value !== segmentId || getRecipientMode() !== 'segment') {
+                return;
+            }
+            selectedCount.innerHTML = data.success
+                ? `<strong>${data.total - data.desabonnes}</strong> destinataire(s) dans ce segment`
+                : `Erreur: ${data.error}`;
+        })
+        .catch(error => {
+            console.error('Error counting segment:', error);
+        });
+}
+
+function describeCriteria(criteres) {
+    const parts = [];
+    if (criteres.pays) parts.push(`Pays: ${criteres.pays.join(', ')}`);
+    if (criteres.sejour_du || criteres.sejour_au) {
+        parts.push(`Séjour ${criteres.sejour_du ? 'à partir du ' + new Date(criteres.sejour_du).toLocaleDateString('fr-FR') : ''} ${criteres.sejour_au ? "jusqu'au " + new Date(criteres.sejour_au).toLocaleDateString('fr-FR') : ''}`.trim());
+    }
+    if (criteres.sejours_min != null) parts.push(`${criteres.sejours_min} séjour(s) minimum`);
+    if (criteres.sejours_max != null) parts.push(`${criteres.sejours_max} séjour(s) maximum`);
+    if (criteres.extras) parts.push(`${criteres.extras.length} extra(s) acheté(s)`);
+    if (criteres.abonnement === 'desabonnes') parts.push('Désabonnés');
+    if (criteres.abonnement === 'tous') parts.push('Abonnés et désabonnés');
+    return parts.length ? parts.join(' · ') : 'Tous les clients abonnés';
+}
+
+function loadSegments() {
+    fetch('/api/newsletters/segments')
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                document.getElementById('segmentsList').innerHTML = 
+                    `<tr><td colspan="3" style="text-align: center; color: #ef4444;">Erreur: ${data.error}</td></tr>`;
+                return;
+            }
+            segments = data.segments;
+            renderSegments();
+        })
+        .catch(error => {
+            console.error('Error loading segments:', error);
+            document.getElementById('segmentsList').innerHTML = 
+                '<tr><td colspan="3" style="text-align: center; color: #ef4444;">Erreur de chargement</td></tr>';
+        });
+}
+
+function renderSegments() {
+    const select = document.getElementById('segmentSelect');
+    const current = select.value;
+    select.innerHTML = '<option value="">-- Choisir un segment --</option>' + segments.map(segment => 
+        `<option value="${segment.id}">${segment.nom}</option>`
+    ).join('');
+    if (segments.some(segment => String(segment.id) === current)) {
+        select.value = current;
+    }
+    if (getRecipientMode() === 'segment') {
+        updateSegmentCount();
+    }
+    
+    const tbody = document.getElementById('segmentsList');
+    if (segments.length === 0) {
+        tbody.innerHTML = '<tr><td colspan="3" style="text-align: center; color: #6b7280;">Aucun segment enregistré</td></tr>';
+        return;
+    }
+    
+    tbody.innerHTML = segments.map(segment => `
+        <tr>
+            <td><strong>${segment.nom}</strong></td>
+            <td>${describeCriteria(segment.criteres)}</td>
+            <td>
+                <button class="btn btn-secondary btn-sm" onclick="editSegment(${segment.id})" title="Modifier">✏️</button>
+                <button class="btn btn-danger btn-sm" onclick="deleteSegment(${segment.id})" title="Supprimer">🗑️</button>
+            </td>
+        </tr>
+    `).join('');
+}
+
+function loadSegmentOptions() {
+    fetch('/api/newsletters/segments/options')
+        .then(response => response.json())
+        .then(data => {
+            if (!data.success) {
+                return;
+            }
+            const selected = collectSegmentCriteria();
+            document.getElementById('segmentPays').innerHTML = data.pays.map(item => 
+                `<option value="${item.pays}">${item.pays} (${item.count})</option>`
+            ).join('');
+            document.getElementById('segmentExtras').innerHTML = data.extras.map(extra => 
+                `<option value="${extra.id}">${extra.nom}${extra.actif ? '' : ' (inactif)'}</option>`
+            ).join('');
+            setMultipleSelection('segmentPays', selected.pays || []);
+            setMultipleSelection('segmentExtras', selected.extras || []);
+        })
+        .catch(error => {
+            console.error('Error loading segment options:', error);
+        });
+}
+
+function setMultipleSelection(selectId, values) {
+    const wanted = values.map(value => String(value).toLowerCase());
+    Array.from(document.getElementById(selectId).options).forEach(option => {
+        option.selected = wanted.includes(option.value.toLowerCase());
+    });
+}
+
+function collectSegmentCriteria() {
+    const selectedValues = id => Array.from(document.getElementById(id).selectedOptions).map(option => option.value);
+    const criteres = {
+        pays: selectedValues('segmentPays'),
+        extras: selectedValues('segmentExtras').map(value => parseInt(value)),
+        sejour_du: document.getElementById('segmentSejourDu').value || null,
+        sejour_au: document.getElementById('segmentSejourAu').value || null,
+        sejours_min: document.getElementById('segmentSejoursMin').value || null,
+        sejours_max: document.getElementById('segmentSejoursMax').value || null,
+        abonnement: document.getElementById('segmentAbonnement').value
+    };
+    return criteres;
+}
+
+function previewSegment() {
+    const preview = document.getElementById('segmentPreview');
+    preview.style.display = 'block';
+    preview.innerHTML = '⏳ Calcul des destinataires...';
+    
+    fetch('/api/newsletters/segments/preview', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({criteres: collectSegmentCriteria(), limit: 10})
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (!data.success) {
+            preview.innerHTML = `❌ ${data.error}`;
+            return;
+        }
+        const sample = data.recipients.map(recipient => 
+            `${recipient.prenom || ''} ${recipient.nom || ''} &lt;${recipient.email}&gt;`
+        ).join(', ');
+        preview.innerHTML = `<strong>${data.total}</strong> destinataire(s)` +
+            (data.desabonnes ? ` dont ${data.desabonnes} désabonné(s)` : '') +
+            (sample ? `<br><small>${sample}${data.total > data.recipients.length ? ', ...' : ''}</small>` : '');
+    })
+    .catch(error => {
+        console.error('Error previewing segment:', error);
+        preview.innerHTML = '❌ Erreur lors du calcul des destinataires';
+    });
+}
+
+function saveSegment() {
+    const nom = document.getElementById('segmentNom').value.trim();
+    if (!nom) {
+        alert('❌ Veuillez saisir un nom de segment');
+        return;
+    }
+    
+    const url = editingSegmentId ? `/api/newsletters/segments/${editingSegmentId}` : '/api/newsletters/segments';
+    fetch(url, {
+        method: editingSegmentId ? 'PUT' : 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({nom: nom, criteres: collectSegmentCriteria()})
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert('✅ Segment enregistré');
+            resetSegmentForm();
+            loadSegments();
+        } else {
+            alert(`❌ Erreur: ${data.error}`);
+        }
+    })
+    .catch(error => {
+        console.error('Error saving segment:', error);
+        alert('❌ Erreur lors de l\'enregistrement du segment');
+    });
+}
+
+function editSegment(segmentId) {
+    const segment = segments.find(item => item.id === segmentId);
+    if (!segment) {
+        return;
+    }
+    const criteres = segment.criteres;
+    editingSegmentId = segmentId;
+    document.getElementById('segmentFormTitle').textContent = `Modifier le segment « ${segment.nom} »`;
+    document.getElementById('segmentNom').value = segment.nom;
+    setMultipleSelection('segmentPays', criteres.pays || []);
+    setMultipleSelection('segmentExtras', criteres.extras || []);
+    document.getElementById('segmentSejourDu').value = criteres.sejour_du || '';
+    document.getElementById('segmentSejourAu').value = criteres.sejour_au || '';
+    document.getElementById('segmentSejoursMin').value = criteres.sejours_min ?? '';
+    document.getElementById('segmentSejoursMax').value = criteres.sejours_max ?? '';
+    document.getElementById('segmentAbonnement').value = criteres.abonnement || 'abonnes';
+    previewSegment();
+    document.getElementById('segmentForm').scrollIntoView({behavior: 'smooth'});
+}
+
+function deleteSegment(segmentId) {
+    if (!confirm('Voulez-vous vraiment supprimer ce segment ? Les newsletters déjà envoyées ne sont pas modifiées.')) {
+        return;
+    }
+    
+    fetch(`/api/newsletters/segments/${segmentId}`, {method: 'DELETE'})
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                if (editingSegmentId === segmentId) {
+                    resetSegmentForm();
+                }
+                loadSegments();
+            } else {
+                alert(`❌ Erreur: ${data.error}`);
+            }
+        })
+        .catch(error => {
+            console.error('Error deleting segment:', error);
+            alert('❌ Erreur lors de la suppression du segment');
+        });
+}
+
+function resetSegmentForm() {
+    editingSegmentId = null;
+    document.getElementById('segmentForm').reset();
+    document.getElementById('segmentFormTitle').textContent = 'Nouveau segment';
+    document.getElementById('segmentPreview').style.display = 'none';
+}
+
+function loadOptOuts() {
+    fetch('/api/newsletters/optouts')
+        .then(response => response.json())
+        .then(data => {
+            const tbody = document.getElementById('optOutsList');
+            if (!data.success) {
+                tbody.innerHTML = `<tr><td colspan="3" style="text-align: center; color: #ef4444;">Erreur: ${data.error}</td></tr>`;
+                return;
+            }
+            if (data.optouts.length === 0) {
+                tbody.innerHTML = '<tr><td colspan="3" style="text-align: center; color: #6b7280;">Aucune adresse désabonnée</td></tr>';
+                return;
+            }
+            tbody.innerHTML = data.optouts.map(optout => `
+                <tr>
+                    <td>${optout.email}</td>
+                    <td>${new Date(optout.created_at).toLocaleDateString('fr-FR')}</td>
+                    <td>
+                        <button class="btn btn-secondary btn-sm" onclick="removeOptOut('${optout.email.replace(/'/g, "\\'")}')">Réabonner</button>
+                    </td>
+                </tr>
+            `).join('');
+        })
+        .catch(error => {
+            console.error('Error loading opt-outs:', error);
+        });
+}
+
+function addOptOuts() {
+    const emails = document.getElementById('optOutEmails').value
+        .split(/[\s,;]+/)
+        .filter(email => email);
+    if (emails.length === 0) {
+        alert('❌ Veuillez saisir au moins une adresse');
+        return;
+    }
+    
+    fetch('/api/newsletters/optouts', {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({emails: emails})
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.success) {
+            alert(`✅ ${data.message}`);
+            document.getElementById('optOutEmails').value = '';
+            loadOptOuts();
+            loadClients();
+        } else {
+            alert(`❌ Erreur: ${data.error}`);
+        }
+    })
+    .catch(error => {
+        console.error('Error adding opt-outs:', error);
+        alert('❌ Erreur lors du désabonnement');
+    });
+}
+
+function removeOptOut(email) {
+    if (!confirm(`Réabonner ${email} aux newsletters ?`)) {
+        return;
+    }
+    
+    fetch(`/api/newsletters/optouts?email=${encodeURIComponent(email)}`, {method: 'DELETE'})
+        .then(response => response.json())
+        .then(data => {
+            if (data.success) {
+                loadOptOuts();
+                loadClients();
+            } else {
+                alert(`❌ Erreur: ${data.error}`);
+            }
+        })
+        .catch(error => {
+            console.error('Error removing opt-out:', error);
+        });
 }
 
 function updateEditorPlaceholder() {
@@ -185,10 +560,10 @@ function updateEditorPlaceholder() {
     const textarea = document.getElementById('newsletterContent');
     
     if (contentType === 'markdown') {
-        helpText.textContent = 'Utilisez la syntaxe Markdown pour formater votre contenu (# Titre, **gras**, *italique*, etc.)';
+        helpText.textContent = 'Utilisez la syntaxe Markdown pour formater votre contenu (# Titre, **gras**, *italique*, etc.). ' + MERGE_FIELDS_HELP;
         textarea.placeholder = '# Titre de votre newsletter\n\nVotre contenu en **Markdown**...';
     } else {
-        helpText.textContent = 'Vous pouvez utiliser les balises HTML pour formater votre contenu.';
+        helpText.textContent = 'Vous pouvez utiliser les balises HTML pour formater votre contenu. ' + MERGE_FIELDS_HELP;
         textarea.placeholder = '<h1>Titre de votre newsletter</h1>\n<p>Votre contenu HTML...</p>';
     }
 }
@@ -219,24 +594,35 @@ function renderNewsletterHistory(newsletters) {
         return;
     }
     
+    // Rafraîchir l'historique tant qu'une newsletter est en cours d'envoi
+    clearTimeout(historyRefreshTimer);
+    if (newsletters.some(newsletter => newsletter.status === 'sending' || newsletter.status === 'pending')) {
+        historyRefreshTimer = setTimeout(loadNewsletterHistory, 3000);
+    }
+    
     tbody.innerHTML = newsletters.map(newsletter => {
         const statusBadge = newsletter.status === 'sent' 
             ? '<span class="badge badge-green">✓ Envoyée</span>'
             : newsletter.status === 'failed'
             ? '<span class="badge badge-red">✗ Échec</span>'
-            : '<span class="badge badge-yellow">⏳ En cours</span>';
+            : newsletter.status === 'partial'
+            ? `<span class="badge badge-yellow" title="${newsletter.error_message || ''}">⚠ ${newsletter.failed_count} échec(s)</span>`
+            : `<span class="badge badge-yellow">⏳ En cours (${newsletter.sent_count + newsletter.failed_count}/${newsletter.total_recipients})</span>`;
         
         const sentBy = newsletter.sent_by_prenom && newsletter.sent_by_nom
             ? `${newsletter.sent_by_prenom} ${newsletter.sent_by_nom}`
             : newsletter.sent_by_username || '-';
         
-        const recipientCount = newsletter.recipient_emails ? newsletter.recipient_emails.length : 0;
+        const recipientCount = newsletter.total_recipients || 0;
+        const segmentLabel = newsletter.segment_id
+            ? `<br><small style="color: #6b7280;">Segment: ${newsletter.segment_nom || 'supprimé'}</small>`
+            : '';
         
         return `
             <tr>
                 <td>${new Date(newsletter.sent_at).toLocaleString('fr-FR')}</td>
                 <td>${newsletter.subject}</td>
-                <td>${recipientCount} destinataire(s)</td>
+                <td>${recipientCount} destinataire(s)${segmentLabel}</td>
                 <td>${statusBadge}</td>
                 <td>${sentBy}</td>
             </tr>
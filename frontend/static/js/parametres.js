@@ -984,7 +984,7 @@ async function loadMailConfigs() {
                     </div>
                     ${config.pop_host ? `
                         <div>
-                            <strong>POP:</strong> ${config.pop_host}:${config.pop_port}
+                            <strong>${config.incoming_protocol === 'imap' ? 'IMAP' : 'POP'}:</strong> ${config.pop_host}:${config.pop_port}
                         </div>
                     ` : ''}
                     <div>
@@ -1058,26 +1058,40 @@ function addMailConfig() {
                             </label>
                         </div>
                         
-                        <h4 style="margin: 1.5rem 0 1rem 0; color: #22c55e;">Paramètres POP3 (Réception)</h4>
+                        <h4 style="margin: 1.5rem 0 1rem 0; color: #22c55e;">Paramètres de réception (POP3 / IMAP)</h4>
                         
                         <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
                             <div class="form-group">
-                                <label>Hôte POP3</label>
+                                <label>Protocole</label>
+                                <select id="mail-incoming-protocol" class="form-control" onchange="toggleIncomingProtocol()">
+                                    <option value="pop3">POP3</option>
+                                    <option value="imap">IMAP (réception en temps réel)</option>
+                                </select>
+                            </div>
+                            <div class="form-group" id="mail-imap-folder-group" style="display: none;">
+                                <label>Dossier IMAP</label>
+                                <input type="text" id="mail-imap-folder" class="form-control" value="INBOX">
+                            </div>
+                        </div>
+                        
+                        <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
+                            <div class="form-group">
+                                <label>Hôte</label>
                                 <input type="text" id="mail-pop-host" class="form-control">
                             </div>
                             <div class="form-group">
-                                <label>Port POP3</label>
+                                <label>Port</label>
                                 <input type="number" id="mail-pop-port" class="form-control" value="995">
                             </div>
                         </div>
                         
                         <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 1rem;">
                             <div class="form-group">
-                                <label>Nom d'utilisateur POP3</label>
+                                <label>Nom d'utilisateur</label>
                                 <input type="text" id="mail-pop-username" class="form-control">
                             </div>
                             <div class="form-group">
-                                <label>Mot de passe POP3</label>
+                                <label>Mot de passe</label>
                                 <input type="password" id="mail-pop-password" class="form-control">
                             </div>
                         </div>
@@ -1113,6 +1127,16 @@ function addMailConfig() {
     document.body.insertAdjacentHTML('beforeend', modalHTML);
 }
 
+function toggleIncomingProtocol() {
+    const imap = document.getElementById('mail-incoming-protocol').value === 'imap';
+    const port = document.getElementById('mail-pop-port');
+    document.getElementById('mail-imap-folder-group').style.display = imap ? '' : 'none';
+    // Ports SSL usuels, tant que l'utilisateur n'en a pas saisi un autre
+    if (port.value === '995' || port.value === '993') {
+        port.value = imap ? '993' : '995';
+    }
+}
+
 async function saveMailConfig(event) {
     event.preventDefault();
     
@@ -1126,6 +1150,8 @@ async function saveMailConfig(event) {
         smtp_password: document.getElementById('mail-smtp-password').value,
         smtp_use_tls: document.getElementById('mail-smtp-tls').checked,
         pop_host: document.getElementById('mail-pop-host').value || null,
+        incoming_protocol: document.getElementById('mail-incoming-protocol').value,
+        imap_folder: document.getElementById('mail-imap-folder').value || 'INBOX',
         pop_port: parseInt(document.getElementById('mail-pop-port').value) || 995,
         pop_username: document.getElementById('mail-pop-username').value || null,
         pop_password: document.getElementById('mail-pop-password').value || null,
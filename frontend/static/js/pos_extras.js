@@ -451,10 +451,8 @@ async function generateInvoice() {
     }
     
     try {
-        const response = await fetch(`/api/sejours/${currentSejour.id}/facture`, {
-            method: 'POST',
-            headers: { 'Content-Type': 'application/json' }
-        });
+        // GET : le navigateur garde la facture et la revalide par ETag
+        const response = await fetch(`/api/sejours/${currentSejour.id}/facture`);
         
         if (response.ok) {
             const blob = await response.blob();
@@ -283,7 +283,7 @@ def init_database():
             CREATE TABLE IF NOT EXISTS emails (
                 id SERIAL PRIMARY KEY,
                 mail_config_id INTEGER REFERENCES mail_configs(id) ON DELETE CASCADE,
-                message_id VARCHAR(255) UNIQUE,
+                message_id VARCHAR(255),
                 subject TEXT,
                 from_email VARCHAR(255),
                 to_email TEXT,
@@ -298,7 +298,8 @@ def init_database():
                 date_sent TIMESTAMP,
                 date_received TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 client_email_indexed VARCHAR(255),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                CONSTRAINT emails_config_message_id_key UNIQUE (mail_config_id, message_id)
             )
         ''')
         
@@ -314,28 +315,82 @@ def init_database():
                 derniere_synchronisation TIMESTAMP,
                 statut_derniere_synchro VARCHAR(50) DEFAULT 'jamais',
                 message_erreur TEXT,
+                etag VARCHAR(500),
+                last_modified VARCHAR(100),
+                content_hash VARCHAR(64),
+                prochaine_synchronisation TIMESTAMP,
+                echecs_consecutifs INTEGER DEFAULT 0,
                 actif BOOLEAN DEFAULT TRUE,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # Ajouter les validateurs de synchronisation dans calendriers_ical s'ils n'existent pas
+        cur.execute('''
+            ALTER TABLE calendriers_ical 
+            ADD COLUMN IF NOT EXISTS etag VARCHAR(500),
+            ADD COLUMN IF NOT EXISTS last_modified VARCHAR(100),
+            ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)
+        ''')
+        
+        # Ajouter la planification de la synchronisation dans calendriers_ical si elle n'existe pas
+        cur.execute('''
+            ALTER TABLE calendriers_ical 
+            ADD COLUMN IF NOT EXISTS prochaine_synchronisation TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS echecs_consecutifs INTEGER DEFAULT 0
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_calendriers_ical_prochaine_synchro
+            ON calendriers_ical(prochaine_synchronisation) WHERE actif = TRUE
+        ''')
+        
         # Créer la table reservations_ical
         print("  📋 Création de la table 'reservations_ical'...")
         cur.execute('''
             CREATE TABLE IF NOT EXISTS reservations_ical (
                 id SERIAL PRIMARY KEY,
                 calendrier_id INTEGER REFERENCES calendriers_ical(id) ON DELETE CASCADE,
-                uid_ical VARCHAR(500) UNIQUE NOT NULL,
+                uid_ical VARCHAR(500) NOT NULL,
                 titre VARCHAR(300),
                 date_debut DATE NOT NULL,
                 date_fin DATE NOT NULL,
                 description TEXT,
+                event_hash VARCHAR(64),
+                cancelled_at TIMESTAMP,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                CONSTRAINT reservations_ical_calendrier_uid_key UNIQUE (calendrier_id, uid_ical)
             )
         ''')
         
+        # Ajouter la colonne event_hash dans reservations_ical si elle n'existe pas
+        cur.execute('''
+            ALTER TABLE reservations_ical 
+            ADD COLUMN IF NOT EXISTS event_hash VARCHAR(64)
+        ''')
+        
+        # Marquer les séjours iCal annulés et limiter l'unicité des UID à chaque calendrier
+        cur.execute('''
+            ALTER TABLE reservations_ical 
+            ADD COLUMN IF NOT EXISTS cancelled_at TIMESTAMP
+        ''')
+        cur.execute('''
+            ALTER TABLE reservations_ical 
+            DROP CONSTRAINT IF EXISTS reservations_ical_uid_ical_key
+        ''')
+        cur.execute('''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'reservations_ical_calendrier_uid_key'
+                ) THEN
+                    ALTER TABLE reservations_ical
+                    ADD CONSTRAINT reservations_ical_calendrier_uid_key UNIQUE (calendrier_id, uid_ical);
+                END IF;
+            END $$
+        ''')
+        
         # Ajouter la colonne closed_at dans reservations si elle n'existe pas
         print("  📋 Ajout de la colonne 'closed_at' dans reservations...")
         cur.execute('''
@@ -372,10 +427,17 @@ def init_database():
                 status_code INTEGER,
                 details JSONB,
                 etablissement_id INTEGER REFERENCES etablissements(id) ON DELETE SET NULL,
+                duration_ms NUMERIC(10, 2),
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         ''')
         
+        # Ajouter la colonne duration_ms dans activity_logs si elle n'existe pas
+        cur.execute('''
+            ALTER TABLE activity_logs 
+            ADD COLUMN IF NOT EXISTS duration_ms NUMERIC(10, 2)
+        ''')
+        
         # Créer des index pour améliorer les performances des requêtes
         print("  📋 Création des index sur 'activity_logs'...")
         cur.execute('''
@@ -433,6 +495,408 @@ def init_database():
             CREATE INDEX IF NOT EXISTS idx_newsletters_status ON newsletters(status)
         ''')
         
+        # Créer la table ical_exports (jeton et version des flux d'export iCal)
+        print("  📋 Création de la table 'ical_exports' et des triggers de version...")
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS ical_exports (
+                etablissement_id INTEGER PRIMARY KEY REFERENCES etablissements(id) ON DELETE CASCADE,
+                token VARCHAR(64) UNIQUE,
+                version BIGINT NOT NULL DEFAULT 1,
+                modifie_le TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION bump_ical_export_version(ids INTEGER[]) RETURNS void AS $$
+            BEGIN
+                INSERT INTO ical_exports (etablissement_id)
+                SELECT e.id FROM etablissements e WHERE e.id = ANY(ids) ORDER BY e.id
+                ON CONFLICT (etablissement_id) DO UPDATE SET
+                    version = ical_exports.version + 1,
+                    modifie_le = CURRENT_TIMESTAMP;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION reservations_ical_export_trigger() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM bump_ical_export_version(ARRAY(SELECT DISTINCT etablissement_id FROM new_rows));
+                ELSIF TG_OP = 'DELETE' THEN
+                    PERFORM bump_ical_export_version(ARRAY(SELECT DISTINCT etablissement_id FROM old_rows));
+                ELSE
+                    PERFORM bump_ical_export_version(ARRAY(
+                        SELECT etablissement_id FROM new_rows UNION SELECT etablissement_id FROM old_rows
+                    ));
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION reservations_chambres_ical_export_trigger() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    PERFORM bump_ical_export_version(ARRAY(
+                        SELECT DISTINCT r.etablissement_id FROM new_rows n JOIN reservations r ON r.id = n.reservation_id
+                    ));
+                ELSE
+                    PERFORM bump_ical_export_version(ARRAY(
+                        SELECT DISTINCT r.etablissement_id FROM old_rows o JOIN reservations r ON r.id = o.reservation_id
+                    ));
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cur.execute('DROP TRIGGER IF EXISTS reservations_ical_export_ins ON reservations')
+        cur.execute('DROP TRIGGER IF EXISTS reservations_ical_export_upd ON reservations')
+        cur.execute('DROP TRIGGER IF EXISTS reservations_ical_export_del ON reservations')
+        cur.execute('DROP TRIGGER IF EXISTS reservations_chambres_ical_export_ins ON reservations_chambres')
+        cur.execute('DROP TRIGGER IF EXISTS reservations_chambres_ical_export_del ON reservations_chambres')
+        cur.execute('''
+            CREATE TRIGGER reservations_ical_export_ins AFTER INSERT ON reservations
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION reservations_ical_export_trigger()
+        ''')
+        cur.execute('''
+            CREATE TRIGGER reservations_ical_export_upd AFTER UPDATE ON reservations
+            REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION reservations_ical_export_trigger()
+        ''')
+        cur.execute('''
+            CREATE TRIGGER reservations_ical_export_del AFTER DELETE ON reservations
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION reservations_ical_export_trigger()
+        ''')
+        cur.execute('''
+            CREATE TRIGGER reservations_chambres_ical_export_ins AFTER INSERT ON reservations_chambres
+            REFERENCING NEW TABLE AS new_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION reservations_chambres_ical_export_trigger()
+        ''')
+        cur.execute('''
+            CREATE TRIGGER reservations_chambres_ical_export_del AFTER DELETE ON reservations_chambres
+            REFERENCING OLD TABLE AS old_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION reservations_chambres_ical_export_trigger()
+        ''')
+        
+        # Créer la table mail_queue (file d'attente des emails sortants)
+        print("  📋 Création de la table 'mail_queue'...")
+        cur.execute('''
+            ALTER TABLE mail_configs
+            ADD COLUMN IF NOT EXISTS send_rate_per_minute INTEGER
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS mail_queue (
+                id BIGSERIAL PRIMARY KEY,
+                mail_config_id INTEGER NOT NULL REFERENCES mail_configs(id) ON DELETE CASCADE,
+                to_email TEXT NOT NULL,
+                cc_email TEXT,
+                bcc_email TEXT,
+                subject TEXT NOT NULL,
+                body_html TEXT NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_error TEXT,
+                created_by_user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                sent_at TIMESTAMP
+            )
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mail_queue_due
+            ON mail_queue(next_attempt_at) WHERE status IN ('pending', 'sending')
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mail_queue_sent
+            ON mail_queue(mail_config_id, sent_at) WHERE status = 'sent'
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mail_queue_config
+            ON mail_queue(mail_config_id, created_at DESC)
+        ''')
+        
+        # Créer la table mail_uidls (relève POP3 incrémentale)
+        print("  📋 Création de la table 'mail_uidls'...")
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS mail_uidls (
+                mail_config_id INTEGER NOT NULL REFERENCES mail_configs(id) ON DELETE CASCADE,
+                uidl VARCHAR(255) NOT NULL,
+                email_id INTEGER REFERENCES emails(id) ON DELETE SET NULL,
+                seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (mail_config_id, uidl)
+            )
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mail_uidls_email_id ON mail_uidls(email_id)
+        ''')
+        cur.execute('''
+            ALTER TABLE emails
+            ADD COLUMN IF NOT EXISTS body_complete BOOLEAN NOT NULL DEFAULT TRUE
+        ''')
+        
+        # Réception IMAP (protocole par configuration et état de synchronisation)
+        print("  📋 Création de la table 'mail_imap_state'...")
+        cur.execute('''
+            ALTER TABLE mail_configs
+            ADD COLUMN IF NOT EXISTS incoming_protocol VARCHAR(10) NOT NULL DEFAULT 'pop3',
+            ADD COLUMN IF NOT EXISTS imap_folder VARCHAR(255) NOT NULL DEFAULT 'INBOX'
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS mail_imap_state (
+                mail_config_id INTEGER PRIMARY KEY REFERENCES mail_configs(id) ON DELETE CASCADE,
+                folder VARCHAR(255) NOT NULL,
+                uidvalidity BIGINT NOT NULL,
+                uidnext BIGINT NOT NULL,
+                highestmodseq BIGINT,
+                synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Corps des emails stockés à part (les listes ne lisent que les en-têtes et l'aperçu)
+        print("  📋 Création de la table 'email_bodies'...")
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS email_bodies (
+                email_id INTEGER PRIMARY KEY REFERENCES emails(id) ON DELETE CASCADE,
+                body_text TEXT,
+                body_html TEXT
+            ) WITH (toast_tuple_target = 128)
+        ''')
+        cur.execute('SAVEPOINT lz4')
+        try:
+            cur.execute('''
+                ALTER TABLE email_bodies
+                ALTER COLUMN body_text SET COMPRESSION lz4,
+                ALTER COLUMN body_html SET COMPRESSION lz4
+            ''')
+        except psycopg2.Error:
+            # PostgreSQL < 14 ou compilé sans lz4 : compression pglz par défaut
+            cur.execute('ROLLBACK TO SAVEPOINT lz4')
+        cur.execute(r'''
+            CREATE OR REPLACE FUNCTION email_snippet(body_text TEXT, body_html TEXT) RETURNS VARCHAR(200) AS $$
+                SELECT left(btrim(regexp_replace(
+                    replace(replace(replace(replace(replace(replace(
+                        COALESCE(NULLIF(btrim(body_text), ''), regexp_replace(regexp_replace(COALESCE(body_html, ''),
+                            '<(style|script|head)[^>]*?>.*?</\1>', ' ', 'gi'), '<[^>]*>', ' ', 'g')),
+                        '&nbsp;', ' '), '&lt;', '<'), '&gt;', '>'), '&quot;', '"'), '&#39;', chr(39)), '&amp;', '&'),
+                    '\s+', ' ', 'g')), 200)
+            $$ LANGUAGE sql IMMUTABLE
+        ''')
+        cur.execute('ALTER TABLE emails ADD COLUMN IF NOT EXISTS snippet VARCHAR(200)')
+        cur.execute('''
+            SELECT COUNT(*) AS count FROM information_schema.columns
+            WHERE table_name = 'emails' AND column_name = 'body_html'
+        ''')
+        if cur.fetchone()['count']:
+            cur.execute('''
+                INSERT INTO email_bodies (email_id, body_text, body_html)
+                SELECT id, body_text, body_html FROM emails
+                WHERE body_text IS NOT NULL OR body_html IS NOT NULL
+                ON CONFLICT (email_id) DO NOTHING
+            ''')
+            cur.execute('UPDATE emails SET snippet = email_snippet(body_text, body_html)')
+            cur.execute('ALTER TABLE emails DROP COLUMN body_text, DROP COLUMN body_html')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_folder
+            ON emails(mail_config_id, folder, date_received DESC)
+        ''')
+        
+        # Recherche plein texte dans les emails (table email_search tenue à jour par triggers)
+        print("  📋 Création de la table 'email_search'...")
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS email_search (
+                email_id INTEGER PRIMARY KEY REFERENCES emails(id) ON DELETE CASCADE,
+                document tsvector NOT NULL
+            )
+        ''')
+        cur.execute(r'''
+            CREATE OR REPLACE FUNCTION email_plain_text(body_text TEXT, body_html TEXT) RETURNS TEXT AS $$
+                SELECT btrim(regexp_replace(
+                    replace(replace(replace(replace(replace(replace(
+                        COALESCE(NULLIF(btrim(body_text), ''), regexp_replace(regexp_replace(COALESCE(body_html, ''),
+                            '<(style|script|head)[^>]*?>.*?</\1>', ' ', 'gi'), '<[^>]*>', ' ', 'g')),
+                        '&nbsp;', ' '), '&lt;', '<'), '&gt;', '>'), '&quot;', '"'), '&#39;', chr(39)), '&amp;', '&'),
+                    '\s+', ' ', 'g'))
+            $$ LANGUAGE sql IMMUTABLE
+        ''')
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION email_snippet(body_text TEXT, body_html TEXT) RETURNS VARCHAR(200) AS $$
+                SELECT left(email_plain_text(body_text, body_html), 200)
+            $$ LANGUAGE sql IMMUTABLE
+        ''')
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION email_search_vector(
+                subject TEXT, from_email TEXT, to_email TEXT, cc_email TEXT, body_text TEXT, body_html TEXT
+            ) RETURNS tsvector AS $$
+                SELECT setweight(to_tsvector('french', COALESCE(subject, '')) || to_tsvector('english', COALESCE(subject, '')), 'A')
+                    || setweight(to_tsvector('simple', concat_ws(' ', from_email, to_email, cc_email)), 'B')
+                    || setweight(to_tsvector('french', body.plain) || to_tsvector('english', body.plain), 'D')
+                FROM (SELECT left(email_plain_text(body_text, body_html), 100000) AS plain) body
+            $$ LANGUAGE sql IMMUTABLE
+        ''')
+        cur.execute('''
+            CREATE OR REPLACE FUNCTION email_search_refresh() RETURNS trigger AS $$
+            DECLARE
+                target_id INTEGER;
+            BEGIN
+                IF TG_TABLE_NAME = 'emails' THEN
+                    target_id := NEW.id;
+                ELSE
+                    target_id := NEW.email_id;
+                END IF;
+                
+                INSERT INTO email_search (email_id, document)
+                SELECT e.id, email_search_vector(e.subject, e.from_email, e.to_email, e.cc_email, b.body_text, b.body_html)
+                FROM emails e
+                LEFT JOIN email_bodies b ON b.email_id = e.id
+                WHERE e.id = target_id
+                ON CONFLICT (email_id) DO UPDATE SET document = EXCLUDED.document;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        cur.execute('DROP TRIGGER IF EXISTS emails_search_refresh ON emails')
+        cur.execute('DROP TRIGGER IF EXISTS email_bodies_search_refresh ON email_bodies')
+        cur.execute('''
+            CREATE TRIGGER emails_search_refresh
+            AFTER INSERT OR UPDATE OF subject, from_email, to_email, cc_email ON emails
+            FOR EACH ROW EXECUTE FUNCTION email_search_refresh()
+        ''')
+        cur.execute('''
+            CREATE TRIGGER email_bodies_search_refresh
+            AFTER INSERT OR UPDATE ON email_bodies
+            FOR EACH ROW EXECUTE FUNCTION email_search_refresh()
+        ''')
+        cur.execute('''
+            INSERT INTO email_search (email_id, document)
+            SELECT e.id, email_search_vector(e.subject, e.from_email, e.to_email, e.cc_email, b.body_text, b.body_html)
+            FROM emails e
+            LEFT JOIN email_bodies b ON b.email_id = e.id
+            ON CONFLICT (email_id) DO NOTHING
+        ''')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_email_search_document ON email_search USING GIN (document)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_emails_client_email ON emails (lower(client_email_indexed))')
+        cur.execute('SAVEPOINT trgm')
+        try:
+            cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_emails_from_trgm ON emails USING GIN (from_email gin_trgm_ops)')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_emails_to_trgm ON emails USING GIN (to_email gin_trgm_ops)')
+            cur.execute('CREATE INDEX IF NOT EXISTS idx_emails_cc_trgm ON emails USING GIN (cc_email gin_trgm_ops)')
+        except psycopg2.Error:
+            # pg_trgm indisponible : recherche par adresse sans index trigrammes
+            cur.execute('ROLLBACK TO SAVEPOINT trgm')
+        
+        # Envoi des newsletters par lots (statut par lot et par destinataire)
+        print("  📋 Création des tables 'newsletter_chunks' et 'newsletter_recipients'...")
+        cur.execute('''
+            ALTER TABLE newsletters
+            ADD COLUMN IF NOT EXISTS html_content TEXT,
+            ADD COLUMN IF NOT EXISTS total_recipients INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS sent_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS failed_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP
+        ''')
+        cur.execute('''
+            UPDATE newsletters SET total_recipients = jsonb_array_length(recipient_emails)
+            WHERE total_recipients = 0 AND jsonb_typeof(recipient_emails) = 'array'
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS newsletter_chunks (
+                id BIGSERIAL PRIMARY KEY,
+                newsletter_id INTEGER NOT NULL REFERENCES newsletters(id) ON DELETE CASCADE,
+                chunk_index INTEGER NOT NULL,
+                recipient_count INTEGER NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_error TEXT,
+                sent_at TIMESTAMP,
+                UNIQUE (newsletter_id, chunk_index)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS newsletter_recipients (
+                id BIGSERIAL PRIMARY KEY,
+                newsletter_id INTEGER NOT NULL REFERENCES newsletters(id) ON DELETE CASCADE,
+                chunk_id BIGINT NOT NULL REFERENCES newsletter_chunks(id) ON DELETE CASCADE,
+                email VARCHAR(255) NOT NULL,
+                status VARCHAR(20) NOT NULL DEFAULT 'pending',
+                error TEXT,
+                UNIQUE (newsletter_id, email)
+            )
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_newsletter_chunks_due
+            ON newsletter_chunks(next_attempt_at) WHERE status IN ('pending', 'sending')
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_newsletter_chunks_sent
+            ON newsletter_chunks(sent_at) WHERE status = 'sent'
+        ''')
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_newsletter_recipients_chunk
+            ON newsletter_recipients(chunk_id)
+        ''')
+        
+        # Profil des destinataires de newsletter lu par adresse (champs de fusion, segments)
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_personnes_email_key
+            ON personnes (lower(btrim(email)))
+        ''')
+        cur.execute('DROP INDEX IF EXISTS idx_personnes_email_lower')
+        
+        # Segments de destinataires des newsletters et adresses désabonnées
+        print("  📋 Création des tables 'newsletter_segments' et 'newsletter_optouts'...")
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS newsletter_segments (
+                id SERIAL PRIMARY KEY,
+                etablissement_id INTEGER NOT NULL REFERENCES etablissements(id) ON DELETE CASCADE,
+                nom VARCHAR(200) NOT NULL,
+                criteres JSONB NOT NULL DEFAULT '{}',
+                created_by_user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                UNIQUE (etablissement_id, nom)
+            )
+        ''')
+        cur.execute('''
+            CREATE TABLE IF NOT EXISTS newsletter_optouts (
+                etablissement_id INTEGER NOT NULL REFERENCES etablissements(id) ON DELETE CASCADE,
+                email_key VARCHAR(255) NOT NULL,
+                email VARCHAR(255) NOT NULL,
+                source VARCHAR(50) NOT NULL DEFAULT 'manuel',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (etablissement_id, email_key)
+            )
+        ''')
+        cur.execute('''
+            ALTER TABLE newsletters
+            ADD COLUMN IF NOT EXISTS segment_id INTEGER REFERENCES newsletter_segments(id) ON DELETE SET NULL,
+            ADD COLUMN IF NOT EXISTS segment_criteres JSONB
+        ''')
+        cur.execute('ALTER TABLE newsletters ALTER COLUMN recipient_emails DROP NOT NULL')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_reservations_etablissement_id ON reservations(etablissement_id)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_personnes_reservation_id ON personnes(reservation_id)')
+        cur.execute('CREATE INDEX IF NOT EXISTS idx_sejours_extras_reservation_id ON sejours_extras(reservation_id)')
+        
+        # Limiter l'unicité des Message-ID à chaque configuration mail
+        cur.execute('''
+            ALTER TABLE emails 
+            DROP CONSTRAINT IF EXISTS emails_message_id_key
+        ''')
+        cur.execute('''
+            DO $$
+            BEGIN
+                IF NOT EXISTS (
+                    SELECT 1 FROM pg_constraint WHERE conname = 'emails_config_message_id_key'
+                ) THEN
+                    ALTER TABLE emails
+                    ADD CONSTRAINT emails_config_message_id_key UNIQUE (mail_config_id, message_id);
+                END IF;
+            END $$
+        ''')
+        
         # Vérifier et créer l'utilisateur admin par défaut
         print("  👤 Vérification de l'utilisateur admin...")
         cur.execute("SELECT COUNT(*) as count FROM users")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Migration 007: Ajouter la durée de traitement des requêtes dans activity_logs
+- Colonne optionnelle duration_ms renseignée par RequestMetricsMiddleware
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 007: Ajout de la durée des requêtes dans activity_logs...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Ajout de la colonne 'duration_ms' dans activity_logs...")
+        cur.execute('''
+            ALTER TABLE activity_logs 
+            ADD COLUMN IF NOT EXISTS duration_ms NUMERIC(10, 2)
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 007 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Les nouvelles entrées du journal d'activité incluent la durée de la requête")
+        print("  - Les métriques détaillées par endpoint sont exposées sur /metrics")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Migration 008: Synchronisation iCal incrémentale
+- Validateurs HTTP (ETag, Last-Modified) et empreinte du flux dans calendriers_ical
+- Empreinte de chaque événement dans reservations_ical
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 008: Synchronisation iCal incrémentale...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Ajout des colonnes 'etag', 'last_modified' et 'content_hash' dans calendriers_ical...")
+        cur.execute('''
+            ALTER TABLE calendriers_ical 
+            ADD COLUMN IF NOT EXISTS etag VARCHAR(500),
+            ADD COLUMN IF NOT EXISTS last_modified VARCHAR(100),
+            ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)
+        ''')
+        
+        print("  📋 Ajout de la colonne 'event_hash' dans reservations_ical...")
+        cur.execute('''
+            ALTER TABLE reservations_ical 
+            ADD COLUMN IF NOT EXISTS event_hash VARCHAR(64)
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 008 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Les flux sont téléchargés par requête conditionnelle (If-None-Match / If-Modified-Since)")
+        print("  - Un flux inchangé (304 ou contenu identique) n'est ni analysé ni réécrit")
+        print("  - La première synchronisation après la migration réécrit chaque événement une fois")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
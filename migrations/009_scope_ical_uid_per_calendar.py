@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Migration 009: Fusion groupée des séjours iCal
+- Unicité des UID par calendrier (UNIQUE(calendrier_id, uid_ical)) au lieu d'une unicité globale
+- Colonne cancelled_at pour marquer les séjours disparus du flux (annulations)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 009: Fusion groupée des séjours iCal...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Ajout de la colonne 'cancelled_at' dans reservations_ical...")
+        cur.execute('''
+            ALTER TABLE reservations_ical 
+            ADD COLUMN IF NOT EXISTS cancelled_at TIMESTAMP
+        ''')
+        
+        print("  📋 Unicité des UID par calendrier...")
+        cur.execute('''
+            ALTER TABLE reservations_ical 
+            DROP CONSTRAINT IF EXISTS reservations_ical_uid_ical_key
+        ''')
+        cur.execute('''
+            SELECT 1 FROM pg_constraint WHERE conname = 'reservations_ical_calendrier_uid_key'
+        ''')
+        if cur.fetchone():
+            print("  ✓ La contrainte 'reservations_ical_calendrier_uid_key' existe déjà")
+        else:
+            cur.execute('''
+                ALTER TABLE reservations_ical
+                ADD CONSTRAINT reservations_ical_calendrier_uid_key UNIQUE (calendrier_id, uid_ical)
+            ''')
+        
+        conn.commit()
+        print("\n✅ Migration 009 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Un même UID peut désormais exister dans plusieurs calendriers (ex: flux dupliqué)")
+        print("  - Les séjours absents du dernier flux sont marqués cancelled_at et masqués des listes")
+        print("  - Un séjour qui réapparaît dans le flux est réactivé")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
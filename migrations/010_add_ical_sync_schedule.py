@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Migration 010: Planification de la synchronisation iCal
+- Colonnes prochaine_synchronisation et echecs_consecutifs dans calendriers_ical
+- Index partiel sur les calendriers actifs pour sélectionner les flux échus
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 010: Planification de la synchronisation iCal...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Ajout des colonnes 'prochaine_synchronisation' et 'echecs_consecutifs' dans calendriers_ical...")
+        cur.execute('''
+            ALTER TABLE calendriers_ical 
+            ADD COLUMN IF NOT EXISTS prochaine_synchronisation TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS echecs_consecutifs INTEGER DEFAULT 0
+        ''')
+        
+        print("  📋 Création de l'index 'idx_calendriers_ical_prochaine_synchro'...")
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_calendriers_ical_prochaine_synchro
+            ON calendriers_ical(prochaine_synchronisation) WHERE actif = TRUE
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 010 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Les calendriers actifs jamais planifiés seront synchronisés au premier passage du planificateur")
+        print("  - Un seul worker gunicorn (verrou consultatif PostgreSQL) exécute le planificateur")
+        print("  - ICAL_SCHEDULER_ENABLED=false le désactive (ex: processus dédié python -m backend.services.calendar_scheduler)")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Migration 011: Export iCal des séjours
+- Table ical_exports (jeton d'accès et version des données par établissement)
+- Triggers incrémentant la version à chaque modification de reservations / reservations_chambres
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+ICAL_EXPORTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS ical_exports (
+        etablissement_id INTEGER PRIMARY KEY REFERENCES etablissements(id) ON DELETE CASCADE,
+        token VARCHAR(64) UNIQUE,
+        version BIGINT NOT NULL DEFAULT 1,
+        modifie_le TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# Triggers par instruction (tables de transition) : un COPY ou un UPDATE massif
+# n'incrémente la version de chaque établissement touché qu'une seule fois
+ICAL_EXPORT_TRIGGERS = [
+    '''
+    CREATE OR REPLACE FUNCTION bump_ical_export_version(ids INTEGER[]) RETURNS void AS $$
+    BEGIN
+        INSERT INTO ical_exports (etablissement_id)
+        SELECT e.id FROM etablissements e WHERE e.id = ANY(ids) ORDER BY e.id
+        ON CONFLICT (etablissement_id) DO UPDATE SET
+            version = ical_exports.version + 1,
+            modifie_le = CURRENT_TIMESTAMP;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION reservations_ical_export_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM bump_ical_export_version(ARRAY(SELECT DISTINCT etablissement_id FROM new_rows));
+        ELSIF TG_OP = 'DELETE' THEN
+            PERFORM bump_ical_export_version(ARRAY(SELECT DISTINCT etablissement_id FROM old_rows));
+        ELSE
+            PERFORM bump_ical_export_version(ARRAY(
+                SELECT etablissement_id FROM new_rows UNION SELECT etablissement_id FROM old_rows
+            ));
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION reservations_chambres_ical_export_trigger() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'INSERT' THEN
+            PERFORM bump_ical_export_version(ARRAY(
+                SELECT DISTINCT r.etablissement_id FROM new_rows n JOIN reservations r ON r.id = n.reservation_id
+            ));
+        ELSE
+            PERFORM bump_ical_export_version(ARRAY(
+                SELECT DISTINCT r.etablissement_id FROM old_rows o JOIN reservations r ON r.id = o.reservation_id
+            ));
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+    'DROP TRIGGER IF EXISTS reservations_ical_export_ins ON reservations',
+    'DROP TRIGGER IF EXISTS reservations_ical_export_upd ON reservations',
+    'DROP TRIGGER IF EXISTS reservations_ical_export_del ON reservations',
+    'DROP TRIGGER IF EXISTS reservations_chambres_ical_export_ins ON reservations_chambres',
+    'DROP TRIGGER IF EXISTS reservations_chambres_ical_export_del ON reservations_chambres',
+    '''
+    CREATE TRIGGER reservations_ical_export_ins AFTER INSERT ON reservations
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION reservations_ical_export_trigger()
+    ''',
+    '''
+    CREATE TRIGGER reservations_ical_export_upd AFTER UPDATE ON reservations
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION reservations_ical_export_trigger()
+    ''',
+    '''
+    CREATE TRIGGER reservations_ical_export_del AFTER DELETE ON reservations
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION reservations_ical_export_trigger()
+    ''',
+    '''
+    CREATE TRIGGER reservations_chambres_ical_export_ins AFTER INSERT ON reservations_chambres
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION reservations_chambres_ical_export_trigger()
+    ''',
+    '''
+    CREATE TRIGGER reservations_chambres_ical_export_del AFTER DELETE ON reservations_chambres
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION reservations_chambres_ical_export_trigger()
+    ''',
+]
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 011: Export iCal des séjours...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création de la table 'ical_exports'...")
+        cur.execute(ICAL_EXPORTS_TABLE)
+        
+        print("  📋 Création des triggers de version sur reservations et reservations_chambres...")
+        for statement in ICAL_EXPORT_TRIGGERS:
+            cur.execute(statement)
+        
+        conn.commit()
+        print("\n✅ Migration 011 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Les liens d'export sont créés à la demande (GET /api/calendriers/export/<etablissement_id>)")
+        print("  - Flux publics: /ical/<jeton>/etablissement.ics et /ical/<jeton>/chambres/<id>.ics")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
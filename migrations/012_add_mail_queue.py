@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Migration 012: File d'attente des emails sortants
+- Table mail_queue (message, statut, tentatives, prochaine tentative)
+- Index partiel sur les messages à distribuer, index des envois récents par configuration
+- Colonne send_rate_per_minute dans mail_configs (limite d'envoi par configuration)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+MAIL_QUEUE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS mail_queue (
+        id BIGSERIAL PRIMARY KEY,
+        mail_config_id INTEGER NOT NULL REFERENCES mail_configs(id) ON DELETE CASCADE,
+        to_email TEXT NOT NULL,
+        cc_email TEXT,
+        bcc_email TEXT,
+        subject TEXT NOT NULL,
+        body_html TEXT NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_error TEXT,
+        created_by_user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        sent_at TIMESTAMP
+    )
+'''
+
+MAIL_QUEUE_INDEXES = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_mail_queue_due
+    ON mail_queue(next_attempt_at) WHERE status IN ('pending', 'sending')
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_mail_queue_sent
+    ON mail_queue(mail_config_id, sent_at) WHERE status = 'sent'
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_mail_queue_config
+    ON mail_queue(mail_config_id, created_at DESC)
+    ''',
+]
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 012: File d'attente des emails sortants...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création de la table 'mail_queue'...")
+        cur.execute(MAIL_QUEUE_TABLE)
+        
+        print("  📋 Création des index sur 'mail_queue'...")
+        for statement in MAIL_QUEUE_INDEXES:
+            cur.execute(statement)
+        
+        print("  📋 Ajout de la colonne 'send_rate_per_minute' dans mail_configs...")
+        cur.execute('''
+            ALTER TABLE mail_configs
+            ADD COLUMN IF NOT EXISTS send_rate_per_minute INTEGER
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 012 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - POST /api/mail/send met désormais le message en file et répond immédiatement")
+        print("  - Les messages sont distribués par les threads d'envoi de chaque worker (MAIL_QUEUE_ENABLED)")
+        print("  - send_rate_per_minute NULL: limite par défaut MAIL_QUEUE_RATE_PER_MINUTE")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Migration 013: Relève POP3 incrémentale
+- Table mail_uidls (identifiants UIDL déjà vus par configuration mail)
+- Colonne body_complete dans emails (FALSE pour un aperçu récupéré avec TOP)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+MAIL_UIDLS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS mail_uidls (
+        mail_config_id INTEGER NOT NULL REFERENCES mail_configs(id) ON DELETE CASCADE,
+        uidl VARCHAR(255) NOT NULL,
+        email_id INTEGER REFERENCES emails(id) ON DELETE SET NULL,
+        seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (mail_config_id, uidl)
+    )
+'''
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 013: Relève POP3 incrémentale...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création de la table 'mail_uidls'...")
+        cur.execute(MAIL_UIDLS_TABLE)
+        
+        print("  📋 Création de l'index 'idx_mail_uidls_email_id'...")
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mail_uidls_email_id ON mail_uidls(email_id)
+        ''')
+        
+        print("  📋 Ajout de la colonne 'body_complete' dans emails...")
+        cur.execute('''
+            ALTER TABLE emails
+            ADD COLUMN IF NOT EXISTS body_complete BOOLEAN NOT NULL DEFAULT TRUE
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 013 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - La première relève d'une configuration télécharge les `limit` messages les plus récents")
+        print("    et marque les plus anciens comme déjà vus ; les suivantes ne récupèrent que les nouveaux")
+        print("  - Les emails déjà enregistrés sont rattachés à leur UIDL par leur Message-ID")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Migration 014: Réception IMAP
+- Colonnes incoming_protocol ('pop3' ou 'imap') et imap_folder dans mail_configs
+- Table mail_imap_state (UIDVALIDITY, UIDNEXT et HIGHESTMODSEQ de la dernière synchronisation)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+MAIL_IMAP_STATE_TABLE = '''
+    CREATE TABLE IF NOT EXISTS mail_imap_state (
+        mail_config_id INTEGER PRIMARY KEY REFERENCES mail_configs(id) ON DELETE CASCADE,
+        folder VARCHAR(255) NOT NULL,
+        uidvalidity BIGINT NOT NULL,
+        uidnext BIGINT NOT NULL,
+        highestmodseq BIGINT,
+        synced_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 014: Réception IMAP...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Ajout des colonnes 'incoming_protocol' et 'imap_folder' dans mail_configs...")
+        cur.execute('''
+            ALTER TABLE mail_configs
+            ADD COLUMN IF NOT EXISTS incoming_protocol VARCHAR(10) NOT NULL DEFAULT 'pop3',
+            ADD COLUMN IF NOT EXISTS imap_folder VARCHAR(255) NOT NULL DEFAULT 'INBOX'
+        ''')
+        
+        print("  📋 Création de la table 'mail_imap_state'...")
+        cur.execute(MAIL_IMAP_STATE_TABLE)
+        
+        conn.commit()
+        print("\n✅ Migration 014 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Avec incoming_protocol = 'imap', les champs pop_* désignent le serveur IMAP (port 993 en SSL)")
+        print("  - Les boîtes IMAP actives sont suivies en IDLE par un seul worker (IMAP_LISTENER_ENABLED)")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
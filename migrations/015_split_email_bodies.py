@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Migration 015: Corps des emails stockés à part
+- Table email_bodies (body_text, body_html), compressée dès 128 octets (toast_tuple_target),
+  en lz4 si le serveur PostgreSQL le permet
+- Colonne snippet dans emails (aperçu pour les listes), fonction email_snippet()
+- Transfert des corps existants puis suppression de emails.body_text / emails.body_html
+- Index des listes par dossier
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+EMAIL_BODIES_TABLE = '''
+    CREATE TABLE IF NOT EXISTS email_bodies (
+        email_id INTEGER PRIMARY KEY REFERENCES emails(id) ON DELETE CASCADE,
+        body_text TEXT,
+        body_html TEXT
+    ) WITH (toast_tuple_target = 128)
+'''
+
+# Aperçu texte d'un email : texte brut, ou HTML sans balises ni styles, espaces réduits, 200 caractères
+EMAIL_SNIPPET_FUNCTION = r'''
+    CREATE OR REPLACE FUNCTION email_snippet(body_text TEXT, body_html TEXT) RETURNS VARCHAR(200) AS $$
+        SELECT left(btrim(regexp_replace(
+            replace(replace(replace(replace(replace(replace(
+                COALESCE(NULLIF(btrim(body_text), ''), regexp_replace(regexp_replace(COALESCE(body_html, ''),
+                    '<(style|script|head)[^>]*?>.*?</\1>', ' ', 'gi'), '<[^>]*>', ' ', 'g')),
+                '&nbsp;', ' '), '&lt;', '<'), '&gt;', '>'), '&quot;', '"'), '&#39;', chr(39)), '&amp;', '&'),
+            '\s+', ' ', 'g')), 200)
+    $$ LANGUAGE sql IMMUTABLE
+'''
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 015: Corps des emails stockés à part...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création de la table 'email_bodies'...")
+        cur.execute(EMAIL_BODIES_TABLE)
+        cur.execute('SAVEPOINT lz4')
+        try:
+            cur.execute('''
+                ALTER TABLE email_bodies
+                ALTER COLUMN body_text SET COMPRESSION lz4,
+                ALTER COLUMN body_html SET COMPRESSION lz4
+            ''')
+            print("  ✓ Compression lz4")
+        except psycopg2.Error:
+            # PostgreSQL < 14 ou compilé sans lz4 : compression pglz par défaut
+            cur.execute('ROLLBACK TO SAVEPOINT lz4')
+            print("  ℹ️  lz4 indisponible, compression pglz")
+        
+        print("  📋 Ajout de la colonne 'snippet' dans emails...")
+        cur.execute(EMAIL_SNIPPET_FUNCTION)
+        cur.execute('ALTER TABLE emails ADD COLUMN IF NOT EXISTS snippet VARCHAR(200)')
+        
+        cur.execute('''
+            SELECT COUNT(*) AS count FROM information_schema.columns
+            WHERE table_name = 'emails' AND column_name = 'body_html'
+        ''')
+        if cur.fetchone()['count']:
+            print("  📋 Transfert des corps existants vers 'email_bodies'...")
+            cur.execute('''
+                INSERT INTO email_bodies (email_id, body_text, body_html)
+                SELECT id, body_text, body_html FROM emails
+                WHERE body_text IS NOT NULL OR body_html IS NOT NULL
+                ON CONFLICT (email_id) DO NOTHING
+            ''')
+            print(f"  ✓ {cur.rowcount} corps transférés")
+            cur.execute('UPDATE emails SET snippet = email_snippet(body_text, body_html)')
+            cur.execute('ALTER TABLE emails DROP COLUMN body_text, DROP COLUMN body_html')
+        
+        print("  📋 Création de l'index des listes par dossier...")
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_emails_folder
+            ON emails(mail_config_id, folder, date_received DESC)
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 015 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Les listes (GET /api/mail/emails/<id>) ne renvoient plus que les en-têtes et l'aperçu")
+        print("  - L'espace libéré dans emails est récupéré par VACUUM FULL emails (verrou exclusif)")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
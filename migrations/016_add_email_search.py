@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Migration 016: Recherche plein texte dans les emails
+- Fonctions email_plain_text() et email_search_vector() (français + anglais, adresses sans racinisation)
+- Table email_search (un tsvector par email, index GIN), tenue à jour par triggers sur emails et email_bodies
+- Index trigrammes (pg_trgm) sur les adresses, si l'extension est disponible
+- Index sur emails.client_email_indexed
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+EMAIL_SEARCH_FUNCTIONS = [
+    # Texte brut d'un email : texte, ou HTML sans balises ni styles, entités courantes décodées
+    r'''
+    CREATE OR REPLACE FUNCTION email_plain_text(body_text TEXT, body_html TEXT) RETURNS TEXT AS $$
+        SELECT btrim(regexp_replace(
+            replace(replace(replace(replace(replace(replace(
+                COALESCE(NULLIF(btrim(body_text), ''), regexp_replace(regexp_replace(COALESCE(body_html, ''),
+                    '<(style|script|head)[^>]*?>.*?</\1>', ' ', 'gi'), '<[^>]*>', ' ', 'g')),
+                '&nbsp;', ' '), '&lt;', '<'), '&gt;', '>'), '&quot;', '"'), '&#39;', chr(39)), '&amp;', '&'),
+            '\s+', ' ', 'g'))
+    $$ LANGUAGE sql IMMUTABLE
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION email_snippet(body_text TEXT, body_html TEXT) RETURNS VARCHAR(200) AS $$
+        SELECT left(email_plain_text(body_text, body_html), 200)
+    $$ LANGUAGE sql IMMUTABLE
+    ''',
+    # Objet (poids A), adresses (B, sans racinisation), corps limité à 100 000 caractères (D)
+    '''
+    CREATE OR REPLACE FUNCTION email_search_vector(
+        subject TEXT, from_email TEXT, to_email TEXT, cc_email TEXT, body_text TEXT, body_html TEXT
+    ) RETURNS tsvector AS $$
+        SELECT setweight(to_tsvector('french', COALESCE(subject, '')) || to_tsvector('english', COALESCE(subject, '')), 'A')
+            || setweight(to_tsvector('simple', concat_ws(' ', from_email, to_email, cc_email)), 'B')
+            || setweight(to_tsvector('french', body.plain) || to_tsvector('english', body.plain), 'D')
+        FROM (SELECT left(email_plain_text(body_text, body_html), 100000) AS plain) body
+    $$ LANGUAGE sql IMMUTABLE
+    ''',
+    '''
+    CREATE OR REPLACE FUNCTION email_search_refresh() RETURNS trigger AS $$
+    DECLARE
+        target_id INTEGER;
+    BEGIN
+        IF TG_TABLE_NAME = 'emails' THEN
+            target_id := NEW.id;
+        ELSE
+            target_id := NEW.email_id;
+        END IF;
+        
+        INSERT INTO email_search (email_id, document)
+        SELECT e.id, email_search_vector(e.subject, e.from_email, e.to_email, e.cc_email, b.body_text, b.body_html)
+        FROM emails e
+        LEFT JOIN email_bodies b ON b.email_id = e.id
+        WHERE e.id = target_id
+        ON CONFLICT (email_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    ''',
+]
+
+EMAIL_SEARCH_TABLE = '''
+    CREATE TABLE IF NOT EXISTS email_search (
+        email_id INTEGER PRIMARY KEY REFERENCES emails(id) ON DELETE CASCADE,
+        document tsvector NOT NULL
+    )
+'''
+
+EMAIL_SEARCH_TRIGGERS = [
+    'DROP TRIGGER IF EXISTS emails_search_refresh ON emails',
+    'DROP TRIGGER IF EXISTS email_bodies_search_refresh ON email_bodies',
+    '''
+    CREATE TRIGGER emails_search_refresh
+    AFTER INSERT OR UPDATE OF subject, from_email, to_email, cc_email ON emails
+    FOR EACH ROW EXECUTE FUNCTION email_search_refresh()
+    ''',
+    '''
+    CREATE TRIGGER email_bodies_search_refresh
+    AFTER INSERT OR UPDATE ON email_bodies
+    FOR EACH ROW EXECUTE FUNCTION email_search_refresh()
+    ''',
+]
+
+EMAIL_SEARCH_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_email_search_document ON email_search USING GIN (document)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_client_email ON emails (lower(client_email_indexed))',
+]
+
+# Recherche des correspondances d'un client par adresse (ILIKE '%adresse%')
+EMAIL_TRIGRAM_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_emails_from_trgm ON emails USING GIN (from_email gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_to_trgm ON emails USING GIN (to_email gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS idx_emails_cc_trgm ON emails USING GIN (cc_email gin_trgm_ops)',
+]
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 016: Recherche plein texte dans les emails...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création de la table 'email_search'...")
+        cur.execute(EMAIL_SEARCH_TABLE)
+        for statement in EMAIL_SEARCH_FUNCTIONS:
+            cur.execute(statement)
+        for statement in EMAIL_SEARCH_TRIGGERS:
+            cur.execute(statement)
+        
+        print("  📋 Indexation des emails existants...")
+        cur.execute('''
+            INSERT INTO email_search (email_id, document)
+            SELECT e.id, email_search_vector(e.subject, e.from_email, e.to_email, e.cc_email, b.body_text, b.body_html)
+            FROM emails e
+            LEFT JOIN email_bodies b ON b.email_id = e.id
+            ON CONFLICT (email_id) DO NOTHING
+        ''')
+        print(f"  ✓ {cur.rowcount} emails indexés")
+        
+        print("  📋 Création des index de recherche...")
+        for statement in EMAIL_SEARCH_INDEXES:
+            cur.execute(statement)
+        
+        cur.execute('SAVEPOINT trgm')
+        try:
+            cur.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for statement in EMAIL_TRIGRAM_INDEXES:
+                cur.execute(statement)
+            print("  ✓ Index trigrammes sur les adresses")
+        except psycopg2.Error:
+            # Extension absente (paquet contrib non installé) ou droits insuffisants
+            cur.execute('ROLLBACK TO SAVEPOINT trgm')
+            print("  ⚠️  pg_trgm indisponible : recherche par adresse sans index trigrammes")
+        
+        conn.commit()
+        print("\n✅ Migration 016 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Recherche: GET /api/mail/search?etablissement_id=…&q=…&guest_email=…&sejour_id=…")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Migration 017: Envoi des newsletters par lots
+- Colonnes de suivi dans newsletters (HTML rendu, compteurs, début et fin d'envoi)
+- Table newsletter_chunks (un appel SendGrid par lot, statut, tentatives, bail)
+- Table newsletter_recipients (statut par destinataire)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+NEWSLETTER_CHUNKS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS newsletter_chunks (
+        id BIGSERIAL PRIMARY KEY,
+        newsletter_id INTEGER NOT NULL REFERENCES newsletters(id) ON DELETE CASCADE,
+        chunk_index INTEGER NOT NULL,
+        recipient_count INTEGER NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        last_error TEXT,
+        sent_at TIMESTAMP,
+        UNIQUE (newsletter_id, chunk_index)
+    )
+'''
+
+NEWSLETTER_RECIPIENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS newsletter_recipients (
+        id BIGSERIAL PRIMARY KEY,
+        newsletter_id INTEGER NOT NULL REFERENCES newsletters(id) ON DELETE CASCADE,
+        chunk_id BIGINT NOT NULL REFERENCES newsletter_chunks(id) ON DELETE CASCADE,
+        email VARCHAR(255) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'pending',
+        error TEXT,
+        UNIQUE (newsletter_id, email)
+    )
+'''
+
+NEWSLETTER_DELIVERY_INDEXES = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_newsletter_chunks_due
+    ON newsletter_chunks(next_attempt_at) WHERE status IN ('pending', 'sending')
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_newsletter_chunks_sent
+    ON newsletter_chunks(sent_at) WHERE status = 'sent'
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_newsletter_recipients_chunk
+    ON newsletter_recipients(chunk_id)
+    ''',
+]
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 017: Envoi des newsletters par lots...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Ajout des colonnes de suivi dans newsletters...")
+        cur.execute('''
+            ALTER TABLE newsletters
+            ADD COLUMN IF NOT EXISTS html_content TEXT,
+            ADD COLUMN IF NOT EXISTS total_recipients INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS sent_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS failed_count INTEGER NOT NULL DEFAULT 0,
+            ADD COLUMN IF NOT EXISTS completed_at TIMESTAMP
+        ''')
+        cur.execute('''
+            UPDATE newsletters SET total_recipients = jsonb_array_length(recipient_emails)
+            WHERE total_recipients = 0 AND jsonb_typeof(recipient_emails) = 'array'
+        ''')
+        
+        print("  📋 Création des tables 'newsletter_chunks' et 'newsletter_recipients'...")
+        cur.execute(NEWSLETTER_CHUNKS_TABLE)
+        cur.execute(NEWSLETTER_RECIPIENTS_TABLE)
+        for statement in NEWSLETTER_DELIVERY_INDEXES:
+            cur.execute(statement)
+        
+        conn.commit()
+        print("\n✅ Migration 017 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - POST /api/newsletters/send enregistre la campagne et répond immédiatement")
+        print("  - Les lots sont envoyés par les threads de chaque worker (NEWSLETTER_DISPATCH_ENABLED)")
+        print("  - Suivi: GET /api/newsletters/<id>/progress")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
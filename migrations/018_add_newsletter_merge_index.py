@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Migration 018: Champs de fusion des newsletters
+- Index sur lower(personnes.email) (profil des destinataires lu par lot à l'envoi)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 018: Champs de fusion des newsletters...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création de l'index sur lower(personnes.email)...")
+        cur.execute('''
+            CREATE INDEX IF NOT EXISTS idx_personnes_email_lower
+            ON personnes (lower(email))
+        ''')
+        
+        conn.commit()
+        print("\n✅ Migration 018 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Champs de fusion: {{ prenom }}, {{ nom }}, {{ etablissement }}, {{ dernier_sejour }}...")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Migration 019: Segments de destinataires des newsletters
+- Table newsletter_segments (critères enregistrés, résolus en SQL à l'envoi)
+- Table newsletter_optouts (adresses désabonnées, par établissement)
+- Colonnes segment_id et segment_criteres dans newsletters (recipient_emails devient facultatif)
+- Index utilisés par la résolution des segments (adresse comparée sans espaces autour)
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+NEWSLETTER_SEGMENTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS newsletter_segments (
+        id SERIAL PRIMARY KEY,
+        etablissement_id INTEGER NOT NULL REFERENCES etablissements(id) ON DELETE CASCADE,
+        nom VARCHAR(200) NOT NULL,
+        criteres JSONB NOT NULL DEFAULT '{}',
+        created_by_user_id INTEGER REFERENCES users(id) ON DELETE SET NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (etablissement_id, nom)
+    )
+'''
+
+NEWSLETTER_OPTOUTS_TABLE = '''
+    CREATE TABLE IF NOT EXISTS newsletter_optouts (
+        etablissement_id INTEGER NOT NULL REFERENCES etablissements(id) ON DELETE CASCADE,
+        email_key VARCHAR(255) NOT NULL,
+        email VARCHAR(255) NOT NULL,
+        source VARCHAR(50) NOT NULL DEFAULT 'manuel',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (etablissement_id, email_key)
+    )
+'''
+
+NEWSLETTER_SEGMENT_INDEXES = [
+    'CREATE INDEX IF NOT EXISTS idx_reservations_etablissement_id ON reservations(etablissement_id)',
+    'CREATE INDEX IF NOT EXISTS idx_personnes_reservation_id ON personnes(reservation_id)',
+    'CREATE INDEX IF NOT EXISTS idx_sejours_extras_reservation_id ON sejours_extras(reservation_id)',
+    # Adresses comparées sans les espaces saisis autour (remplace idx_personnes_email_lower, migration 018)
+    'CREATE INDEX IF NOT EXISTS idx_personnes_email_key ON personnes (lower(btrim(email)))',
+    'DROP INDEX IF EXISTS idx_personnes_email_lower',
+]
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 019: Segments de destinataires des newsletters...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Création des tables 'newsletter_segments' et 'newsletter_optouts'...")
+        cur.execute(NEWSLETTER_SEGMENTS_TABLE)
+        cur.execute(NEWSLETTER_OPTOUTS_TABLE)
+        
+        print("  📋 Ajout du segment dans newsletters...")
+        cur.execute('''
+            ALTER TABLE newsletters
+            ADD COLUMN IF NOT EXISTS segment_id INTEGER REFERENCES newsletter_segments(id) ON DELETE SET NULL,
+            ADD COLUMN IF NOT EXISTS segment_criteres JSONB
+        ''')
+        cur.execute('ALTER TABLE newsletters ALTER COLUMN recipient_emails DROP NOT NULL')
+        
+        print("  📋 Création des index de résolution des segments...")
+        for statement in NEWSLETTER_SEGMENT_INDEXES:
+            cur.execute(statement)
+        
+        conn.commit()
+        print("\n✅ Migration 019 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Segments: /api/newsletters/segments (pays, dates de séjour, nombre de séjours, extras, abonnement)")
+        print("  - POST /api/newsletters/send accepte segment_id à la place de recipient_emails")
+        print("  - Les adresses désabonnées (/api/newsletters/optouts) ne reçoivent plus aucune newsletter")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()
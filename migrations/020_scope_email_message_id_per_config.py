@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Migration 020: Unicité des Message-ID par configuration mail
+- UNIQUE(mail_config_id, message_id) au lieu d'une unicité globale : un même
+  message reçu par deux établissements est enregistré dans chaque boîte, et la
+  synchronisation d'une boîte ne modifie plus les emails d'une autre
+"""
+
+import os
+import sys
+import psycopg2
+from psycopg2.extras import RealDictCursor
+
+def get_db_connection():
+    """Obtenir une connexion à la base de données"""
+    try:
+        database_url = os.environ.get('DATABASE_URL')
+        if not database_url:
+            print("❌ DATABASE_URL n'est pas défini dans les variables d'environnement")
+            sys.exit(1)
+        
+        conn = psycopg2.connect(database_url, cursor_factory=RealDictCursor)
+        return conn
+    except Exception as e:
+        print(f"❌ Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+def migrate():
+    """Exécuter la migration"""
+    print("🔧 Migration 020: Unicité des Message-ID par configuration mail...")
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        print("  📋 Unicité des Message-ID par configuration mail...")
+        cur.execute('''
+            ALTER TABLE emails 
+            DROP CONSTRAINT IF EXISTS emails_message_id_key
+        ''')
+        cur.execute('''
+            SELECT 1 FROM pg_constraint WHERE conname = 'emails_config_message_id_key'
+        ''')
+        if cur.fetchone():
+            print("  ✓ La contrainte 'emails_config_message_id_key' existe déjà")
+        else:
+            cur.execute('''
+                ALTER TABLE emails
+                ADD CONSTRAINT emails_config_message_id_key UNIQUE (mail_config_id, message_id)
+            ''')
+        
+        conn.commit()
+        print("\n✅ Migration 020 terminée avec succès!")
+        print("\nℹ️  Notes:")
+        print("  - Un message reçu par plusieurs boîtes est enregistré une fois par boîte")
+        print("  - Les UIDL et drapeaux IMAP d'une boîte ne pointent plus que vers ses propres emails")
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"\n❌ Erreur lors de la migration: {e}")
+        sys.exit(1)
+    finally:
+        cur.close()
+        conn.close()
+
+if __name__ == '__main__':
+    migrate()